@@ -1,2 +1,4 @@
 from .endpoints import chat_router
-__all__ = ["chat_router"]
\ No newline at end of file
+from .admin import admin_router
+from .dependencies import get_discutidor, require_admin
+__all__ = ["chat_router", "admin_router", "get_discutidor", "require_admin"]
\ No newline at end of file
@@ -0,0 +1,119 @@
+from ..structures import ProfilingRequest, PurgeRequest, CapacityRequest
+from ..services.discutidor3000 import Discutidor3000
+from ..services.export import ndjson_chunks, gzip_chunks
+from ..telemetry.profiling import profiler, ProfilingError
+
+from .dependencies import get_discutidor, require_admin
+
+import os
+import logging
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+logger = logging.getLogger(__name__)
+admin_router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@admin_router.post("/profiling/start")
+def start_profiling(request: ProfilingRequest):
+    try:
+        status = profiler.start(mode=request.mode,
+                                sample_rate=request.sample_rate,
+                                duration=request.duration,
+                                interval_ms=request.interval_ms)
+        return JSONResponse(status_code=200, content=status)
+    except ProfilingError as pe:
+        raise HTTPException(status_code=409, detail=str(pe))
+
+
+@admin_router.post("/profiling/stop")
+def stop_profiling():
+    return JSONResponse(status_code=200, content=profiler.stop())
+
+
+@admin_router.get("/profiling")
+def get_profiling_status(limit: int = Query(20, ge=1, le=200)):
+    return JSONResponse(
+        status_code=200,
+        content={**profiler.status(), "top_allocations": profiler.top_allocations(limit)})
+
+
+@admin_router.get("/profiling/download")
+def download_profile():
+    """Pilas plegadas de la última sesión de este worker, para flamegraph.pl
+    o speedscope. La cabecera `X-Worker-Pid` indica qué worker respondió."""
+    pid = os.getpid()
+    if profiler.mode is None:
+        raise HTTPException(status_code=404, headers={"X-Worker-Pid": str(pid)},
+                            detail=f"No hay resultados de perfilado en el worker {pid}.")
+    return PlainTextResponse(
+        profiler.folded(),
+        headers={"X-Worker-Pid": str(pid),
+                 "Content-Disposition":
+                 f'attachment; filename="profile-{profiler.mode}-{pid}-{int(profiler.started_at)}.folded"'})
+
+
+@admin_router.get("/conversations/export")
+def export_conversations(posture: Optional[str] = None,
+                         since: Optional[str] = Query(None, description="ISO 8601"),
+                         until: Optional[str] = Query(None, description="ISO 8601"),
+                         compress: bool = False,
+                         discutidor: Discutidor3000 = Depends(get_discutidor)):
+    """Exporta todas las conversaciones como NDJSON en streaming."""
+    for value in (since, until):
+        if value:
+            try:
+                datetime.fromisoformat(value)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Fecha inválida: {value}")
+    chunks = ndjson_chunks(discutidor.export_conversations(posture=posture,
+                                                           since=since,
+                                                           until=until))
+    filename = "conversations.ndjson"
+    media_type = "application/x-ndjson"
+    if compress:
+        chunks = gzip_chunks(chunks)
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(chunks,
+                             media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+@admin_router.post("/conversations/purge")
+def purge_conversations(request: PurgeRequest,
+                        discutidor: Discutidor3000 = Depends(get_discutidor)):
+    """Lanza una purga masiva en segundo plano; devuelve el ID del trabajo."""
+    if request.older_than_days is None and not request.posture and not request.client_id:
+        raise HTTPException(status_code=400,
+                            detail="Indica al menos un filtro: older_than_days, posture o client_id.")
+    job_id = discutidor.start_purge(**request.model_dump())
+    return JSONResponse(status_code=202, content={"job_id": job_id})
+
+
+@admin_router.get("/conversations/purge/{job_id}")
+def get_purge_progress(job_id: str,
+                       discutidor: Discutidor3000 = Depends(get_discutidor)):
+    progress = discutidor.get_purge_progress(job_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Trabajo de purga no encontrado.")
+    return JSONResponse(status_code=200, content={"job_id": job_id, **progress})
+
+
+@admin_router.post("/capacity")
+def start_capacity_report(request: CapacityRequest,
+                          discutidor: Discutidor3000 = Depends(get_discutidor)):
+    """Lanza el informe de capacidad en segundo plano; devuelve el ID del trabajo."""
+    job_id = discutidor.start_capacity_report(**request.model_dump())
+    return JSONResponse(status_code=202, content={"job_id": job_id})
+
+
+@admin_router.get("/capacity/{job_id}")
+def get_capacity_report(job_id: str,
+                        discutidor: Discutidor3000 = Depends(get_discutidor)):
+    report = discutidor.get_capacity_report(job_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Informe de capacidad no encontrado.")
+    return JSONResponse(status_code=200, content={"job_id": job_id, **report})
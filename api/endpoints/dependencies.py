@@ -0,0 +1,25 @@
+from ..services.discutidor3000 import Discutidor3000
+
+import os, secrets
+from typing import Optional
+from fastapi import Header, HTTPException, Request
+
+
+def get_discutidor(request: Request) -> Discutidor3000:
+    """Instancia de Discutidor3000 creada en el lifespan de la aplicación."""
+    discutidor = getattr(request.app.state, "discutidor", None)
+    if discutidor is None:
+        raise HTTPException(status_code=503, detail="Servicio no inicializado.")
+    return discutidor
+
+
+def require_admin(admin_token: Optional[str] = Header(None, alias="X-Admin-Token")) -> None:
+    """Exige la cabecera `X-Admin-Token` igual a `ADMIN_TOKEN`. Sin
+    `ADMIN_TOKEN` configurado, los endpoints de administración quedan
+    deshabilitados."""
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403,
+                            detail="Endpoints de administración deshabilitados.")
+    if not admin_token or not secrets.compare_digest(admin_token, expected):
+        raise HTTPException(status_code=401, detail="Token de administración inválido.")
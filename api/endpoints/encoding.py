@@ -0,0 +1,85 @@
+from typing import (
+    Any,
+    Dict,
+    Optional)
+
+import os, json, gzip
+from fastapi import Request
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+"""Codificación de respuestas JSON sin pasos intermedios: los modelos de
+pydantic se serializan directamente a bytes con `model_dump_json` y los
+diccionarios con orjson (si está instalado) o con json sin escapar
+caracteres no ASCII. Las respuestas grandes (historial, listados) se
+comprimen con brotli o gzip según `Accept-Encoding`."""
+
+try:
+    import orjson
+except ImportError:  # dependencia opcional
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # dependencia opcional
+    brotli = None
+
+
+def dumps(content: Any) -> bytes:
+    """Serializa a JSON compacto en UTF-8."""
+    if isinstance(content, BaseModel):
+        return content.model_dump_json().encode()
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Codificación preferida por el cliente entre las disponibles (`br`,
+    `gzip`), respetando los pesos `q`. None si no acepta ninguna."""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        try:
+            q = float(params.strip()[2:]) if params.strip().startswith("q=") else 1.0
+        except ValueError:
+            q = 0.0
+        weights[name.strip().lower()] = q
+    available = ["br", "gzip"] if brotli is not None else ["gzip"]
+    candidates = [(weights.get(name, weights.get("*", 0.0)), -rank, name)
+                  for rank, name in enumerate(available)]
+    q, _, name = max(candidates)
+    return name if q > 0 else None
+
+
+def json_response(content: Any,
+                  request: Optional[Request] = None,
+                  status_code: int = 200,
+                  headers: Optional[Dict[str, str]] = None) -> Response:
+    """Respuesta JSON codificada con `dumps`. Con `request`, el cuerpo se
+    comprime si supera `COMPRESS_MIN_BYTES` (por defecto 1024; 0 desactiva
+    la compresión) y el cliente acepta brotli o gzip.
+    Args:
+        content (Any): Modelo de pydantic o estructura serializable.
+        request (Optional[Request]): Petición, para negociar la compresión.
+        status_code (int): Código de estado.
+        headers (Optional[Dict[str, str]]): Cabeceras adicionales.
+    Returns:
+        Response: Respuesta con el cuerpo ya codificado."""
+    body = dumps(content)
+    headers = dict(headers or {})
+    if request is not None:
+        headers["Vary"] = "Accept-Encoding"
+        min_bytes = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+        encoding = (negotiate_encoding(request.headers.get("accept-encoding"))
+                    if min_bytes and len(body) >= min_bytes else None)
+        if encoding == "br":
+            body = brotli.compress(body, quality=4)
+        elif encoding == "gzip":
+            body = gzip.compress(body, compresslevel=5, mtime=0)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+    return Response(content=body, status_code=status_code,
+                    headers=headers, media_type="application/json")
@@ -1,18 +1,24 @@
 from ..structures import ChatRequest
 from ..services.discutidor3000 import (
     Discutidor3000,
+    BackendNotFoundError,
     ConversationNotFoundError,
-    PostureExtractionError
+    InvalidForkError,
+    ModelNotAllowedError,
+    PostureExtractionError,
+    StorageWriteError
 )
 
-import os, logging
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
-from dotenv import load_dotenv
-load_dotenv()
+from ..telemetry.profiling import profiler
+from .dependencies import get_discutidor
+from .encoding import json_response
+
+import logging
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response
 
 logger = logging.getLogger(__name__)
-discutidor = Discutidor3000(api_key=os.getenv("OPENROUTER_API_KEY"))
 chat_router = APIRouter()
 
 @chat_router.get("/")
@@ -23,38 +29,213 @@ def hola():
 
 
 @chat_router.post("/chat")
-def chat_endpoint(request: ChatRequest):
+def chat_endpoint(request: ChatRequest,
+                  client_id: Optional[str] = Header(None, alias="X-Client-Id"),
+                  discutidor: Discutidor3000 = Depends(get_discutidor)):
     try:
-        response = discutidor.chat(
-            message=request.message,
-            conversation_id=request.conversation_id)
+        # perfilado bajo demanda de una fracción de las peticiones
+        with profiler.profile_request():
+            response = discutidor.chat(
+                message=request.message,
+                conversation_id=request.conversation_id,
+                backend=request.backend,
+                model=request.model,
+                client_id=client_id,
+                speculative=request.speculative)
         if response is None:
             raise HTTPException(status_code=500,
                                  detail="Error en la conversación, inténtalo de nuevo.")
-        return JSONResponse(
-            status_code=200,
-            content=response.model_dump())
+        # directamente de ChatResponse a bytes, sin diccionario intermedio
+        return json_response(response)
     
     except ConversationNotFoundError as cnfe:
         logger.error(f"Conversación no encontrada en el endpoint /chat: {cnfe}")
         raise HTTPException(status_code=404, detail=str(cnfe))
+    except BackendNotFoundError as bnfe:
+        logger.error(f"Backend no configurado en el endpoint /chat: {bnfe}")
+        raise HTTPException(status_code=400, detail=str(bnfe))
+    except ModelNotAllowedError as mnae:
+        logger.error(f"Modelo no permitido en el endpoint /chat: {mnae}")
+        raise HTTPException(status_code=400, detail=str(mnae))
     except PostureExtractionError as pee:
         logger.error(f"Error de extracción de postura en el endpoint /chat: {pee}")
         raise HTTPException(status_code=500, detail=str(pee))
+    except StorageWriteError as swe:
+        logger.error(f"Error de almacenamiento en el endpoint /chat: {swe}")
+        raise HTTPException(status_code=503, detail=str(swe))
     except Exception as e:
         logger.error(f"Error en el endpoint /chat: {e}")
-        logger.debug(f"Trazo completo del error:", exc_info=True)
+        logger.debug("Trazo completo del error:", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
     
 
 @chat_router.get("/conversations")
-def get_conversations():
+def get_conversations(request: Request,
+                      posture: Optional[str] = Query(None, min_length=1, max_length=500),
+                      limit: int = Query(100, ge=1, le=1000),
+                      offset: int = Query(0, ge=0),
+                      discutidor: Discutidor3000 = Depends(get_discutidor)):
+    try:
+        if posture is not None:
+            found = discutidor.find_conversations(posture, limit=limit, offset=offset)
+            if found is None:
+                raise HTTPException(status_code=500,
+                                    detail="Error al consultar el índice, inténtalo de nuevo.")
+            return json_response(found, request)
+        # sin postura: página de las más recientes, sin recorrer todas las claves
+        return json_response(discutidor.list_conversations(limit=limit, offset=offset), request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error en el endpoint /conversations: {e}")
+        logger.debug("Trazo completo del error:", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@chat_router.get("/conversations/search")
+def search_conversations(request: Request,
+                         q: str = Query(..., min_length=1, max_length=200),
+                         mode: str = Query("prefix", pattern="^(prefix|keywords)$"),
+                         limit: int = Query(20, ge=1, le=100),
+                         discutidor: Discutidor3000 = Depends(get_discutidor)):
+    try:
+        results = discutidor.search_postures(q, mode=mode, limit=limit)
+        if results is None:
+            raise HTTPException(status_code=500,
+                                detail="Error al consultar el índice, inténtalo de nuevo.")
+        return json_response(results, request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error en el endpoint /conversations/search: {e}")
+        logger.debug("Trazo completo del error:", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Comparación débil de `If-None-Match` con el ETag actual."""
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+@chat_router.get("/conversations/{conversation_id}/messages")
+def get_messages(conversation_id: str,
+                 request: Request,
+                 offset: int = Query(0, ge=0),
+                 limit: int = Query(50, ge=1, le=500),
+                 since: Optional[int] = Query(None, ge=0),
+                 if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+                 discutidor: Discutidor3000 = Depends(get_discutidor)):
+    try:
+        # sin cambios desde la versión del cliente: 304 sin leer la conversación.
+        # El ETag es débil: el mismo contenido se sirve con distintas codificaciones
+        if if_none_match:
+            version = discutidor.get_conversation_version(conversation_id)
+            if version is not None and _etag_matches(if_none_match, f'"{version}"'):
+                return Response(status_code=304,
+                                headers={"ETag": f'W/"{version}"', "Cache-Control": "no-cache",
+                                         "Vary": "Accept-Encoding"})
+        page = discutidor.get_messages(conversation_id, offset=offset, limit=limit, since=since)
+        return json_response(
+            page, request,
+            headers={"ETag": f'W/"{page["version"]}"', "Cache-Control": "no-cache"})
+    except ConversationNotFoundError as cnfe:
+        raise HTTPException(status_code=404, detail=str(cnfe))
+    except Exception as e:
+        logger.error(f"Error en el endpoint /conversations/messages: {e}")
+        logger.debug("Trazo completo del error:", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@chat_router.post("/conversations/{conversation_id}/fork")
+def fork_conversation(conversation_id: str,
+                      at: Optional[int] = Query(None, ge=1),
+                      client_id: Optional[str] = Header(None, alias="X-Client-Id"),
+                      discutidor: Discutidor3000 = Depends(get_discutidor)):
+    try:
+        fork = discutidor.fork_conversation(conversation_id, at=at, client_id=client_id)
+        if fork is None:
+            raise HTTPException(status_code=500,
+                                detail="Error al bifurcar la conversación, inténtalo de nuevo.")
+        return JSONResponse(
+            status_code=201,
+            content={"conversation_id": fork.conversation_id,
+                     "forked_from": conversation_id,
+                     "messages": len(fork.messages),
+                     "shared": fork.fork_at})
+    except HTTPException:
+        raise
+    except ConversationNotFoundError as cnfe:
+        raise HTTPException(status_code=404, detail=str(cnfe))
+    except InvalidForkError as ife:
+        raise HTTPException(status_code=400, detail=str(ife))
+    except Exception as e:
+        logger.error(f"Error en el endpoint /conversations/fork: {e}")
+        logger.debug("Trazo completo del error:", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@chat_router.delete("/conversations/{conversation_id}")
+def delete_conversation(conversation_id: str,
+                        discutidor: Discutidor3000 = Depends(get_discutidor)):
+    try:
+        discutidor.delete_conversation(conversation_id)
+        return Response(status_code=204)
+    except ConversationNotFoundError as cnfe:
+        raise HTTPException(status_code=404, detail=str(cnfe))
+    except Exception as e:
+        logger.error(f"Error en el endpoint DELETE /conversations: {e}")
+        logger.debug("Trazo completo del error:", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@chat_router.get("/router/stats")
+def get_router_stats(discutidor: Discutidor3000 = Depends(get_discutidor)):
     try:
-        conversations = discutidor.get_all_conversations()
         return JSONResponse(
             status_code=200,
-            content={"conversations": conversations or {}})
+            content={"targets": discutidor.get_router_stats()})
     except Exception as e:
-        logger.error(f"Error en el endpoint /conversations: {e}")
-        logger.debug(f"Trazo completo del error:", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        logger.error(f"Error en el endpoint /router/stats: {e}")
+        logger.debug("Trazo completo del error:", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@chat_router.get("/storage/stats")
+def get_storage_stats(discutidor: Discutidor3000 = Depends(get_discutidor)):
+    try:
+        return JSONResponse(status_code=200, content=discutidor.get_storage_stats())
+    except Exception as e:
+        logger.error(f"Error en el endpoint /storage/stats: {e}")
+        logger.debug("Trazo completo del error:", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@chat_router.get("/openings/stats")
+def get_opening_stats(discutidor: Discutidor3000 = Depends(get_discutidor)):
+    try:
+        return JSONResponse(status_code=200, content=discutidor.get_opening_stats())
+    except Exception as e:
+        logger.error(f"Error en el endpoint /openings/stats: {e}")
+        logger.debug("Trazo completo del error:", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@chat_router.get("/usage/top")
+def get_top_usage(by: str = Query("clients", pattern="^(clients|models|conversations)$"),
+                  days: int = Query(1, ge=1, le=90),
+                  limit: int = Query(10, ge=1, le=100),
+                  discutidor: Discutidor3000 = Depends(get_discutidor)):
+    try:
+        top = discutidor.get_top_usage(dimension=by, days=days, limit=limit)
+        if top is None:
+            raise HTTPException(status_code=500,
+                                detail="Error al obtener el consumo, inténtalo de nuevo.")
+        return JSONResponse(
+            status_code=200,
+            content={"by": by, "days": days, "top": top})
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error en el endpoint /usage/top: {e}")
+        logger.debug("Trazo completo del error:", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
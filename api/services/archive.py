@@ -0,0 +1,246 @@
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple)
+
+import os, json, zlib, fcntl, struct, threading, logging
+
+"""Nivel de archivo para conversaciones inactivas.
+Las conversaciones se guardan comprimidas en archivos de segmento de solo
+anexado (`segment-NNNNNN.seg`). Cada registro es una cabecera de 8 bytes
+(longitud y CRC32 del contenido comprimido) seguida del JSON comprimido con
+zlib. Un índice en disco de solo anexado (`index.ndjson`) asocia cada ID con
+su segmento, offset y longitud; la última entrada de un ID es la vigente y
+una entrada `deleted` lo elimina."""
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct(">II")
+
+
+class ArchiveCorruptedError(Exception):
+    pass
+
+
+class ConversationArchive:
+    """Archivo de conversaciones en segmentos comprimidos.
+    Varios procesos pueden leerlo; las escrituras se serializan con un
+    bloqueo de archivo y cada lector incorpora las entradas nuevas del
+    índice cuando no encuentra un ID.
+    Args:
+        directory (str): Directorio de los segmentos y el índice.
+        segment_max_bytes (int): Tamaño a partir del cual se abre un segmento nuevo.
+        compression_level (int): Nivel de zlib (1-9)."""
+
+    def __init__(self,
+                 directory: str,
+                 segment_max_bytes: int = 64 * 1024 * 1024,
+                 compression_level: int = 6):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.compression_level = compression_level
+        os.makedirs(directory, exist_ok=True)
+        self.index_path = os.path.join(directory, "index.ndjson")
+        self.lock_path = os.path.join(directory, ".lock")
+        self.lock = threading.Lock()
+        self.index: Dict[str, Tuple[int, int, int]] = {}
+        self._index_offset = 0
+        self._refresh()
+
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"segment-{segment:06d}.seg")
+
+
+    def _refresh(self) -> None:
+        """Incorpora las entradas del índice escritas desde la última lectura,
+        incluidas las de otros procesos."""
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "rb") as f:
+            f.seek(self._index_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # entrada a medio escribir
+                self._index_offset += len(line)
+                entry = json.loads(line)
+                if entry.get("deleted"):
+                    self.index.pop(entry["id"], None)
+                else:
+                    self.index[entry["id"]] = (entry["segment"], entry["offset"], entry["length"])
+
+
+    def _current_segment(self) -> int:
+        segments = [int(name[8:14]) for name in os.listdir(self.directory)
+                    if name.startswith("segment-") and name.endswith(".seg")]
+        segment = max(segments, default=1)
+        path = self._segment_path(segment)
+        if os.path.exists(path) and os.path.getsize(path) >= self.segment_max_bytes:
+            segment += 1
+        return segment
+
+
+    def put_many(self, conversations: Dict[str, str]) -> int:
+        """Anexa varias conversaciones serializadas y las indexa. Los
+        segmentos se sincronizan con disco antes de escribir el índice, de
+        modo que una entrada del índice siempre apunta a datos completos.
+        Args:
+            conversations (Dict[str, str]): ID -> JSON de la conversación.
+        Returns:
+            int: Bytes comprimidos escritos."""
+        if not conversations:
+            return 0
+        written = 0
+        with self.lock, open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                entries = []
+                segment = self._current_segment()
+                f = open(self._segment_path(segment), "ab")
+                try:
+                    for conversation_id, data in conversations.items():
+                        if f.tell() >= self.segment_max_bytes:
+                            f.flush()
+                            os.fsync(f.fileno())
+                            f.close()
+                            segment += 1
+                            f = open(self._segment_path(segment), "ab")
+                        payload = zlib.compress(data.encode(), self.compression_level)
+                        offset = f.tell()
+                        f.write(_HEADER.pack(len(payload), zlib.crc32(payload)))
+                        f.write(payload)
+                        written += _HEADER.size + len(payload)
+                        entries.append({"id": conversation_id, "segment": segment,
+                                        "offset": offset,
+                                        "length": _HEADER.size + len(payload)})
+                    f.flush()
+                    os.fsync(f.fileno())
+                finally:
+                    f.close()
+                self._append_index(entries)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return written
+
+
+    def put(self, conversation_id: str, data: str) -> int:
+        return self.put_many({conversation_id: data})
+
+
+    def _append_index(self, entries) -> None:
+        with open(self.index_path, "ab") as f:
+            f.write("".join(json.dumps(e) + "\n" for e in entries).encode())
+            f.flush()
+            os.fsync(f.fileno())
+        self._refresh()
+
+
+    def get(self, conversation_id: str) -> Optional[str]:
+        """Lee una conversación archivada.
+        Returns:
+            Optional[str]: JSON de la conversación, o None si no está archivada."""
+        with self.lock:
+            location = self.index.get(conversation_id)
+            if location is None:
+                self._refresh()
+                location = self.index.get(conversation_id)
+        if location is None:
+            return None
+        segment, offset, length = location
+        with open(self._segment_path(segment), "rb") as f:
+            f.seek(offset)
+            record = f.read(length)
+        size, crc = _HEADER.unpack_from(record)
+        payload = record[_HEADER.size:_HEADER.size + size]
+        if len(payload) != size or zlib.crc32(payload) != crc:
+            raise ArchiveCorruptedError(
+                f"Registro corrupto: {conversation_id} (segmento {segment}, offset {offset})")
+        return zlib.decompress(payload).decode()
+
+
+    def delete(self, conversation_id: str) -> bool:
+        """Elimina una conversación del índice. El espacio del segmento no se recupera."""
+        return bool(self.delete_many([conversation_id]))
+
+
+    def delete_many(self, conversation_ids: List[str]) -> List[str]:
+        """Elimina varias conversaciones del índice con una sola escritura.
+        Returns:
+            List[str]: IDs que estaban archivados."""
+        with self.lock, open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                deleted = [cid for cid in dict.fromkeys(conversation_ids) if cid in self.index]
+                if deleted:
+                    self._append_index([{"id": cid, "deleted": True} for cid in deleted])
+                return deleted
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+    def __contains__(self, conversation_id: str) -> bool:
+        with self.lock:
+            self._refresh()
+            return conversation_id in self.index
+
+
+    def __len__(self) -> int:
+        with self.lock:
+            self._refresh()
+            return len(self.index)
+
+
+    def ids(self) -> Iterator[str]:
+        with self.lock:
+            self._refresh()
+            return iter(list(self.index))
+
+
+    def stats(self) -> Dict[str, Any]:
+        segments = [name for name in os.listdir(self.directory) if name.endswith(".seg")]
+        return {"conversations": len(self),
+                "segments": len(segments),
+                "bytes": sum(os.path.getsize(os.path.join(self.directory, name))
+                             for name in segments)}
+
+
+class ArchiveSweeper:
+    """Hilo que archiva periódicamente las conversaciones inactivas.
+    Args:
+        service: RedisService con el archivo configurado.
+        interval (float): Segundos entre pasadas."""
+
+    def __init__(self, service, interval: float = 300.0):
+        self.service = service
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="archive-sweeper", daemon=True)
+        self._thread.start()
+
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                archived = self.service.archive_idle()
+                if archived:
+                    logger.info(f"Conversaciones archivadas: {archived}")
+            except Exception as e:
+                logger.error(f"Error en el barrido de archivo: {e}")
+
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
@@ -0,0 +1,307 @@
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional)
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests, json, time, logging
+from requests.adapters import HTTPAdapter
+
+from ..telemetry import tracing
+
+logger = logging.getLogger(__name__)
+
+
+def mark_cache_prefix(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Marca el prefijo estable de la conversación con `cache_control` para
+    que el proveedor reutilice su caché de prompts entre turnos.
+    Se colocan dos puntos de corte: el system prompt y el último mensaje del
+    historial previo al mensaje nuevo. Todo lo anterior a cada punto es
+    idéntico turno tras turno. No modifica la lista original.
+    Args:
+        messages (List[Dict]): Mensajes en formato de chat.
+    Returns:
+        List[Dict]: Mensajes con los puntos de corte en formato de partes."""
+    breakpoints = {0} if messages and messages[0].get("role") == "system" else set()
+    if len(messages) >= 3:
+        breakpoints.add(len(messages) - 2)
+    marked = []
+    for index, message in enumerate(messages):
+        if index in breakpoints and isinstance(message.get("content"), str):
+            message = {**message,
+                       "content": [{"type": "text",
+                                    "text": message["content"],
+                                    "cache_control": {"type": "ephemeral"}}]}
+        marked.append(message)
+    return marked
+
+
+def parse_usage(response: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    """Extrae el consumo de tokens del bloque `usage` de una respuesta.
+    Los tokens cacheados se leen de `prompt_tokens_details.cached_tokens`
+    (formato OpenAI/OpenRouter) o de `prompt_cache_hit_tokens` (DeepSeek).
+    Returns:
+        Dict[str, int]: prompt_tokens, completion_tokens y cached_tokens."""
+    usage = (response or {}).get("usage") or {}
+    details = usage.get("prompt_tokens_details") or {}
+    cached = details.get("cached_tokens", usage.get("prompt_cache_hit_tokens", 0))
+    return {"prompt_tokens": int(usage.get("prompt_tokens") or 0),
+            "completion_tokens": int(usage.get("completion_tokens") or 0),
+            "cached_tokens": int(cached or 0)}
+
+
+class LLMBackend(ABC):
+    """Interfaz de un backend de completions de chat.
+    Cada backend declara qué capacidades soporta, para que el chatbot
+    pueda adaptar las peticiones (p. ej. modo JSON en `_get_posture`)."""
+
+    name: str = "base"
+    supports_streaming: bool = False
+    supports_json_mode: bool = False
+    supports_cache_control: bool = False
+
+    @abstractmethod
+    def complete(self,
+                 messages: List[Dict[str, Any]],
+                 model: str,
+                 use_json: bool = False,
+                 **params) -> Optional[Dict[str, Any]]:
+        """Solicita una completion.
+        Args:
+            messages (List[Dict]): Mensajes en formato de chat.
+            model (str): Modelo a utilizar.
+            use_json (bool): Si es True, se pide una respuesta JSON.
+        Returns:
+            Optional[Dict]: Respuesta en formato OpenAI, o None si hay un error."""
+
+
+    def stream(self,
+               messages: List[Dict[str, Any]],
+               model: str,
+               **params) -> Iterator[Dict[str, Any]]:
+        """Solicita una completion en streaming.
+        Returns:
+            Iterator[Dict]: Chunks de la respuesta en formato OpenAI."""
+        raise NotImplementedError(f"El backend {self.name} no soporta streaming.")
+
+
+    def ping(self, timeout: float = 2.0) -> Dict[str, Any]:
+        """Comprueba que el backend es alcanzable.
+        Returns:
+            Dict: `reachable` y `latency_ms`."""
+        return {"reachable": True, "latency_ms": 0.0}
+
+
+    def warmup(self, connections: int = 1) -> None:
+        """Abre conexiones con el backend antes de recibir tráfico."""
+
+
+    def close(self) -> None:
+        """Libera las conexiones del backend."""
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """Backend para cualquier servidor compatible con la API de OpenAI
+    (p. ej. llama.cpp, vLLM u Ollama autoalojados).
+    Args:
+        base_url (str): URL base de la API, p. ej. `http://localhost:8080/v1`.
+        api_key (Optional[str]): API key, si el servidor la requiere.
+        name (str): Nombre del backend para la configuración de destinos.
+        supports_streaming (bool): Si el servidor soporta `stream=True`.
+        supports_json_mode (bool): Si el servidor soporta `response_format`.
+        supports_cache_control (bool): Si el servidor acepta marcas
+            `cache_control` para cachear el prefijo del prompt.
+        timeout (float): Timeout de cada petición en segundos.
+        pool_size (int): Conexiones HTTP persistentes a mantener."""
+
+    def __init__(self,
+                 base_url: str,
+                 api_key: Optional[str] = None,
+                 name: str = "openai",
+                 supports_streaming: bool = True,
+                 supports_json_mode: bool = False,
+                 supports_cache_control: bool = False,
+                 timeout: float = 120,
+                 endpoint: str = "/chat/completions",
+                 pool_size: int = 32):
+        self.base_url = base_url.rstrip("/")
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.name = name
+        self.supports_streaming = supports_streaming
+        self.supports_json_mode = supports_json_mode
+        self.supports_cache_control = supports_cache_control
+        self.timeout = timeout
+        self.headers = {"Content-Type": "application/json"}
+        if api_key:
+            self.headers["Authorization"] = f"Bearer {api_key}"
+        # sesión con pool de conexiones keep-alive: evita repetir el
+        # handshake TCP/TLS en cada turno
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}{self.endpoint}"
+
+
+    def _headers(self) -> Dict[str, str]:
+        """Cabeceras de la petición, propagando la traza actual."""
+        traceparent = tracing.traceparent()
+        if traceparent is None:
+            return self.headers
+        return {**self.headers, "traceparent": traceparent}
+
+
+    def _payload(self,
+                 messages: List[Dict[str, Any]],
+                 model: str,
+                 use_json: bool = False,
+                 **params) -> Dict[str, Any]:
+        if self.supports_cache_control:
+            messages = mark_cache_prefix(messages)
+        payload = {
+            "messages": messages,
+            "model": model,
+            "temperature": params.get("temperature", 0.7),
+            "max_tokens": params.get("max_tokens", 3750)}
+        if use_json and self.supports_json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        return payload
+
+
+    def complete(self,
+                 messages: List[Dict[str, Any]],
+                 model: str,
+                 use_json: bool = False,
+                 **params) -> Optional[Dict[str, Any]]:
+        payload = self._payload(messages, model, use_json, **params)
+        try:
+            response = self.session.post(
+                url=self.url,
+                headers=self._headers(),
+                json=payload,
+                timeout=self.timeout)
+            # `elapsed` mide hasta recibir las cabeceras: sin streaming, el
+            # proveedor solo responde al terminar, así que incluye la generación
+            elapsed = getattr(response, "elapsed", None)
+            if isinstance(elapsed, timedelta):
+                tracing.set_attribute("llm.ttfb_ms", round(elapsed.total_seconds() * 1000, 2))
+            tracing.set_attribute("http.status_code", response.status_code)
+            if response.status_code == 200:
+                with tracing.span("llm.decode"):
+                    return response.json()
+            else:
+                logger.error(f"Error en la API ({self.name}): {response.status_code} - {response.text}")
+                logger.debug("Trazo completo: URL: %s Payload: %s Response: %s",
+                             self.url, payload, response.text)
+                return None
+        except Exception as e:
+            logger.error(f"Error en la petición a la API ({self.name}): {e}")
+            return None
+
+
+    def stream(self,
+               messages: List[Dict[str, Any]],
+               model: str,
+               **params) -> Iterator[Dict[str, Any]]:
+        if not self.supports_streaming:
+            raise NotImplementedError(f"El backend {self.name} no soporta streaming.")
+        payload = self._payload(messages, model, **params)
+        payload["stream"] = True
+        start = time.perf_counter()
+        first_token = True
+        with self.session.post(url=self.url,
+                               headers=self._headers(),
+                               json=payload,
+                               timeout=self.timeout,
+                               stream=True) as response:
+            if response.status_code != 200:
+                raise RuntimeError(f"Error en la API ({self.name}): "
+                                   f"{response.status_code} - {response.text}")
+            for line in response.iter_lines(decode_unicode=True):
+                # formato Server-Sent Events: "data: {...}"
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                if first_token:
+                    first_token = False
+                    ttft = (time.perf_counter() - start) * 1000
+                    tracing.set_attribute("llm.ttft_ms", round(ttft, 2))
+                    tracing.record_timing("ttft", ttft)
+                yield json.loads(data)
+
+
+    def ping(self, timeout: float = 2.0) -> Dict[str, Any]:
+        """Comprueba que el servidor es alcanzable con una petición ligera a
+        `/models`. Cualquier respuesta HTTP cuenta como alcanzable."""
+        start = time.perf_counter()
+        try:
+            self.session.head(f"{self.base_url}/models",
+                              headers=self.headers,
+                              timeout=timeout)
+            reachable = True
+        except requests.RequestException as e:
+            logger.warning(f"Backend {self.name} no alcanzable: {e}")
+            reachable = False
+        return {"reachable": reachable,
+                "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+
+    def warmup(self, connections: int = 1) -> None:
+        """Establece conexiones keep-alive con el servidor; quedan en el pool
+        de la sesión para las primeras peticiones reales. Los pings se lanzan
+        en paralelo para que cada uno abra su propia conexión."""
+        connections = max(1, min(connections, self.pool_size))
+        with ThreadPoolExecutor(max_workers=connections) as pool:
+            list(pool.map(lambda _: self.ping(), range(connections)))
+
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class OpenRouterBackend(OpenAICompatibleBackend):
+    """Backend para OpenRouter. Soporta modo JSON, streaming, caché de
+    prompts con `cache_control` y la preferencia de proveedor por destino.
+    Los proveedores con caché automática de prefijos (p. ej. DeepSeek)
+    ignoran las marcas, pero igualmente se benefician del prefijo estable."""
+
+    def __init__(self,
+                 api_key: Optional[str],
+                 base_url: str = "https://openrouter.ai/api/v1",
+                 timeout: float = 120,
+                 endpoint: str = "/chat/completions",
+                 pool_size: int = 32):
+        super().__init__(base_url=base_url,
+                         api_key=api_key,
+                         name="openrouter",
+                         supports_streaming=True,
+                         supports_json_mode=True,
+                         supports_cache_control=True,
+                         timeout=timeout,
+                         endpoint=endpoint,
+                         pool_size=pool_size)
+
+
+    def _payload(self,
+                 messages: List[Dict[str, Any]],
+                 model: str,
+                 use_json: bool = False,
+                 **params) -> Dict[str, Any]:
+        payload = super()._payload(messages, model, use_json, **params)
+        provider = params.get("provider")
+        if provider:
+            payload["provider"] = {"order": [provider],
+                                   "allow_fallbacks": False}
+        return payload
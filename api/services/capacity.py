@@ -0,0 +1,192 @@
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Sequence)
+from bisect import bisect_right
+from datetime import datetime
+
+import json, logging
+
+"""Informe de capacidad del almacenamiento de conversaciones. A partir de una
+muestra de claves (recorridas con SCAN) acumula la memoria que ocupa cada
+conversación en Redis (`MEMORY USAGE`), su tamaño serializado, su número de
+mensajes y su TTL restante, y resume la muestra en histogramas, en la
+relación entre tamaño y número de mensajes y en una proyección de la memoria
+al ritmo actual de creación de conversaciones."""
+
+logger = logging.getLogger(__name__)
+
+DAY = 86_400
+
+# Límites superiores de las cubetas de los histogramas
+BYTES_BUCKETS = (1024, 2048, 4096, 8192, 16_384, 32_768, 65_536, 131_072,
+                 262_144, 524_288, 1_048_576)
+MESSAGES_BUCKETS = (3, 5, 9, 17, 33, 65, 129, 257)
+TTL_DAYS_BUCKETS = (1, 2, 4, 7, 10, 13)
+
+PROJECTION_DAYS = (7, 30, 90)
+
+
+def histogram(values: Sequence[float], bounds: Sequence[float]) -> List[Dict[str, Any]]:
+    """Histograma (no acumulado) con una cubeta por límite superior
+    inclusivo, más una cubeta final `+Inf`."""
+    counts = [0] * (len(bounds) + 1)
+    for value in values:
+        index = next((i for i, bound in enumerate(bounds) if value <= bound), len(bounds))
+        counts[index] += 1
+    labels = list(bounds) + ["+Inf"]
+    return [{"le": label, "count": count} for label, count in zip(labels, counts)]
+
+
+def percentiles(values: Sequence[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {"min": ordered[0], "p50": pick(0.5), "p90": pick(0.9),
+            "p99": pick(0.99), "max": ordered[-1],
+            "mean": round(sum(ordered) / len(ordered), 1)}
+
+
+class CapacityReport:
+    """Acumula la muestra de conversaciones y genera el informe.
+    Args:
+        ttl (int): TTL con el que se guardan las conversaciones (segundos).
+        rate_window_days (float): Ventana para estimar el ritmo de creación."""
+
+    def __init__(self, ttl: int = 1_120_000, rate_window_days: float = 1.0):
+        self.ttl = ttl
+        self.rate_window_days = rate_window_days
+        self.scanned = 0
+        self.memory: List[int] = []
+        self.sizes: List[int] = []
+        self.messages: List[int] = []
+        self.stored_messages: List[int] = []
+        self.ttls: List[int] = []
+        self.forks = 0
+        self.recent = 0
+        self.started_at = datetime.now()
+
+
+    def add(self, data: Optional[str], memory: Optional[int], ttl: int) -> bool:
+        """Añade una conversación a la muestra.
+        Args:
+            data (Optional[str]): Conversación serializada.
+            memory (Optional[int]): Bytes según `MEMORY USAGE`.
+            ttl (int): TTL restante (-1 sin expiración, -2 ya no existe).
+        Returns:
+            bool: False si la clave expiró o no se pudo leer."""
+        if not data or memory is None or ttl == -2:
+            return False
+        try:
+            conversation = json.loads(data)
+        except json.JSONDecodeError:
+            return False
+        # las bifurcaciones solo guardan los mensajes propios
+        stored = len(conversation.get("messages") or [])
+        self.memory.append(int(memory))
+        self.sizes.append(len(data.encode("utf-8")))
+        self.stored_messages.append(stored)
+        self.messages.append(stored + int(conversation.get("fork_at") or 0))
+        self.ttls.append(ttl)
+        if conversation.get("parent_id"):
+            self.forks += 1
+        try:
+            created = datetime.fromisoformat(conversation.get("created_at") or "")
+            if (self.started_at - created).total_seconds() <= self.rate_window_days * DAY:
+                self.recent += 1
+        except (TypeError, ValueError):
+            pass
+        return True
+
+
+    @property
+    def sampled(self) -> int:
+        return len(self.memory)
+
+
+    def _size_per_message(self) -> Dict[str, float]:
+        """Ajuste lineal (mínimos cuadrados) de la memoria frente al número
+        de mensajes guardados: `bytes ≈ base_bytes + bytes_per_message * n`."""
+        n = self.sampled
+        if n < 2:
+            return {}
+        mean_x = sum(self.stored_messages) / n
+        mean_y = sum(self.memory) / n
+        var = sum((x - mean_x) ** 2 for x in self.stored_messages)
+        if not var:
+            return {"bytes_per_message": round(mean_y / mean_x, 1) if mean_x else 0.0,
+                    "base_bytes": 0.0}
+        slope = sum((x - mean_x) * (y - mean_y)
+                    for x, y in zip(self.stored_messages, self.memory)) / var
+        return {"bytes_per_message": round(slope, 1),
+                "base_bytes": round(mean_y - slope * mean_x, 1)}
+
+
+    def _alive_fraction(self, sorted_ttls: List[int], seconds: float) -> float:
+        """Fracción de la muestra que sigue viva pasados `seconds` (sin más actividad)."""
+        persistent = sum(1 for ttl in sorted_ttls if ttl < 0)
+        expiring = [ttl for ttl in sorted_ttls if ttl >= 0]
+        alive = persistent + len(expiring) - bisect_right(expiring, seconds)
+        return alive / len(sorted_ttls)
+
+
+    def summary(self, used_memory: int = 0, maxmemory: int = 0) -> Dict[str, Any]:
+        """Informe de la muestra.
+        Args:
+            used_memory (int): Memoria usada por Redis (`INFO memory`).
+            maxmemory (int): Límite de memoria de Redis (0: sin límite).
+        Returns:
+            Dict[str, Any]: Totales estimados, distribuciones, histogramas,
+            relación tamaño/mensajes y proyección."""
+        report: Dict[str, Any] = {"scanned": self.scanned,
+                                  "sampled": self.sampled,
+                                  "used_memory": used_memory,
+                                  "maxmemory": maxmemory}
+        if not self.sampled:
+            return report
+        avg_memory = sum(self.memory) / self.sampled
+        conversations_memory = int(avg_memory * self.scanned)
+        # conversaciones creadas al día, extrapoladas al total de claves
+        rate = self.scanned * (self.recent / self.sampled) / self.rate_window_days
+        ttl_days = self.ttl / DAY
+        sorted_ttls = sorted(self.ttls)
+        other_memory = max(0, used_memory - conversations_memory)
+
+        def projected(days: float) -> Dict[str, Any]:
+            keys = (self.scanned * self._alive_fraction(sorted_ttls, days * DAY)
+                    + rate * min(days, ttl_days))
+            return {"days": days,
+                    "conversations": int(keys),
+                    "memory": int(keys * avg_memory),
+                    "used_memory": other_memory + int(keys * avg_memory)}
+
+        days_until_full = None
+        if maxmemory:
+            days_until_full = next((day for day in range(0, 366)
+                                    if projected(day)["used_memory"] >= maxmemory), None)
+
+        report.update({
+            "conversations_memory": conversations_memory,
+            "forks": self.forks,
+            "memory": percentiles(self.memory),
+            "serialized": percentiles(self.sizes),
+            "messages": percentiles(self.messages),
+            "ttl": percentiles(self.ttls),
+            "overhead_ratio": round(sum(self.memory) / max(1, sum(self.sizes)), 3),
+            "size_per_message": self._size_per_message(),
+            "histograms": {
+                "memory": histogram(self.memory, BYTES_BUCKETS),
+                "serialized": histogram(self.sizes, BYTES_BUCKETS),
+                "messages": histogram(self.messages, MESSAGES_BUCKETS),
+                "ttl_days": histogram([ttl / DAY for ttl in self.ttls if ttl >= 0],
+                                      TTL_DAYS_BUCKETS)},
+            "creation_rate_per_day": round(rate, 1),
+            "projection": {
+                "steady_state_conversations": int(rate * ttl_days),
+                "steady_state_memory": int(rate * ttl_days * avg_memory),
+                "horizons": [projected(days) for days in PROJECTION_DAYS],
+                "days_until_maxmemory": days_until_full}})
+        return report
@@ -0,0 +1,194 @@
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple)
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from uuid import uuid4
+
+import os, socket, logging
+
+"""Debates entre dos instancias del bot: una defiende la postura A y la otra
+su contraria. Cada debate son dos conversaciones normales que se alimentan
+mutuamente, turno a turno, durante N rondas. El orquestador ejecuta muchos
+debates en paralelo (uno por hilo, con turnos secuenciales dentro de cada
+debate) y guarda un punto de control en Redis después de cada turno, de
+modo que tras una caída se reanudan desde el último turno completado."""
+
+logger = logging.getLogger(__name__)
+
+OPENING_MESSAGE = ("Vamos a debatir. Tu oponente sostiene: \"{opponent}\". "
+                   "Presenta tu argumento inicial.")
+
+
+class DebateError(Exception):
+    pass
+
+
+def opposite_posture(posture: str) -> str:
+    """Postura contraria por defecto (no-A)."""
+    return f"Es falso que {posture[:1].lower()}{posture[1:]}"
+
+
+class DebateOrchestrator:
+    """Crea, ejecuta y reanuda debates entre dos conversaciones.
+    Args:
+        discutidor: Instancia de Discutidor3000.
+        concurrency (Optional[int]): Debates simultáneos. Por defecto
+            `DEBATE_CONCURRENCY`, o la mitad del pool del upstream
+            (`LLM_POOL_SIZE`) para dejar capacidad al tráfico normal.
+        lock_ttl (int): Segundos del bloqueo de cada debate; se renueva en
+            cada turno, así que debe superar la duración de un turno."""
+
+    def __init__(self,
+                 discutidor,
+                 concurrency: Optional[int] = None,
+                 lock_ttl: int = 600):
+        self.discutidor = discutidor
+        self.redis = discutidor.redis
+        self.concurrency = (concurrency
+                            or int(os.getenv("DEBATE_CONCURRENCY", "0"))
+                            or max(1, discutidor.pool_size // 2))
+        self.lock_ttl = lock_ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+
+    def create(self,
+               posture_a: str,
+               posture_b: Optional[str] = None,
+               rounds: int = 3,
+               backend: Optional[str] = None,
+               model: Optional[str] = None) -> str:
+        """Registra un debate pendiente.
+        Args:
+            posture_a (str): Postura del primer bot, que abre el debate.
+            posture_b (Optional[str]): Postura del segundo; por defecto la contraria.
+            rounds (int): Rondas (un turno de cada bot por ronda).
+            backend (Optional[str]): Backend de ambas conversaciones.
+            model (Optional[str]): Modelo de ambas conversaciones.
+        Returns:
+            str: ID del debate."""
+        if rounds < 1:
+            raise ValueError("Un debate necesita al menos una ronda.")
+        debate_id = str(uuid4())
+        self.redis.save_debate(debate_id, {
+            "debate_id": debate_id,
+            "status": "pending",
+            "posture_a": posture_a,
+            "posture_b": posture_b or opposite_posture(posture_a),
+            "rounds": rounds,
+            "backend": backend,
+            "model": model,
+            # los IDs se fijan de antemano para poder reanudar la apertura
+            "conversation_a": str(uuid4()),
+            "conversation_b": str(uuid4()),
+            "turns": [],
+            "created_at": datetime.now().isoformat()})
+        return debate_id
+
+
+    def run(self, debate_ids: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        """Ejecuta debates en paralelo, como mucho `concurrency` a la vez.
+        Returns:
+            Iterator[Dict[str, Any]]: Transcripciones, según van terminando.
+            Los debates que ya ejecuta otro worker, o que fallan por un error
+            del almacenamiento, se omiten."""
+        with ThreadPoolExecutor(max_workers=self.concurrency,
+                                thread_name_prefix="debate") as executor:
+            futures = {executor.submit(self._run_debate, debate_id): debate_id
+                       for debate_id in debate_ids}
+            for future in as_completed(futures):
+                # un error de Redis en un debate no corta la salida de los demás;
+                # el debate queda activo y se reanuda más tarde
+                try:
+                    transcript = future.result()
+                except Exception as e:
+                    logger.error(f"Error al ejecutar el debate {futures[future]}: {e}")
+                    continue
+                if transcript is not None:
+                    yield transcript
+
+
+    def run_postures(self,
+                     postures: Iterable[Tuple[str, Optional[str]]],
+                     rounds: int = 3,
+                     **options) -> Iterator[Dict[str, Any]]:
+        """Crea y ejecuta un debate por cada par de posturas (A, B o None)."""
+        debate_ids = [self.create(posture_a, posture_b, rounds=rounds, **options)
+                      for posture_a, posture_b in postures]
+        return self.run(debate_ids)
+
+
+    def resume(self) -> Iterator[Dict[str, Any]]:
+        """Reanuda los debates sin terminar (por ejemplo, tras una caída)."""
+        return self.run(self.redis.active_debates())
+
+
+    def _run_debate(self, debate_id: str) -> Optional[Dict[str, Any]]:
+        if not self.redis.lock_debate(debate_id, self.owner, self.lock_ttl):
+            logger.info(f"Debate {debate_id} en ejecución en otro worker")
+            return None
+        state = self.redis.get_debate(debate_id)
+        if state is None or state["status"] in ("done", "failed"):
+            self.redis.unlock_debate(debate_id, self.owner)
+            return state
+        owned = True
+        try:
+            state["status"] = "running"
+            while len(state["turns"]) < 2 * state["rounds"]:
+                turn = len(state["turns"])
+                side = "a" if turn % 2 == 0 else "b"
+                content = self._turn(state, side)
+                if content is None:
+                    raise DebateError(f"Sin respuesta del upstream en el turno {turn + 1}")
+                state["turns"].append({"round": turn // 2 + 1, "side": side, "content": content})
+                state["updated_at"] = datetime.now().isoformat()
+                self.redis.save_debate(debate_id, state)
+                if not self.redis.lock_debate(debate_id, self.owner, self.lock_ttl):
+                    # el bloqueo expiró y lo tomó otro worker: él continúa
+                    owned = False
+                    logger.warning(f"Debate {debate_id}: bloqueo perdido, se deja al otro worker")
+                    return None
+            state["status"] = "done"
+        except Exception as e:
+            logger.error(f"Error en el debate {debate_id}: {e}")
+            state["status"] = "failed"
+            state["error"] = str(e)
+        finally:
+            if owned:
+                if state["status"] != "running":
+                    state["finished_at"] = datetime.now().isoformat()
+                self.redis.save_debate(debate_id, state)
+                self.redis.unlock_debate(debate_id, self.owner)
+        logger.info(f"Debate {debate_id}: {state['status']} ({len(state['turns'])} turnos)")
+        return state
+
+
+    def _turn(self, state: Dict[str, Any], side: str) -> Optional[str]:
+        """Ejecuta un turno de un bot. Si el turno ya se completó antes de una
+        caída (la respuesta está en la conversación, pero no en el punto de
+        control), se recupera en lugar de volver a generarla."""
+        turns: List[Dict[str, Any]] = state["turns"]
+        conversation_id = state[f"conversation_{side}"]
+        opponent = "b" if side == "a" else "a"
+        message = (turns[-1]["content"] if turns
+                   else OPENING_MESSAGE.format(opponent=state[f"posture_{opponent}"]))
+        # turnos previos de este bot: system + (usuario, bot) por turno
+        previous = len(turns) // 2
+        conversation = self.redis.get_conversation(conversation_id)
+        if conversation is None:
+            if previous:
+                raise DebateError(f"Conversación {conversation_id} perdida")
+            response = self.discutidor.open_conversation(
+                conversation_id, state[f"posture_{side}"], message,
+                backend=state.get("backend"), model=state.get("model"), client_id="debates")
+        else:
+            messages = conversation.messages
+            if len(messages) >= 3 + 2 * previous and messages[-1].role == "assistant":
+                return messages[-1].content
+            response = self.discutidor.reply(conversation_id, message)
+        return response["response"] if response else None
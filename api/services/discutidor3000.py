@@ -1,5 +1,6 @@
 from typing import ( 
     Any,
+    Iterator,
     List,
     Dict,
     Optional)
@@ -8,13 +9,49 @@ from ..structures import (
     Conversation,
     ChatResponse)
 from .redis import RedisService
+from .storage import create_storage
+from .events import turn_event
+from .router import ModelRouter, RouteTarget
+from .speculation import Opening, OpeningPool
+from .backends import (
+    LLMBackend,
+    OpenAICompatibleBackend,
+    OpenRouterBackend,
+    parse_usage)
+from ..telemetry import tracing
 
-import requests, json, logging
+import os, json, time, threading, logging
 from datetime import datetime
 from uuid import uuid4
 
 logger = logging.getLogger(__name__)
 
+# Plantilla del system prompt; se construye una sola vez al importar el módulo
+# y debe producir exactamente el mismo texto para una postura dada, ya que es
+# el inicio del prefijo cacheable del prompt.
+SYSTEM_PROMPT_TEMPLATE = """
+        Eres un chatbot cuya única misión es defender la postura: {posture}.
+        Durante toda la conversación, debes defender esta postura sin desviarte,
+        por muy absurda que sea. No puedes admitir que la postura es incorrecta,
+        y debes argumentar siempre a favor de la postura. 
+
+        Te voy a proporcionar, además del historial de conversación, una serie
+        de consejos para que te puedas defender mejor:
+
+        1. Todas las respuestas deben relacionarse con el tema: {posture}.
+        2. No puedes admitir que la postura es incorrecta.
+        3. Debes ser persuasivo y convincente pero nunca agresivo.
+        4. Mantén un hilo lógico en tus respuestas.
+        5. Puedes usar falacias lógicas para defender la postura.
+        6. Pregunta retóricamente para guiar al usuario hacia la postura.
+
+        Recuerda, tu objetivo es defender la postura: {posture}, sin importar qué.
+        """
+
+# Mensaje de usuario con el que se pregeneran las aperturas de las posturas en
+# tendencia: la respuesta es un primer alegato genérico a favor de la postura.
+OPENING_MESSAGE = "Defiende la postura: {posture}"
+
 # Errores personalizados
 class PostureExtractionError(Exception):
     pass
@@ -22,6 +59,18 @@ class PostureExtractionError(Exception):
 class ConversationNotFoundError(Exception):
     pass
 
+class BackendNotFoundError(Exception):
+    pass
+
+class InvalidForkError(Exception):
+    pass
+
+class StorageWriteError(Exception):
+    pass
+
+class ModelNotAllowedError(Exception):
+    pass
+
 
 class Discutidor3000:
     """Chatbot que defiente una postura dada durante toda la conversación."""
@@ -30,15 +79,40 @@ class Discutidor3000:
         self.api_base = "https://openrouter.ai/api/v1"
         self.api_endpoint = "/chat/completions"
         self.api_key = api_key
-        self.model = "deepseek/deepseek-v3.1-terminus"
+        self.model = os.getenv("LLM_MODEL", "deepseek/deepseek-v3.1-terminus")
         self.temperature = 0.7
         self.max_tokens = 3750
-        self.headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
+        self.timeout = float(os.getenv("LLM_TIMEOUT", "120"))
+        self.pool_size = int(os.getenv("LLM_POOL_SIZE", "32"))
+        self.default_backend = os.getenv("LLM_BACKEND", "openrouter")
+        # precios en USD por millón de tokens:
+        # {"modelo": {"prompt": float, "completion": float, "cached": float}}
+        self.pricing: Dict[str, Dict[str, float]] = json.loads(os.getenv("LLM_PRICING") or "{}")
 
-        self.redis = RedisService()
+        self.backends: Dict[str, LLMBackend] = self._load_backends()
+        self.router = ModelRouter(
+            targets=self._load_targets(),
+            hedge=os.getenv("LLM_HEDGE", "0") == "1",
+            hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95")),
+            hedge_delay=float(os.getenv("LLM_HEDGE_DELAY", "2.0")),
+            max_pinned=int(os.getenv("LLM_MAX_PINNED_TARGETS", "16")))
+        # modelos que una conversación puede fijar: los configurados en los
+        # destinos, el modelo por defecto y los de LLM_ALLOWED_MODELS
+        self.allowed_models = ({t.model for t in self.router.targets} | {self.model}
+                               | {m.strip() for m in os.getenv("LLM_ALLOWED_MODELS", "").split(",")
+                                  if m.strip()})
+
+        self._upstream_status: tuple = (0.0, None)
+        # bifurcaciones: profundidad máxima de la cadena de antecesores y
+        # mínimo de mensajes compartidos para referenciar en lugar de copiar
+        self.fork_max_depth = int(os.getenv("FORK_MAX_DEPTH", "8"))
+        self.fork_min_shared = int(os.getenv("FORK_MIN_SHARED", "4"))
+
+        # almacenamiento de conversaciones (STORAGE_BACKEND: redis, memory o sqlite)
+        backend = os.getenv("STORAGE_BACKEND", "redis").lower()
+        self.storage = RedisService() if backend == "redis" else create_storage(backend)
+        # nombre anterior del almacenamiento, se mantiene por compatibilidad
+        self.redis = self.storage
         self.conversations: Dict[str, List[Dict]] = {}
         self.new_chat_prompt = """
         En la primer interacción, recibirás un mensaje del usuario indicándote una postura,
@@ -47,105 +121,242 @@ class Discutidor3000:
         me devuelvas un JSON con la siguiente estructura:
         { "posture": str }
         """
+        self.posture_system_message = {"role": "system", "content": self.new_chat_prompt}
+
+        # aperturas pregeneradas para las posturas en tendencia (SPECULATIVE_OPENINGS=1)
+        self.openings: Optional[OpeningPool] = None
+        if os.getenv("SPECULATIVE_OPENINGS", "0") == "1":
+            self.speculative_max_in_flight = int(os.getenv("SPECULATIVE_MAX_IN_FLIGHT", "0"))
+            self.openings = OpeningPool(
+                generate=self._gen_opening,
+                is_idle=self._upstream_idle,
+                window=float(os.getenv("SPECULATIVE_WINDOW", "600")),
+                min_count=int(os.getenv("SPECULATIVE_MIN_COUNT", "3")),
+                top=int(os.getenv("SPECULATIVE_TOP_POSTURES", "5")),
+                per_posture=int(os.getenv("SPECULATIVE_PER_POSTURE", "2")),
+                max_age=float(os.getenv("SPECULATIVE_MAX_AGE", "900")))
 
-        if not self.api_key:
+        uses_openrouter = any(t.backend == "openrouter" for t in self.router.targets)
+        if uses_openrouter and not self.api_key:
             raise ValueError("API key is required for Discutidor3000.")
 
 
-    def _gen_system_prompt(self, posture: str) -> str:
-        return f"""
-        Eres un chatbot cuya única misión es defender la postura: {posture}.
-        Durante toda la conversación, debes defender esta postura sin desviarte,
-        por muy absurda que sea. No puedes admitir que la postura es incorrecta,
-        y debes argumentar siempre a favor de la postura. 
+    def _load_backends(self) -> Dict[str, LLMBackend]:
+        """Registra los backends disponibles. OpenRouter siempre está
+        disponible; el backend `local` (servidor autoalojado compatible con
+        OpenAI) solo si se define `LOCAL_LLM_BASE_URL`."""
+        backends: Dict[str, LLMBackend] = {
+            "openrouter": OpenRouterBackend(api_key=self.api_key,
+                                            base_url=self.api_base,
+                                            timeout=self.timeout,
+                                            endpoint=self.api_endpoint,
+                                            pool_size=self.pool_size)}
+        local_url = os.getenv("LOCAL_LLM_BASE_URL")
+        if local_url:
+            backends["local"] = OpenAICompatibleBackend(
+                base_url=local_url,
+                api_key=os.getenv("LOCAL_LLM_API_KEY") or None,
+                name="local",
+                supports_streaming=os.getenv("LOCAL_LLM_STREAMING", "1") == "1",
+                supports_json_mode=os.getenv("LOCAL_LLM_JSON_MODE", "0") == "1",
+                supports_cache_control=os.getenv("LOCAL_LLM_CACHE_CONTROL", "0") == "1",
+                timeout=self.timeout,
+                pool_size=self.pool_size)
+        return backends
 
-        Te voy a proporcionar, además del historial de conversación, una serie
-        de consejos para que te puedas defender mejor:
 
-        1. Todas las respuestas deben relacionarse con el tema: {posture}.
-        2. No puedes admitir que la postura es incorrecta.
-        3. Debes ser persuasivo y convincente pero nunca agresivo.
-        4. Mantén un hilo lógico en tus respuestas.
-        5. Puedes usar falacias lógicas para defender la postura.
-        6. Pregunta retóricamente para guiar al usuario hacia la postura.
+    def _load_targets(self) -> List[RouteTarget]:
+        """Lee los destinos de enrutamiento de `LLM_TARGETS`, una lista
+        ordenada separada por comas con el formato `[backend:]modelo[@proveedor]`.
+        Por defecto, únicamente `self.model` en el backend por defecto."""
+        specs = os.getenv("LLM_TARGETS", "")
+        targets = [RouteTarget.parse(spec,
+                                     backends=list(self.backends),
+                                     default_backend=self.default_backend)
+                   for spec in specs.split(",") if spec.strip()]
+        for target in targets:
+            if target.backend not in self.backends:
+                raise BackendNotFoundError(f"Backend no configurado: {target.backend}")
+        return targets or [RouteTarget(self.model, backend=self.default_backend)]
 
-        Recuerda, tu objetivo es defender la postura: {posture}, sin importar qué.
-        """
+
+    def _select_targets(self,
+                        backend: Optional[str] = None,
+                        model: Optional[str] = None) -> Optional[List[RouteTarget]]:
+        """Destinos permitidos para una conversación que fija backend y/o modelo.
+        Args:
+            backend (Optional[str]): Nombre del backend.
+            model (Optional[str]): Modelo.
+        Returns:
+            Optional[List[RouteTarget]]: Destinos candidatos, o None para usar
+            todos los configurados."""
+        if backend is None and model is None:
+            return None
+        if backend is not None and backend not in self.backends:
+            raise BackendNotFoundError(f"Backend no configurado: {backend}")
+        if model is not None and model not in self.allowed_models:
+            raise ModelNotAllowedError(f"Modelo no permitido: {model}")
+        targets = self.router.find(backend, model)
+        if targets:
+            return targets
+        # combinación no configurada: se fija un destino propio
+        return [self.router.pin(RouteTarget(model or self.model,
+                                            backend=backend or self.default_backend))]
+
+
+    def _gen_system_prompt(self, posture: str) -> str:
+        return SYSTEM_PROMPT_TEMPLATE.format(posture=posture)
 
 
     def _api_request(self,
                      messages: List[Dict[str,str]],
-                     use_json: bool = False) -> Optional[Dict[str, Any]]:
-        """Esta función centraliza toda la comunicación con la API de DeepSeek.
+                     use_json: bool = False,
+                     targets: Optional[List[RouteTarget]] = None) -> Optional[Dict[str, Any]]:
+        """Esta función centraliza toda la comunicación con los backends del LLM.
+        El enrutador elige el mejor destino sano y, si está habilitado,
+        cubre la petición con un duplicado cuando se retrasa.
         Args:
             messages (List[Dict[str,str]]): Lista de mensajes en el formato esperado por la API.
             use_json (bool): Si es True, se espera que la respuesta sea un JSON.
+                Solo se pide modo JSON a los backends que lo soportan.
+            targets (Optional[List[RouteTarget]]): Destinos permitidos.
         Returns:
             Optional[Dict]: Respuesta de la API en formato JSON.
             None si hay un error."""
-        payload = {
-            "messages": messages,
-            "model": self.model,
-            "temperature": self.temperature,
-            "max_tokens": self.max_tokens  }
-        if use_json:
-            payload["response_format"] = {"type": "json_object"}
-        try:
-            response = requests.post(
-                url = f"{self.api_base}{self.api_endpoint}",
-                headers=self.headers,
-                json=payload)
-            if response.status_code == 200:
-                return response.json()
+        return self.router.call(
+            lambda target: self._complete(target, messages, use_json),
+            candidates=targets)
+
+
+    def _complete(self,
+                  target: RouteTarget,
+                  messages: List[Dict[str,str]],
+                  use_json: bool = False) -> Optional[Dict[str, Any]]:
+        """Solicita una completion a un destino y registra su consumo de tokens,
+        incluidos los tokens servidos desde la caché de prompts del proveedor."""
+        with tracing.span("llm.upstream", **{"llm.target": target.name,
+                                             "llm.json_mode": use_json}) as span:
+            response = self.backends[target.backend].complete(
+                messages,
+                model=target.model,
+                use_json=use_json,
+                provider=target.provider,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens)
+            if response is not None:
+                response.setdefault("model", target.model)
+                usage = parse_usage(response)
+                target.stats.record_usage(usage)
+                span.attributes.update({f"llm.{k}": v for k, v in usage.items()})
+                logger.debug("Uso de tokens en %s: %s", target.name, usage)
             else:
-                logger.error(f"Error en la API: {response.status_code} - {response.text}")
-                logger.debug(f"""Trazo completo:
-                             URL: {self.api_base}{self.api_endpoint}
-                             Headers: {self.headers}
-                             Payload: {payload}
-                             Response: {response.text}""")
-                return None
-        except Exception as e:
-            print(f" > [!] Error en la petición a la API: {e}")
-            return None
-        
+                span.error = "Sin respuesta del backend"
+        return response
+
 
-    def _get_posture(self, message: str) -> Optional[str]:
+    def _get_posture(self,
+                     message: str,
+                     targets: Optional[List[RouteTarget]] = None,
+                     conversation_id: Optional[str] = None,
+                     client_id: Optional[str] = None) -> Optional[str]:
         """Extrae la postura del mensaje inicial del usuario.
         Args
             message (str): Mensaje del usuario.
+            targets (Optional[List[RouteTarget]]): Destinos permitidos.
+            conversation_id (Optional[str]): Conversación a la que se atribuye
+                el consumo de la extracción.
+            client_id (Optional[str]): Cliente al que se atribuye el consumo.
         Returns:
             Optional[str]: Postura extraída del mensaje.
             None si hay un error."""
         messages = [
-            {"role": "system", "content": self.new_chat_prompt},
+            self.posture_system_message,
             {"role": "user", "content": message}
         ]
 
-        response = self._api_request(messages, use_json=True)
+        with tracing.span("posture"):
+            response = self._api_request(messages, use_json=True, targets=targets)
         if response is None:
             return None
+        if conversation_id is not None:
+            self._count_usage(conversation_id, client_id, None, response)
         
         try:
             content = response["choices"][0]["message"]["content"]
             if isinstance(content, str):
-                content = json.loads(content)
+                # sin modo JSON el modelo puede envolver el objeto en texto
+                start, end = content.find("{"), content.rfind("}")
+                content = json.loads(content[start:end + 1] if start != -1 else content)
             posture = content["posture"]
             return posture
         except Exception as e:
-            print(f" > [!] Error al extraer la postura: {e}")
+            logger.error(f"Error al extraer la postura: {e}")
             return None
         
 
+    def _compute_cost(self, model: str, usage: Dict[str, int]) -> float:
+        """Costo estimado en USD de un turno según `LLM_PRICING`.
+        Los tokens cacheados se cobran al precio `cached` (por defecto, `prompt`)."""
+        prices = self.pricing.get(model)
+        if not prices:
+            return 0.0
+        prompt_price = prices.get("prompt", 0.0)
+        cached = usage.get("cached_tokens", 0)
+        uncached = usage.get("prompt_tokens", 0) - cached
+        return (uncached * prompt_price
+                + cached * prices.get("cached", prompt_price)
+                + usage.get("completion_tokens", 0) * prices.get("completion", 0.0)) / 1_000_000
+
+
+    def _record_usage(self,
+                      conversation_data: Conversation,
+                      response: Dict[str, Any]) -> Dict[str, Any]:
+        """Acumula el consumo de tokens de un turno en la conversación y en
+        los contadores por cliente y modelo.
+        Returns:
+            Dict[str, Any]: Consumo del turno, con su `cost` y su `model`."""
+        usage = self._count_usage(conversation_data.conversation_id,
+                                  conversation_data.client_id,
+                                  conversation_data.model, response)
+        totals = conversation_data.usage
+        totals.prompt_tokens += usage["prompt_tokens"]
+        totals.completion_tokens += usage["completion_tokens"]
+        totals.cached_tokens += usage["cached_tokens"]
+        totals.cost += usage["cost"]
+        return usage
+
+
+    def _count_usage(self,
+                     conversation_id: str,
+                     client_id: Optional[str],
+                     model: Optional[str],
+                     response: Dict[str, Any]) -> Dict[str, Any]:
+        """Acumula el consumo de una respuesta en los contadores por cliente,
+        modelo y conversación.
+        Returns:
+            Dict[str, Any]: Consumo de la respuesta, con su `cost` y su `model`."""
+        usage = parse_usage(response)
+        model = response.get("model") or model or self.model
+        cost = self._compute_cost(model, usage)
+        self.redis.record_usage(conversation_id, client_id, model, usage, cost)
+        return {**usage, "cost": cost, "model": model}
+
+
     def _init_conversation(self,
                            conversation_id: str,
                            posture: str,
-                           initial_message: str) -> None:
+                           initial_message: str,
+                           backend: Optional[str] = None,
+                           model: Optional[str] = None,
+                           client_id: Optional[str] = None) -> None:
         """Inicializa una nueva conversación y la almacena en Redis
         Args:
             conversation_id (str): ID de la conversación.
             posture (str): Postura a defender.
-            initial_message (str): Mensaje inicial del usuario."""
+            initial_message (str): Mensaje inicial del usuario.
+            backend (Optional[str]): Backend fijado para la conversación.
+            model (Optional[str]): Modelo fijado para la conversación.
+            client_id (Optional[str]): Cliente al que se atribuye el consumo."""
         conversation = Conversation(
             conversation_id=conversation_id,
             posture=posture,
@@ -153,12 +364,20 @@ class Discutidor3000:
                 Message(role="system", content=self._gen_system_prompt(posture)),
                 Message(role="user", content=initial_message)
             ],
+            backend=backend,
+            model=model,
+            client_id=client_id,
             created_at=datetime.now().isoformat(),
             last_updated=datetime.now().isoformat()
         )
         #self.conversations[conversation_id] = conversation.model_dump()
-        self.redis.set_conversation(conversation_id,
-                                    conversation)
+        # el mensaje del usuario debe estar guardado antes de llamar al LLM
+        if not self.redis.set_conversation(conversation_id,
+                                           conversation,
+                                           event=turn_event(conversation_id, "user",
+                                                            initial_message,
+                                                            client_id=client_id)):
+            raise StorageWriteError("No se pudo guardar la conversación.")
         
 
     def _gen_response(self, conversation_id: str) -> Optional[Dict[str, Any]]:
@@ -170,33 +389,205 @@ class Discutidor3000:
             Optional[Dict]: Diccionario con la respuesta del chatbot y el ID de la conversación.
             None si hay un error."""
         conversation_data = self.redis.get_conversation(conversation_id)
-        logger.debug(f"Tipo de conversation_data: {type(conversation_data)}")
         if not conversation_data:
             raise ValueError("Conversación no encontrada en Redis.")
         
-        # Trabajar directamente con el modelo Conversation
+        # Trabajar directamente con el modelo Conversation. El historial se
+        # envía siempre en el mismo orden y sin reescribir mensajes previos,
+        # para que el prefijo (system prompt + historial) sea estable y el
+        # proveedor pueda servirlo desde su caché de prompts.
         messages = [msg.model_dump() for msg in conversation_data.messages]
-        response = self._api_request(messages)
+        targets = self._select_targets(conversation_data.backend, conversation_data.model)
+        started = time.monotonic()
+        response = self._api_request(messages, targets=targets)
+        latency_ms = (time.monotonic() - started) * 1000
         if response is None:
             return None
         
         chatbot_response = response["choices"][0]["message"]["content"]
-        
+        self._save_reply(conversation_data, chatbot_response, response, latency_ms)
+                                    
+        return {
+            "conversation_id": conversation_id,
+            "response": chatbot_response,
+            "posture": conversation_data.posture,
+            # los mensajes ya se serializaron para la petición al upstream
+            "messages": messages + [{"role": "assistant", "content": chatbot_response}]
+        }
+    
+
+    def _save_reply(self,
+                    conversation_data: Conversation,
+                    chatbot_response: str,
+                    response: Dict[str, Any],
+                    latency_ms: float) -> Dict[str, Any]:
+        """Agrega la respuesta del chatbot a la conversación, acumula su
+        consumo y la guarda junto con el evento del turno.
+        Returns:
+            Dict[str, Any]: Consumo del turno, con su `cost` y su `model`."""
+        conversation_id = conversation_data.conversation_id
+        usage = self._record_usage(conversation_data, response)
+
         # Agregar la respuesta del chatbot como nuevo mensaje
         new_message = Message(role="assistant", content=chatbot_response)
         conversation_data.messages.append(new_message)
         conversation_data.last_updated = datetime.now().isoformat()
-        
-        # Actualizar en Redis
-        self.redis.set_conversation(conversation_id, conversation_data)
-                                    
+
+        # Actualizar en Redis, junto con el evento del turno. La respuesta
+        # puede confirmarse en diferido: las lecturas siguientes ya la ven
+        self.redis.set_conversation(conversation_id, conversation_data,
+                                    event=turn_event(conversation_id, "assistant",
+                                                     chatbot_response, usage=usage,
+                                                     latency_ms=latency_ms,
+                                                     model=usage["model"],
+                                                     client_id=conversation_data.client_id),
+                                    durable=False)
+        return usage
+
+
+    def _gen_opening(self, posture: str) -> Optional[Opening]:
+        """Genera una respuesta de apertura para la postura, sin conversación
+        asociada, para el lote de aperturas pregeneradas.
+        Args:
+            posture (str): Postura a defender.
+        Returns:
+            Optional[Opening]: Respuesta generada. None si hay un error."""
+        messages = [
+            {"role": "system", "content": self._gen_system_prompt(posture)},
+            {"role": "user", "content": OPENING_MESSAGE.format(posture=posture)}
+        ]
+        started = time.monotonic()
+        with tracing.span("opening.pregenerate"):
+            response = self._api_request(messages)
+        if response is None:
+            return None
+        return Opening(posture,
+                       response["choices"][0]["message"]["content"],
+                       response,
+                       latency_ms=(time.monotonic() - started) * 1000)
+
+
+    def _upstream_idle(self) -> bool:
+        """True si las peticiones en curso al upstream no superan
+        `SPECULATIVE_MAX_IN_FLIGHT`, para que la pregeneración solo use
+        capacidad que el tráfico real no está usando."""
+        in_flight = sum(target.stats.in_flight for target in self.router.targets)
+        return in_flight <= self.speculative_max_in_flight
+
+
+    def _take_opening(self,
+                      posture: str,
+                      backend: Optional[str] = None,
+                      model: Optional[str] = None,
+                      speculative: bool = True) -> Optional[Opening]:
+        """Registra la postura de una conversación nueva y, si es elegible,
+        toma una apertura pregenerada y vigente para ella. Solo lo son las
+        conversaciones que usan el enrutamiento por defecto (las aperturas se
+        generan con él) y que no desactivan la especulación.
+        Returns:
+            Optional[Opening]: Apertura a usar, o None para generarla."""
+        if self.openings is None:
+            return None
+        self.openings.record(posture)
+        if not speculative or backend is not None or model is not None:
+            return None
+        return self.openings.take(posture)
+
+
+    def _use_opening(self, conversation_id: str, opening: Opening) -> Dict[str, Any]:
+        """Responde al primer mensaje de una conversación con una apertura
+        pregenerada. Su consumo de tokens se atribuye a la conversación.
+        Returns:
+            Dict[str, Any]: Igual que `_gen_response`."""
+        conversation_data = self.redis.get_conversation(conversation_id)
+        if not conversation_data:
+            raise ConversationNotFoundError("Conversación no existente.")
+        messages = [msg.model_dump() for msg in conversation_data.messages]
+        self._save_reply(conversation_data, opening.content, opening.response,
+                         opening.latency_ms)
         return {
             "conversation_id": conversation_id,
-            "response": chatbot_response,
+            "response": opening.content,
             "posture": conversation_data.posture,
-            "messages": [msg.model_dump() for msg in conversation_data.messages]
+            "messages": messages + [{"role": "assistant", "content": opening.content}]
         }
-    
+
+
+    def _stream_target(self,
+                       targets: Optional[List[RouteTarget]] = None) -> Optional[RouteTarget]:
+        """Mejor destino sano cuyo backend soporta streaming, o None."""
+        for target in self.router.rank(targets):
+            if self.backends[target.backend].supports_streaming and self.router.is_healthy(target):
+                return target
+        return None
+
+
+    def _stream_response(self, conversation_id: str) -> Iterator[Dict[str, Any]]:
+        """Genera la respuesta del chatbot en streaming. Los fragmentos se
+        emiten según llegan y el turno se guarda al completarse, igual que
+        en `_gen_response`. Sin destinos con streaming, o si el streaming
+        falla antes del primer fragmento, se genera la respuesta completa.
+        Args:
+            conversation_id (str): ID de la conversación.
+        Returns:
+            Iterator[Dict[str, Any]]: Eventos `token` (`content`) y un evento
+            final `done` con `response` (None si hay un error) y `usage`."""
+        conversation_data = self.redis.get_conversation(conversation_id)
+        if not conversation_data:
+            raise ConversationNotFoundError("Conversación no existente.")
+        targets = self._select_targets(conversation_data.backend, conversation_data.model)
+        target = self._stream_target(targets)
+
+        parts: List[str] = []
+        final: Dict[str, Any] = {"model": target.model} if target else {}
+        if target is not None:
+            messages = [msg.model_dump() for msg in conversation_data.messages]
+            stats = target.stats
+            with stats.lock:
+                stats.in_flight += 1
+            started = time.monotonic()
+            try:
+                for chunk in self.backends[target.backend].stream(messages,
+                                                                  model=target.model,
+                                                                  provider=target.provider,
+                                                                  temperature=self.temperature,
+                                                                  max_tokens=self.max_tokens):
+                    if chunk.get("usage"):
+                        final["usage"] = chunk["usage"]
+                    for choice in chunk.get("choices") or []:
+                        delta = (choice.get("delta") or {}).get("content")
+                        if delta:
+                            parts.append(delta)
+                            yield {"type": "token", "content": delta}
+            except Exception as e:
+                stats.record_error()
+                logger.warning("Error en streaming desde %s: %s", target.name, e)
+                if parts:
+                    # la respuesta parcial no se guarda
+                    yield {"type": "done", "response": None, "usage": None}
+                    return
+                target = None
+            else:
+                latency_ms = (time.monotonic() - started) * 1000
+                stats.record_success(latency_ms / 1000)
+                stats.record_usage(parse_usage(final))
+            finally:
+                with stats.lock:
+                    stats.in_flight -= 1
+
+        if target is None:
+            response = self._gen_response(conversation_id)
+            if response is None:
+                yield {"type": "done", "response": None, "usage": None}
+                return
+            yield {"type": "token", "content": response["response"]}
+            yield {"type": "done", "response": response["response"], "usage": None}
+            return
+
+        chatbot_response = "".join(parts)
+        usage = self._save_reply(conversation_data, chatbot_response, final, latency_ms)
+        yield {"type": "done", "response": chatbot_response, "usage": usage}
+
 
     def _format_response(self, conversation_data: Dict) -> ChatResponse:
         """Formatea la respuesta del chatbot a la estructura ChatResponse.
@@ -204,32 +595,52 @@ class Discutidor3000:
             conversation_data (Dict): Datos de la conversación.
         Returns:
             ChatResponse: Respuesta formateada."""
-        conversation_id = conversation_data["conversation_id"]
-        messages = conversation_data["messages"][1:]  # excluir system prompt
-        recent_messages = messages[-5:]  # 5 últimos mensajes
-        history = list()
-        for m in recent_messages[::-1]:
-            role = "bot" if m["role"] == "assistant" else m["role"]
-            history.append(Message(role=role,
-                                   content=m["content"]))
-        return ChatResponse(
-            conversation_id=conversation_id,
-            message=history)
+        with tracing.span("serialize"):
+            conversation_id = conversation_data["conversation_id"]
+            messages = conversation_data["messages"][1:]  # excluir system prompt
+            recent_messages = messages[-5:]  # 5 últimos mensajes
+            # los mensajes vienen de una conversación ya validada: se
+            # construyen sin volver a validarlos
+            history = [Message.model_construct(
+                           role="bot" if m["role"] == "assistant" else m["role"],
+                           content=m["content"])
+                       for m in recent_messages[::-1]]
+            return ChatResponse.model_construct(
+                conversation_id=conversation_id,
+                message=history)
 
 
-    def new_conversation(self, message: str) -> Optional[ChatResponse]:
+    def new_conversation(self,
+                         message: str,
+                         backend: Optional[str] = None,
+                         model: Optional[str] = None,
+                         client_id: Optional[str] = None,
+                         speculative: bool = True) -> Optional[ChatResponse]:
         """Inicia una nueva conversación, extrayendo la postura del mensaje inicial.
+        Si hay una apertura pregenerada para la postura, responde con ella.
         Args:
             message (str): Mensaje inicial del usuario.
+            backend (Optional[str]): Backend a usar durante toda la conversación.
+            model (Optional[str]): Modelo a usar durante toda la conversación.
+            client_id (Optional[str]): Cliente al que se atribuye el consumo.
+            speculative (bool): Si es False, la primera respuesta siempre se
+                genera para este mensaje, sin usar aperturas pregeneradas.
         Returns:
             Optional[ChatResponse]: Diccionario con la respuesta del chatbot y el ID de la conversación.
             None si hay un error."""
         conversation_id = str(uuid4())
-        posture = self._get_posture(message)
+        targets = self._select_targets(backend, model)
+        posture = self._get_posture(message, targets=targets,
+                                    conversation_id=conversation_id, client_id=client_id)
         if not posture:
             raise PostureExtractionError("No se pudo extraer la postura del mensaje inicial.")
-        self._init_conversation(conversation_id, posture, message)
-        response = self._gen_response(conversation_id)
+        self._init_conversation(conversation_id, posture, message,
+                                backend=backend, model=model, client_id=client_id)
+        opening = self._take_opening(posture, backend, model, speculative)
+        if opening is not None:
+            response = self._use_opening(conversation_id, opening)
+        else:
+            response = self._gen_response(conversation_id)
         if not response:
             return None
         return self._format_response(response)
@@ -245,45 +656,502 @@ class Discutidor3000:
         Returns:
             Optional[ChatResponse]: Diccionario con la respuesta del chatbot y el ID de la conversación.
             None si hay un error."""
-        logger.debug(f"Continuando conversación ID: {conversation_id} con mensaje: {message}")
-        
+        logger.debug("Continuando conversación ID: %s (%d caracteres)", conversation_id, len(message))
+        response = self.reply(conversation_id, message)
+        if not response:
+            return None
+        return self._format_response(response)
+
+
+    def reply(self, conversation_id: str, message: str) -> Optional[Dict[str, Any]]:
+        """Agrega un mensaje del usuario a una conversación y genera la
+        respuesta. Si el último mensaje ya es ese mismo mensaje del usuario
+        (un reintento tras un fallo del upstream), no se duplica.
+        Args:
+            conversation_id (str): ID de la conversación.
+            message (str): Mensaje del usuario.
+        Returns:
+            Optional[Dict[str, Any]]: Respuesta (`response`) y mensajes de la conversación.
+            None si hay un error."""
+        self._add_user_message(conversation_id, message)
+        return self._gen_response(conversation_id)
+
+
+    def _add_user_message(self, conversation_id: str, message: str) -> Conversation:
+        """Agrega el mensaje del usuario a la conversación, salvo que ya sea
+        el último (reintento tras un fallo del upstream).
+        Returns:
+            Conversation: Conversación actualizada."""
         # Obtener la conversación desde Redis
         conversation_data = self.redis.get_conversation(conversation_id)
         if not conversation_data:
             raise ConversationNotFoundError("Conversación no existente.")
-        
-        # Agregar el nuevo mensaje del usuario
-        user_message = Message(role="user", content=message)
-        conversation_data.messages.append(user_message)
-        conversation_data.last_updated = datetime.now().isoformat()
-        
-        # Actualizar en Redis con el nuevo mensaje del usuario
-        self.redis.set_conversation(conversation_id, conversation_data)
-        
-        response = self._gen_response(conversation_id)
-        if not response:
-            return None
-        return self._format_response(response)
+
+        last = conversation_data.messages[-1] if conversation_data.messages else None
+        if last is None or last.role != "user" or last.content != message:
+            # Agregar el nuevo mensaje del usuario
+            user_message = Message(role="user", content=message)
+            conversation_data.messages.append(user_message)
+            conversation_data.last_updated = datetime.now().isoformat()
+
+            # Actualizar en Redis con el nuevo mensaje del usuario; sin
+            # confirmarlo no se llama al LLM, o la respuesta se guardaría
+            # sobre un historial sin este mensaje
+            if not self.redis.set_conversation(conversation_id, conversation_data,
+                                               event=turn_event(conversation_id, "user", message,
+                                                                client_id=conversation_data.client_id)):
+                raise StorageWriteError("No se pudo guardar el mensaje del usuario.")
+        return conversation_data
+
+
+    def open_conversation(self,
+                          conversation_id: str,
+                          posture: str,
+                          message: str,
+                          backend: Optional[str] = None,
+                          model: Optional[str] = None,
+                          client_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Inicia una conversación con una postura ya conocida (sin extraerla
+        del mensaje) y genera la primera respuesta.
+        Args:
+            conversation_id (str): ID de la nueva conversación.
+            posture (str): Postura a defender.
+            message (str): Mensaje inicial del usuario.
+            backend (Optional[str]): Backend fijado para la conversación.
+            model (Optional[str]): Modelo fijado para la conversación.
+            client_id (Optional[str]): Cliente al que se atribuye el consumo.
+        Returns:
+            Optional[Dict[str, Any]]: Respuesta (`response`) y mensajes de la conversación.
+            None si hay un error."""
+        self._select_targets(backend, model)  # valida el backend antes de guardar nada
+        self._init_conversation(conversation_id, posture, message,
+                                backend=backend, model=model, client_id=client_id)
+        return self._gen_response(conversation_id)
     
 
     # función principal para interfaz externa
     def chat(self,
              message: str,
-             conversation_id: Optional[str] = None) -> Optional[ChatResponse]:
+             conversation_id: Optional[str] = None,
+             backend: Optional[str] = None,
+             model: Optional[str] = None,
+             client_id: Optional[str] = None,
+             speculative: bool = True) -> Optional[ChatResponse]:
         """Función principal para interactuar con el chatbot.
         Si no se proporciona conversation_id, se inicia una nueva conversación.
         Args:
             message (str): Mensaje del usuario.
             conversation_id (Optional[str]): ID de la conversación.
                 Si es None, se inicia una nueva conversación.
+            backend (Optional[str]): Backend para una nueva conversación.
+            model (Optional[str]): Modelo para una nueva conversación.
+            client_id (Optional[str]): Cliente de una nueva conversación.
+                Las conversaciones existentes conservan los que se fijaron al crearlas.
+            speculative (bool): Si una conversación nueva puede responderse
+                con una apertura pregenerada.
         Returns:
             Optional[ChatResponse]: Diccionario con la respuesta del chatbot y el ID de la conversación.
             None si hay un error."""
+        with tracing.span("chat", **{"chat.new": conversation_id is None}):
+            if conversation_id is None:
+                options = {key: value for key, value in
+                           (("backend", backend), ("model", model), ("client_id", client_id))
+                           if value is not None}
+                if not speculative:
+                    options["speculative"] = False
+                return self.new_conversation(message, **options)
+            else:
+                return self.continue_conversation(conversation_id, message)
+    
+
+    def stream_chat(self,
+                    message: str,
+                    conversation_id: Optional[str] = None,
+                    backend: Optional[str] = None,
+                    model: Optional[str] = None,
+                    client_id: Optional[str] = None,
+                    speculative: bool = True) -> Iterator[Dict[str, Any]]:
+        """Como `chat`, pero la respuesta se emite por fragmentos según la
+        genera el backend.
+        Args:
+            message (str): Mensaje del usuario.
+            conversation_id (Optional[str]): ID de la conversación.
+                Si es None, se inicia una nueva conversación.
+            backend (Optional[str]): Backend para una nueva conversación.
+            model (Optional[str]): Modelo para una nueva conversación.
+            client_id (Optional[str]): Cliente de una nueva conversación.
+            speculative (bool): Si una conversación nueva puede responderse
+                con una apertura pregenerada (se emite en un único fragmento).
+        Returns:
+            Iterator[Dict[str, Any]]: Un evento `start` (`conversation_id`,
+            `posture`), eventos `token` y un evento final `done`."""
+        opening = None
         if conversation_id is None:
-            return self.new_conversation(message)
+            conversation_id = str(uuid4())
+            targets = self._select_targets(backend, model)
+            posture = self._get_posture(message, targets=targets,
+                                    conversation_id=conversation_id, client_id=client_id)
+            if not posture:
+                raise PostureExtractionError("No se pudo extraer la postura del mensaje inicial.")
+            self._init_conversation(conversation_id, posture, message,
+                                    backend=backend, model=model, client_id=client_id)
+            opening = self._take_opening(posture, backend, model, speculative)
         else:
-            return self.continue_conversation(conversation_id, message)
-    
+            posture = self._add_user_message(conversation_id, message).posture
+        yield {"type": "start", "conversation_id": conversation_id, "posture": posture}
+        if opening is None:
+            yield from self._stream_response(conversation_id)
+            return
+        response = self._use_opening(conversation_id, opening)
+        yield {"type": "token", "content": response["response"]}
+        yield {"type": "done", "response": response["response"], "usage": None}
+
+
+    def warmup(self) -> Dict[str, Any]:
+        """Prepara el servicio antes de recibir tráfico: abre conexiones con
+        Redis y con los backends del LLM, y construye el system prompt una vez.
+        Returns:
+            Dict[str, Any]: Resultado del precalentamiento por componente."""
+        self._gen_system_prompt("")
+        redis_ok = self.redis.warmup(connections=int(os.getenv("REDIS_WARMUP_CONNECTIONS", "4")))
+        connections = int(os.getenv("LLM_WARMUP_CONNECTIONS", "2"))
+        backends = {name: backend.ping() for name, backend in self.backends.items()}
+        for name, backend in self.backends.items():
+            if backends[name]["reachable"]:
+                backend.warmup(connections=connections)
+        return {"redis": redis_ok, "backends": backends}
+
+
+    def start_background_tasks(self) -> None:
+        """Arranca las tareas periódicas del servicio (archivo de
+        conversaciones inactivas y reposición de aperturas pregeneradas)."""
+        self.redis.start_sweeper()
+        if self.openings is not None:
+            self.openings.start()
+
+
+    def check_readiness(self) -> Dict[str, Any]:
+        """Comprueba la latencia de Redis y que los backends usados por los
+        destinos de enrutamiento sean alcanzables.
+        Returns:
+            Dict[str, Any]: `ready` y el detalle por componente."""
+        max_latency = float(os.getenv("READY_MAX_REDIS_LATENCY_MS", "250"))
+        redis_status = self.redis.ping()
+        redis_ok = redis_status["ok"] and redis_status["latency_ms"] <= max_latency
+        # el estado del upstream se cachea unos segundos para que las sondas
+        # frecuentes no generen tráfico hacia el proveedor
+        cache_ttl = float(os.getenv("READY_UPSTREAM_CACHE_SECONDS", "10"))
+        checked_at, upstream = self._upstream_status
+        if upstream is None or time.monotonic() - checked_at > cache_ttl:
+            used = {target.backend for target in self.router.targets}
+            upstream = {name: self.backends[name].ping() for name in used}
+            self._upstream_status = (time.monotonic(), upstream)
+        upstream_ok = any(status["reachable"] for status in upstream.values())
+        return {"ready": redis_ok and upstream_ok,
+                "redis": redis_status,
+                "upstream": upstream}
+
+
+    def close(self) -> None:
+        """Libera las conexiones con Redis y con los backends."""
+        if self.openings is not None:
+            self.openings.stop()
+        for backend in self.backends.values():
+            backend.close()
+        self.redis.close()
+
+
+    def get_router_stats(self) -> List[Dict[str, Any]]:
+        """Estadísticas de latencia y errores por destino de enrutamiento.
+        Returns:
+            List[Dict[str, Any]]: Una entrada por destino."""
+        return self.router.stats()
+
+
+    def get_storage_stats(self) -> Dict[str, Any]:
+        """Backend de almacenamiento y métricas de su búfer de escrituras
+        (lotes, escrituras por lote y latencia de confirmación)."""
+        return {"backend": self.storage.name,
+                "write_buffer": self.storage.write_stats()}
+
+
+    def get_opening_stats(self) -> Dict[str, Any]:
+        """Posturas en tendencia y uso de las aperturas pregeneradas.
+        Returns:
+            Dict[str, Any]: `enabled` y, si lo está, las métricas del lote."""
+        if self.openings is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.openings.stats()}
+
+
+    def get_top_usage(self,
+                      dimension: str = "clients",
+                      days: int = 1,
+                      limit: int = 10) -> Optional[List[Dict[str, Any]]]:
+        """Obtiene los mayores consumidores de tokens.
+        Args:
+            dimension (str): `clients`, `models` o `conversations`.
+            days (int): Días a agregar, incluyendo el actual.
+            limit (int): Número máximo de resultados.
+        Returns:
+            Optional[List[Dict[str, Any]]]: Consumidores ordenados por tokens totales."""
+        return self.redis.get_top_usage(dimension, days, limit)
+
+
+    def fork_conversation(self,
+                          conversation_id: str,
+                          at: Optional[int] = None,
+                          client_id: Optional[str] = None) -> Optional[Conversation]:
+        """Crea una conversación nueva que continúa desde uno de los mensajes
+        de otra, para probar otro argumento. La bifurcación referencia el
+        prefijo de la conversación original en lugar de copiarlo; solo se
+        copia si el prefijo es corto (`FORK_MIN_SHARED`) o si la cadena de
+        antecesores superaría `FORK_MAX_DEPTH` (compactación).
+        Args:
+            conversation_id (str): Conversación original.
+            at (Optional[int]): Mensajes que se conservan, incluido el prompt
+                de sistema. Por defecto, todos.
+            client_id (Optional[str]): Cliente de la bifurcación; por defecto
+                el de la conversación original.
+        Returns:
+            Optional[Conversation]: Bifurcación creada, o None si no se pudo guardar."""
+        with tracing.span("fork"):
+            parent = self.redis.get_conversation(conversation_id)
+            if not parent:
+                raise ConversationNotFoundError("Conversación no existente.")
+            at = len(parent.messages) if at is None else at
+            if not 1 <= at <= len(parent.messages):
+                raise InvalidForkError(f"El punto de bifurcación debe estar entre 1 y "
+                                       f"{len(parent.messages)}.")
+            now = datetime.now().isoformat()
+            fork = Conversation(
+                conversation_id=str(uuid4()),
+                posture=parent.posture,
+                messages=parent.messages[:at],
+                backend=parent.backend,
+                model=parent.model,
+                client_id=client_id or parent.client_id,
+                created_at=now,
+                last_updated=now)
+            if at >= self.fork_min_shared:
+                if parent.parent_id and at <= parent.fork_at:
+                    # el prefijo está entero en el antecesor: se referencia directamente
+                    fork.parent_id, fork.ancestors = parent.parent_id, parent.ancestors
+                else:
+                    fork.parent_id = parent.conversation_id
+                    fork.ancestors = parent.ancestors + [parent.conversation_id]
+                if len(fork.ancestors) > self.fork_max_depth:
+                    fork.parent_id, fork.ancestors = None, []
+                else:
+                    fork.fork_at = at
+            if not self.redis.set_conversation(fork.conversation_id, fork):
+                return None
+            logger.debug("Conversación %s bifurcada en %d mensajes: %s (%s)",
+                         conversation_id, at, fork.conversation_id,
+                         "compartida" if fork.parent_id else "copiada")
+            return fork
+
+
+    def get_conversation_version(self, conversation_id: str) -> Optional[int]:
+        """Versión de una conversación, sin leer su contenido."""
+        return self.redis.get_conversation_version(conversation_id)
+
+
+    def get_messages(self,
+                     conversation_id: str,
+                     offset: int = 0,
+                     limit: int = 50,
+                     since: Optional[int] = None) -> Dict[str, Any]:
+        """Historial paginado de una conversación, sin el prompt de sistema.
+        Cada mensaje lleva su posición (`index`) en la conversación, que sirve
+        como cursor y como punto de bifurcación (`at = index + 1`).
+        Args:
+            conversation_id (str): ID de la conversación.
+            offset (int): Mensajes a saltar.
+            limit (int): Máximo de mensajes devueltos.
+            since (Optional[int]): Solo los mensajes posteriores a esta posición
+                (el `next_cursor` de una página anterior, o el último `index` conocido).
+        Returns:
+            Dict[str, Any]: `conversation_id`, `version`, `total`, `messages` y
+            `next_cursor` (None si no hay más mensajes)."""
+        # la versión se lee antes que el contenido: si hay una escritura en
+        # medio, la versión queda atrasada (el cliente volverá a descargar)
+        # y nunca adelantada (el cliente perdería la escritura)
+        version = self.redis.get_conversation_version(conversation_id)
+        conversation = self.redis.get_conversation(conversation_id)
+        if not conversation:
+            raise ConversationNotFoundError("Conversación no existente.")
+        if version is None:
+            version = self.redis.init_conversation_version(conversation_id)
+        messages = conversation.messages
+        first = max(1, (since + 1) if since is not None else 1) + offset
+        last = min(len(messages), first + limit)
+        return {
+            "conversation_id": conversation_id,
+            "version": version,
+            "total": len(messages) - 1,
+            "messages": [{"index": i,
+                          "role": "bot" if messages[i].role == "assistant" else messages[i].role,
+                          "content": messages[i].content}
+                         for i in range(first, last)],
+            "next_cursor": last - 1 if last < len(messages) else None}
+
+
+    def delete_conversation(self, conversation_id: str) -> None:
+        """Elimina una conversación, sus índices y su copia archivada.
+        Args:
+            conversation_id (str): ID de la conversación."""
+        if not self.redis.delete_conversation(conversation_id):
+            raise ConversationNotFoundError("Conversación no existente.")
+
+
+    def start_purge(self,
+                    older_than_days: Optional[float] = None,
+                    posture: Optional[str] = None,
+                    client_id: Optional[str] = None,
+                    dry_run: bool = False,
+                    max_per_second: Optional[float] = None) -> str:
+        """Lanza una purga masiva en segundo plano. Su progreso se guarda en
+        Redis y se consulta con `get_purge_progress`.
+        Returns:
+            str: ID del trabajo."""
+        job_id = str(uuid4())
+        options = {"older_than_days": older_than_days,
+                   "posture": posture,
+                   "client_id": client_id,
+                   "dry_run": dry_run,
+                   "max_per_second": max_per_second or float(
+                       os.getenv("PURGE_MAX_PER_SECOND", "1000"))}
+        self.redis.save_purge_progress(job_id, {"status": "running",
+                                                "options": options,
+                                                "started_at": datetime.now().isoformat(),
+                                                "scanned": 0, "matched": 0, "deleted": 0})
+        threading.Thread(target=self._run_purge, args=(job_id, options),
+                         name=f"purge-{job_id[:8]}", daemon=True).start()
+        return job_id
+
+
+    def _run_purge(self, job_id: str, options: Dict[str, Any]) -> None:
+        progress: Dict[str, Any] = {}
+        try:
+            for progress in self.redis.purge_conversations(**options):
+                self.redis.save_purge_progress(job_id, progress)
+            self.redis.save_purge_progress(job_id, {"status": "done",
+                                                    "finished_at": datetime.now().isoformat()})
+            logger.info(f"Purga {job_id} completada: {progress}")
+        except Exception as e:
+            logger.error(f"Error en la purga {job_id}: {e}")
+            self.redis.save_purge_progress(job_id, {"status": "failed", "error": str(e)})
+
+
+    def get_purge_progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Progreso de una purga: `status`, `scanned`, `matched` y `deleted`."""
+        return self.redis.get_purge_progress(job_id)
+
+
+    def start_capacity_report(self,
+                              sample_size: int = 10_000,
+                              sample_rate: float = 1.0,
+                              batch_size: int = 200,
+                              pause: float = 0.05) -> str:
+        """Lanza en segundo plano el informe de capacidad del almacenamiento.
+        Su progreso y el informe final se consultan con `get_capacity_report`.
+        Returns:
+            str: ID del trabajo."""
+        job_id = str(uuid4())
+        options = {"sample_size": sample_size,
+                   "sample_rate": sample_rate,
+                   "batch_size": batch_size,
+                   "pause": pause}
+        self.redis.save_job_progress("capacity", job_id, {"status": "running",
+                                                          "options": options,
+                                                          "started_at": datetime.now().isoformat(),
+                                                          "scanned": 0, "sampled": 0})
+        threading.Thread(target=self._run_capacity_report, args=(job_id, options),
+                         name=f"capacity-{job_id[:8]}", daemon=True).start()
+        return job_id
+
+
+    def _run_capacity_report(self, job_id: str, options: Dict[str, Any]) -> None:
+        try:
+            for progress in self.redis.capacity_report(**options):
+                self.redis.save_job_progress("capacity", job_id, progress)
+            self.redis.save_job_progress("capacity", job_id,
+                                         {"status": "done",
+                                          "finished_at": datetime.now().isoformat()})
+            logger.info(f"Informe de capacidad {job_id} completado")
+        except Exception as e:
+            logger.error(f"Error en el informe de capacidad {job_id}: {e}")
+            self.redis.save_job_progress("capacity", job_id, {"status": "failed", "error": str(e)})
+
+
+    def get_capacity_report(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Progreso (`status`, `scanned`, `sampled`) y, al terminar, `report`."""
+        return self.redis.get_job_progress("capacity", job_id)
+
+
+    def export_conversations(self,
+                             posture: Optional[str] = None,
+                             since: Optional[str] = None,
+                             until: Optional[str] = None,
+                             batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """Recorre todas las conversaciones (incluidas las archivadas) para
+        exportarlas en streaming.
+        Args:
+            posture (Optional[str]): Filtro por postura (subcadena).
+            since (Optional[str]): Creadas desde esta fecha (ISO 8601).
+            until (Optional[str]): Creadas antes de esta fecha (ISO 8601).
+            batch_size (int): Conversaciones leídas por lote.
+        Returns:
+            Iterator[Dict[str, Any]]: Conversaciones como diccionarios."""
+        return self.redis.iter_conversations(batch_size=batch_size,
+                                             posture=posture,
+                                             since=since,
+                                             until=until)
+
+
+    def find_conversations(self,
+                           posture: str,
+                           limit: int = 100,
+                           offset: int = 0) -> Optional[Dict[str, Any]]:
+        """Conversaciones activas que defienden una postura, según el índice.
+        Args:
+            posture (str): Postura (se normaliza antes de buscarla).
+            limit (int): Máximo de IDs devueltos.
+            offset (int): IDs a saltar, para paginar.
+        Returns:
+            Optional[Dict[str, Any]]: `posture`, `total` y `conversations`."""
+        return self.redis.find_conversations_by_posture(posture, limit=limit, offset=offset)
+
+
+    def search_postures(self,
+                        query: str,
+                        mode: str = "prefix",
+                        limit: int = 20) -> Optional[Dict[str, Any]]:
+        """Búsqueda por prefijo o por palabras clave en el índice de posturas.
+        Args:
+            query (str): Texto buscado.
+            mode (str): `prefix` o `keywords`.
+            limit (int): Máximo de resultados.
+        Returns:
+            Optional[Dict[str, Any]]: Resultados de la búsqueda."""
+        return self.redis.search_postures(query, mode=mode, limit=limit)
+
+
+    def list_conversations(self,
+                           limit: int = 20,
+                           offset: int = 0) -> Dict[str, Any]:
+        """Conversaciones activas más recientes primero, paginadas. En Redis
+        se leen del índice de actividad; los backends embebidos recorren el
+        almacenamiento por lotes y solo retienen `offset + limit` resúmenes.
+        Args:
+            limit (int): Máximo de conversaciones devueltas.
+            offset (int): Conversaciones a saltar, para paginar.
+        Returns:
+            Dict[str, Any]: `total` y `conversations` (ID, postura, mensajes
+            y última actualización)."""
+        return self.redis.list_recent(limit=limit, offset=offset)
+
 
     def get_all_conversations(self) -> Optional[Dict[str,
                                                      Optional[List[str]]]]:
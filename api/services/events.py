@@ -0,0 +1,141 @@
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple)
+
+import os, time, socket, logging, redis
+
+"""Eventos de turno para consumidores externos (analítica, moderación,
+facturación). Cada turno confirmado añade un evento compacto a un Redis
+Stream acotado, en el mismo pipeline que guarda la conversación, así que
+evento y conversación se escriben juntos. Los consumidores leen el stream
+con grupos de consumidores y nunca tocan las claves de las conversaciones."""
+
+logger = logging.getLogger(__name__)
+
+TURNS_STREAM = "events:turns"
+
+
+def turn_event(conversation_id: str,
+               role: str,
+               content: str,
+               usage: Optional[Dict[str, Any]] = None,
+               latency_ms: Optional[float] = None,
+               model: Optional[str] = None,
+               client_id: Optional[str] = None) -> Dict[str, str]:
+    """Evento de un turno. Solo lleva metadatos (no el contenido del mensaje)
+    y todos los campos son texto, como exige XADD.
+    Args:
+        conversation_id (str): ID de la conversación.
+        role (str): `user` o `assistant`.
+        content (str): Mensaje del turno (solo se registra su longitud).
+        usage (Optional[Dict[str, Any]]): Tokens y costo del turno.
+        latency_ms (Optional[float]): Latencia del upstream.
+        model (Optional[str]): Modelo que generó la respuesta.
+        client_id (Optional[str]): Cliente de la conversación.
+    Returns:
+        Dict[str, str]: Campos del evento."""
+    event = {"conversation_id": conversation_id,
+             "role": role,
+             "length": str(len(content)),
+             "ts": f"{time.time():.3f}"}
+    for key in ("prompt_tokens", "completion_tokens", "cached_tokens", "cost"):
+        if usage and key in usage:
+            event[key] = str(usage[key])
+    if latency_ms is not None:
+        event["latency_ms"] = f"{latency_ms:.1f}"
+    if model:
+        event["model"] = model
+    if client_id:
+        event["client_id"] = client_id
+    return event
+
+
+class TurnEventConsumer:
+    """Consumidor de eventos de turno dentro de un grupo de consumidores.
+    Cada evento se confirma (XACK) después de procesarlo; si el consumidor
+    cae, sus eventos pendientes los reclama otro miembro del grupo tras
+    `claim_idle_ms`, de modo que ningún evento se pierde.
+    Args:
+        client: Cliente Redis.
+        group (str): Grupo de consumidores (uno por carga: `billing`, `moderation`...).
+        consumer (Optional[str]): Nombre de este consumidor dentro del grupo.
+        stream (str): Stream de eventos.
+        claim_idle_ms (int): Inactividad tras la cual se reclaman pendientes ajenos."""
+
+    def __init__(self,
+                 client,
+                 group: str,
+                 consumer: Optional[str] = None,
+                 stream: str = TURNS_STREAM,
+                 claim_idle_ms: int = 60_000):
+        self.redis = client
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}:{os.getpid()}"
+        self.stream = stream
+        self.claim_idle_ms = claim_idle_ms
+        self._stop = False
+
+
+    def ensure_group(self, start: str = "$") -> None:
+        """Crea el grupo (y el stream) si no existen.
+        Args:
+            start (str): Primer evento del grupo nuevo: `$` solo los nuevos,
+                `0` todo el historial retenido."""
+        try:
+            self.redis.xgroup_create(self.stream, self.group, id=start, mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+
+    def claim(self, count: int = 100) -> List[Tuple[str, Dict[str, str]]]:
+        """Reclama eventos pendientes de consumidores inactivos del grupo."""
+        result = self.redis.xautoclaim(self.stream, self.group, self.consumer,
+                                       min_idle_time=self.claim_idle_ms,
+                                       start_id="0-0", count=count)
+        return result[1] if result else []
+
+
+    def read(self, count: int = 100, block_ms: int = 5000) -> List[Tuple[str, Dict[str, str]]]:
+        """Lee eventos nuevos para este consumidor (quedan pendientes hasta `ack`)."""
+        response = self.redis.xreadgroup(self.group, self.consumer, {self.stream: ">"},
+                                         count=count, block=block_ms)
+        return [entry for _, entries in response or [] for entry in entries]
+
+
+    def ack(self, *event_ids: str) -> int:
+        if not event_ids:
+            return 0
+        return self.redis.xack(self.stream, self.group, *event_ids)
+
+
+    def run(self,
+            handler: Callable[[Dict[str, str]], Any],
+            count: int = 100,
+            block_ms: int = 5000) -> None:
+        """Procesa eventos con `handler` hasta `stop()`, confirmando en lote
+        los que terminan sin error. Los fallidos quedan pendientes y se
+        reintentan al reclamarlos: al arrancar y cuando no hay eventos nuevos."""
+        self.ensure_group()
+        batch = self.claim(count)
+        while True:
+            done = []
+            for event_id, fields in batch:
+                try:
+                    handler(fields)
+                except Exception as e:
+                    logger.error(f"Error al procesar el evento {event_id} ({self.group}): {e}")
+                    continue
+                done.append(event_id)
+            self.ack(*done)
+            if self._stop:
+                break
+            batch = self.read(count, block_ms) or self.claim(count)
+
+
+    def stop(self) -> None:
+        self._stop = True
@@ -0,0 +1,45 @@
+from typing import (
+    Any,
+    Dict,
+    IO,
+    Iterable,
+    Iterator)
+
+import io, json, gzip, zlib
+
+"""Codificación NDJSON en streaming para exportar e importar conversaciones."""
+
+
+def ndjson_chunks(records: Iterable[Dict[str, Any]],
+                  chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Serializa registros como NDJSON en bloques de ~`chunk_size` bytes, para
+    no emitir una escritura por registro."""
+    buffer = io.BytesIO()
+    for record in records:
+        buffer.write(json.dumps(record, ensure_ascii=False).encode())
+        buffer.write(b"\n")
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Comprime un flujo de bloques en formato gzip sin acumularlo en memoria."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: cabecera gzip
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def open_ndjson(path: str) -> IO[str]:
+    """Abre un archivo NDJSON para lectura, descomprimiéndolo si es gzip."""
+    with open(path, "rb") as f:
+        is_gzip = f.read(2) == b"\x1f\x8b"
+    if is_gzip:
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
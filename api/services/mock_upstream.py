@@ -0,0 +1,243 @@
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional)
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import OrderedDict
+
+import json, time, hashlib, threading, argparse, logging
+
+logger = logging.getLogger(__name__)
+
+"""Servidor LLM simulado compatible con la API de OpenAI.
+Sirve para pruebas, demos y pruebas de carga sin consumir tokens reales.
+Simula la caché de prompts del proveedor: los prefijos marcados con
+`cache_control` se recuerdan, y en peticiones posteriores con el mismo
+prefijo se reportan como `prompt_tokens_details.cached_tokens`. Como el
+proveedor, desde cada punto de corte se buscan también aciertos en los
+mensajes anteriores (hasta `CACHE_LOOKBACK`), así que el punto de corte que
+avanza turno a turno reutiliza el prefijo guardado en el turno previo."""
+
+# Mensajes anteriores a cada punto de corte en los que se buscan aciertos
+CACHE_LOOKBACK = 20
+
+
+def count_tokens(content: Any) -> int:
+    """Aproximación de tokens: ~4 caracteres por token."""
+    if isinstance(content, list):
+        content = "".join(part.get("text", "") for part in content)
+    return max(1, len(content or "") // 4)
+
+
+def _plain(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Mensaje sin marcas de caché, para comparar prefijos."""
+    content = message.get("content")
+    if isinstance(content, list):
+        content = "".join(part.get("text", "") for part in content)
+    return {"role": message.get("role"), "content": content}
+
+
+class PromptCache:
+    """Caché LRU de prefijos de prompt: hash del prefijo -> tokens."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+
+
+    @staticmethod
+    def _digest(messages: List[Dict[str, Any]]) -> str:
+        raw = json.dumps([_plain(m) for m in messages], sort_keys=True)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+
+    def lookup_and_store(self, messages: List[Dict[str, Any]]) -> int:
+        """Devuelve los tokens del prefijo cacheado más largo y registra los
+        prefijos que terminan en cada punto de corte de la petición. Desde
+        cada punto de corte se prueban también los prefijos que terminan en
+        los `CACHE_LOOKBACK` mensajes anteriores.
+        Returns:
+            int: Tokens servidos desde la caché."""
+        breakpoints = [i for i, m in enumerate(messages)
+                       if isinstance(m.get("content"), list)
+                       and any("cache_control" in part for part in m["content"])]
+        tokens = [count_tokens(m.get("content")) for m in messages]
+        cached = 0
+        with self.lock:
+            for index in breakpoints:
+                for end in range(index, max(-1, index - CACHE_LOOKBACK), -1):
+                    digest = self._digest(messages[:end + 1])
+                    if digest in self.entries:
+                        self.entries.move_to_end(digest)
+                        cached = max(cached, sum(tokens[:end + 1]))
+                        break
+                digest = self._digest(messages[:index + 1])
+                if digest not in self.entries:
+                    self.entries[digest] = sum(tokens[:index + 1])
+                    if len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+        return cached
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_Server"
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug("mock upstream: " + format, *args)
+
+
+    def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list",
+                                  "data": [{"id": "mock-model", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+
+    def do_POST(self) -> None:
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        self.server.requests.append(payload)
+        if self.server.delay:
+            time.sleep(self.server.delay)
+
+        messages = payload.get("messages", [])
+        last_user = next((_plain(m)["content"] for m in reversed(messages)
+                          if m.get("role") == "user"), "")
+        if payload.get("response_format", {}).get("type") == "json_object":
+            content = json.dumps({"posture": last_user})
+        else:
+            turn = sum(1 for m in messages if m.get("role") == "assistant") + 1
+            content = f"Respuesta simulada #{turn}: {last_user[:80]}"
+
+        usage = {
+            "prompt_tokens": sum(count_tokens(m.get("content")) for m in messages),
+            "completion_tokens": count_tokens(content),
+            "prompt_tokens_details": {
+                "cached_tokens": self.server.cache.lookup_and_store(messages)}}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        model = payload.get("model", "mock-model")
+
+        if payload.get("stream"):
+            self._stream(model, content, usage)
+            return
+        self._send_json(200, {
+            "id": f"mock-{len(self.server.requests)}",
+            "object": "chat.completion",
+            "model": model,
+            "choices": [{"index": 0,
+                         "message": {"role": "assistant", "content": content},
+                         "finish_reason": "stop"}],
+            "usage": usage})
+
+
+    def _stream(self, model: str, content: str, usage: Dict[str, Any]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            delta = word if i == 0 else f" {word}"
+            chunk = {"object": "chat.completion.chunk",
+                     "model": model,
+                     "choices": [{"index": 0, "delta": {"content": delta}}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            if self.server.token_delay:
+                time.sleep(self.server.token_delay)
+        final = {"object": "chat.completion.chunk", "model": model,
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                 "usage": usage}
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+        self.wfile.flush()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    cache: PromptCache
+    requests: List[Dict[str, Any]]
+    delay: float
+    token_delay: float
+
+
+class MockUpstream:
+    """Servidor LLM simulado que corre en un hilo en segundo plano.
+    Args:
+        host (str): Interfaz de escucha.
+        port (int): Puerto; 0 para elegir uno libre.
+        delay (float): Latencia simulada por petición, en segundos.
+        token_delay (float): Pausa entre chunks en streaming, en segundos."""
+
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 delay: float = 0.0,
+                 token_delay: float = 0.0):
+        self.server = _Server((host, port), _Handler)
+        self.server.cache = PromptCache()
+        self.server.requests = []
+        self.server.delay = delay
+        self.server.token_delay = token_delay
+        self._thread: Optional[threading.Thread] = None
+
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+    @property
+    def requests(self) -> List[Dict[str, Any]]:
+        """Payloads recibidos, en orden de llegada."""
+        return self.server.requests
+
+
+    def start(self) -> "MockUpstream":
+        self._thread = threading.Thread(target=self.server.serve_forever,
+                                        name="mock-upstream",
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+    def __enter__(self) -> "MockUpstream":
+        return self.start()
+
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor LLM simulado compatible con OpenAI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--delay", type=float, default=0.0)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    args = parser.parse_args()
+    upstream = MockUpstream(args.host, args.port, args.delay, args.token_delay)
+    print(f"Mock upstream escuchando en {upstream.base_url}")
+    try:
+        upstream.server.serve_forever()
+    except KeyboardInterrupt:
+        upstream.stop()
@@ -0,0 +1,257 @@
+from typing import (
+    Any,
+    Dict,
+    List)
+
+import re, time, zlib, unicodedata, logging
+
+"""Índice secundario de posturas en Redis.
+- `postures:posture:{<postura normalizada>}`: zset ID -> expiración.
+- `postures:token:{<token>}`: índice invertido, zset ID -> expiración.
+- `postures:{idx}:names` y `postures:{idx}:tokens`: zsets lexicográficos
+  (score 0) de posturas y tokens, para búsquedas por prefijo con ZRANGEBYLEX.
+- `postures:byid:{<ID>}`: postura normalizada de una conversación, para
+  desindexarla (en el mismo slot o nodo que la conversación).
+- `postures:expiry:{expiry-<n>}`: zsets ID -> expiración, repartidos en
+  `EXPIRY_SHARDS` claves, para la limpieza.
+El score es el instante en que expira la conversación: las consultas solo
+devuelven conversaciones activas y la limpieza elimina las expiradas.
+Cada postura y cada token tiene su propio hash tag, así que en Cluster o con
+sharding el índice se reparte entre los nodos; solo los dos zsets
+lexicográficos comparten el tag `{idx}`. Ninguna consulta usa comandos con
+varias claves: se encadenan comandos de una clave en pipelines."""
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "postures:{idx}"
+EXPIRY_SHARDS = 16
+# Margen tras la expiración de la conversación durante el que se conserva su
+# postura, para que la limpieza pueda desindexarla.
+BYID_GRACE = 86_400
+
+_STOPWORDS = {"el", "la", "los", "las", "un", "una", "unos", "unas", "de", "del",
+              "que", "es", "son", "en", "y", "o", "a", "al", "por", "para", "con",
+              "se", "su", "sus", "lo", "no", "mas", "the", "is", "of", "and", "to"}
+
+
+def normalize_posture(posture: str) -> str:
+    """Postura en minúsculas, sin acentos ni puntuación y con espacios simples."""
+    text = unicodedata.normalize("NFKD", posture or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return re.sub(r"[^a-z0-9ñ]+", " ", text).strip()
+
+
+def posture_tokens(posture: str) -> List[str]:
+    """Tokens indexables de una postura (sin palabras vacías ni repetidos)."""
+    tokens = []
+    for token in normalize_posture(posture).split():
+        if len(token) > 1 and token not in _STOPWORDS and token not in tokens:
+            tokens.append(token)
+    return tokens
+
+
+class PostureIndex:
+    """Índice de conversaciones por postura y por tokens de la postura.
+    Args:
+        client: Cliente Redis (cualquier topología soportada)."""
+
+    def __init__(self, client):
+        self.redis = client
+
+
+    @staticmethod
+    def _posture_key(normalized: str) -> str:
+        return f"postures:posture:{{{normalized}}}"
+
+
+    @staticmethod
+    def _token_key(token: str) -> str:
+        return f"postures:token:{{{token}}}"
+
+
+    @staticmethod
+    def _byid_key(conversation_id: str) -> str:
+        return f"postures:byid:{{{conversation_id}}}"
+
+
+    @staticmethod
+    def _expiry_key(shard: int) -> str:
+        return f"postures:expiry:{{expiry-{shard}}}"
+
+
+    @classmethod
+    def _expiry_key_for(cls, conversation_id: str) -> str:
+        return cls._expiry_key(zlib.crc32(conversation_id.encode()) % EXPIRY_SHARDS)
+
+
+    def add(self, pipe, conversation_id: str, posture: str, ttl: int) -> None:
+        """Encola la indexación (o el refresco de la expiración) de una conversación."""
+        normalized = normalize_posture(posture)
+        if not normalized:
+            return
+        expires_at = time.time() + ttl
+        entry = {conversation_id: expires_at}
+        pipe.zadd(self._posture_key(normalized), entry)
+        pipe.expire(self._posture_key(normalized), ttl)
+        tokens = posture_tokens(posture)
+        for token in tokens:
+            pipe.zadd(self._token_key(token), entry)
+            pipe.expire(self._token_key(token), ttl)
+        pipe.zadd(f"{PREFIX}:names", {normalized: 0})
+        if tokens:
+            pipe.zadd(f"{PREFIX}:tokens", {token: 0 for token in tokens})
+        pipe.set(self._byid_key(conversation_id), normalized, ex=ttl + BYID_GRACE)
+        pipe.zadd(self._expiry_key_for(conversation_id), entry)
+
+
+    def remove(self, pipe, conversation_ids: List[str]) -> List[str]:
+        """Encola la eliminación de conversaciones del índice. Lee antes sus
+        posturas para saber de qué claves quitarlas.
+        Returns:
+            List[str]: Posturas normalizadas afectadas."""
+        if not conversation_ids:
+            return []
+        reads = self.redis.pipeline(transaction=False)
+        for conversation_id in conversation_ids:
+            reads.get(self._byid_key(conversation_id))
+        postures = reads.execute()
+        for conversation_id, normalized in zip(conversation_ids, postures):
+            if normalized:
+                pipe.zrem(self._posture_key(normalized), conversation_id)
+                for token in posture_tokens(normalized):
+                    pipe.zrem(self._token_key(token), conversation_id)
+            pipe.delete(self._byid_key(conversation_id))
+            pipe.zrem(self._expiry_key_for(conversation_id), conversation_id)
+        return sorted({normalized for normalized in postures if normalized})
+
+
+    def cleanup(self, limit: int = 1000) -> int:
+        """Desindexa hasta `limit` conversaciones ya expiradas y retira de los
+        índices lexicográficos las posturas y tokens que se quedan vacíos.
+        Returns:
+            int: Conversaciones desindexadas."""
+        now = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        for shard in range(EXPIRY_SHARDS):
+            pipe.zrangebyscore(self._expiry_key(shard), "-inf", now, start=0, num=limit)
+        expired = [member for page in pipe.execute() for member in page][:limit]
+        if not expired:
+            return 0
+        postures = self.remove(pipe, expired)
+        pipe.execute()
+
+        tokens = sorted({token for name in postures for token in posture_tokens(name)})
+        for name in postures:
+            pipe.zcard(self._posture_key(name))
+        for token in tokens:
+            pipe.zcard(self._token_key(token))
+        counts = pipe.execute()
+        empty_names = [name for name, count in zip(postures, counts) if not count]
+        empty_tokens = [token for token, count in zip(tokens, counts[len(postures):])
+                        if not count]
+        if empty_names:
+            pipe.zrem(f"{PREFIX}:names", *empty_names)
+        if empty_tokens:
+            pipe.zrem(f"{PREFIX}:tokens", *empty_tokens)
+        pipe.execute()
+        logger.debug("Índice de posturas: %d conversaciones expiradas desindexadas",
+                     len(expired))
+        return len(expired)
+
+
+    def find(self, posture: str, limit: int = 100, offset: int = 0) -> Dict[str, Any]:
+        """Conversaciones activas que defienden una postura (tras normalizarla),
+        de las que expiran más tarde a las que antes.
+        Returns:
+            Dict[str, Any]: `posture` normalizada, `total` y `conversations`."""
+        normalized = normalize_posture(posture)
+        key = self._posture_key(normalized)
+        now = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zcount(key, now, "+inf")
+        pipe.zrevrangebyscore(key, "+inf", now, start=offset, num=limit)
+        total, ids = pipe.execute()
+        return {"posture": normalized, "total": total, "conversations": ids}
+
+
+    def _live_names(self, lex_key: str, prefix: str, limit: int) -> List[str]:
+        return self.redis.zrangebylex(lex_key, f"[{prefix}", f"[{prefix}\xff",
+                                      start=0, num=limit)
+
+
+    def search_prefix(self, prefix: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Posturas que empiezan por `prefix`, con su número de conversaciones
+        activas. Las posturas sin conversaciones se retiran del índice."""
+        normalized = normalize_posture(prefix)
+        names = self._live_names(f"{PREFIX}:names", normalized, limit)
+        if not names:
+            return []
+        now = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        for name in names:
+            pipe.zcount(self._posture_key(name), now, "+inf")
+        counts = pipe.execute()
+        dead = [name for name, count in zip(names, counts) if not count]
+        if dead:
+            self.redis.zrem(f"{PREFIX}:names", *dead)
+        return [{"posture": name, "count": count}
+                for name, count in zip(names, counts) if count]
+
+
+    def search_keywords(self, query: str, limit: int = 100) -> Dict[str, Any]:
+        """Conversaciones activas cuya postura contiene todas las palabras de
+        la consulta. La última palabra se trata como prefijo (búsqueda
+        mientras se escribe) y se expande a los tokens indexados que empiezan
+        por ella.
+        Returns:
+            Dict[str, Any]: `tokens` usados y `conversations`."""
+        tokens = posture_tokens(query)
+        if not tokens:
+            return {"tokens": [], "conversations": []}
+        *complete, partial = tokens
+        expanded = self._live_names(f"{PREFIX}:tokens", partial, 50) or [partial]
+        now = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        for token in complete + expanded:
+            pipe.zcount(self._token_key(token), now, "+inf")
+        live = dict(zip(complete + expanded, pipe.execute()))
+        ids: Dict[str, float] = {}
+        for candidate in expanded:
+            for member, score in self._intersect(complete + [candidate], live, now, limit):
+                ids[member] = max(score, ids.get(member, 0))
+        ranked = sorted(ids, key=ids.get, reverse=True)[:limit]
+        return {"tokens": complete + expanded, "conversations": ranked}
+
+
+    def _intersect(self, tokens: List[str], live: Dict[str, int], now: float,
+                   limit: int, chunk: int = 200) -> List[tuple]:
+        """Las `limit` conversaciones activas que expiran más tarde entre las
+        que tienen todos los tokens. Recorre por páginas el token con menos
+        conversaciones activas y comprueba la pertenencia a los demás con
+        ZSCORE, parando en cuanto reúne `limit`: el coste depende del token
+        más raro, no de la suma de todos."""
+        if any(not live.get(token) for token in tokens):
+            return []
+        smallest, *others = sorted(tokens, key=live.get)
+        found: List[tuple] = []
+        start = 0
+        while len(found) < limit:
+            page = self.redis.zrevrangebyscore(self._token_key(smallest), "+inf", now,
+                                               start=start, num=chunk, withscores=True)
+            if not page:
+                break
+            start += len(page)
+            if others:
+                pipe = self.redis.pipeline(transaction=False)
+                for member, _ in page:
+                    for token in others:
+                        pipe.zscore(self._token_key(token), member)
+                scores = pipe.execute()
+                width = len(others)
+                page = [(member, min([score] + scores[i * width:(i + 1) * width]))
+                        for i, (member, score) in enumerate(page)
+                        if None not in scores[i * width:(i + 1) * width]]
+            found.extend((member, score) for member, score in page if score >= now)
+            if start >= live[smallest]:
+                break
+        return found[:limit]
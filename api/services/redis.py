@@ -1,42 +1,346 @@
-from ..structures import Conversation
+from ..structures import Conversation, Message
+from ..telemetry import tracing
+from .sharding import ShardedRedis
+from .archive import ArchiveCorruptedError, ConversationArchive, ArchiveSweeper
+from .posture_index import PostureIndex
+from .events import TURNS_STREAM, TurnEventConsumer
+from .capacity import CapacityReport
+from .write_buffer import WriteBuffer
+from .storage import ConversationStore, conversation_key, create_storage, _matches, _summary
 
-import os, json, redis, logging
-from typing import List, Optional
+import os, json, time, random, redis, logging
+from uuid import uuid4
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from datetime import datetime, timedelta, timezone
+from redis.cluster import RedisCluster
+from redis.sentinel import Sentinel
 
 logger = logging.getLogger(__name__)
 
-class RedisService:
+# Dimensiones de los contadores de consumo de tokens
+USAGE_DIMENSIONS = ("clients", "models", "conversations")
+
+# Topologías soportadas (REDIS_MODE)
+REDIS_MODES = ("standalone", "sentinel", "cluster", "sharded")
+
+# Índice de última actividad por conversación (score: timestamp)
+ACTIVITY_KEY = "conversations:activity"
+
+# Debates en curso o pendientes, para reanudarlos tras una caída
+DEBATES_KEY = "debates:active"
+
+# Bloqueo del barrido de archivo (un solo worker a la vez)
+ARCHIVE_LOCK_KEY = "archive:sweeper:lock"
+
+# Borra la clave solo si su valor no cambió desde que se archivó; también
+# libera un bloqueo solo si sigue siendo de quien lo tomó
+_DELETE_IF_UNCHANGED = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Renueva la expiración de un bloqueo solo si sigue siendo del mismo dueño
+_EXPIRE_IF_OWNER = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+def open_storage(backend: Optional[str] = None) -> ConversationStore:
+    """Almacenamiento según `STORAGE_BACKEND` (`redis`, `memory` o `sqlite`)."""
+    backend = (backend or os.getenv("STORAGE_BACKEND", "redis")).lower()
+    return RedisService() if backend == "redis" else create_storage(backend)
+
+
+def conversation_id_from_key(key: str) -> str:
+    """ID de una conversación a partir de su clave (actual o anterior)."""
+    conversation_id = key[len("conversation:"):]
+    if conversation_id.startswith("{") and conversation_id.endswith("}"):
+        conversation_id = conversation_id[1:-1]
+    return conversation_id
+
+
+def version_key(conversation_id: str) -> str:
+    """Clave del contador de versión de una conversación (en el mismo slot
+    o nodo que la conversación)."""
+    return f"version:{{{conversation_id}}}"
+
+
+def forks_key(conversation_id: str) -> str:
+    """Clave del conjunto de bifurcaciones directas de una conversación
+    (en el mismo slot o nodo que la conversación)."""
+    return f"forks:{{{conversation_id}}}"
+
+
+class RedisService(ConversationStore):
     """Servicio para interactuar con Redis."""
+
+    name = "redis"
+    supports_events = True
+    supports_capacity_report = True
+
     def __init__(self):
+        self.usage_retention_days = int(os.getenv("USAGE_RETENTION_DAYS", "90"))
         self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
-        self.redis = redis.Redis.from_url(
-            self.redis_url,
-            decode_responses=True,
-            socket_timeout=5,
-            retry_on_timeout=True)
+        self.mode = os.getenv("REDIS_MODE", "standalone")
+        self.pool_size = int(os.getenv("REDIS_POOL_SIZE", "64"))
+        self.redis = self._connect()
+        self.postures = PostureIndex(self.redis)
+        self.index_cleanup_interval = float(os.getenv("POSTURE_INDEX_CLEANUP_INTERVAL", "60"))
+        self._index_cleaned_at = 0.0
+        # longitud aproximada del stream de eventos de turno (0: sin eventos)
+        self.turn_events_maxlen = int(os.getenv("TURN_EVENTS_MAXLEN", "100000"))
+        # escritura diferida con confirmación en grupo (REDIS_WRITE_BUFFER=1)
+        self.write_buffer: Optional[WriteBuffer] = None
+        self.write_timeout = float(os.getenv("REDIS_WRITE_TIMEOUT", "10"))
+        if os.getenv("REDIS_WRITE_BUFFER", "0") == "1":
+            self.write_buffer = WriteBuffer(
+                self.redis,
+                flush_interval=float(os.getenv("REDIS_WRITE_FLUSH_MS", "2")) / 1000,
+                max_batch=int(os.getenv("REDIS_WRITE_MAX_BATCH", "128")))
+        self.archive: Optional[ConversationArchive] = None
+        self.archive_after_days = float(os.getenv("ARCHIVE_AFTER_DAYS", "7"))
+        self.sweeper: Optional[ArchiveSweeper] = None
+        archive_dir = os.getenv("ARCHIVE_DIR")
+        if archive_dir:
+            self.archive = ConversationArchive(
+                archive_dir,
+                segment_max_bytes=int(os.getenv("ARCHIVE_SEGMENT_MB", "64")) * 1024 * 1024)
+            if self.archive_after_days * 86_400 >= 1_120_000:
+                logger.warning("ARCHIVE_AFTER_DAYS supera el TTL de las conversaciones: "
+                               "expirarán antes de archivarse.")
+
+
+    def _connect(self):
+        """Crea el cliente según la topología de `REDIS_MODE`:
+        - `standalone`: un nodo (`REDIS_URL`).
+        - `sentinel`: maestro `REDIS_SENTINEL_MASTER` descubierto mediante los
+          sentinels de `REDIS_SENTINELS` (`host:puerto,...`), con failover.
+        - `cluster`: Redis Cluster, con `REDIS_URL` como nodo semilla.
+        - `sharded`: hashing consistente en el cliente sobre los nodos
+          independientes de `REDIS_SHARDS` (URLs separadas por comas).
+        Todas usan un pool de como máximo `REDIS_POOL_SIZE` conexiones por nodo."""
+        options = {"decode_responses": True,
+                   "socket_timeout": 5,
+                   "retry_on_timeout": True,
+                   "max_connections": self.pool_size}
+        if self.mode == "standalone":
+            return redis.Redis.from_url(self.redis_url, **options)
+        if self.mode == "sentinel":
+            sentinels = [(host, int(port)) for host, port in
+                         (node.strip().rsplit(":", 1)
+                          for node in os.getenv("REDIS_SENTINELS", "localhost:26379").split(","))]
+            sentinel = Sentinel(sentinels, socket_timeout=1,
+                                sentinel_kwargs={"password": os.getenv("REDIS_SENTINEL_PASSWORD")
+                                                 or None})
+            return sentinel.master_for(os.getenv("REDIS_SENTINEL_MASTER", "mymaster"),
+                                       password=os.getenv("REDIS_PASSWORD") or None,
+                                       **options)
+        if self.mode == "cluster":
+            options.pop("retry_on_timeout")
+            return RedisCluster.from_url(self.redis_url, **options)
+        if self.mode == "sharded":
+            urls = [url.strip() for url in os.getenv("REDIS_SHARDS", self.redis_url).split(",")
+                    if url.strip()]
+            return ShardedRedis(urls, **options)
+        raise ValueError(f"REDIS_MODE no soportado: {self.mode}")
+
+
+    def _connection_pools(self) -> List[Any]:
+        """Pools de conexiones de todos los nodos."""
+        if isinstance(self.redis, ShardedRedis):
+            return self.redis.connection_pools
+        if isinstance(self.redis, RedisCluster):
+            return [node.redis_connection.connection_pool
+                    for node in self.redis.get_nodes() if node.redis_connection]
+        return [self.redis.connection_pool]
+
+
+    def ping(self) -> Dict[str, Any]:
+        """Comprueba la conexión con Redis y mide su latencia.
+        Returns:
+            Dict: `ok` y `latency_ms`"""
+        start = time.perf_counter()
+        try:
+            ok = bool(self.redis.ping())
+        except redis.RedisError as e:
+            logger.error(f"Error al hacer ping a Redis: {e}")
+            ok = False
+        return {"ok": ok, "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+
+    def warmup(self, connections: int = 4) -> bool:
+        """Abre conexiones del pool antes de recibir tráfico, para que las
+        primeras peticiones no paguen el establecimiento de la conexión.
+        Args:
+            connections (int): Conexiones a abrir en cada nodo
+        Returns:
+            bool: True si Redis respondió, False si hubo error"""
+        opened = []
+        try:
+            for pool in self._connection_pools():
+                for _ in range(min(connections, self.pool_size)):
+                    opened.append((pool, pool.get_connection()))
+            return bool(self.redis.ping())
+        except redis.RedisError as e:
+            logger.error(f"Error al precalentar conexiones de Redis: {e}")
+            return False
+        finally:
+            for pool, connection in opened:
+                pool.release(connection)
+
+
+    def close(self) -> None:
+        """Confirma las escrituras diferidas, detiene el barrido de archivo y
+        cierra las conexiones del pool."""
+        if self.write_buffer is not None:
+            self.write_buffer.close()
+            self.write_buffer = None
+        if self.sweeper is not None:
+            self.sweeper.stop()
+            self.sweeper = None
+        self.redis.close()
+
+
+    def start_sweeper(self) -> None:
+        """Arranca el barrido periódico de conversaciones inactivas hacia el
+        archivo (cada `ARCHIVE_SWEEP_INTERVAL` segundos), si está configurado."""
+        if self.archive is None or self.sweeper is not None:
+            return
+        self.sweeper = ArchiveSweeper(self,
+                                      interval=float(os.getenv("ARCHIVE_SWEEP_INTERVAL", "300")))
+        self.sweeper.start()
         
 
     def set_conversation(self, conversation_id: str,
                          conversation_data: Conversation,
-                         ttl:int = 1_120_000) -> bool:
+                         ttl:int = 1_120_000,
+                         event: Optional[Dict[str, str]] = None,
+                         durable: bool = True) -> bool:
         """Almacena conversación en Redis por 2 semanas (por defecto)
         Args:
             conversation_id (str): ID de la conversación
             conversation_data (Conversation): Datos de la conversación
+            event (Optional[Dict[str, str]]): Evento del turno que se confirma;
+                se añade al stream de eventos en el mismo pipeline
+            durable (bool): Con el búfer de escrituras activo, si es False se
+                devuelve sin esperar a que el lote se confirme en Redis
         Returns:
             bool: True si se almacenó correctamente, False si hubo error"""
         try:
-            return self.redis.setex(
-                f"conversation:{conversation_id}",
-                ttl,
-                json.dumps(conversation_data.model_dump()))
-        except redis.RedisError as e:
+            with tracing.span("redis.serialize"):
+                payload = self._serialize(conversation_data)
+            build = lambda pipe: self._queue_conversation(pipe, conversation_id, payload,
+                                                          conversation_data, ttl, event)
+            if self.write_buffer is not None:
+                future = self.write_buffer.submit(build, key=conversation_key(conversation_id),
+                                                  payload=payload)
+                if not durable:
+                    return True
+                with tracing.span("redis.group_commit", **{"db.bytes": len(payload)}):
+                    return bool(future.result(timeout=self.write_timeout)[0])
+            with tracing.span("redis.set", **{"db.bytes": len(payload)}):
+                pipe = self.redis.pipeline(transaction=False)
+                build(pipe)
+                return bool(pipe.execute()[0])
+        except (redis.RedisError, TimeoutError) as e:
             logger.error(f"Error al guardar conversación en Redis: {e}")
-            logger.debug(f"Datos: {conversation_data}")
-            logger.debug(f"e.args: {e.args}\nexc_info: {e.__traceback__}")
+            logger.debug("conversation_id: %s (%d mensajes)", conversation_id,
+                         len(conversation_data.messages), exc_info=True)
             return False
+
+
+    def _queue_conversation(self, pipe, conversation_id: str, payload: str,
+                            conversation_data: Conversation, ttl: int,
+                            event: Optional[Dict[str, str]]) -> None:
+        """Comandos de la escritura de una conversación; el primero es el SETEX."""
+        # en el mismo pipeline se refresca la expiración en el índice de
+        # posturas y la actividad (listado de recientes y barrido de archivo)
+        pipe.setex(conversation_key(conversation_id), ttl, payload)
+        pipe.incr(version_key(conversation_id))
+        pipe.expire(version_key(conversation_id), ttl)
+        pipe.zadd(ACTIVITY_KEY, {conversation_id: time.time()})
+        self.postures.add(pipe, conversation_id, conversation_data.posture, ttl)
+        if event and self.turn_events_maxlen:
+            pipe.xadd(TURNS_STREAM, event, maxlen=self.turn_events_maxlen,
+                      approximate=True)
+        if conversation_data.parent_id:
+            # el prefijo compartido debe sobrevivir a la bifurcación:
+            # se extiende el TTL de los antecesores (solo si es menor)
+            pipe.sadd(forks_key(conversation_data.parent_id), conversation_id)
+            pipe.expire(forks_key(conversation_data.parent_id), ttl, nx=True)
+            for ancestor_id in conversation_data.ancestors:
+                pipe.expire(conversation_key(ancestor_id), ttl, gt=True)
+                pipe.expire(forks_key(ancestor_id), ttl, gt=True)
+
+
+    def sync_writes(self) -> None:
+        """Espera a que se confirmen las escrituras diferidas encoladas.
+        Raises:
+            TimeoutError: Si no se confirman en `REDIS_WRITE_TIMEOUT` segundos.
+                Quien borra o expira no debe seguir: una escritura aún
+                encolada desharía la operación."""
+        if self.write_buffer is not None:
+            self.write_buffer.sync(timeout=self.write_timeout)
+
+
+    def write_stats(self) -> Optional[Dict[str, Any]]:
+        """Métricas del búfer de escrituras, o None si no está activo."""
+        return self.write_buffer.stats() if self.write_buffer is not None else None
         
-    
+
+    def expire_conversation(self, conversation_id: str, ttl: int) -> bool:
+        """Fija la expiración de una conversación y de su versión.
+        Returns:
+            bool: True si existía."""
+        self.sync_writes()
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.expire(conversation_key(conversation_id), ttl)
+        pipe.expire(version_key(conversation_id), ttl)
+        return bool(pipe.execute()[0])
+
+
+    def get_conversation_version(self, conversation_id: str) -> Optional[int]:
+        """Versión de una conversación, sin leer su contenido. Se incrementa
+        en cada escritura y expira junto con la conversación.
+        Args:
+            conversation_id (str): ID de la conversación
+        Returns:
+            Optional[int]: Versión, o None si no hay contador o hubo error"""
+        try:
+            with tracing.span("redis.version"):
+                version = self.redis.get(version_key(conversation_id))
+            return int(version) if version is not None else None
+        except redis.RedisError as e:
+            logger.error(f"Error al obtener la versión de la conversación: {e}")
+            return None
+
+
+    def init_conversation_version(self, conversation_id: str, ttl: int = 1_120_000) -> int:
+        """Crea el contador de versión de una conversación que no lo tiene
+        (guardada antes de existir los contadores, o recuperada del archivo).
+        Returns:
+            int: Versión actual."""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.incr(version_key(conversation_id))
+        pipe.expire(version_key(conversation_id), ttl, nx=True)
+        return int(pipe.execute()[0])
+
+
+    @staticmethod
+    def _serialize(conversation: Conversation) -> str:
+        """JSON de una conversación. Las bifurcaciones solo guardan sus
+        mensajes propios; el prefijo compartido se lee de los antecesores."""
+        data = conversation.model_dump()
+        if conversation.parent_id:
+            data["messages"] = data["messages"][conversation.fork_at:]
+        return json.dumps(data)
+
+
     def get_conversation(self, conversation_id: str) -> Optional[Conversation]:
         """Obtiene conversación de Redis
         Args:
@@ -45,36 +349,806 @@ class RedisService:
             bool: True si se obtuvo correctamente, False si hubo error"""
         data = None
         try:
-            data = self.redis.get(f"conversation:{conversation_id}")
+            if self.write_buffer is not None:
+                # una escritura diferida aún sin confirmar es la más reciente
+                data = self.write_buffer.get_pending(conversation_key(conversation_id))
+            if data is None:
+                with tracing.span("redis.get"):
+                    data = self.redis.get(conversation_key(conversation_id))
+                    if data is None:
+                        data = self._migrate_legacy(conversation_id)
+            if data is None and self.archive is not None:
+                with tracing.span("archive.fault_in"):
+                    data = self._fault_in(conversation_id)
             if data:
-                return Conversation.model_validate(json.loads(data))
+                with tracing.span("redis.deserialize", **{"db.bytes": len(data)}):
+                    conversation = Conversation.model_validate(json.loads(data))
+                if conversation.parent_id:
+                    return self._resolve_fork(conversation)
+                return conversation
             return None
         except redis.RedisError as e:
             logger.error(f"Error al obtener conversación de Redis: {e}")
-            logger.debug(f"conversation_id: {conversation_id}")
-            logger.debug(e.with_traceback(e.__traceback__))
-            logger.debug(f"Data obtenida: {data}")
+            logger.debug("conversation_id: %s", conversation_id, exc_info=True)
             return None
         except (json.JSONDecodeError, ValueError) as e:
             logger.error(f"Error al decodificar JSON de conversación en Redis: {e}")
-            logger.debug(f"conversation_id: {conversation_id}")
-            logger.debug(e.with_traceback(e.__traceback__))
-            logger.debug(f"Data obtenida: {data}")
+            logger.debug("conversation_id: %s (%d bytes)", conversation_id,
+                         len(data or ""), exc_info=True)
             return None
         
 
+    def _resolve_fork(self, conversation: Conversation) -> Optional[Conversation]:
+        """Reconstruye el historial completo de una bifurcación. Los
+        antecesores se leen en un solo pipeline (su número está acotado por
+        `FORK_MAX_DEPTH`) y el historial se compone desde el más cercano que
+        guarda el suyo completo: la raíz o uno compactado.
+        Returns:
+            Optional[Conversation]: Conversación con todos sus mensajes, o
+            None si falta un antecesor necesario."""
+        chain = conversation.ancestors or [conversation.parent_id]
+        with tracing.span("redis.resolve_fork", **{"fork.depth": len(chain)}):
+            pipe = self.redis.pipeline(transaction=False)
+            for ancestor_id in chain:
+                pipe.get(conversation_key(ancestor_id))
+            nodes = []
+            for ancestor_id, data in zip(reversed(chain), reversed(pipe.execute())):
+                if data is None:
+                    data = self._migrate_legacy(ancestor_id)
+                if data is None and self.archive is not None:
+                    data = self._fault_in(ancestor_id)
+                if data is None:
+                    logger.error(f"Falta el antecesor {ancestor_id} de la bifurcación "
+                                 f"{conversation.conversation_id}")
+                    return None
+                node = json.loads(data)
+                nodes.append(node)
+                if not node.get("parent_id"):
+                    break
+            messages: List[Dict[str, Any]] = []
+            for node in reversed(nodes):
+                messages = messages[:node.get("fork_at", 0)] + node["messages"]
+            conversation.messages = ([Message.model_validate(m)
+                                      for m in messages[:conversation.fork_at]]
+                                     + conversation.messages)
+        return conversation
+
+
+    def compact_conversation(self, conversation_id: str) -> bool:
+        """Materializa el historial completo de una bifurcación para que deje
+        de depender de sus antecesores, conservando su TTL.
+        Args:
+            conversation_id (str): ID de la bifurcación.
+        Returns:
+            bool: True si se compactó, False si no existe o no es una bifurcación."""
+        conversation = self.get_conversation(conversation_id)
+        if conversation is None or not conversation.parent_id:
+            return False
+        parent_id = conversation.parent_id
+        conversation.parent_id, conversation.fork_at, conversation.ancestors = None, 0, []
+        ttl = self.redis.ttl(conversation_key(conversation_id))
+        if not self.set_conversation(conversation_id, conversation,
+                                     ttl if isinstance(ttl, int) and ttl > 0 else 1_120_000):
+            return False
+        self.redis.srem(forks_key(parent_id), conversation_id)
+        return True
+
+
+    def _detach_forks(self, conversation_ids: List[str]) -> int:
+        """Compacta las bifurcaciones directas de conversaciones que se van a
+        eliminar, para que no pierdan el prefijo compartido.
+        Returns:
+            int: Bifurcaciones compactadas."""
+        pipe = self.redis.pipeline(transaction=False)
+        for conversation_id in conversation_ids:
+            pipe.smembers(forks_key(conversation_id))
+        children = pipe.execute()
+        compacted = sum(self.compact_conversation(child_id)
+                        for forks in children for child_id in forks or ())
+        if any(children):
+            self.redis.unlink(*(forks_key(conversation_id)
+                                for conversation_id, forks in zip(conversation_ids, children)
+                                if forks))
+        return compacted
+
+
+    def _migrate_legacy(self, conversation_id: str) -> Optional[str]:
+        """Lee una conversación guardada con la clave anterior a los hash tags
+        (`conversation:<id>`) y la mueve a la clave actual conservando su TTL."""
+        legacy = f"conversation:{conversation_id}"
+        data = self.redis.get(legacy)
+        if isinstance(data, str):
+            ttl = self.redis.ttl(legacy)
+            self.redis.setex(conversation_key(conversation_id),
+                             ttl if isinstance(ttl, int) and ttl > 0 else 1_120_000,
+                             data)
+            self.redis.delete(legacy)
+            return data
+        return None
+
+
+    def _fault_in(self, conversation_id: str) -> Optional[str]:
+        """Recupera una conversación archivada y la devuelve a Redis como activa."""
+        data = self.archive.get(conversation_id)
+        if data is None:
+            return None
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.setex(conversation_key(conversation_id), 1_120_000, data)
+        pipe.zadd(ACTIVITY_KEY, {conversation_id: time.time()})
+        self.postures.add(pipe, conversation_id, json.loads(data).get("posture", ""), 1_120_000)
+        pipe.execute()
+        logger.debug("Conversación recuperada del archivo: %s", conversation_id)
+        return data
+
+
+    def archive_idle(self,
+                     max_idle_days: Optional[float] = None,
+                     batch_size: int = 500,
+                     max_batches: int = 100) -> int:
+        """Mueve al archivo las conversaciones sin actividad en los últimos
+        días y las elimina de Redis. Solo un worker barre a la vez.
+        Args:
+            max_idle_days (Optional[float]): Días de inactividad; por defecto
+                `ARCHIVE_AFTER_DAYS`.
+            batch_size (int): Conversaciones por lote.
+            max_batches (int): Lotes como máximo por pasada.
+        Returns:
+            int: Conversaciones archivadas."""
+        if self.archive is None:
+            return 0
+        days = self.archive_after_days if max_idle_days is None else max_idle_days
+        cutoff = time.time() - days * 86_400
+        lock_ttl = int(os.getenv("ARCHIVE_SWEEP_INTERVAL", "300"))
+        # el bloqueo lleva un token propio: si la pasada dura más que su TTL y
+        # otro worker lo toma, al terminar no se borra el bloqueo ajeno
+        token = uuid4().hex
+        if not self.redis.set(ARCHIVE_LOCK_KEY, token, nx=True, ex=lock_ttl):
+            return 0
+        archived = 0
+        try:
+            for _ in range(max_batches):
+                ids = self.redis.zrangebyscore(ACTIVITY_KEY, "-inf", cutoff,
+                                               start=0, num=batch_size)
+                if not ids:
+                    break
+                pipe = self.redis.pipeline(transaction=False)
+                for conversation_id in ids:
+                    pipe.get(conversation_key(conversation_id))
+                found = {cid: data for cid, data in zip(ids, pipe.execute()) if data}
+                self.archive.put_many(found)
+
+                # solo se borra lo que no cambió durante el archivado; lo que
+                # cambió ya tiene una actividad más reciente en el índice
+                pipe = self.redis.pipeline(transaction=False)
+                for conversation_id, data in found.items():
+                    pipe.eval(_DELETE_IF_UNCHANGED, 1, conversation_key(conversation_id), data)
+                deleted = dict(zip(found, pipe.execute()))
+                done = [cid for cid in ids if cid not in found or deleted.get(cid)]
+                if done:
+                    pipe = self.redis.pipeline(transaction=False)
+                    self._unindex(pipe, done)
+                    pipe.execute()
+                archived += sum(1 for cid in found if deleted.get(cid))
+                if len(ids) < batch_size:
+                    break
+        finally:
+            self.redis.eval(_DELETE_IF_UNCHANGED, 1, ARCHIVE_LOCK_KEY, token)
+        return archived
+
+
     def get_all_conversations(self) -> Optional[List[str]]:
         """Obtiene todas las conversaciones almacenadas en Redis
         Returns:
             Optional[dict]: Diccionario con todas las conversaciones o None si hubo error"""
         try:
-            keys = self.redis.keys("conversation:*")
+            with tracing.span("redis.scan"):
+                keys = list(self.redis.scan_iter(match="conversation:*", count=1000))
             if not keys:
                 logger.debug("No se encontraron conversaciones en Redis.")
                 return None
             return keys
         except redis.RedisError as e:
             logger.error(f"Error al obtener todas las conversaciones de Redis: {e}")
-            logger.debug(e.with_traceback(e.__traceback__))
+            logger.debug("Trazo completo del error:", exc_info=True)
+            return None
+
+
+    def iter_conversations(self,
+                           batch_size: int = 500,
+                           posture: Optional[str] = None,
+                           since: Optional[str] = None,
+                           until: Optional[str] = None,
+                           include_archived: bool = True) -> Iterator[Dict[str, Any]]:
+        """Recorre todas las conversaciones con SCAN y las lee en lotes
+        con pipelines, con memoria constante respecto al total.
+        Args:
+            batch_size (int): Claves por lote (SCAN COUNT y tamaño del pipeline).
+            posture (Optional[str]): Solo conversaciones cuya postura lo contenga.
+            since (Optional[str]): Creadas desde esta fecha (ISO 8601).
+            until (Optional[str]): Creadas antes de esta fecha (ISO 8601).
+            include_archived (bool): Incluir también las del archivo.
+        Returns:
+            Iterator[Dict[str, Any]]: Conversaciones como diccionarios."""
+        batch: List[str] = []
+        for key in self.redis.scan_iter(match="conversation:*", count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                yield from self._read_batch(batch, posture, since, until)
+                batch = []
+        if batch:
+            yield from self._read_batch(batch, posture, since, until)
+
+        if include_archived and self.archive is not None:
+            # las archivadas que no están activas en Redis
+            ids: List[str] = []
+            for conversation_id in self.archive.ids():
+                ids.append(conversation_id)
+                if len(ids) >= batch_size:
+                    yield from self._read_archived(ids, posture, since, until)
+                    ids = []
+            if ids:
+                yield from self._read_archived(ids, posture, since, until)
+
+
+    def list_recent(self, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """Conversaciones activas más recientes primero, paginadas desde el
+        índice de actividad con ZREVRANGE (sin recorrer las conversaciones).
+        Las que ya expiraron se retiran del índice al encontrarlas."""
+        self._cleanup_posture_index()
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zcard(ACTIVITY_KEY)
+        pipe.zrevrange(ACTIVITY_KEY, offset, offset + limit - 1)
+        total, ids = pipe.execute()
+        for conversation_id in ids:
+            pipe.get(conversation_key(conversation_id))
+        conversations, expired = [], []
+        for conversation_id, data in zip(ids, pipe.execute()):
+            try:
+                conversation = json.loads(data) if data else None
+            except json.JSONDecodeError:
+                logger.warning(f"Conversación ilegible en el listado: {conversation_id}")
+                conversation = None
+            if conversation is None:
+                expired.append(conversation_id)
+                continue
+            conversations.append(_summary(conversation))
+        if expired:
+            self.redis.zrem(ACTIVITY_KEY, *expired)
+        return {"total": total - len(expired), "conversations": conversations}
+
+
+    def _standalone(self, conversation: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Conversación exportable por sí sola: las bifurcaciones se exportan
+        con el historial completo y sin `parent_id`, `fork_at` ni `ancestors`,
+        para que se puedan importar en cualquier almacenamiento.
+        Returns:
+            Optional[Dict[str, Any]]: La conversación, o None si falta un
+            antecesor necesario."""
+        if not conversation.get("parent_id"):
+            return conversation
+        resolved = self._resolve_fork(Conversation.model_validate(conversation))
+        if resolved is None:
             return None
-    
+        resolved.parent_id, resolved.fork_at, resolved.ancestors = None, 0, []
+        return resolved.model_dump()
+
+
+    def _read_batch(self, keys: List[str], posture, since, until) -> Iterator[Dict[str, Any]]:
+        pipe = self.redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.get(key)
+        for key, data in zip(keys, pipe.execute()):
+            if not data:
+                continue  # expiró entre SCAN y GET
+            try:
+                conversation = self._standalone(json.loads(data))
+            except (json.JSONDecodeError, ValueError):
+                logger.warning(f"Conversación ilegible en la exportación: {key}")
+                continue
+            if conversation is not None and _matches(conversation, posture, since, until):
+                yield conversation
+
+
+    def _read_archived(self, ids: List[str], posture, since, until) -> Iterator[Dict[str, Any]]:
+        pipe = self.redis.pipeline(transaction=False)
+        for conversation_id in ids:
+            pipe.exists(conversation_key(conversation_id))
+        for conversation_id, active in zip(ids, pipe.execute()):
+            if active:
+                continue
+            data = self.archive.get(conversation_id)
+            if data:
+                conversation = self._standalone(json.loads(data))
+                if conversation is not None and _matches(conversation, posture, since, until):
+                    yield conversation
+
+
+    def import_conversations(self,
+                             lines: Iterable[str],
+                             batch_size: int = 500,
+                             ttl: int = 1_120_000) -> Dict[str, int]:
+        """Importa conversaciones en formato NDJSON con escrituras en lotes
+        mediante pipelines. Cada línea se valida como `Conversation`; las
+        inválidas se cuentan y se omiten. Las bifurcaciones de exportaciones
+        anteriores (solo con sus mensajes propios y `parent_id`) se registran
+        en su padre y extienden el TTL de sus antecesores, como al guardarlas.
+        Args:
+            lines (Iterable[str]): Líneas NDJSON.
+            batch_size (int): Conversaciones por pipeline.
+            ttl (int): TTL de las conversaciones importadas, en segundos.
+        Returns:
+            Dict[str, int]: `imported` y `failed`."""
+        result = {"imported": 0, "failed": 0}
+        pipe = self.redis.pipeline(transaction=False)
+        pending = 0
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                conversation = Conversation.model_validate_json(line)
+            except ValueError as e:
+                logger.warning(f"Línea {number} inválida en la importación: {e}")
+                result["failed"] += 1
+                continue
+            self._queue_conversation(pipe, conversation.conversation_id,
+                                     conversation.model_dump_json(), conversation, ttl, None)
+            pending += 1
+            if pending >= batch_size:
+                pipe.execute()
+                result["imported"] += pending
+                pending = 0
+        if pending:
+            pipe.execute()
+            result["imported"] += pending
+        return result
+
+
+    def _unindex(self, pipe, conversation_ids: List[str]) -> None:
+        """Encola la limpieza de los índices secundarios de las conversaciones
+        eliminadas, para que no apunten a conversaciones inexistentes."""
+        if conversation_ids:
+            pipe.zrem(ACTIVITY_KEY, *conversation_ids)
+            self.postures.remove(pipe, conversation_ids)
+
+
+    def _cleanup_posture_index(self) -> None:
+        """Limpia del índice de posturas y del de actividad las conversaciones
+        expiradas, como mucho una vez cada `POSTURE_INDEX_CLEANUP_INTERVAL`
+        segundos."""
+        now = time.monotonic()
+        if now - self._index_cleaned_at < self.index_cleanup_interval:
+            return
+        self._index_cleaned_at = now
+        try:
+            with tracing.span("redis.index_cleanup"):
+                self.postures.cleanup()
+                self.redis.zremrangebyscore(ACTIVITY_KEY, "-inf", time.time() - 1_120_000)
+        except redis.RedisError as e:
+            logger.warning(f"Error al limpiar el índice de posturas: {e}")
+
+
+    def find_conversations_by_posture(self,
+                                      posture: str,
+                                      limit: int = 100,
+                                      offset: int = 0) -> Optional[Dict[str, Any]]:
+        """Conversaciones activas con una postura, resueltas desde el índice
+        (sin recorrer las conversaciones).
+        Args:
+            posture (str): Postura; se normaliza (mayúsculas, acentos, puntuación).
+            limit (int): Máximo de IDs devueltos.
+            offset (int): IDs a saltar, para paginar.
+        Returns:
+            Optional[Dict[str, Any]]: `posture` normalizada, `total` y
+            `conversations`, o None si hubo error"""
+        self._cleanup_posture_index()
+        try:
+            with tracing.span("redis.index_find"):
+                return self.postures.find(posture, limit=limit, offset=offset)
+        except redis.RedisError as e:
+            logger.error(f"Error al consultar el índice de posturas: {e}")
+            return None
+
+
+    def search_postures(self,
+                        query: str,
+                        mode: str = "prefix",
+                        limit: int = 20) -> Optional[Dict[str, Any]]:
+        """Búsqueda en el índice de posturas.
+        Args:
+            query (str): Texto buscado.
+            mode (str): `prefix` (posturas que empiezan por el texto, con su
+                número de conversaciones) o `keywords` (conversaciones cuya
+                postura contiene todas las palabras).
+            limit (int): Máximo de resultados.
+        Returns:
+            Optional[Dict[str, Any]]: Resultados, o None si hubo error"""
+        if mode not in ("prefix", "keywords"):
+            raise ValueError(f"Modo de búsqueda no soportado: {mode}")
+        self._cleanup_posture_index()
+        try:
+            with tracing.span("redis.index_search", **{"search.mode": mode}):
+                if mode == "prefix":
+                    return {"query": query, "postures": self.postures.search_prefix(query, limit)}
+                return {"query": query, **self.postures.search_keywords(query, limit)}
+        except redis.RedisError as e:
+            logger.error(f"Error al buscar en el índice de posturas: {e}")
+            return None
+
+
+    def delete_conversation(self, conversation_id: str) -> bool:
+        """Elimina una conversación de Redis (con UNLINK, sin bloquear), de
+        sus índices y del archivo.
+        Args:
+            conversation_id (str): ID de la conversación
+        Returns:
+            bool: True si existía, False si no"""
+        # una escritura diferida posterior al borrado lo desharía
+        self.sync_writes()
+        self._detach_forks([conversation_id])
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.unlink(conversation_key(conversation_id))
+        pipe.unlink(version_key(conversation_id))
+        self._unindex(pipe, [conversation_id])
+        with tracing.span("redis.delete"):
+            removed = bool(pipe.execute()[0])
+        if self.archive is not None:
+            removed = self.archive.delete(conversation_id) or removed
+        return removed
+
+
+    def purge_conversations(self,
+                            older_than_days: Optional[float] = None,
+                            posture: Optional[str] = None,
+                            client_id: Optional[str] = None,
+                            batch_size: int = 500,
+                            max_per_second: float = 1000.0,
+                            dry_run: bool = False) -> Iterator[Dict[str, Any]]:
+        """Elimina en lotes las conversaciones que cumplen todos los filtros,
+        sin bloquear Redis: recorre las claves con SCAN, las evalúa con GET en
+        pipeline y las borra con UNLINK (la memoria se libera en segundo
+        plano). Tras cada lote, también en las simulaciones y en el archivo,
+        se pausa para no superar `max_per_second` claves leídas por segundo
+        (las borradas son un subconjunto) y proteger la latencia del tráfico
+        normal.
+        Args:
+            older_than_days (Optional[float]): Sin actividad en estos días.
+            posture (Optional[str]): Postura que contiene este texto.
+            client_id (Optional[str]): Cliente que creó la conversación.
+            batch_size (int): Claves por lote.
+            max_per_second (float): Límite de claves procesadas por segundo.
+            dry_run (bool): Solo contar, sin borrar.
+        Returns:
+            Iterator[Dict[str, Any]]: Progreso (`scanned`, `matched`,
+            `deleted`) después de cada lote."""
+        cutoff = ((datetime.now() - timedelta(days=older_than_days)).isoformat()
+                  if older_than_days is not None else None)
+
+        def matches(conversation: Dict[str, Any]) -> bool:
+            if cutoff and (conversation.get("last_updated") or "") >= cutoff:
+                return False
+            if client_id and conversation.get("client_id") != client_id:
+                return False
+            return _matches(conversation, posture, None, None)
+
+        self.sync_writes()
+        progress = {"scanned": 0, "matched": 0, "deleted": 0}
+        start = time.monotonic()
+        batch: List[str] = []
+
+        def throttle() -> None:
+            # limitar el ritmo de lectura y borrado
+            done = max(progress["scanned"], progress["deleted"])
+            wait = done / max_per_second - (time.monotonic() - start)
+            if wait > 0:
+                time.sleep(wait)
+
+        def unlink(ids: List[str]) -> List[Any]:
+            self._detach_forks(ids)
+            pipe = self.redis.pipeline(transaction=False)
+            for conversation_id in ids:
+                pipe.unlink(conversation_key(conversation_id))
+            for conversation_id in ids:
+                pipe.unlink(version_key(conversation_id))
+            self._unindex(pipe, ids)
+            return pipe.execute()[:len(ids)]
+
+        def purge(keys: List[str]) -> None:
+            pipe = self.redis.pipeline(transaction=False)
+            for key in keys:
+                pipe.get(key)
+            ids = []
+            for key, data in zip(keys, pipe.execute()):
+                try:
+                    if data and matches(json.loads(data)):
+                        ids.append(conversation_id_from_key(key))
+                except json.JSONDecodeError:
+                    continue
+            progress["scanned"] += len(keys)
+            progress["matched"] += len(ids)
+            if ids and not dry_run:
+                progress["deleted"] += sum(1 for r in unlink(ids) if r)
+            throttle()
+
+        def purge_archived(conversation_ids: List[str]) -> None:
+            ids = []
+            for conversation_id in conversation_ids:
+                try:
+                    data = self.archive.get(conversation_id)
+                    if data and matches(json.loads(data)):
+                        ids.append(conversation_id)
+                except (json.JSONDecodeError, ArchiveCorruptedError) as e:
+                    logger.warning(f"Conversación archivada ilegible en la purga: {e}")
+            progress["scanned"] += len(conversation_ids)
+            progress["matched"] += len(ids)
+            if ids and not dry_run:
+                # al compactar las bifurcaciones pueden recuperarse del
+                # archivo: se borran también de Redis
+                restored = {cid for cid, r in zip(ids, unlink(ids)) if r}
+                progress["deleted"] += len(restored | set(self.archive.delete_many(ids)))
+            throttle()
+
+        for key in self.redis.scan_iter(match="conversation:*", count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                purge(batch)
+                batch = []
+                yield dict(progress)
+        if batch:
+            purge(batch)
+
+        if self.archive is not None:
+            batch = []
+            for conversation_id in self.archive.ids():
+                batch.append(conversation_id)
+                if len(batch) >= batch_size:
+                    purge_archived(batch)
+                    batch = []
+                    yield dict(progress)
+            if batch:
+                purge_archived(batch)
+        yield dict(progress)
+
+
+    def save_job_progress(self, kind: str, job_id: str, progress: Dict[str, Any],
+                          ttl: int = 86_400) -> None:
+        """Guarda el progreso de un trabajo en segundo plano (`purge`,
+        `capacity`...) para consultarlo desde cualquier worker."""
+        key = f"{kind}:job:{job_id}"
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hset(key, mapping={k: json.dumps(v) for k, v in progress.items()})
+        pipe.expire(key, ttl)
+        pipe.execute()
+
+
+    def get_job_progress(self, kind: str, job_id: str) -> Optional[Dict[str, Any]]:
+        data = self.redis.hgetall(f"{kind}:job:{job_id}")
+        if not data:
+            return None
+        return {k: json.loads(v) for k, v in data.items()}
+
+
+    def save_purge_progress(self, job_id: str, progress: Dict[str, Any],
+                            ttl: int = 86_400) -> None:
+        """Guarda el progreso de una purga para consultarlo desde cualquier worker."""
+        self.save_job_progress("purge", job_id, progress, ttl)
+
+
+    def get_purge_progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.get_job_progress("purge", job_id)
+
+
+    def _memory_info(self) -> Dict[str, int]:
+        """`used_memory` y `maxmemory` sumados sobre todos los nodos."""
+        nodes = self.redis.shards if isinstance(self.redis, ShardedRedis) else [self.redis]
+        totals = {"used_memory": 0, "maxmemory": 0}
+        for node in nodes:
+            info = node.info("memory")
+            # Redis Cluster devuelve un diccionario por nodo
+            sections = (list(info.values())
+                        if info and all(isinstance(v, dict) for v in info.values())
+                        else [info])
+            for section in sections:
+                for field in totals:
+                    totals[field] += int(section.get(field, 0))
+        return totals
+
+
+    def capacity_report(self,
+                        sample_size: int = 10_000,
+                        sample_rate: float = 1.0,
+                        batch_size: int = 200,
+                        pause: float = 0.05,
+                        ttl: int = 1_120_000) -> Iterator[Dict[str, Any]]:
+        """Muestrea las conversaciones para el informe de capacidad sin
+        afectar al tráfico normal: recorre todas las claves con SCAN (que no
+        bloquea) para contarlas, inspecciona una fracción `sample_rate` de
+        ellas hasta `sample_size` con `MEMORY USAGE`, `GET` y `TTL` en
+        pipelines de `batch_size`, y se pausa `pause` segundos entre lotes.
+        Args:
+            sample_size (int): Máximo de conversaciones inspeccionadas.
+            sample_rate (float): Probabilidad de inspeccionar cada clave.
+            batch_size (int): Claves por lote (SCAN COUNT y pipeline).
+            pause (float): Pausa entre lotes, en segundos.
+            ttl (int): TTL de las conversaciones, para la proyección.
+        Returns:
+            Iterator[Dict[str, Any]]: Progreso (`scanned`, `sampled`) después
+            de cada lote; el último elemento lleva además el `report`."""
+        report = CapacityReport(ttl=ttl)
+        batch: List[str] = []
+
+        def inspect(keys: List[str]) -> None:
+            pipe = self.redis.pipeline(transaction=False)
+            for key in keys:
+                pipe.memory_usage(key)
+                pipe.get(key)
+                pipe.ttl(key)
+            results = pipe.execute()
+            for i in range(0, len(results), 3):
+                report.add(results[i + 1], results[i], results[i + 2])
+
+        for key in self.redis.scan_iter(match="conversation:*", count=batch_size):
+            report.scanned += 1
+            if report.sampled + len(batch) < sample_size and random.random() < sample_rate:
+                batch.append(key)
+            if report.scanned % batch_size == 0:
+                if batch:
+                    inspect(batch)
+                    batch = []
+                yield {"scanned": report.scanned, "sampled": report.sampled}
+                if pause:
+                    time.sleep(pause)
+        if batch:
+            inspect(batch)
+        yield {"scanned": report.scanned, "sampled": report.sampled,
+               "report": report.summary(**self._memory_info())}
+
+
+    def turn_events(self, group: str, consumer: Optional[str] = None) -> TurnEventConsumer:
+        """Consumidor de eventos de turno de un grupo (analítica, moderación,
+        facturación...), que lee el stream sin tocar las conversaciones."""
+        return TurnEventConsumer(self.redis, group, consumer=consumer)
+
+
+    def save_debate(self, debate_id: str, state: Dict[str, Any],
+                    ttl: int = 7 * 86_400) -> None:
+        """Guarda el punto de control de un debate. Los debates sin terminar
+        quedan registrados en `DEBATES_KEY` para poder reanudarlos."""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.set(f"debate:{{{debate_id}}}", json.dumps(state), ex=ttl)
+        if state.get("status") in ("pending", "running"):
+            pipe.sadd(DEBATES_KEY, debate_id)
+        else:
+            pipe.srem(DEBATES_KEY, debate_id)
+        pipe.execute()
+
+
+    def get_debate(self, debate_id: str) -> Optional[Dict[str, Any]]:
+        data = self.redis.get(f"debate:{{{debate_id}}}")
+        return json.loads(data) if data else None
+
+
+    def active_debates(self) -> List[str]:
+        """IDs de los debates sin terminar."""
+        return sorted(self.redis.smembers(DEBATES_KEY))
+
+
+    def lock_debate(self, debate_id: str, owner: str, ttl: int = 600) -> bool:
+        """Toma (o renueva, si ya es suyo) el bloqueo de un debate, para que
+        un solo worker lo ejecute. Si el worker cae, el bloqueo expira y otro
+        puede reanudarlo."""
+        key = f"debate:{{{debate_id}}}:lock"
+        if self.redis.set(key, owner, nx=True, ex=ttl):
+            return True
+        # comprobar el dueño y renovar en un solo paso: entre un GET y un
+        # EXPIRE el bloqueo podría expirar y pasar a otro worker
+        return bool(self.redis.eval(_EXPIRE_IF_OWNER, 1, key, owner, ttl))
+
+
+    def unlock_debate(self, debate_id: str, owner: str) -> None:
+        """Libera el bloqueo de un debate, solo si sigue siendo de `owner`."""
+        self.redis.eval(_DELETE_IF_UNCHANGED, 1, f"debate:{{{debate_id}}}:lock", owner)
+
+
+    def _usage_key(self, dimension: str, day: str, member: Optional[str] = None) -> str:
+        """Clave de los contadores diarios de consumo. El hash tag `{dimension}`
+        mantiene todos los días de una dimensión en el mismo slot."""
+        key = f"usage:{{{dimension}}}:{day}"
+        return f"{key}:{member}" if member is not None else key
+
+
+    def record_usage(self,
+                     conversation_id: str,
+                     client_id: Optional[str],
+                     model: str,
+                     usage: Dict[str, int],
+                     cost: float = 0.0) -> bool:
+        """Acumula el consumo de tokens de un turno en los contadores diarios
+        por cliente, modelo y conversación.
+        Args:
+            conversation_id (str): ID de la conversación
+            client_id (Optional[str]): ID del cliente (`anonymous` si es None)
+            model (str): Modelo que generó la respuesta
+            usage (Dict[str, int]): prompt_tokens, completion_tokens y cached_tokens
+            cost (float): Costo estimado en USD
+        Returns:
+            bool: True si se registró correctamente, False si hubo error"""
+        day = datetime.now(timezone.utc).strftime("%Y%m%d")
+        ttl = self.usage_retention_days * 86_400
+        total = usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+        members = {"clients": client_id or "anonymous",
+                   "models": model,
+                   "conversations": conversation_id}
+
+        def build(pipe) -> None:
+            for dimension, member in members.items():
+                ranking = self._usage_key(dimension, day)
+                detail = self._usage_key(dimension, day, member)
+                pipe.zincrby(ranking, total, member)
+                pipe.expire(ranking, ttl)
+                for field in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+                    pipe.hincrby(detail, field, usage.get(field, 0))
+                pipe.hincrby(detail, "requests", 1)
+                pipe.hincrbyfloat(detail, "cost", cost)
+                pipe.expire(detail, ttl)
+
+        try:
+            if self.write_buffer is not None:
+                # los contadores son conmutativos: no hace falta esperar al lote
+                self.write_buffer.submit(build)
+                return True
+            pipe = self.redis.pipeline(transaction=False)
+            build(pipe)
+            with tracing.span("redis.record_usage", **{"db.commands": len(pipe)}):
+                pipe.execute()
+            return True
+        except redis.RedisError as e:
+            logger.error(f"Error al registrar consumo en Redis: {e}")
+            return False
+
+
+    def get_top_usage(self,
+                      dimension: str = "clients",
+                      days: int = 1,
+                      limit: int = 10) -> Optional[List[Dict[str, Any]]]:
+        """Obtiene los mayores consumidores de tokens de los últimos días.
+        Args:
+            dimension (str): `clients`, `models` o `conversations`
+            days (int): Días a agregar, incluyendo el actual
+            limit (int): Número máximo de resultados
+        Returns:
+            Optional[List[Dict]]: Consumidores ordenados por tokens totales,
+            o None si hubo error"""
+        if dimension not in USAGE_DIMENSIONS:
+            raise ValueError(f"Dimensión no soportada: {dimension}")
+        today = datetime.now(timezone.utc)
+        day_list = [(today - timedelta(days=i)).strftime("%Y%m%d") for i in range(days)]
+        try:
+            # la unión se guarda en una clave temporal del mismo slot y solo
+            # se leen los `limit` primeros, ya ordenados por Redis
+            union = f"{self._usage_key(dimension, 'top')}:{uuid4().hex}"
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.zunionstore(union, [self._usage_key(dimension, d) for d in day_list])
+            pipe.expire(union, 60)
+            pipe.zrevrange(union, 0, limit - 1, withscores=True)
+            pipe.delete(union)
+            top = pipe.execute()[2]
+            for member, _ in top:
+                for day in day_list:
+                    pipe.hgetall(self._usage_key(dimension, day, member))
+            with tracing.span("redis.usage_details", **{"db.commands": len(pipe)}):
+                details = pipe.execute()
+        except redis.RedisError as e:
+            logger.error(f"Error al obtener consumo de Redis: {e}")
+            return None
+
+        result = []
+        for i, (member, total) in enumerate(top):
+            entry = {"id": member, "total_tokens": int(total),
+                     "prompt_tokens": 0, "completion_tokens": 0,
+                     "cached_tokens": 0, "requests": 0, "cost": 0.0}
+            for detail in details[i * len(day_list):(i + 1) * len(day_list)]:
+                for field, value in (detail or {}).items():
+                    entry[field] += float(value) if field == "cost" else int(value)
+            entry["cost"] = round(entry["cost"], 6)
+            result.append(entry)
+        return result
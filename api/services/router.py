@@ -0,0 +1,356 @@
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional)
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    wait)
+from collections import deque
+
+import threading, time, logging, contextvars
+
+logger = logging.getLogger(__name__)
+
+
+class TargetStats:
+    """Estadísticas de latencia y errores de un destino de enrutamiento.
+    La latencia y la tasa de error se suavizan con una media móvil
+    exponencial (EWMA); además se conserva una ventana de latencias
+    recientes para calcular percentiles."""
+
+    def __init__(self, alpha: float = 0.2, window: int = 256):
+        self.alpha = alpha
+        self.lock = threading.Lock()
+        self.latencies: deque = deque(maxlen=window)
+        self.ewma_latency: Optional[float] = None
+        self.ewma_error = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.hedges = 0
+        self.in_flight = 0
+        self.consecutive_errors = 0
+        self.last_error_at: Optional[float] = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+
+
+    def record_success(self, latency: float) -> None:
+        with self.lock:
+            self.requests += 1
+            self.consecutive_errors = 0
+            self.latencies.append(latency)
+            if self.ewma_latency is None:
+                self.ewma_latency = latency
+            else:
+                self.ewma_latency += self.alpha * (latency - self.ewma_latency)
+            self.ewma_error -= self.alpha * self.ewma_error
+
+
+    def record_error(self) -> None:
+        with self.lock:
+            self.requests += 1
+            self.errors += 1
+            self.consecutive_errors += 1
+            self.last_error_at = time.monotonic()
+            self.ewma_error += self.alpha * (1.0 - self.ewma_error)
+
+
+    def record_usage(self, usage: Dict[str, int]) -> None:
+        """Acumula el consumo de tokens reportado por el proveedor."""
+        with self.lock:
+            self.prompt_tokens += usage.get("prompt_tokens", 0)
+            self.completion_tokens += usage.get("completion_tokens", 0)
+            self.cached_tokens += usage.get("cached_tokens", 0)
+
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Percentil `p` (0-1) de la ventana de latencias recientes."""
+        with self.lock:
+            if not self.latencies:
+                return None
+            ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(p * len(ordered)))
+        return ordered[index]
+
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50 = self.percentile(0.5)
+        p95 = self.percentile(0.95)
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "hedges": self.hedges,
+                "in_flight": self.in_flight,
+                "ewma_latency_ms": None if self.ewma_latency is None
+                                   else round(self.ewma_latency * 1000, 2),
+                "ewma_error_rate": round(self.ewma_error, 4),
+                "p50_ms": None if p50 is None else round(p50 * 1000, 2),
+                "p95_ms": None if p95 is None else round(p95 * 1000, 2),
+                "consecutive_errors": self.consecutive_errors,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cached_tokens": self.cached_tokens,
+                "cache_hit_ratio": round(self.cached_tokens / self.prompt_tokens, 4)
+                                   if self.prompt_tokens else None}
+
+
+class RouteTarget:
+    """Destino de enrutamiento: un modelo servido por un backend.
+    Args:
+        model (str): Identificador del modelo.
+        provider (Optional[str]): Proveedor preferido dentro de la pasarela
+            (p. ej. preferencia de proveedor en OpenRouter).
+        backend (str): Nombre del backend que sirve el modelo."""
+
+    def __init__(self,
+                 model: str,
+                 provider: Optional[str] = None,
+                 backend: str = "openrouter"):
+        self.model = model
+        self.provider = provider
+        self.backend = backend
+        name = f"{model}@{provider}" if provider else model
+        self.name = name if backend == "openrouter" else f"{backend}:{name}"
+        self.stats = TargetStats()
+
+
+    @classmethod
+    def parse(cls,
+              spec: str,
+              backends: Optional[List[str]] = None,
+              default_backend: str = "openrouter") -> "RouteTarget":
+        """Construye un destino a partir de `[backend:]modelo[@proveedor]`.
+        El prefijo solo se interpreta como backend si está en `backends`,
+        ya que algunos modelos incluyen `:` en su nombre (p. ej. `:free`)."""
+        spec = spec.strip()
+        backend = default_backend
+        prefix, sep, rest = spec.partition(":")
+        if sep and prefix in (backends or []):
+            backend, spec = prefix, rest
+        model, _, provider = spec.partition("@")
+        return cls(model=model, provider=provider or None, backend=backend)
+
+
+    def __repr__(self) -> str:
+        return f"RouteTarget({self.name!r})"
+
+
+class ModelRouter:
+    """Enruta cada llamada al LLM al mejor destino sano de un conjunto
+    ordenado, con conmutación por error y peticiones cubiertas (hedged)
+    opcionales.
+    Args:
+        targets (List[RouteTarget]): Destinos en orden de preferencia.
+        hedge (bool): Si es True, se envía un duplicado al siguiente destino
+            cuando la primera petición supera el umbral de latencia.
+        hedge_percentile (float): Percentil de latencia usado como umbral.
+        hedge_min_samples (int): Muestras necesarias antes de usar el percentil;
+            mientras tanto se usa `hedge_delay`.
+        hedge_delay (float): Umbral en segundos sin muestras suficientes.
+        error_threshold (float): Tasa de error EWMA a partir de la cual un
+            destino se considera no sano.
+        failure_threshold (int): Errores consecutivos que abren el circuito.
+        cooldown (float): Segundos antes de volver a probar un destino no sano.
+        max_pinned (int): Destinos fijados por conversaciones como máximo."""
+
+    def __init__(self,
+                 targets: List[RouteTarget],
+                 hedge: bool = False,
+                 hedge_percentile: float = 0.95,
+                 hedge_min_samples: int = 20,
+                 hedge_delay: float = 2.0,
+                 error_threshold: float = 0.5,
+                 failure_threshold: int = 3,
+                 cooldown: float = 30.0,
+                 max_workers: int = 32,
+                 max_pinned: int = 16):
+        if not targets:
+            raise ValueError("Se requiere al menos un destino de enrutamiento.")
+        self.targets = list(targets)
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_delay = hedge_delay
+        self.error_threshold = error_threshold
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.pinned: List[RouteTarget] = []
+        self.max_pinned = max_pinned
+        self._pinned_lock = threading.Lock()
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+
+    def is_healthy(self, target: RouteTarget) -> bool:
+        """Un destino no es sano si acumula errores, salvo que haya pasado
+        el tiempo de enfriamiento (semiapertura del circuito)."""
+        stats = target.stats
+        failing = (stats.consecutive_errors >= self.failure_threshold
+                   or stats.ewma_error >= self.error_threshold)
+        if not failing:
+            return True
+        return (stats.last_error_at is not None
+                and time.monotonic() - stats.last_error_at >= self.cooldown)
+
+
+    def rank(self,
+             candidates: Optional[List[RouteTarget]] = None) -> List[RouteTarget]:
+        """Ordena los destinos: primero los sanos, por latencia EWMA
+        penalizada por la tasa de error; el orden configurado desempata."""
+        candidates = candidates if candidates is not None else self.targets
+        order = {id(t): i for i, t in enumerate(candidates)}
+
+        def score(target: RouteTarget):
+            stats = target.stats
+            latency = stats.ewma_latency or 0.0
+            return (not self.is_healthy(target),
+                    latency * (1.0 + stats.ewma_error),
+                    order[id(target)])
+
+        return sorted(candidates, key=score)
+
+
+    def _hedge_threshold(self, target: RouteTarget) -> float:
+        if len(target.stats.latencies) >= self.hedge_min_samples:
+            return target.stats.percentile(self.hedge_percentile) or self.hedge_delay
+        return self.hedge_delay
+
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._max_workers,
+                    thread_name_prefix="llm-hedge")
+            return self._executor
+
+
+    def _attempt(self,
+                 target: RouteTarget,
+                 fn: Callable[[RouteTarget], Optional[Any]]) -> Optional[Any]:
+        """Ejecuta `fn` contra un destino y registra su resultado.
+        Un resultado None o una excepción cuentan como error."""
+        stats = target.stats
+        with stats.lock:
+            stats.in_flight += 1
+        start = time.perf_counter()
+        result = None
+        try:
+            result = fn(target)
+        except Exception as e:
+            logger.warning("Error en destino %s: %s", target.name, e)
+        finally:
+            with stats.lock:
+                stats.in_flight -= 1
+        if result is None:
+            stats.record_error()
+        else:
+            stats.record_success(time.perf_counter() - start)
+        return result
+
+
+    def _hedged(self,
+                primary: RouteTarget,
+                backup: RouteTarget,
+                fn: Callable[[RouteTarget], Optional[Any]]) -> tuple:
+        """Envía la petición al destino principal y, si supera el umbral,
+        un duplicado al de respaldo. Gana la primera respuesta válida.
+        Returns:
+            tuple: (respuesta o None, destinos intentados)."""
+        pool = self._pool()
+        # cada intento corre con una copia del contexto, para que sus spans
+        # cuelguen de la traza de la petición
+        first = pool.submit(contextvars.copy_context().run, self._attempt, primary, fn)
+        done, _ = wait([first], timeout=self._hedge_threshold(primary))
+        if done:
+            return first.result(), [primary]
+
+        logger.debug("Petición cubierta: %s -> %s", primary.name, backup.name)
+        with backup.stats.lock:
+            backup.stats.hedges += 1
+        pending = {first, pool.submit(contextvars.copy_context().run,
+                                      self._attempt, backup, fn)}
+        result = None
+        while pending and result is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if result is None:
+                    result = future.result()
+        # cancelar el perdedor: si no ha empezado no se ejecuta; si ya está
+        # en vuelo su respuesta se descarta (solo se registran sus métricas)
+        for future in pending:
+            future.cancel()
+        return result, [primary, backup]
+
+
+    def call(self,
+             fn: Callable[[RouteTarget], Optional[Any]],
+             candidates: Optional[List[RouteTarget]] = None) -> Optional[Any]:
+        """Ejecuta `fn(target)` contra el mejor destino disponible.
+        Args:
+            fn (Callable): Función que realiza la petición a un destino y
+                devuelve la respuesta, o None si hubo error.
+            candidates (Optional[List[RouteTarget]]): Subconjunto de destinos
+                permitidos. Por defecto, todos.
+        Returns:
+            Optional[Any]: Primera respuesta válida, o None si todos fallan."""
+        ranked = self.rank(candidates)
+        if self.hedge and len(ranked) > 1:
+            # con un solo destino no hay a quién enviar el duplicado
+            result, tried = self._hedged(ranked[0], ranked[1], fn)
+            if result is not None:
+                return result
+            ranked = [t for t in ranked if t not in tried]
+        for target in ranked:
+            result = self._attempt(target, fn)
+            if result is not None:
+                return result
+        return None
+
+
+    def find(self,
+             backend: Optional[str] = None,
+             model: Optional[str] = None) -> List[RouteTarget]:
+        """Destinos configurados o fijados que coinciden con el backend
+        y/o el modelo indicados."""
+        with self._pinned_lock:
+            pinned = list(self.pinned)
+        return [t for t in self.targets + pinned
+                if (backend is None or t.backend == backend)
+                and (model is None or t.model == model)]
+
+
+    def pin(self, target: RouteTarget) -> RouteTarget:
+        """Registra un destino fuera de la rotación por defecto (p. ej. uno
+        elegido por una conversación) para que sus estadísticas se expongan.
+        Si ya hay uno igual se reutiliza; con `max_pinned` destinos fijados,
+        el nuevo se usa sin registrarse (sin estadísticas acumuladas).
+        Returns:
+            RouteTarget: Destino a usar."""
+        with self._pinned_lock:
+            for pinned in self.pinned:
+                if pinned.name == target.name:
+                    return pinned
+            if len(self.pinned) < self.max_pinned:
+                self.pinned.append(target)
+            else:
+                logger.warning(f"Límite de destinos fijados alcanzado; {target.name} no se registra")
+        return target
+
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Estadísticas por destino, en el orden configurado."""
+        with self._pinned_lock:
+            pinned = list(self.pinned)
+        return [{"target": t.name,
+                 "backend": t.backend,
+                 "model": t.model,
+                 "provider": t.provider,
+                 "healthy": self.is_healthy(t),
+                 **t.stats.snapshot()} for t in self.targets + pinned]
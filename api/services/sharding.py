@@ -0,0 +1,223 @@
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple)
+from bisect import bisect
+from concurrent.futures import ThreadPoolExecutor
+
+import hashlib, redis, logging
+
+"""Sharding en el cliente sobre varios nodos Redis independientes.
+Las claves se reparten con hashing consistente: añadir o quitar un nodo
+solo mueve ~1/N de las claves. Como en Redis Cluster, si la clave contiene
+un hash tag (`{...}`) solo se usa esa parte, de modo que todas las claves
+de una conversación (`conversation:{id}`, `...:{id}:...`) caen en el mismo
+nodo."""
+
+logger = logging.getLogger(__name__)
+
+
+def hash_tag(key: str) -> str:
+    """Parte de la clave que decide su nodo: el contenido del primer `{...}`
+    no vacío, o la clave entera (misma regla que Redis Cluster)."""
+    start = key.find("{")
+    if start != -1:
+        end = key.find("}", start + 1)
+        if end > start + 1:
+            return key[start + 1:end]
+    return key
+
+
+class HashRing:
+    """Anillo de hashing consistente con nodos virtuales.
+    Args:
+        nodes (Sequence[int]): Identificadores de los nodos.
+        replicas (int): Nodos virtuales por nodo, para repartir uniformemente."""
+
+    def __init__(self, nodes: Sequence[int], replicas: int = 160):
+        points = []
+        for node in nodes:
+            for replica in range(replicas):
+                points.append((self._hash(f"{node}-{replica}"), node))
+        points.sort()
+        self._points = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+    def node_for(self, key: str) -> int:
+        index = bisect(self._points, self._hash(hash_tag(key))) % len(self._points)
+        return self._nodes[index]
+
+
+def _first_key(args: Tuple[Any, ...], command: str = "") -> str:
+    # EVAL/EVALSHA: script, numkeys, claves...
+    key = args[2] if command in ("eval", "evalsha") else args[0]
+    if isinstance(key, (list, tuple)):
+        key = key[0]
+    return key
+
+
+class ShardedPipeline:
+    """Pipeline que agrupa los comandos por nodo, ejecuta un pipeline por
+    nodo y devuelve los resultados en el orden original. Las transacciones
+    solo son atómicas dentro de cada nodo."""
+
+    def __init__(self, client: "ShardedRedis", transaction: bool = False):
+        self.client = client
+        self.transaction = transaction
+        self.commands: List[Tuple[int, str, tuple, dict]] = []
+
+
+    def __len__(self) -> int:
+        return len(self.commands)
+
+
+    def __getattr__(self, name: str):
+        def queue(*args, **kwargs):
+            self.commands.append((self.client.shard_index(_first_key(args, name)),
+                                  name, args, kwargs))
+            return self
+        return queue
+
+
+    def execute(self) -> List[Any]:
+        by_shard: Dict[int, List[int]] = {}
+        for position, (shard, *_) in enumerate(self.commands):
+            by_shard.setdefault(shard, []).append(position)
+        results: List[Any] = [None] * len(self.commands)
+
+        def run(shard: int) -> None:
+            pipe = self.client.shards[shard].pipeline(transaction=self.transaction)
+            for position in by_shard[shard]:
+                _, name, args, kwargs = self.commands[position]
+                getattr(pipe, name)(*args, **kwargs)
+            for position, result in zip(by_shard[shard], pipe.execute()):
+                results[position] = result
+
+        if len(by_shard) == 1:
+            run(next(iter(by_shard)))
+        elif by_shard:
+            list(self.client.executor.map(run, by_shard))
+        self.commands = []
+        return results
+
+
+    def __enter__(self) -> "ShardedPipeline":
+        return self
+
+
+    def __exit__(self, *exc) -> None:
+        self.commands = []
+
+
+class ShardedRedis:
+    """Cliente que reparte las claves entre varios nodos Redis.
+    Los comandos de una clave se envían a su nodo; los de listado (`keys`,
+    `scan_iter`) y `ping` se reparten entre todos y se combinan. Los
+    comandos con varias claves exigen que estén en el mismo nodo.
+    Args:
+        urls (List[str]): URLs de los nodos, en un orden estable.
+        replicas (int): Nodos virtuales por nodo en el anillo.
+        **options: Opciones de conexión de cada nodo."""
+
+    def __init__(self, urls: List[str], replicas: int = 160, **options):
+        if not urls:
+            raise ValueError("Se necesita al menos un nodo Redis.")
+        self.urls = urls
+        self.shards = [redis.Redis.from_url(url, **options) for url in urls]
+        self.ring = HashRing(range(len(urls)), replicas)
+        self.executor = ThreadPoolExecutor(max_workers=len(urls),
+                                           thread_name_prefix="redis-shard")
+
+
+    def shard_index(self, key: str) -> int:
+        return self.ring.node_for(key)
+
+
+    def node_for(self, key: str) -> redis.Redis:
+        return self.shards[self.shard_index(key)]
+
+
+    def _same_shard(self, keys: Iterable[str]) -> redis.Redis:
+        indexes = {self.shard_index(key) for key in keys}
+        if len(indexes) != 1:
+            raise redis.RedisError("CROSSSLOT: las claves pertenecen a nodos distintos; "
+                                   "usa un hash tag común.")
+        return self.shards[indexes.pop()]
+
+
+    def __getattr__(self, name: str):
+        # comandos de una clave: se enrutan por la primera clave
+        def routed(*args, **kwargs):
+            return getattr(self.node_for(_first_key(args, name)), name)(*args, **kwargs)
+        return routed
+
+
+    def _fan_out(self, fn) -> List[Any]:
+        return list(self.executor.map(fn, self.shards))
+
+
+    def ping(self) -> bool:
+        return all(self._fan_out(lambda shard: shard.ping()))
+
+
+    def keys(self, pattern: str = "*") -> List[str]:
+        return [key for keys in self._fan_out(lambda shard: shard.keys(pattern))
+                for key in keys]
+
+
+    def scan_iter(self, match: Optional[str] = None,
+                  count: Optional[int] = None, **kwargs) -> Iterator[str]:
+        for shard in self.shards:
+            yield from shard.scan_iter(match=match, count=count, **kwargs)
+
+
+    def zunion(self, keys: List[str], *args, **kwargs):
+        return self._same_shard(keys).zunion(keys, *args, **kwargs)
+
+
+    def delete(self, *keys: str) -> int:
+        return self._grouped("delete", keys)
+
+
+    def unlink(self, *keys: str) -> int:
+        return self._grouped("unlink", keys)
+
+
+    def exists(self, *keys: str) -> int:
+        return self._grouped("exists", keys)
+
+
+    def _grouped(self, command: str, keys: Sequence[str]) -> int:
+        """Comandos de varias claves independientes: se agrupan por nodo y
+        se suman los resultados."""
+        groups: Dict[int, List[str]] = {}
+        for key in keys:
+            groups.setdefault(self.shard_index(key), []).append(key)
+        return sum(getattr(self.shards[index], command)(*group)
+                   for index, group in groups.items())
+
+
+    def pipeline(self, transaction: bool = False) -> ShardedPipeline:
+        return ShardedPipeline(self, transaction=transaction)
+
+
+    @property
+    def connection_pools(self) -> List[redis.ConnectionPool]:
+        return [shard.connection_pool for shard in self.shards]
+
+
+    def close(self) -> None:
+        for shard in self.shards:
+            shard.close()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,222 @@
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Tuple)
+from collections import deque
+from .posture_index import normalize_posture
+
+import time, threading, logging
+
+logger = logging.getLogger(__name__)
+
+"""Respuestas de apertura pregeneradas para las posturas en tendencia.
+Se cuenta cuántas conversaciones nuevas abre cada postura en una ventana
+deslizante y, para las más populares, se mantiene un pequeño lote de
+primeras respuestas ya generadas y sin usar. Un hilo las repone cuando el
+upstream está ocioso; una conversación nueva con esa postura toma una en
+lugar de esperar a la generación, siempre que no haya caducado.
+Las posturas se agrupan con la misma normalización que el índice de
+posturas. Los contadores y los lotes viven en el proceso: con varios
+workers cada uno mide su propia popularidad y mantiene sus propios lotes."""
+
+
+class Opening:
+    """Primera respuesta pregenerada para una postura.
+    Args:
+        posture (str): Postura con la que se generó.
+        content (str): Texto de la respuesta.
+        response (Dict): Respuesta del backend (modelo y consumo de tokens).
+        latency_ms (float): Lo que tardó en generarse."""
+    __slots__ = ("posture", "content", "response", "latency_ms", "created")
+
+    def __init__(self, posture: str, content: str, response: Dict[str, Any], latency_ms: float):
+        self.posture = posture
+        self.content = content
+        self.response = response
+        self.latency_ms = latency_ms
+        self.created = time.monotonic()
+
+
+class OpeningPool:
+    """Popularidad de posturas y lotes de respuestas de apertura pregeneradas.
+    Args:
+        generate (Callable): Genera la apertura de una postura; devuelve un
+            `Opening` o None si el upstream falla.
+        is_idle (Callable): True si el upstream puede atender una generación
+            especulativa sin retrasar tráfico real.
+        window (float): Segundos de la ventana de popularidad.
+        min_count (int): Conversaciones en la ventana para que una postura
+            esté en tendencia.
+        top (int): Posturas en tendencia que reciben lote.
+        per_posture (int): Respuestas sin usar por postura.
+        max_age (float): Segundos tras los que una respuesta caduca sin usarse.
+        interval (float): Segundos entre comprobaciones del hilo de reposición."""
+
+    def __init__(self,
+                 generate: Callable[[str], Optional[Opening]],
+                 is_idle: Callable[[], bool],
+                 window: float = 600.0,
+                 min_count: int = 3,
+                 top: int = 5,
+                 per_posture: int = 2,
+                 max_age: float = 900.0,
+                 interval: float = 1.0):
+        self.generate = generate
+        self.is_idle = is_idle
+        self.window = window
+        self.min_count = min_count
+        self.top = top
+        self.per_posture = per_posture
+        self.max_age = max_age
+        self.interval = interval
+        self.lock = threading.Lock()
+        # conversaciones nuevas en la ventana: (instante, clave)
+        self.seen: Deque[Tuple[float, str]] = deque()
+        self.counts: Dict[str, int] = {}
+        # último texto visto de cada postura, con el que se generan las aperturas
+        self.postures: Dict[str, str] = {}
+        self.pool: Dict[str, Deque[Opening]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.failed = 0
+        self.expired = 0
+        self.wasted_tokens = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+
+    def _evict(self, now: float) -> None:
+        """Descarta lo que salió de la ventana y las respuestas caducadas.
+        Se llama con el lock tomado."""
+        while self.seen and now - self.seen[0][0] > self.window:
+            _, key = self.seen.popleft()
+            self.counts[key] -= 1
+            if not self.counts[key]:
+                del self.counts[key]
+                self.postures.pop(key, None)
+        for key in list(self.pool):
+            openings = self.pool[key]
+            while openings and now - openings[0].created > self.max_age:
+                stale = openings.popleft()
+                self.expired += 1
+                usage = stale.response.get("usage") or {}
+                self.wasted_tokens += (usage.get("prompt_tokens", 0)
+                                       + usage.get("completion_tokens", 0))
+            if not openings:
+                del self.pool[key]
+
+
+    def _ranked(self) -> List[Tuple[str, int]]:
+        """Claves en tendencia y sus conversaciones, de más a menos popular.
+        Se llama con el lock tomado."""
+        ranked = sorted(((count, key) for key, count in self.counts.items()
+                         if count >= self.min_count), reverse=True)
+        return [(key, count) for count, key in ranked[:self.top]]
+
+
+    def record(self, posture: str) -> None:
+        """Registra una conversación nueva con esta postura."""
+        key = normalize_posture(posture)
+        now = time.monotonic()
+        with self.lock:
+            self._evict(now)
+            self.seen.append((now, key))
+            self.counts[key] = self.counts.get(key, 0) + 1
+            self.postures[key] = posture
+
+
+    def trending(self) -> List[Tuple[str, int]]:
+        """Posturas en tendencia, de más a menos popular.
+        Returns:
+            List[Tuple[str, int]]: Postura y conversaciones en la ventana."""
+        with self.lock:
+            self._evict(time.monotonic())
+            return [(self.postures[key], count) for key, count in self._ranked()]
+
+
+    def take(self, posture: str) -> Optional[Opening]:
+        """Toma una respuesta sin usar y vigente para la postura, o None."""
+        key = normalize_posture(posture)
+        with self.lock:
+            self._evict(time.monotonic())
+            openings = self.pool.get(key)
+            if not openings:
+                self.misses += 1
+                return None
+            # la más reciente: las antiguas caducan antes
+            opening = openings.pop()
+            self.hits += 1
+            return opening
+
+
+    def refill(self) -> int:
+        """Repone una respuesta de la postura en tendencia con más hueco en
+        su lote, si el upstream está ocioso.
+        Returns:
+            int: Respuestas generadas (0 o 1)."""
+        if not self.is_idle():
+            return 0
+        with self.lock:
+            self._evict(time.monotonic())
+            missing = [(self.postures[key], key) for key, _ in self._ranked()
+                       if len(self.pool.get(key, ())) < self.per_posture]
+        if not missing:
+            return 0
+        posture, key = missing[0]
+        opening = self.generate(posture)
+        with self.lock:
+            if opening is None:
+                self.failed += 1
+                return 0
+            self.generated += 1
+            self.pool.setdefault(key, deque()).append(opening)
+        logger.debug("Apertura pregenerada para la postura '%s'", posture)
+        return 1
+
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="opening-pool", daemon=True)
+        self._thread.start()
+
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                # se repone de una en una mientras el upstream siga ocioso
+                while not self._stop.is_set() and self.refill():
+                    pass
+            except Exception as e:
+                logger.error(f"Error al pregenerar aperturas: {e}")
+
+
+    def stats(self) -> Dict[str, Any]:
+        """Posturas en tendencia, respuestas disponibles y aciertos."""
+        trending = self.trending()
+        with self.lock:
+            pooled = {posture: len(self.pool.get(normalize_posture(posture), ()))
+                      for posture, _ in trending}
+            taken = self.hits + self.misses
+            return {"trending": [{"posture": posture, "count": count, "pooled": pooled[posture]}
+                                 for posture, count in trending],
+                    "pooled": sum(len(openings) for openings in self.pool.values()),
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "hit_rate": round(self.hits / taken, 3) if taken else None,
+                    "generated": self.generated,
+                    "failed": self.failed,
+                    "expired": self.expired,
+                    "wasted_tokens": self.wasted_tokens}
+
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
@@ -0,0 +1,907 @@
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple)
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import os, json, time, heapq, sqlite3, threading, logging
+
+from ..structures import Conversation, Message
+from .posture_index import normalize_posture, posture_tokens
+
+"""Almacenamiento de conversaciones.
+`ConversationStore` es la interfaz común (leer, guardar, anexar mensajes,
+listar, borrar y expirar). `RedisService` la implementa sobre Redis; para
+el CLI, los tests y despliegues de un solo nodo hay dos backends embebidos
+que no necesitan un servidor:
+- `MemoryStore`: en el proceso, acotado por número de conversaciones (LRU).
+- `SQLiteStore`: en un archivo SQLite en modo WAL, con barrido de expiradas.
+Los backends embebidos guardan también en el proceso los contadores de
+consumo, los debates y el progreso de los trabajos, que en Redis se
+comparten entre workers."""
+
+logger = logging.getLogger(__name__)
+
+# TTL por defecto de las conversaciones (~13 días)
+DEFAULT_TTL = 1_120_000
+
+STORAGE_BACKENDS = ("redis", "memory", "sqlite")
+
+
+class StorageFeatureError(NotImplementedError):
+    pass
+
+
+def conversation_key(conversation_id: str) -> str:
+    """Clave de una conversación. El hash tag `{id}` asegura que todas las
+    claves de la conversación caigan en el mismo slot o nodo."""
+    return f"conversation:{{{conversation_id}}}"
+
+
+def _matches(conversation: Dict[str, Any],
+             posture: Optional[str],
+             since: Optional[str],
+             until: Optional[str]) -> bool:
+    """Filtros de exportación: postura (subcadena, sin distinguir mayúsculas)
+    y rango de fechas de creación (ISO 8601, `until` exclusivo)."""
+    if posture and posture.lower() not in (conversation.get("posture") or "").lower():
+        return False
+    created = conversation.get("created_at") or ""
+    if since and created < since:
+        return False
+    if until and created >= until:
+        return False
+    return True
+
+
+def _summary(conversation: Dict[str, Any]) -> Dict[str, Any]:
+    """Resumen de una conversación para los listados."""
+    return {"conversation_id": conversation["conversation_id"],
+            "posture": conversation.get("posture"),
+            "messages": len(conversation.get("messages") or []),
+            "last_updated": conversation.get("last_updated") or ""}
+
+
+class ConversationStore(ABC):
+    """Interfaz del almacenamiento de conversaciones.
+    Cada backend declara qué capacidades opcionales soporta."""
+
+    name: str = "base"
+    supports_events: bool = False
+    supports_capacity_report: bool = False
+
+    @abstractmethod
+    def get_conversation(self, conversation_id: str) -> Optional[Conversation]:
+        """Conversación completa, o None si no existe, expiró o hubo error."""
+
+
+    @abstractmethod
+    def set_conversation(self,
+                         conversation_id: str,
+                         conversation_data: Conversation,
+                         ttl: int = DEFAULT_TTL,
+                         event: Optional[Dict[str, str]] = None,
+                         durable: bool = True) -> bool:
+        """Guarda (o reemplaza) una conversación, renueva su expiración e
+        incrementa su versión.
+        Args:
+            conversation_id (str): ID de la conversación.
+            conversation_data (Conversation): Conversación.
+            ttl (int): Segundos hasta que expira.
+            event (Optional[Dict[str, str]]): Evento del turno, si el backend
+                soporta eventos.
+            durable (bool): Si es False, el backend puede confirmar la
+                escritura después de devolver (escritura diferida); las
+                lecturas posteriores la ven igualmente.
+        Returns:
+            bool: True si se guardó (o se encoló), False si hubo error."""
+
+
+    @abstractmethod
+    def delete_conversation(self, conversation_id: str) -> bool:
+        """Elimina una conversación. Returns: True si existía."""
+
+
+    @abstractmethod
+    def expire_conversation(self, conversation_id: str, ttl: int) -> bool:
+        """Fija la expiración de una conversación, sin modificarla.
+        Returns: True si existía."""
+
+
+    @abstractmethod
+    def get_conversation_version(self, conversation_id: str) -> Optional[int]:
+        """Versión de una conversación (se incrementa en cada escritura),
+        sin leer su contenido. None si no existe."""
+
+
+    @abstractmethod
+    def get_all_conversations(self) -> Optional[List[str]]:
+        """Claves de todas las conversaciones activas, o None si no hay."""
+
+
+    @abstractmethod
+    def iter_conversations(self,
+                           batch_size: int = 500,
+                           posture: Optional[str] = None,
+                           since: Optional[str] = None,
+                           until: Optional[str] = None,
+                           include_archived: bool = True) -> Iterator[Dict[str, Any]]:
+        """Recorre las conversaciones activas en lotes, como diccionarios,
+        con memoria constante respecto al total."""
+
+
+    def list_recent(self, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """Conversaciones activas más recientes primero, paginadas. Recorre
+        el almacenamiento por lotes y solo retiene `offset + limit` resúmenes.
+        Returns:
+            Dict[str, Any]: `total` y `conversations` (ID, postura, mensajes
+            y última actualización)."""
+        total = 0
+        def summaries():
+            nonlocal total
+            for conversation in self.iter_conversations(include_archived=False):
+                total += 1
+                yield _summary(conversation)
+        recent = heapq.nlargest(offset + limit, summaries(),
+                                key=lambda c: c["last_updated"])
+        return {"total": total, "conversations": recent[offset:]}
+
+
+    def append_messages(self,
+                        conversation_id: str,
+                        messages: List[Message],
+                        ttl: int = DEFAULT_TTL,
+                        event: Optional[Dict[str, str]] = None) -> Optional[Conversation]:
+        """Anexa mensajes a una conversación existente y actualiza
+        `last_updated`. Los backends embebidos lo hacen de forma atómica, pero
+        Discutidor3000 no lo usa en los turnos (lee la conversación, añade el
+        mensaje y la guarda con `set_conversation`), así que dos turnos
+        simultáneos de una misma conversación pueden pisarse en cualquier
+        backend.
+        Returns:
+            Optional[Conversation]: Conversación actualizada, o None si no
+            existe o no se pudo guardar."""
+        conversation = self.get_conversation(conversation_id)
+        if conversation is None:
+            return None
+        conversation.messages.extend(messages)
+        conversation.last_updated = datetime.now().isoformat()
+        if not self.set_conversation(conversation_id, conversation, ttl=ttl, event=event):
+            return None
+        return conversation
+
+
+    def init_conversation_version(self, conversation_id: str, ttl: int = DEFAULT_TTL) -> int:
+        """Versión actual de una conversación que aún no tiene contador."""
+        return self.get_conversation_version(conversation_id) or 0
+
+
+    def import_conversations(self,
+                             lines: Iterable[str],
+                             batch_size: int = 500,
+                             ttl: int = DEFAULT_TTL) -> Dict[str, int]:
+        """Importa conversaciones en formato NDJSON; las líneas inválidas se
+        cuentan y se omiten.
+        Returns:
+            Dict[str, int]: `imported` y `failed`."""
+        result = {"imported": 0, "failed": 0}
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                conversation = Conversation.model_validate_json(line)
+            except ValueError as e:
+                logger.warning(f"Línea {number} inválida en la importación: {e}")
+                result["failed"] += 1
+                continue
+            if self.set_conversation(conversation.conversation_id, conversation, ttl=ttl):
+                result["imported"] += 1
+            else:
+                result["failed"] += 1
+        return result
+
+
+    def ping(self) -> Dict[str, Any]:
+        """Comprueba el almacenamiento. Returns: `ok` y `latency_ms`."""
+        return {"ok": True, "latency_ms": 0.0}
+
+
+    def warmup(self, connections: int = 4) -> bool:
+        """Prepara el almacenamiento antes de recibir tráfico."""
+        return True
+
+
+    def start_sweeper(self) -> None:
+        """Arranca las tareas periódicas del almacenamiento, si tiene."""
+
+
+    def close(self) -> None:
+        """Libera los recursos del almacenamiento."""
+
+
+    def sync_writes(self) -> None:
+        """Espera a que se confirmen las escrituras diferidas, si las hay."""
+
+
+    def write_stats(self) -> Optional[Dict[str, Any]]:
+        """Métricas de las escrituras diferidas, o None si no se usan."""
+        return None
+
+
+    def turn_events(self, group: str, consumer: Optional[str] = None):
+        raise StorageFeatureError(f"El almacenamiento {self.name} no soporta eventos de turno.")
+
+
+    def capacity_report(self, **options) -> Iterator[Dict[str, Any]]:
+        raise StorageFeatureError(
+            f"El almacenamiento {self.name} no soporta el informe de capacidad.")
+
+
+class StorageSweeper:
+    """Hilo que elimina periódicamente las conversaciones expiradas de un
+    backend embebido.
+    Args:
+        store: Backend con un método `sweep()`.
+        interval (float): Segundos entre pasadas."""
+
+    def __init__(self, store, interval: float = 60.0):
+        self.store = store
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="storage-sweeper", daemon=True)
+        self._thread.start()
+
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                removed = self.store.sweep()
+                if removed:
+                    logger.debug("Conversaciones expiradas eliminadas: %d", removed)
+            except Exception as e:
+                logger.error(f"Error en el barrido de conversaciones expiradas: {e}")
+
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+class EmbeddedStore(ConversationStore):
+    """Base de los backends de un solo nodo. Implementa en el proceso lo que
+    en Redis se comparte entre workers: búsqueda por postura (recorriendo
+    las conversaciones), contadores de consumo, debates, bloqueos y
+    progreso de trabajos. Nada de ello sobrevive a un reinicio."""
+
+    def __init__(self):
+        self.usage_retention_days = int(os.getenv("USAGE_RETENTION_DAYS", "90"))
+        self.sweep_interval = float(os.getenv("STORAGE_SWEEP_INTERVAL", "60"))
+        self.sweeper: Optional[StorageSweeper] = None
+        self._state_lock = threading.RLock()
+        # (dimensión, día) -> miembro -> contadores
+        self._usage: Dict[Tuple[str, str], Dict[str, Dict[str, float]]] = {}
+        self._debates: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, Tuple[str, float]] = {}
+        self._jobs: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+
+    def sweep(self) -> int:
+        """Elimina las conversaciones expiradas. Returns: cuántas."""
+        return 0
+
+
+    def start_sweeper(self) -> None:
+        """Arranca el barrido de expiradas cada `STORAGE_SWEEP_INTERVAL` segundos."""
+        if self.sweeper is None and self.sweep_interval > 0:
+            self.sweeper = StorageSweeper(self, interval=self.sweep_interval)
+            self.sweeper.start()
+
+
+    def close(self) -> None:
+        if self.sweeper is not None:
+            self.sweeper.stop()
+            self.sweeper = None
+
+
+    def _live_postures(self) -> Iterator[Tuple[str, str, str]]:
+        """(postura normalizada, última actualización, ID) de cada conversación."""
+        for conversation in self.iter_conversations():
+            yield (normalize_posture(conversation.get("posture") or ""),
+                   conversation.get("last_updated") or "",
+                   conversation["conversation_id"])
+
+
+    def find_conversations_by_posture(self,
+                                      posture: str,
+                                      limit: int = 100,
+                                      offset: int = 0) -> Optional[Dict[str, Any]]:
+        """Conversaciones con una postura (tras normalizarla), de la más a
+        la menos reciente."""
+        normalized = normalize_posture(posture)
+        found = sorted(((updated, conversation_id)
+                        for name, updated, conversation_id in self._live_postures()
+                        if name == normalized), reverse=True)
+        return {"posture": normalized,
+                "total": len(found),
+                "conversations": [conversation_id for _, conversation_id
+                                  in found[offset:offset + limit]]}
+
+
+    def search_postures(self,
+                        query: str,
+                        mode: str = "prefix",
+                        limit: int = 20) -> Optional[Dict[str, Any]]:
+        """Búsqueda por postura, con los mismos modos y resultados que el
+        índice de Redis (`prefix` o `keywords`)."""
+        if mode not in ("prefix", "keywords"):
+            raise ValueError(f"Modo de búsqueda no soportado: {mode}")
+        if mode == "prefix":
+            prefix = normalize_posture(query)
+            counts: Dict[str, int] = {}
+            for name, _, _ in self._live_postures():
+                if name and name.startswith(prefix):
+                    counts[name] = counts.get(name, 0) + 1
+            return {"query": query,
+                    "postures": [{"posture": name, "count": counts[name]}
+                                 for name in sorted(counts)[:limit]]}
+
+        tokens = posture_tokens(query)
+        if not tokens:
+            return {"query": query, "tokens": [], "conversations": []}
+        *complete, partial = tokens
+        expanded, found = set(), []
+        for name, updated, conversation_id in self._live_postures():
+            candidates = posture_tokens(name)
+            matching = [t for t in candidates if t.startswith(partial)]
+            if matching and all(t in candidates for t in complete):
+                expanded.update(matching)
+                found.append((updated, conversation_id))
+        return {"query": query,
+                "tokens": complete + (sorted(expanded)[:50] or [partial]),
+                "conversations": [conversation_id for _, conversation_id
+                                  in sorted(found, reverse=True)[:limit]]}
+
+
+    def record_usage(self,
+                     conversation_id: str,
+                     client_id: Optional[str],
+                     model: str,
+                     usage: Dict[str, int],
+                     cost: float = 0.0) -> bool:
+        """Acumula el consumo de tokens de un turno en contadores diarios por
+        cliente, modelo y conversación."""
+        day = datetime.now(timezone.utc).strftime("%Y%m%d")
+        members = {"clients": client_id or "anonymous",
+                   "models": model,
+                   "conversations": conversation_id}
+        with self._state_lock:
+            for dimension, member in members.items():
+                counters = self._usage.setdefault((dimension, day), {}).setdefault(
+                    member, {"prompt_tokens": 0, "completion_tokens": 0,
+                             "cached_tokens": 0, "requests": 0, "cost": 0.0})
+                for field in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+                    counters[field] += usage.get(field, 0)
+                counters["requests"] += 1
+                counters["cost"] += cost
+            oldest = (datetime.now(timezone.utc)
+                      - timedelta(days=self.usage_retention_days)).strftime("%Y%m%d")
+            for key in [key for key in self._usage if key[1] < oldest]:
+                del self._usage[key]
+        return True
+
+
+    def get_top_usage(self,
+                      dimension: str = "clients",
+                      days: int = 1,
+                      limit: int = 10) -> Optional[List[Dict[str, Any]]]:
+        """Mayores consumidores de tokens de los últimos días."""
+        if dimension not in ("clients", "models", "conversations"):
+            raise ValueError(f"Dimensión no soportada: {dimension}")
+        today = datetime.now(timezone.utc)
+        totals: Dict[str, Dict[str, float]] = {}
+        with self._state_lock:
+            for i in range(days):
+                day = (today - timedelta(days=i)).strftime("%Y%m%d")
+                for member, counters in self._usage.get((dimension, day), {}).items():
+                    entry = totals.setdefault(member, {field: 0 for field in counters})
+                    for field, value in counters.items():
+                        entry[field] += value
+        result = [{"id": member,
+                   "total_tokens": int(c["prompt_tokens"] + c["completion_tokens"]),
+                   "prompt_tokens": int(c["prompt_tokens"]),
+                   "completion_tokens": int(c["completion_tokens"]),
+                   "cached_tokens": int(c["cached_tokens"]),
+                   "requests": int(c["requests"]),
+                   "cost": round(c["cost"], 6)}
+                  for member, c in totals.items()]
+        return sorted(result, key=lambda entry: entry["total_tokens"], reverse=True)[:limit]
+
+
+    def purge_conversations(self,
+                            older_than_days: Optional[float] = None,
+                            posture: Optional[str] = None,
+                            client_id: Optional[str] = None,
+                            batch_size: int = 500,
+                            max_per_second: float = 1000.0,
+                            dry_run: bool = False) -> Iterator[Dict[str, Any]]:
+        """Elimina las conversaciones que cumplen todos los filtros. En un
+        solo nodo no hay tráfico de otros workers que proteger, así que
+        `max_per_second` no se aplica.
+        Returns:
+            Iterator[Dict[str, Any]]: Progreso (`scanned`, `matched`, `deleted`)."""
+        cutoff = ((datetime.now() - timedelta(days=older_than_days)).isoformat()
+                  if older_than_days is not None else None)
+        progress = {"scanned": 0, "matched": 0, "deleted": 0}
+        ids = []
+        for conversation in self.iter_conversations(batch_size=batch_size):
+            progress["scanned"] += 1
+            if cutoff and (conversation.get("last_updated") or "") >= cutoff:
+                continue
+            if client_id and conversation.get("client_id") != client_id:
+                continue
+            if _matches(conversation, posture, None, None):
+                ids.append(conversation["conversation_id"])
+        progress["matched"] = len(ids)
+        yield dict(progress)
+        if not dry_run:
+            for start in range(0, len(ids), batch_size):
+                progress["deleted"] += sum(1 for conversation_id in ids[start:start + batch_size]
+                                           if self.delete_conversation(conversation_id))
+                yield dict(progress)
+
+
+    def save_job_progress(self, kind: str, job_id: str, progress: Dict[str, Any],
+                          ttl: int = 86_400) -> None:
+        with self._state_lock:
+            self._jobs.setdefault((kind, job_id), {}).update(json.loads(json.dumps(progress)))
+
+
+    def get_job_progress(self, kind: str, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._state_lock:
+            progress = self._jobs.get((kind, job_id))
+            return dict(progress) if progress else None
+
+
+    def save_purge_progress(self, job_id: str, progress: Dict[str, Any],
+                            ttl: int = 86_400) -> None:
+        self.save_job_progress("purge", job_id, progress, ttl)
+
+
+    def get_purge_progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.get_job_progress("purge", job_id)
+
+
+    def save_debate(self, debate_id: str, state: Dict[str, Any],
+                    ttl: int = 7 * 86_400) -> None:
+        with self._state_lock:
+            self._debates[debate_id] = json.loads(json.dumps(state))
+
+
+    def get_debate(self, debate_id: str) -> Optional[Dict[str, Any]]:
+        with self._state_lock:
+            state = self._debates.get(debate_id)
+            return json.loads(json.dumps(state)) if state else None
+
+
+    def active_debates(self) -> List[str]:
+        """IDs de los debates sin terminar."""
+        with self._state_lock:
+            return sorted(debate_id for debate_id, state in self._debates.items()
+                          if state.get("status") in ("pending", "running"))
+
+
+    def lock_debate(self, debate_id: str, owner: str, ttl: int = 600) -> bool:
+        """Toma (o renueva, si ya es suyo) el bloqueo de un debate."""
+        now = time.monotonic()
+        with self._state_lock:
+            current = self._locks.get(debate_id)
+            if current and current[0] != owner and current[1] > now:
+                return False
+            self._locks[debate_id] = (owner, now + ttl)
+            return True
+
+
+    def unlock_debate(self, debate_id: str, owner: str) -> None:
+        """Libera el bloqueo de un debate, solo si sigue siendo de `owner`."""
+        with self._state_lock:
+            current = self._locks.get(debate_id)
+            if current and current[0] == owner:
+                del self._locks[debate_id]
+
+
+class MemoryStore(EmbeddedStore):
+    """Conversaciones en el proceso, acotadas a `max_conversations`: al
+    superarlo se descarta la usada hace más tiempo (LRU). Se guardan
+    serializadas, así que quien las lee recibe siempre una copia.
+    Args:
+        max_conversations (Optional[int]): Límite; por defecto
+            `MEMORY_STORE_MAX_CONVERSATIONS` (10000)."""
+
+    name = "memory"
+
+    def __init__(self, max_conversations: Optional[int] = None):
+        super().__init__()
+        self.max_conversations = max_conversations or int(
+            os.getenv("MEMORY_STORE_MAX_CONVERSATIONS", "10000"))
+        # ID -> (JSON, versión, instante de expiración)
+        self._data: "OrderedDict[str, Tuple[str, int, float]]" = OrderedDict()
+        self._lock = threading.RLock()
+
+
+    def _entry(self, conversation_id: str) -> Optional[Tuple[str, int, float]]:
+        """Entrada vigente (la marca como usada); elimina la expirada."""
+        entry = self._data.get(conversation_id)
+        if entry is None:
+            return None
+        if entry[2] <= time.time():
+            del self._data[conversation_id]
+            return None
+        self._data.move_to_end(conversation_id)
+        return entry
+
+
+    def _put(self, conversation_id: str, payload: str, ttl: int) -> None:
+        entry = self._data.get(conversation_id)
+        version = entry[1] + 1 if entry else 1
+        self._data[conversation_id] = (payload, version, time.time() + ttl)
+        self._data.move_to_end(conversation_id)
+        while len(self._data) > self.max_conversations:
+            evicted, _ = self._data.popitem(last=False)
+            logger.debug("Conversación %s descartada de la memoria (LRU)", evicted)
+
+
+    def get_conversation(self, conversation_id: str) -> Optional[Conversation]:
+        with self._lock:
+            entry = self._entry(conversation_id)
+        return Conversation.model_validate_json(entry[0]) if entry else None
+
+
+    def set_conversation(self,
+                         conversation_id: str,
+                         conversation_data: Conversation,
+                         ttl: int = DEFAULT_TTL,
+                         event: Optional[Dict[str, str]] = None,
+                         durable: bool = True) -> bool:
+        payload = conversation_data.model_dump_json()
+        with self._lock:
+            self._put(conversation_id, payload, ttl)
+        return True
+
+
+    def append_messages(self,
+                        conversation_id: str,
+                        messages: List[Message],
+                        ttl: int = DEFAULT_TTL,
+                        event: Optional[Dict[str, str]] = None) -> Optional[Conversation]:
+        with self._lock:
+            return super().append_messages(conversation_id, messages, ttl=ttl, event=event)
+
+
+    def delete_conversation(self, conversation_id: str) -> bool:
+        with self._lock:
+            return self._data.pop(conversation_id, None) is not None
+
+
+    def expire_conversation(self, conversation_id: str, ttl: int) -> bool:
+        with self._lock:
+            entry = self._entry(conversation_id)
+            if entry is None:
+                return False
+            self._data[conversation_id] = (entry[0], entry[1], time.time() + ttl)
+            return True
+
+
+    def get_conversation_version(self, conversation_id: str) -> Optional[int]:
+        with self._lock:
+            entry = self._entry(conversation_id)
+        return entry[1] if entry else None
+
+
+    def get_all_conversations(self) -> Optional[List[str]]:
+        now = time.time()
+        with self._lock:
+            keys = [conversation_key(conversation_id)
+                    for conversation_id, entry in self._data.items() if entry[2] > now]
+        return keys or None
+
+
+    def iter_conversations(self,
+                           batch_size: int = 500,
+                           posture: Optional[str] = None,
+                           since: Optional[str] = None,
+                           until: Optional[str] = None,
+                           include_archived: bool = True) -> Iterator[Dict[str, Any]]:
+        with self._lock:
+            ids = list(self._data)
+        for start in range(0, len(ids), batch_size):
+            now = time.time()
+            with self._lock:
+                payloads = [entry[0] for entry in
+                            (self._data.get(conversation_id)
+                             for conversation_id in ids[start:start + batch_size])
+                            if entry and entry[2] > now]
+            for payload in payloads:
+                conversation = json.loads(payload)
+                if _matches(conversation, posture, since, until):
+                    yield conversation
+
+
+    def sweep(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [conversation_id for conversation_id, entry in self._data.items()
+                       if entry[2] <= now]
+            for conversation_id in expired:
+                del self._data[conversation_id]
+        return len(expired)
+
+
+class SQLiteStore(EmbeddedStore):
+    """Conversaciones en un archivo SQLite en modo WAL: los lectores no
+    bloquean al escritor, y cada hilo usa su propia conexión. La tabla está
+    indexada por ID (clave primaria), por `last_updated` (listados y purgas
+    por antigüedad) y por `expires_at` (barrido de expiradas).
+    Args:
+        path (Optional[str]): Archivo de la base de datos; por defecto
+            `SQLITE_PATH` (`discutidor3000.db`)."""
+
+    name = "sqlite"
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS conversations (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            posture TEXT,
+            version INTEGER NOT NULL DEFAULT 1,
+            last_updated TEXT,
+            expires_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS conversations_last_updated ON conversations (last_updated);
+        CREATE INDEX IF NOT EXISTS conversations_expires_at ON conversations (expires_at);
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        super().__init__()
+        self.path = path or os.getenv("SQLITE_PATH", "discutidor3000.db")
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._connection().executescript(self._SCHEMA)
+
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión del hilo actual (se crea la primera vez)."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # isolation_level=None: las transacciones se abren explícitamente
+            connection = sqlite3.connect(self.path, timeout=5.0,
+                                         isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+
+    def ping(self) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            self._connection().execute("SELECT 1").fetchone()
+            ok = True
+        except sqlite3.Error as e:
+            logger.error(f"Error al consultar SQLite: {e}")
+            ok = False
+        return {"ok": ok, "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+
+    def get_conversation(self, conversation_id: str) -> Optional[Conversation]:
+        try:
+            row = self._connection().execute(
+                "SELECT data FROM conversations WHERE id = ? AND expires_at > ?",
+                (conversation_id, time.time())).fetchone()
+            return Conversation.model_validate_json(row[0]) if row else None
+        except (sqlite3.Error, ValueError) as e:
+            logger.error(f"Error al obtener conversación de SQLite: {e}")
+            return None
+
+
+    def _upsert(self, connection: sqlite3.Connection, conversation_id: str,
+                conversation: Conversation, ttl: int) -> None:
+        # una conversación expirada pendiente de barrido vuelve a la versión 1
+        connection.execute(
+            """INSERT INTO conversations (id, data, posture, version, last_updated, expires_at)
+               VALUES (?, ?, ?, 1, ?, ?)
+               ON CONFLICT (id) DO UPDATE SET
+                   data = excluded.data,
+                   posture = excluded.posture,
+                   version = CASE WHEN conversations.expires_at > ?
+                                  THEN conversations.version + 1 ELSE 1 END,
+                   last_updated = excluded.last_updated,
+                   expires_at = excluded.expires_at""",
+            (conversation_id, conversation.model_dump_json(), conversation.posture,
+             conversation.last_updated, time.time() + ttl, time.time()))
+
+
+    def set_conversation(self,
+                         conversation_id: str,
+                         conversation_data: Conversation,
+                         ttl: int = DEFAULT_TTL,
+                         event: Optional[Dict[str, str]] = None,
+                         durable: bool = True) -> bool:
+        try:
+            self._upsert(self._connection(), conversation_id, conversation_data, ttl)
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Error al guardar conversación en SQLite: {e}")
+            return False
+
+
+    def append_messages(self,
+                        conversation_id: str,
+                        messages: List[Message],
+                        ttl: int = DEFAULT_TTL,
+                        event: Optional[Dict[str, str]] = None) -> Optional[Conversation]:
+        """Anexa mensajes en una transacción (`BEGIN IMMEDIATE`), de modo que
+        dos escrituras concurrentes no se pisan."""
+        connection = self._connection()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute(
+                    "SELECT data FROM conversations WHERE id = ? AND expires_at > ?",
+                    (conversation_id, time.time())).fetchone()
+                if row is None:
+                    connection.execute("ROLLBACK")
+                    return None
+                conversation = Conversation.model_validate_json(row[0])
+                conversation.messages.extend(messages)
+                conversation.last_updated = datetime.now().isoformat()
+                self._upsert(connection, conversation_id, conversation, ttl)
+                connection.execute("COMMIT")
+                return conversation
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logger.error(f"Error al anexar mensajes en SQLite: {e}")
+            return None
+
+
+    def delete_conversation(self, conversation_id: str) -> bool:
+        try:
+            cursor = self._connection().execute(
+                "DELETE FROM conversations WHERE id = ? AND expires_at > ?",
+                (conversation_id, time.time()))
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            logger.error(f"Error al eliminar conversación de SQLite: {e}")
+            return False
+
+
+    def expire_conversation(self, conversation_id: str, ttl: int) -> bool:
+        now = time.time()
+        try:
+            cursor = self._connection().execute(
+                "UPDATE conversations SET expires_at = ? WHERE id = ? AND expires_at > ?",
+                (now + ttl, conversation_id, now))
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            logger.error(f"Error al fijar la expiración en SQLite: {e}")
+            return False
+
+
+    def get_conversation_version(self, conversation_id: str) -> Optional[int]:
+        try:
+            row = self._connection().execute(
+                "SELECT version FROM conversations WHERE id = ? AND expires_at > ?",
+                (conversation_id, time.time())).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Error al obtener la versión de SQLite: {e}")
+            return None
+        return row[0] if row else None
+
+
+    def get_all_conversations(self) -> Optional[List[str]]:
+        try:
+            rows = self._connection().execute(
+                "SELECT id FROM conversations WHERE expires_at > ? ORDER BY last_updated DESC",
+                (time.time(),)).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Error al obtener todas las conversaciones de SQLite: {e}")
+            return None
+        return [conversation_key(row[0]) for row in rows] or None
+
+
+    def list_recent(self, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """Página ordenada con el índice de `last_updated`: solo se leen las
+        columnas del resumen de las filas de la página (el número de mensajes
+        con `json_array_length`), sin deserializar las conversaciones."""
+        now = time.time()
+        connection = self._connection()
+        total = connection.execute(
+            "SELECT COUNT(*) FROM conversations WHERE expires_at > ?", (now,)).fetchone()[0]
+        rows = connection.execute(
+            "SELECT id, posture, json_array_length(data, '$.messages'), last_updated "
+            "FROM conversations WHERE expires_at > ? "
+            "ORDER BY last_updated DESC LIMIT ? OFFSET ?", (now, limit, offset)).fetchall()
+        return {"total": total,
+                "conversations": [{"conversation_id": conversation_id, "posture": posture,
+                                   "messages": messages or 0, "last_updated": updated or ""}
+                                  for conversation_id, posture, messages, updated in rows]}
+
+
+    def iter_conversations(self,
+                           batch_size: int = 500,
+                           posture: Optional[str] = None,
+                           since: Optional[str] = None,
+                           until: Optional[str] = None,
+                           include_archived: bool = True) -> Iterator[Dict[str, Any]]:
+        """Recorre la tabla por ID en páginas (keyset), sin mantener abierta
+        una lectura entre lotes."""
+        last = ""
+        while True:
+            rows = self._connection().execute(
+                "SELECT id, data FROM conversations WHERE id > ? AND expires_at > ? "
+                "ORDER BY id LIMIT ?", (last, time.time(), batch_size)).fetchall()
+            for _, data in rows:
+                conversation = json.loads(data)
+                if _matches(conversation, posture, since, until):
+                    yield conversation
+            if len(rows) < batch_size:
+                return
+            last = rows[-1][0]
+
+
+    def _live_postures(self) -> Iterator[Tuple[str, str, str]]:
+        # solo las columnas necesarias, sin deserializar las conversaciones
+        rows = self._connection().execute(
+            "SELECT posture, last_updated, id FROM conversations WHERE expires_at > ?",
+            (time.time(),)).fetchall()
+        for posture, updated, conversation_id in rows:
+            yield normalize_posture(posture or ""), updated or "", conversation_id
+
+
+    def sweep(self, limit: int = 10_000) -> int:
+        """Elimina hasta `limit` conversaciones expiradas (usa el índice de
+        `expires_at`)."""
+        cursor = self._connection().execute(
+            "DELETE FROM conversations WHERE id IN "
+            "(SELECT id FROM conversations WHERE expires_at <= ? LIMIT ?)",
+            (time.time(), limit))
+        return cursor.rowcount
+
+
+    def close(self) -> None:
+        super().close()
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+        self._local = threading.local()
+
+
+def create_storage(backend: Optional[str] = None) -> ConversationStore:
+    """Backend embebido según `STORAGE_BACKEND` (`memory` o `sqlite`). El de
+    Redis lo crea `RedisService`."""
+    backend = (backend or os.getenv("STORAGE_BACKEND", "redis")).lower()
+    if backend == "memory":
+        return MemoryStore()
+    if backend == "sqlite":
+        return SQLiteStore()
+    raise ValueError(f"Backend de almacenamiento no soportado: {backend} "
+                     f"(disponibles: {', '.join(STORAGE_BACKENDS)})")
@@ -0,0 +1,195 @@
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional)
+from concurrent.futures import Future
+from collections import deque
+
+import time, threading, logging
+
+logger = logging.getLogger(__name__)
+
+"""Escritura diferida con confirmación en grupo (group commit) para Redis.
+Las escrituras de peticiones concurrentes se encolan y un hilo las envía
+juntas en un único pipeline cada pocos milisegundos, o en cuanto se
+acumulan suficientes. Cada escritura recibe un Future que se resuelve con
+sus propios resultados cuando el lote se confirma: quien necesita
+durabilidad espera al Future; el resto sigue sin esperar y sus datos se
+sirven desde el búfer hasta que se confirman."""
+
+
+class _PendingWrite:
+    __slots__ = ("key", "payload", "build", "future")
+
+    def __init__(self, key: Optional[str], payload: Optional[str],
+                 build: Callable[[Any], None]):
+        self.key = key
+        self.payload = payload
+        self.build = build
+        self.future: Future = Future()
+
+
+class WriteBuffer:
+    """Búfer de escrituras agrupadas sobre un cliente de Redis.
+    Args:
+        client: Cliente de Redis (o de Redis Cluster, o fragmentado) con
+            soporte de pipelines.
+        flush_interval (float): Espera máxima de una escritura antes de
+            enviarse, en segundos.
+        max_batch (int): Escrituras por lote; un lote lleno se envía sin esperar.
+        window (int): Lotes recientes usados para las estadísticas."""
+
+    def __init__(self,
+                 client: Any,
+                 flush_interval: float = 0.002,
+                 max_batch: int = 128,
+                 window: int = 1024):
+        self.client = client
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.queue: List[_PendingWrite] = []
+        # último payload sin confirmar por clave, para leer lo propio
+        self.pending: Dict[str, _PendingWrite] = {}
+        self.condition = threading.Condition()
+        self.closed = False
+        self.flushes = 0
+        self.writes = 0
+        self.commands = 0
+        self.errors = 0
+        self.batch_sizes: Deque[int] = deque(maxlen=window)
+        self.flush_latencies: Deque[float] = deque(maxlen=window)
+        self._thread = threading.Thread(target=self._run, name="redis-write-buffer",
+                                        daemon=True)
+        self._thread.start()
+
+
+    def submit(self,
+               build: Callable[[Any], None],
+               key: Optional[str] = None,
+               payload: Optional[str] = None) -> Future:
+        """Encola una escritura.
+        Args:
+            build (Callable): Añade los comandos de la escritura al pipeline.
+            key (Optional[str]): Clave cuyo valor escribe, si debe poder leerse
+                antes de confirmarse.
+            payload (Optional[str]): Valor escrito en `key`.
+        Returns:
+            Future: Se resuelve con los resultados de los comandos de la
+            escritura, o con la excepción si el lote falla."""
+        write = _PendingWrite(key, payload, build)
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("El búfer de escrituras está cerrado.")
+            self.queue.append(write)
+            if key is not None:
+                self.pending[key] = write
+            self.condition.notify()
+        return write.future
+
+
+    def get_pending(self, key: str) -> Optional[str]:
+        """Valor aún sin confirmar de una clave, o None."""
+        with self.condition:
+            write = self.pending.get(key)
+        return write.payload if write is not None else None
+
+
+    def sync(self, timeout: Optional[float] = None) -> None:
+        """Espera a que se confirmen todas las escrituras encoladas hasta ahora.
+        Los lotes se envían en orden: basta con esperar a una marca vacía.
+        Raises:
+            TimeoutError: Si las escrituras no se confirman en `timeout`
+                segundos; siguen encoladas y podrían aplicarse después."""
+        future = self.submit(lambda pipe: None)
+        try:
+            future.result(timeout)
+        except TimeoutError:
+            raise
+        except Exception:
+            pass  # el lote ya se resolvió; el error se notificó a quien escribió
+
+
+    def _run(self) -> None:
+        while True:
+            with self.condition:
+                while not self.queue and not self.closed:
+                    self.condition.wait()
+                if not self.queue:
+                    return
+                # se da tiempo a que lleguen más escrituras, salvo lote lleno
+                deadline = time.monotonic() + self.flush_interval
+                while len(self.queue) < self.max_batch and not self.closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                batch, self.queue = self.queue[:self.max_batch], self.queue[self.max_batch:]
+            self._flush(batch)
+
+
+    def _flush(self, batch: List[_PendingWrite]) -> None:
+        started = time.perf_counter()
+        spans = []
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for write in batch:
+                start = len(pipe)
+                write.build(pipe)
+                spans.append((start, len(pipe)))
+            results = pipe.execute()
+        except Exception as e:
+            logger.error(f"Error al confirmar un lote de {len(batch)} escrituras en Redis: {e}")
+            self.errors += 1
+            for write in batch:
+                write.future.set_exception(e)
+        else:
+            for write, (start, end) in zip(batch, spans):
+                write.future.set_result(results[start:end])
+            self.commands += len(results)
+        finally:
+            latency = time.perf_counter() - started
+            with self.condition:
+                for write in batch:
+                    if write.key is not None and self.pending.get(write.key) is write:
+                        del self.pending[write.key]
+                self.flushes += 1
+                self.writes += len(batch)
+                self.batch_sizes.append(len(batch))
+                self.flush_latencies.append(latency)
+        logger.debug("Lote confirmado: %d escrituras en %.2f ms", len(batch), latency * 1000)
+
+
+    def stats(self) -> Dict[str, Any]:
+        """Lotes enviados, tamaño de lote y latencia de confirmación."""
+        with self.condition:
+            sizes = sorted(self.batch_sizes)
+            latencies = sorted(self.flush_latencies)
+            queued = len(self.queue)
+
+        def percentile(values: List[float], p: float) -> Optional[float]:
+            return values[min(len(values) - 1, int(p * len(values)))] if values else None
+
+        def ms(value: Optional[float]) -> Optional[float]:
+            return round(value * 1000, 3) if value is not None else None
+
+        return {"flushes": self.flushes,
+                "writes": self.writes,
+                "commands": self.commands,
+                "errors": self.errors,
+                "queued": queued,
+                "writes_per_flush": round(self.writes / self.flushes, 2) if self.flushes else None,
+                "batch_size_p50": percentile(sizes, 0.5),
+                "batch_size_max": sizes[-1] if sizes else None,
+                "flush_latency_p50_ms": ms(percentile(latencies, 0.5)),
+                "flush_latency_p99_ms": ms(percentile(latencies, 0.99))}
+
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Confirma las escrituras pendientes y detiene el hilo."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self._thread.join(timeout)
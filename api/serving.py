@@ -0,0 +1,122 @@
+from typing import (
+    Any,
+    Optional)
+
+import os, signal, logging, warnings
+
+"""Modo de producción: gunicorn gestiona los procesos y cada worker sirve
+la app ASGI con uvicorn sobre uvloop y httptools. Los workers se reciclan
+tras un número de peticiones o al superar un límite de memoria, y al
+apagarse esperan a que terminen las peticiones en curso (llamadas al LLM
+y respuestas en streaming) hasta un plazo máximo.
+La configuración vive en `gunicorn.conf.py`."""
+
+with warnings.catch_warnings():
+    # uvicorn marca su worker de gunicorn como obsoleto en favor de un
+    # paquete aparte; se usa el incluido para no añadir dependencias
+    warnings.simplefilter("ignore", DeprecationWarning)
+    from uvicorn.workers import UvicornWorker
+
+try:
+    import uvloop
+except ImportError:  # dependencia opcional (no disponible en Windows)
+    uvloop = None
+
+try:
+    import httptools
+except ImportError:  # dependencia opcional
+    httptools = None
+
+logger = logging.getLogger(__name__)
+
+# Archivos de cgroup con la cuota de CPU del contenedor (v2 y v1)
+CGROUP_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+CGROUP_V1_QUOTA = "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"
+CGROUP_V1_PERIOD = "/sys/fs/cgroup/cpu/cpu.cfs_period_us"
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cpu_limit(cgroup_root: str = "") -> float:
+    """CPUs disponibles para el proceso: la cuota del cgroup si el
+    contenedor está limitado y, si no, los núcleos asignados al proceso.
+    Args:
+        cgroup_root (str): Prefijo de las rutas de cgroup (para pruebas).
+    Returns:
+        float: Número de CPUs (puede ser fraccionario, p. ej. 1.5)."""
+    try:
+        cpus = float(len(os.sched_getaffinity(0)))
+    except AttributeError:  # no disponible fuera de Linux
+        cpus = float(os.cpu_count() or 1)
+
+    quota = period = None
+    cpu_max = _read(cgroup_root + CGROUP_CPU_MAX)
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+    else:
+        quota = _read(cgroup_root + CGROUP_V1_QUOTA)
+        period = _read(cgroup_root + CGROUP_V1_PERIOD)
+    try:
+        # "max" (v2) o -1 (v1) indican que no hay cuota
+        if quota and period and quota != "max" and int(quota) > 0:
+            cpus = min(cpus, int(quota) / int(period))
+    except ValueError:
+        pass
+    return cpus
+
+
+def default_workers(cpus: Optional[float] = None) -> int:
+    """Workers por defecto: `WORKERS_PER_CPU` (por defecto 2) por CPU
+    disponible, entre 1 y `MAX_WORKERS` (por defecto 16). Los turnos pasan
+    casi todo el tiempo esperando al LLM en el pool de hilos, así que más
+    de un worker por CPU mantiene ocupados los núcleos sin sobresuscribirlos."""
+    cpus = cpu_limit() if cpus is None else cpus
+    per_cpu = float(os.getenv("WORKERS_PER_CPU", "2"))
+    max_workers = int(os.getenv("MAX_WORKERS", "16"))
+    return max(1, min(max_workers, round(cpus * per_cpu)))
+
+
+def rss_bytes() -> int:
+    """Memoria residente actual del proceso, en bytes."""
+    statm = _read("/proc/self/statm")
+    if statm:
+        return int(statm.split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    import resource  # fuera de Linux, el pico de memoria (en bytes en macOS)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class DiscutidorWorker(UvicornWorker):
+    """Worker de gunicorn para la API.
+    - Usa uvloop y httptools cuando están instalados.
+    - Al recibir SIGTERM deja de aceptar conexiones y espera a las
+      peticiones en curso hasta `DRAIN_TIMEOUT` segundos (por defecto 30).
+    - Se recicla de forma ordenada cuando su memoria residente supera
+      `WORKER_MAX_RSS_MB` (0 o vacío: sin límite); gunicorn arranca otro."""
+
+    CONFIG_KWARGS = {"loop": "uvloop" if uvloop is not None else "auto",
+                     "http": "httptools" if httptools is not None else "auto"}
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.config.timeout_graceful_shutdown = float(os.getenv("DRAIN_TIMEOUT", "30"))
+        self.max_rss = int(float(os.getenv("WORKER_MAX_RSS_MB") or 0) * 1024 * 1024)
+        self.recycling = False
+
+
+    def notify(self) -> None:
+        """Latido hacia el árbitro de gunicorn; también comprueba la memoria."""
+        super().notify()
+        if self.max_rss and not self.recycling:
+            rss = rss_bytes()
+            if rss > self.max_rss:
+                self.recycling = True
+                logger.warning("Worker %s supera el límite de memoria (%d MB > %d MB); "
+                               "reciclando", self.pid, rss // 2**20, self.max_rss // 2**20)
+                # la misma salida ordenada que un SIGTERM del árbitro
+                os.kill(self.pid, signal.SIGTERM)
@@ -1 +1 @@
-from .structures import Message, ChatRequest, ChatResponse, Conversation
\ No newline at end of file
+from .structures import Message, ChatRequest, ChatResponse, Conversation, Usage, ProfilingRequest, PurgeRequest, CapacityRequest
@@ -1,4 +1,4 @@
-from pydantic import BaseModel as Base
+from pydantic import BaseModel as Base, Field
 from typing import List, Optional
 from datetime import datetime
 
@@ -10,11 +10,26 @@ class Message(Base):
     content: str
 
 
+class Usage(Base):
+    """Consumo acumulado de tokens y costo estimado (USD)."""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    cost: float = 0.0
+
+
 class Conversation(Base):
     """Estructura para conversaciones."""
     conversation_id: str
     posture: str
     messages: List[Message] # todos los mensajes
+    backend: Optional[str] = None # backend fijado para la conversación
+    model: Optional[str] = None # modelo fijado para la conversación
+    client_id: Optional[str] = None # cliente que creó la conversación
+    usage: Usage = Usage() # tokens acumulados de todos los turnos
+    parent_id: Optional[str] = None # conversación de la que se bifurcó
+    fork_at: int = 0 # mensajes compartidos con la conversación padre
+    ancestors: List[str] = [] # cadena de bifurcación, de la raíz al padre
     created_at: str = datetime.now().isoformat()
     last_updated: str = datetime.now().isoformat()
 
@@ -23,9 +38,38 @@ class ChatRequest(Base):
     """Estructura para request de chat."""
     message: str
     conversation_id: Optional[str] = None
+    backend: Optional[str] = None # solo aplica a conversaciones nuevas
+    model: Optional[str] = None # solo aplica a conversaciones nuevas
+    speculative: bool = True # False: no responder con una apertura pregenerada
 
 
 class ChatResponse(Base):
     """Estructura para response de chat."""
     conversation_id: str
     message: List[Message] # 5 mensajes más recientes
+
+
+class ProfilingRequest(Base):
+    """Estructura para iniciar una sesión de perfilado."""
+    mode: str = Field("cpu", pattern="^(cpu|alloc)$")
+    sample_rate: float = Field(0.1, ge=0.0, le=1.0) # fracción de peticiones de chat
+    duration: Optional[float] = Field(60.0, gt=0, le=3600) # None: hasta detenerla
+    interval_ms: float = Field(5.0, ge=1.0, le=1000.0)
+
+
+class PurgeRequest(Base):
+    """Estructura para una purga masiva de conversaciones. Se aplican todos
+    los filtros indicados; al menos uno es obligatorio."""
+    older_than_days: Optional[float] = Field(None, ge=0) # sin actividad en estos días
+    posture: Optional[str] = None # postura que contiene este texto
+    client_id: Optional[str] = None
+    dry_run: bool = False # solo contar, sin borrar
+    max_per_second: Optional[float] = Field(None, gt=0) # claves procesadas por segundo
+
+
+class CapacityRequest(Base):
+    """Estructura para lanzar el informe de capacidad del almacenamiento."""
+    sample_size: int = Field(10_000, ge=1, le=1_000_000) # conversaciones inspeccionadas
+    sample_rate: float = Field(1.0, gt=0.0, le=1.0) # fracción de claves inspeccionadas
+    batch_size: int = Field(200, ge=1, le=5000) # claves por lote
+    pause: float = Field(0.05, ge=0.0, le=10.0) # segundos entre lotes
@@ -0,0 +1,2 @@
+from .logs import configure_logging, shutdown_logging, RequestIdMiddleware, request_id_var
+from .tracing import configure_tracing, shutdown_tracing, TracingMiddleware
@@ -0,0 +1,199 @@
+from typing import (
+    Any,
+    Dict,
+    Optional)
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from uuid import uuid4
+
+import os, re, sys, json, queue, random, logging, atexit
+
+"""Subsistema de logging: los registros se encolan en el hilo que atiende la
+petición y un hilo en segundo plano los formatea (JSON estructurado),
+redacta secretos y los escribe. Los DEBUG se muestrean por tasa."""
+
+# ID de la petición en curso; se propaga a todos los registros
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Atributos estándar de LogRecord; el resto se considera contexto extra
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+_SECRET_PATTERNS = [
+    (re.compile(r"(Bearer\s+)[A-Za-z0-9._~+/=\-]+", re.IGNORECASE), r"\1[REDACTED]"),
+    (re.compile(r"\bsk-[A-Za-z0-9_\-]{8,}"), "[REDACTED]"),
+    (re.compile(r"""(["']?(?:api[_-]?key|authorization|password|secret|token)["']?\s*[:=]\s*["']?)"""
+                r"""[^"',\s}]+""", re.IGNORECASE), r"\1[REDACTED]"),
+]
+
+
+def redact(text: str) -> str:
+    """Reemplaza API keys, tokens y cabeceras Authorization por [REDACTED]."""
+    for pattern, replacement in _SECRET_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class ContextFilter(logging.Filter):
+    """Adjunta el ID de la petición. Se ejecuta en el hilo que emite el
+    registro, antes de encolarlo, porque el contexto no cruza hilos."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """Deja pasar solo una fracción `rate` de los registros DEBUG; el
+    resto se descarta antes de formatear o encolar nada."""
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class RedactionFilter(logging.Filter):
+    """Redacta secretos del mensaje ya formateado y de la excepción."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.msg = redact(record.getMessage())
+        record.args = None
+        if record.exc_text:
+            record.exc_text = redact(record.exc_text)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formatea cada registro como una línea JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()}
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _PreparedQueueHandler(QueueHandler):
+    """QueueHandler que conserva la traza de la excepción como texto.
+    El formateo final ocurre en el hilo del listener."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_listener: Optional[QueueListener] = None
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """Parsea `modulo=NIVEL,modulo=NIVEL` en un diccionario."""
+    levels = {}
+    for item in spec.split(","):
+        name, sep, level = item.partition("=")
+        if sep and name.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(level: Optional[str] = None,
+                      module_levels: Optional[Dict[str, str]] = None,
+                      debug_sample_rate: Optional[float] = None,
+                      fmt: Optional[str] = None) -> QueueListener:
+    """Configura el logging asíncrono del proceso. Es idempotente.
+    Args:
+        level (Optional[str]): Nivel raíz (`LOG_LEVEL`, por defecto INFO).
+        module_levels (Optional[Dict[str, str]]): Niveles por módulo
+            (`LOG_LEVELS`, p. ej. `api.services.redis=DEBUG`).
+        debug_sample_rate (Optional[float]): Fracción de registros DEBUG que
+            se emiten (`LOG_DEBUG_SAMPLE_RATE`, por defecto 1.0).
+        fmt (Optional[str]): `json` o `text` (`LOG_FORMAT`, por defecto json).
+    Returns:
+        QueueListener: Listener en segundo plano que escribe los registros."""
+    global _listener
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    module_levels = module_levels if module_levels is not None \
+        else parse_levels(os.getenv("LOG_LEVELS", ""))
+    rate = debug_sample_rate if debug_sample_rate is not None \
+        else float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+    fmt = fmt or os.getenv("LOG_FORMAT", "json")
+
+    shutdown_logging()
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(
+        "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"))
+    output.addFilter(RedactionFilter())
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _PreparedQueueHandler(log_queue)
+    handler.addFilter(DebugSampler(rate))
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        if isinstance(existing, _PreparedQueueHandler):
+            root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+    for name, module_level in module_levels.items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """Detiene el listener, escribiendo los registros pendientes."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
+class RequestIdMiddleware:
+    """Middleware ASGI que asigna un ID a cada petición (o reutiliza el de
+    la cabecera `X-Request-ID`) y lo devuelve en la respuesta."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        incoming = dict(scope["headers"]).get(b"x-request-id")
+        request_id = incoming.decode("latin-1")[:64] if incoming else uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
@@ -0,0 +1,243 @@
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional)
+from collections import Counter
+from contextlib import contextmanager
+
+import os, sys, time, random, threading, tracemalloc, logging
+
+"""Perfilado bajo demanda de los workers en producción.
+Dos modos:
+- `cpu`: un hilo muestrea periódicamente la pila de los hilos que están
+  atendiendo peticiones seleccionadas y acumula pilas plegadas (formato
+  `marco;marco;marco N`), compatibles con flamegraph.pl y speedscope.
+- `alloc`: tracemalloc toma una instantánea al iniciar y otra al terminar
+  la ventana; la diferencia se exporta con el mismo formato, ponderada en
+  bytes, para localizar el crecimiento de memoria.
+La sesión vive en el proceso: con varios workers cada petición de control
+llega a uno solo, que es el único que se perfila. Las respuestas incluyen el
+`pid` del worker para distinguir las sesiones y sus resultados."""
+
+logger = logging.getLogger(__name__)
+
+PROFILING_MODES = ("cpu", "alloc")
+
+
+class ProfilingError(Exception):
+    pass
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def fold_stack(frame, max_depth: int = 128) -> str:
+    """Pila de un marco en formato plegado, de la raíz a la hoja."""
+    labels = []
+    while frame is not None and len(labels) < max_depth:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class Profiler:
+    """Sesión de perfilado de un worker. Solo una sesión a la vez.
+    El resultado de la última sesión se conserva hasta iniciar otra."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.mode: Optional[str] = None
+        self.sample_rate = 0.0
+        self.interval = 0.005
+        self.started_at: Optional[float] = None
+        self.deadline: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.requests = 0
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self._tracked: Dict[int, int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._started_tracemalloc = False
+
+
+    @property
+    def active(self) -> bool:
+        return self.started_at is not None and self.finished_at is None
+
+
+    def start(self,
+              mode: str = "cpu",
+              sample_rate: float = 1.0,
+              duration: Optional[float] = 60.0,
+              interval_ms: float = 5.0,
+              frames: int = 25) -> Dict[str, Any]:
+        """Inicia una sesión de perfilado.
+        Args:
+            mode (str): `cpu` (pilas muestreadas) o `alloc` (tracemalloc).
+            sample_rate (float): Fracción de peticiones de chat perfiladas (modo `cpu`).
+            duration (Optional[float]): Segundos de la ventana; None hasta `stop()`.
+            interval_ms (float): Intervalo de muestreo de pilas (modo `cpu`).
+            frames (int): Profundidad de las trazas de tracemalloc (modo `alloc`).
+        Returns:
+            Dict[str, Any]: Estado de la sesión."""
+        if mode not in PROFILING_MODES:
+            raise ValueError(f"Modo de perfilado no soportado: {mode}")
+        with self.lock:
+            if self.active:
+                raise ProfilingError("Ya hay una sesión de perfilado activa.")
+            self.mode = mode
+            self.sample_rate = max(0.0, min(1.0, sample_rate))
+            self.interval = max(0.001, interval_ms / 1000)
+            self.started_at = time.time()
+            self.deadline = self.started_at + duration if duration else None
+            self.finished_at = None
+            self.requests = 0
+            self.samples = 0
+            self.stacks = Counter()
+            self._tracked.clear()
+            self._stop.clear()
+            if mode == "alloc":
+                self._started_tracemalloc = not tracemalloc.is_tracing()
+                if self._started_tracemalloc:
+                    tracemalloc.start(frames)
+                self._snapshot = tracemalloc.take_snapshot()
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+        logger.info(f"Perfilado {mode} iniciado (rate={self.sample_rate}, duración={duration}s)")
+        return self.status()
+
+
+    def stop(self) -> Dict[str, Any]:
+        """Detiene la sesión activa, si la hay, y conserva su resultado."""
+        thread = self._thread
+        self._stop.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        return self.status()
+
+
+    def _finish(self) -> None:
+        with self.lock:
+            if not self.active:
+                return
+            if self.mode == "alloc":
+                self._collect_allocations()
+            self.finished_at = time.time()
+            self._tracked.clear()
+        logger.info(f"Perfilado {self.mode} finalizado: {self.samples} muestras, "
+                    f"{self.requests} peticiones")
+
+
+    def _run(self) -> None:
+        """Hilo de la sesión: muestrea pilas (modo `cpu`) hasta que se pide
+        detener o vence la ventana."""
+        while not self._stop.is_set():
+            if self.deadline is not None and time.time() >= self.deadline:
+                break
+            if self.mode == "cpu":
+                self._sample()
+            self._stop.wait(self.interval if self.mode == "cpu" else 0.1)
+        self._finish()
+
+
+    def _sample(self) -> None:
+        with self.lock:
+            tracked = list(self._tracked)
+        if not tracked:
+            return
+        frames = sys._current_frames()
+        stacks = [fold_stack(frames[thread_id]) for thread_id in tracked
+                  if thread_id in frames]
+        del frames
+        with self.lock:
+            self.stacks.update(stacks)
+            self.samples += len(stacks)
+
+
+    def _collect_allocations(self) -> None:
+        """Diferencia de memoria entre el inicio y el final de la ventana,
+        agrupada por traza de asignación."""
+        current = tracemalloc.take_snapshot()
+        ignored = [tracemalloc.Filter(False, tracemalloc.__file__),
+                   tracemalloc.Filter(False, "<frozen importlib._bootstrap>")]
+        current = current.filter_traces(ignored)
+        previous = self._snapshot.filter_traces(ignored) if self._snapshot else None
+        stats = current.compare_to(previous, "traceback") if previous else []
+        for stat in stats:
+            if stat.size_diff <= 0:
+                continue
+            labels = [f"{os.path.basename(frame.filename)}:{frame.lineno}"
+                      for frame in reversed(stat.traceback)]
+            self.stacks[";".join(labels)] += stat.size_diff
+            self.samples += 1
+        self._snapshot = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+
+    def should_profile(self) -> bool:
+        """Decide si una petición entra en la muestra de la sesión activa."""
+        return (self.active and self.mode == "cpu"
+                and (self.sample_rate >= 1.0 or random.random() < self.sample_rate))
+
+
+    @contextmanager
+    def profile_request(self) -> Iterator[bool]:
+        """Registra el hilo actual para el muestreo mientras dura la petición,
+        si la petición entra en la muestra. Sin sesión activa no tiene coste
+        más allá de una comprobación."""
+        if not self.should_profile():
+            yield False
+            return
+        thread_id = threading.get_ident()
+        with self.lock:
+            self._tracked[thread_id] = self._tracked.get(thread_id, 0) + 1
+            self.requests += 1
+        try:
+            yield True
+        finally:
+            with self.lock:
+                count = self._tracked.pop(thread_id, 0) - 1
+                if count > 0:
+                    self._tracked[thread_id] = count
+
+
+    def status(self) -> Dict[str, Any]:
+        return {"pid": os.getpid(),
+                "active": self.active,
+                "mode": self.mode,
+                "sample_rate": self.sample_rate,
+                "started_at": self.started_at,
+                "deadline": self.deadline,
+                "finished_at": self.finished_at,
+                "requests": self.requests,
+                "samples": self.samples,
+                "stacks": len(self.stacks)}
+
+
+    def folded(self) -> str:
+        """Resultado en formato de pilas plegadas (`pila peso` por línea)."""
+        with self.lock:
+            items = self.stacks.most_common()
+        return "".join(f"{stack} {weight}\n" for stack, weight in items)
+
+
+    def top_allocations(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Trazas con mayor crecimiento de memoria de la última sesión `alloc`."""
+        if self.mode != "alloc":
+            return []
+        with self.lock:
+            items = self.stacks.most_common(limit)
+        return [{"traceback": stack.split(";"), "size_diff": size}
+                for stack, size in items]
+
+
+# un perfilador por proceso worker
+profiler = Profiler()
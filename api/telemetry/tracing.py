@@ -0,0 +1,358 @@
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple)
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import os, re, json, time, queue, secrets, threading, logging, atexit
+import requests
+
+"""Trazas distribuidas ligeras, compatibles con W3C Trace Context y
+exportables en formato OTLP/JSON a un colector local o a un archivo.
+Cada petición HTTP es una traza; sus spans alimentan la cabecera
+`Server-Timing` de la respuesta."""
+
+logger = logging.getLogger(__name__)
+
+_TRACEPARENT = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """Parsea una cabecera `traceparent`.
+    Returns:
+        Optional[Tuple[str, str, bool]]: (trace_id, parent_span_id, sampled),
+        o None si la cabecera no es válida."""
+    match = _TRACEPARENT.match((header or "").strip().lower())
+    if not match:
+        return None
+    version, trace_id, span_id, flags = match.groups()
+    if version == "ff" or trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return trace_id, span_id, bool(int(flags, 16) & 0x01)
+
+
+class Span:
+    """Operación con nombre, duración y atributos dentro de una traza."""
+
+    __slots__ = ("name", "trace", "span_id", "parent_id", "start_ns",
+                 "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, trace: "Trace", parent_id: Optional[str]):
+        self.name = name
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 2 if self.parent_id == self.trace.remote_parent_id else 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1}}
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class Trace:
+    """Spans y tiempos de una misma traza (normalmente, una petición)."""
+
+    def __init__(self,
+                 trace_id: Optional[str] = None,
+                 remote_parent_id: Optional[str] = None,
+                 sampled: bool = True):
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.remote_parent_id = remote_parent_id
+        self.sampled = sampled
+        self.spans: List[Span] = []
+        self.timings: List[Tuple[str, float]] = []
+        self.lock = threading.Lock()
+
+
+    def add(self, span: Span) -> None:
+        with self.lock:
+            self.spans.append(span)
+
+
+    def server_timing(self) -> str:
+        """Resumen para la cabecera `Server-Timing`: duración total por nombre
+        de span (excepto la raíz) más los tiempos registrados explícitamente."""
+        totals: Dict[str, float] = {}
+        with self.lock:
+            for span in self.spans:
+                if span.parent_id != self.remote_parent_id and span.end_ns is not None:
+                    totals[span.name] = totals.get(span.name, 0.0) + span.duration_ms
+            for name, duration in self.timings:
+                totals[name] = totals.get(name, 0.0) + duration
+        return ", ".join(f"{name};dur={duration:.1f}" for name, duration in totals.items())
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class SpanExporter(ABC):
+    """Exporta lotes de spans en segundo plano, fuera del camino de la petición.
+    Las subclases implementan `export` para enviar cada lote."""
+
+    def __init__(self, service_name: str = "discutidor3000-api",
+                 max_queue: int = 10_000, batch_size: int = 256):
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+
+    def submit(self, spans: List[Span]) -> None:
+        for span in spans:
+            try:
+                self.queue.put_nowait(span)
+            except queue.Full:
+                self.dropped += 1
+
+
+    def _run(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+            if batch[0] is None:
+                return
+            while len(batch) < self.batch_size:
+                try:
+                    span = self.queue.get(timeout=0.5)
+                except queue.Empty:
+                    break
+                if span is None:
+                    self._safe_export(batch)
+                    return
+                batch.append(span)
+            self._safe_export(batch)
+
+
+    def _safe_export(self, batch: List[Span]) -> None:
+        try:
+            self.export(self._payload(batch))
+        except Exception as e:
+            logger.warning(f"Error al exportar {len(batch)} spans: {e}")
+
+
+    def _payload(self, batch: List[Span]) -> Dict[str, Any]:
+        return {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+            "scopeSpans": [{"scope": {"name": "discutidor3000"},
+                            "spans": [span.to_otlp() for span in batch]}]}]}
+
+
+    @abstractmethod
+    def export(self, payload: Dict[str, Any]) -> None:
+        """Envía un lote en formato OTLP/JSON."""
+
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        self.queue.put(None)
+        self._thread.join(timeout)
+
+
+class FileSpanExporter(SpanExporter):
+    """Escribe cada lote como una línea OTLP/JSON en un archivo."""
+
+    def __init__(self, path: str, **kwargs):
+        self.path = path
+        super().__init__(**kwargs)
+
+
+    def export(self, payload: Dict[str, Any]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(payload) + "\n")
+
+
+class OTLPHttpExporter(SpanExporter):
+    """Envía cada lote a un colector OTLP/HTTP (`/v1/traces`, JSON)."""
+
+    def __init__(self, endpoint: str, **kwargs):
+        self.endpoint = endpoint.rstrip("/")
+        if not self.endpoint.endswith("/v1/traces"):
+            self.endpoint += "/v1/traces"
+        self.session = requests.Session()
+        super().__init__(**kwargs)
+
+
+    def export(self, payload: Dict[str, Any]) -> None:
+        self.session.post(self.endpoint, json=payload, timeout=5)
+
+
+_exporter: Optional[SpanExporter] = None
+
+
+def configure_tracing(exporter: Optional[str] = None) -> Optional[SpanExporter]:
+    """Configura el exportador de spans.
+    Args:
+        exporter (Optional[str]): `none`, `file` (`TRACE_FILE`) u `otlp`
+            (`OTEL_EXPORTER_OTLP_ENDPOINT`). Por defecto, `TRACE_EXPORTER`.
+    Returns:
+        Optional[SpanExporter]: Exportador activo, o None."""
+    global _exporter
+    shutdown_tracing()
+    kind = (exporter or os.getenv("TRACE_EXPORTER", "none")).lower()
+    service = os.getenv("OTEL_SERVICE_NAME", "discutidor3000-api")
+    if kind == "file":
+        _exporter = FileSpanExporter(os.getenv("TRACE_FILE", "traces.ndjson"),
+                                     service_name=service)
+    elif kind == "otlp":
+        _exporter = OTLPHttpExporter(os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT",
+                                               "http://localhost:4318"),
+                                     service_name=service)
+    return _exporter
+
+
+def shutdown_tracing() -> None:
+    global _exporter
+    if _exporter is not None:
+        _exporter.shutdown()
+        _exporter = None
+
+
+atexit.register(shutdown_tracing)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace(traceparent: Optional[str] = None) -> Iterator[Trace]:
+    """Inicia una traza, continuando la del `traceparent` entrante si es
+    válido. Al terminar, sus spans muestreados se exportan."""
+    parsed = parse_traceparent(traceparent)
+    trace = Trace(*parsed) if parsed else Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        if _exporter is not None and trace.sampled and trace.spans:
+            _exporter.submit(trace.spans)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """Mide una operación como span hijo del span actual. Fuera de una
+    traza activa se crea una nueva, que se exporta al cerrar el span."""
+    trace = _current_trace.get()
+    owns_trace = trace is None
+    if owns_trace:
+        trace = Trace()
+        trace_token = _current_trace.set(trace)
+    parent = _current_span.get()
+    current = Span(name, trace,
+                   parent.span_id if parent is not None and parent.trace is trace
+                   else trace.remote_parent_id)
+    current.attributes.update(attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        trace.add(current)
+        _current_span.reset(token)
+        if owns_trace:
+            _current_trace.reset(trace_token)
+            if _exporter is not None:
+                _exporter.submit(trace.spans)
+
+
+def set_attribute(key: str, value: Any) -> None:
+    """Añade un atributo al span actual, si lo hay."""
+    current = _current_span.get()
+    if current is not None:
+        current.attributes[key] = value
+
+
+def record_timing(name: str, duration_ms: float) -> None:
+    """Registra un tiempo que no corresponde a un span (p. ej. el tiempo
+    hasta el primer token) para la cabecera `Server-Timing`."""
+    trace = _current_trace.get()
+    if trace is not None:
+        with trace.lock:
+            trace.timings.append((name, duration_ms))
+
+
+def traceparent() -> Optional[str]:
+    """Cabecera `traceparent` para propagar el span actual a otro servicio."""
+    current = _current_span.get()
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    span_id = current.span_id if current is not None else secrets.token_hex(8)
+    return f"00-{trace.trace_id}-{span_id}-{'01' if trace.sampled else '00'}"
+
+
+class TracingMiddleware:
+    """Middleware ASGI: cada petición es una traza (continuando el
+    `traceparent` entrante), con un span raíz y la cabecera `Server-Timing`
+    con el desglose de tiempos."""
+
+    def __init__(self, app):
+        self.app = app
+
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        incoming = headers.get(b"traceparent")
+        with start_trace(incoming.decode("latin-1") if incoming else None) as trace:
+            with span(f"{scope['method']} {scope['path']}",
+                      **{"http.method": scope["method"], "http.target": scope["path"]}) as root:
+
+                async def send_with_timing(message):
+                    if message["type"] == "http.response.start":
+                        root.attributes["http.status_code"] = message["status"]
+                        timing = trace.server_timing()
+                        total = f"total;dur={root.duration_ms:.1f}"
+                        flags = "01" if trace.sampled else "00"
+                        extra = [(b"server-timing",
+                                  (f"{timing}, {total}" if timing else total).encode("latin-1")),
+                                 (b"traceparent",
+                                  f"00-{trace.trace_id}-{root.span_id}-{flags}".encode("latin-1"))]
+                        message["headers"] = list(message.get("headers", [])) + extra
+                    await send(message)
+
+                await self.app(scope, receive, send_with_timing)
@@ -0,0 +1,77 @@
+"""
+Benchmark de la codificación de respuestas
+Compara la ruta anterior (model_dump + JSONResponse con json estándar,
+re-validando los mensajes) con la actual (model_construct + model_dump_json
+u orjson, sin diccionarios intermedios) y mide la compresión del historial.
+
+    python -m benchmarks.bench_encoding [--turns 40] [--repeat 2000]
+"""
+
+import argparse, gzip, os, sys, timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse
+
+from api.endpoints.encoding import brotli, dumps, orjson
+from api.structures import ChatResponse, Message
+
+
+def conversation(turns: int):
+    messages = [{"role": "system", "content": "Eres un bot que defiende una postura. " * 20}]
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"Argumento {i}: " + "no estoy de acuerdo " * 15})
+        messages.append({"role": "assistant", "content": f"Réplica {i}: " + "la evidencia muestra " * 30})
+    return messages
+
+
+def chat_before(messages):
+    history = [Message(role="bot" if m["role"] == "assistant" else m["role"], content=m["content"])
+               for m in messages[1:][-5:][::-1]]
+    response = ChatResponse(conversation_id="bench", message=history)
+    return JSONResponse(status_code=200, content=response.model_dump()).body
+
+
+def chat_after(messages):
+    history = [Message.model_construct(role="bot" if m["role"] == "assistant" else m["role"],
+                                       content=m["content"])
+               for m in messages[1:][-5:][::-1]]
+    return dumps(ChatResponse.model_construct(conversation_id="bench", message=history))
+
+
+def page(messages):
+    return {"conversation_id": "bench", "version": 7, "total": len(messages) - 1,
+            "messages": [{"index": i, "role": m["role"], "content": m["content"]}
+                         for i, m in enumerate(messages[1:], 1)],
+            "next_cursor": None}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    messages = conversation(args.turns)
+    history = page(messages)
+    cases = [
+        ("chat: antes (model_dump + JSONResponse)", lambda: chat_before(messages)),
+        ("chat: ahora (model_dump_json)", lambda: chat_after(messages)),
+        ("historial: antes (JSONResponse)", lambda: JSONResponse(content=history).body),
+        (f"historial: ahora ({'orjson' if orjson else 'json compacto'})", lambda: dumps(history)),
+    ]
+    print(f"orjson: {'sí' if orjson else 'no'} - brotli: {'sí' if brotli else 'no'}")
+    for name, fn in cases:
+        seconds = min(timeit.repeat(fn, number=args.repeat, repeat=5)) / args.repeat
+        print(f"{name:<45} {seconds * 1e6:9.1f} µs")
+
+    body = dumps(history)
+    sizes = [("sin comprimir", body), ("gzip", gzip.compress(body, compresslevel=5, mtime=0))]
+    if brotli:
+        sizes.append(("brotli", brotli.compress(body, quality=4)))
+    for name, data in sizes:
+        print(f"historial {name:<35} {len(data):9d} bytes")
+
+
+if __name__ == "__main__":
+    main()
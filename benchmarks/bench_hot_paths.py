@@ -0,0 +1,199 @@
+"""
+Microbenchmarks de las rutas de CPU de un turno, con control de regresiones
+Mide la validación y serialización de Conversation/Message con historiales
+de varias longitudes, la codificación y decodificación en RedisService, el
+system prompt, el formateo de la respuesta y el armado del payload para el
+upstream. Compara con una línea base en JSON y termina con error si alguna
+ruta empeora más que el umbral (`--threshold` o `BENCH_THRESHOLD`, por
+defecto 0.25, es decir, un 25 %). Las rutas que parecen empeorar se vuelven
+a medir antes de fallar, para no confundir ruido de la máquina con regresiones.
+
+    python -m benchmarks.bench_hot_paths                   # medir y comparar
+    python -m benchmarks.bench_hot_paths --save-baseline   # actualizar la línea base
+    python -m benchmarks.bench_hot_paths --filter redis    # solo algunas rutas
+"""
+
+import argparse, json, os, platform, re, sys, timeit
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.services.discutidor3000 import Discutidor3000
+from api.services.redis import RedisService, conversation_key
+from api.structures import Conversation, Message
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "hot_paths.json")
+
+# longitudes de historial (mensajes, sin contar el system prompt)
+HISTORY_LENGTHS = (2, 20, 200)
+
+POSTURE = "La Tierra es plana"
+
+
+def history(length: int) -> List[Dict[str, str]]:
+    messages = [{"role": "system", "content": Discutidor3000._gen_system_prompt(None, POSTURE)}]
+    for i in range(length):
+        if i % 2 == 0:
+            messages.append({"role": "user", "content": f"Argumento {i}: " + "no estoy de acuerdo " * 12})
+        else:
+            messages.append({"role": "assistant", "content": f"Réplica {i}: " + "la evidencia muestra " * 30})
+    return messages
+
+
+class _DictRedis(dict):
+    """Cliente mínimo para leer conversaciones sin red."""
+
+    def close(self) -> None:
+        pass
+
+
+def cases() -> List[Tuple[str, Callable[[], Any]]]:
+    """Rutas medidas, con nombres estables (son las claves de la línea base)."""
+    with patch.dict(os.environ, {"STORAGE_BACKEND": "memory", "LLM_TARGETS": ""}):
+        discutidor = Discutidor3000(api_key="bench")
+    client = _DictRedis()
+    with patch("api.services.redis.redis.Redis.from_url", return_value=client):
+        redis_service = RedisService()
+    upstream = discutidor.backends["openrouter"]
+
+    found: List[Tuple[str, Callable[[], Any]]] = [
+        ("message.validate", lambda: Message.model_validate({"role": "user", "content": "hola"})),
+        ("prompt.system", lambda: discutidor._gen_system_prompt(POSTURE)),
+    ]
+    for length in HISTORY_LENGTHS:
+        messages = history(length)
+        data = {"conversation_id": f"bench-{length}", "posture": POSTURE, "messages": messages,
+                "created_at": "2025-03-25T12:00:00", "last_updated": "2025-03-25T12:00:00"}
+        conversation = Conversation.model_validate(data)
+        payload = RedisService._serialize(conversation)
+        client[conversation_key(conversation.conversation_id)] = payload
+        response = {"conversation_id": conversation.conversation_id, "messages": messages}
+        found += [
+            (f"conversation.validate[{length}]", lambda d=data: Conversation.model_validate(d)),
+            (f"conversation.dump[{length}]", lambda c=conversation: c.model_dump()),
+            (f"conversation.dump_json[{length}]", lambda c=conversation: c.model_dump_json()),
+            (f"redis.encode[{length}]", lambda c=conversation: RedisService._serialize(c)),
+            (f"redis.decode[{length}]",
+             lambda i=conversation.conversation_id: redis_service.get_conversation(i)),
+            (f"response.format[{length}]", lambda r=response: discutidor._format_response(r)),
+            (f"upstream.payload[{length}]",
+             lambda c=conversation: upstream._payload([m.model_dump() for m in c.messages],
+                                                      discutidor.model,
+                                                      provider="deepinfra",
+                                                      temperature=discutidor.temperature,
+                                                      max_tokens=discutidor.max_tokens)),
+        ]
+    discutidor.close()
+    return found
+
+
+def measure(fn: Callable[[], Any], repeat: int = 5, min_time: float = 0.05) -> float:
+    """Microsegundos por llamada: mínimo de `repeat` series de al menos
+    `min_time` segundos (el mínimo es lo menos afectado por el ruido)."""
+    number, _ = timeit.Timer(fn).autorange()
+    number = max(1, int(number * min_time / 0.2))
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+
+
+def compare(results: Dict[str, float],
+            baseline: Dict[str, float],
+            threshold: float) -> Tuple[List[str], List[str]]:
+    """Rutas que empeoran más que `threshold` y rutas que mejoran más que
+    `threshold` respecto a la línea base. Las rutas nuevas no cuentan."""
+    regressions, improvements = [], []
+    for name, value in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        if value > reference * (1 + threshold):
+            regressions.append(name)
+        elif value < reference * (1 - threshold):
+            improvements.append(name)
+    return regressions, improvements
+
+
+def environment() -> Dict[str, str]:
+    return {"python": platform.python_version(),
+            "machine": platform.machine(),
+            "processor": platform.processor() or platform.machine()}
+
+
+def load_baseline(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--baseline", default=BASELINE, help="Archivo JSON de la línea base")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Guardar los resultados como nueva línea base")
+    parser.add_argument("--threshold", type=float,
+                        default=float(os.getenv("BENCH_THRESHOLD", "0.25")),
+                        help="Empeoramiento relativo tolerado (0.25 = 25 %%)")
+    parser.add_argument("--filter", default="", help="Expresión regular sobre los nombres")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--retries", type=int, default=2,
+                        help="Nuevas mediciones de una ruta antes de darla por empeorada")
+    parser.add_argument("-o", "--output", help="Guardar también los resultados en este JSON")
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline(args.baseline)
+    reference = (baseline or {}).get("results", {})
+    if baseline and baseline.get("environment") != environment():
+        print(f"Aviso: la línea base se midió en otro entorno ({baseline.get('environment')})",
+              file=sys.stderr)
+
+    results: Dict[str, float] = {}
+    pattern = re.compile(args.filter)
+    selected = [(name, fn) for name, fn in cases() if pattern.search(name)]
+    print(f"{'ruta':<32}{'µs':>12}{'base µs':>12}{'cambio':>10}")
+    for name, fn in selected:
+        # la línea base toma el mejor de varios pases para no fijar una medición ruidosa
+        passes = 1 + args.retries if args.save_baseline else 1
+        results[name] = round(min(measure(fn, repeat=args.repeat) for _ in range(passes)), 3)
+        base = reference.get(name)
+        change = f"{(results[name] / base - 1) * 100:+.1f}%" if base else "-"
+        print(f"{name:<32}{results[name]:>12.2f}{base or float('nan'):>12.2f}{change:>10}")
+
+    record = {"environment": environment(), "threshold": args.threshold, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2)
+    if args.save_baseline:
+        # al filtrar se conservan las demás rutas de la línea base
+        record["results"] = {**reference, **results}
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Línea base guardada en {args.baseline}")
+        return 0
+    if baseline is None:
+        print("Sin línea base: ejecuta con --save-baseline para crearla", file=sys.stderr)
+        return 0
+
+    regressions, improvements = compare(results, reference, args.threshold)
+    functions = dict(selected)
+    for _ in range(args.retries):
+        if not regressions:
+            break
+        for name in regressions:
+            results[name] = min(results[name], round(measure(functions[name], repeat=args.repeat), 3))
+        regressions, _ = compare({name: results[name] for name in regressions},
+                                 reference, args.threshold)
+    if improvements:
+        print(f"Mejoran más del {args.threshold:.0%}: {', '.join(improvements)} "
+              "(considera actualizar la línea base)")
+    if regressions:
+        print(f"REGRESIÓN (más del {args.threshold:.0%}): {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    print(f"Sin regresiones (umbral {args.threshold:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
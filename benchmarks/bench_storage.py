@@ -0,0 +1,86 @@
+"""
+Benchmark de los backends de almacenamiento
+Ejecuta las mismas operaciones (guardar, leer, anexar, listar, borrar)
+contra cada backend de ConversationStore. Redis solo se incluye con
+--redis-url (o REDIS_URL) y si responde.
+
+    python -m benchmarks.bench_storage [--conversations 2000] [--messages 20]
+"""
+
+import argparse, os, sys, shutil, tempfile, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.services.storage import MemoryStore, SQLiteStore
+from api.structures import Conversation, Message
+
+
+def conversation(conversation_id: str, messages: int) -> Conversation:
+    history = [Message(role="system", content="Defiende la postura. " * 20)]
+    for i in range(messages // 2):
+        history.append(Message(role="user", content=f"Argumento {i}: " + "no estoy de acuerdo " * 10))
+        history.append(Message(role="assistant", content=f"Réplica {i}: " + "la evidencia " * 25))
+    return Conversation(conversation_id=conversation_id, posture="La Tierra es plana",
+                        messages=history)
+
+
+def run(store, ids, messages: int):
+    """Tiempo por operación (µs) de cada fase."""
+    data = {conversation_id: conversation(conversation_id, messages) for conversation_id in ids}
+    reply = [Message(role="user", content="¿Y las fotos desde el espacio?")]
+    phases = [
+        ("set", lambda i: store.set_conversation(i, data[i])),
+        ("get", lambda i: store.get_conversation(i)),
+        ("append", lambda i: store.append_messages(i, reply)),
+        ("version", lambda i: store.get_conversation_version(i)),
+    ]
+    results = {}
+    for name, operation in phases:
+        start = time.perf_counter()
+        for conversation_id in ids:
+            operation(conversation_id)
+        results[name] = (time.perf_counter() - start) / len(ids) * 1e6
+    start = time.perf_counter()
+    listed = sum(1 for _ in store.iter_conversations(batch_size=500))
+    results["list"] = (time.perf_counter() - start) / max(1, listed) * 1e6
+    start = time.perf_counter()
+    for conversation_id in ids:
+        store.delete_conversation(conversation_id)
+    results["delete"] = (time.perf_counter() - start) / len(ids) * 1e6
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--redis-url", default=os.getenv("REDIS_URL"))
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    stores = [("memory", MemoryStore(max_conversations=args.conversations)),
+              ("sqlite", SQLiteStore(os.path.join(directory, "bench.db")))]
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+        from api.services.redis import RedisService
+        redis_store = RedisService()
+        if redis_store.ping()["ok"]:
+            stores.append(("redis", redis_store))
+        else:
+            print(f"Redis no responde en {args.redis_url}; se omite", file=sys.stderr)
+
+    ids = [f"bench-{i}" for i in range(args.conversations)]
+    phases = ("set", "get", "append", "version", "list", "delete")
+    print(f"{args.conversations} conversaciones de {args.messages} mensajes (µs por operación)")
+    print(f"{'backend':<8}" + "".join(f"{phase:>10}" for phase in phases))
+    try:
+        for name, store in stores:
+            results = run(store, ids, args.messages)
+            print(f"{name:<8}" + "".join(f"{results[phase]:>10.1f}" for phase in phases))
+            store.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
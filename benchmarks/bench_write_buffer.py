@@ -0,0 +1,120 @@
+"""
+Benchmark del búfer de escrituras agrupadas de Redis
+Simula turnos concurrentes (mensaje del usuario durable, consumo y respuesta
+diferida) contra un Redis con latencia de red simulada, o contra uno real
+con --redis-url, y compara las idas y vueltas a Redis por turno con y sin
+REDIS_WRITE_BUFFER.
+
+    python -m benchmarks.bench_write_buffer [--threads 64] [--turns 20] [--rtt-ms 0.5]
+"""
+
+import argparse, os, sys, threading, time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.services.redis import RedisService
+from api.structures import Conversation, Message
+
+
+class SimulatedRedis:
+    """Cliente que solo acepta pipelines: cada ejecución cuesta `rtt`
+    segundos y cuenta como una ida y vuelta."""
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.round_trips = 0
+        self.lock = threading.Lock()
+
+    def pipeline(self, transaction: bool = False):
+        return _Pipeline(self)
+
+    def close(self) -> None:
+        pass
+
+
+class _Pipeline:
+
+    def __init__(self, client: SimulatedRedis):
+        self.client = client
+        self.commands = 0
+
+    def __len__(self) -> int:
+        return self.commands
+
+    def __getattr__(self, name: str):
+        def queue(*args, **kwargs):
+            self.commands += 1
+            return self
+        return queue
+
+    def execute(self):
+        time.sleep(self.client.rtt)
+        with self.client.lock:
+            self.client.round_trips += 1
+        return [True] * self.commands
+
+
+def service(buffered: bool, flush_ms: float, redis_url: str, rtt: float):
+    env = {"REDIS_WRITE_BUFFER": "1" if buffered else "0",
+           "REDIS_WRITE_FLUSH_MS": str(flush_ms)}
+    if redis_url:
+        env["REDIS_URL"] = redis_url
+        with patch.dict(os.environ, env):
+            return RedisService(), None
+    client = SimulatedRedis(rtt)
+    with patch.dict(os.environ, env), \
+         patch("api.services.redis.redis.Redis.from_url", return_value=client):
+        return RedisService(), client
+
+
+def run(store, threads: int, turns: int):
+    """Ejecuta `turns` turnos por hilo. Devuelve turnos por segundo."""
+    def worker(index: int) -> None:
+        conversation_id = f"bench-{index}"
+        conversation = Conversation(conversation_id=conversation_id, posture="La Tierra es plana",
+                                    messages=[Message(role="system", content="s")])
+        for turn in range(turns):
+            conversation.messages.append(Message(role="user", content=f"Argumento {turn}"))
+            store.set_conversation(conversation_id, conversation)
+            store.record_usage(conversation_id, None, "bench-model",
+                               {"prompt_tokens": 100, "completion_tokens": 50, "cached_tokens": 0})
+            conversation.messages.append(Message(role="assistant", content=f"Réplica {turn}"))
+            store.set_conversation(conversation_id, conversation, durable=False)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    store.sync_writes()
+    return threads * turns / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--rtt-ms", type=float, default=0.5, help="Latencia simulada por ida y vuelta")
+    parser.add_argument("--flush-ms", type=float, default=2.0)
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+
+    total = args.threads * args.turns
+    print(f"{args.threads} hilos x {args.turns} turnos"
+          + (f" contra {args.redis_url}" if args.redis_url else f", RTT simulado {args.rtt_ms} ms"))
+    print(f"{'modo':<10}{'turnos/s':>10}{'viajes/turno':>14}{'escr./lote':>12}{'flush p99 ms':>14}")
+    for buffered in (False, True):
+        store, client = service(buffered, args.flush_ms, args.redis_url, args.rtt_ms / 1000)
+        rate = run(store, args.threads, args.turns)
+        stats = store.write_stats() or {}
+        trips = (client.round_trips / total) if client else float("nan")
+        print(f"{'búfer' if buffered else 'directo':<10}{rate:>10.0f}{trips:>14.2f}"
+              f"{stats.get('writes_per_flush') or 1:>12}"
+              f"{stats.get('flush_latency_p99_ms') or 0:>14}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
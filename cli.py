@@ -1,70 +1,307 @@
 from api.services import Discutidor3000
-import os
+from api.services.discutidor3000 import ConversationNotFoundError
+from api.services.mock_upstream import MockUpstream
+from api.services.redis import open_storage
+from api.services.storage import StorageFeatureError
+from api.services.debate import DebateOrchestrator
+from api.services.export import ndjson_chunks, gzip_chunks, open_ndjson
+import os, sys, json, argparse
+
+BANNER = """
+    =====Discutidor3000 CLI=====
 
-def init():
-    print("""
-    =====Discutidor3000 [DeepSeek Edition] Test CLI=====
-          
     En el primer mensaje, indica la postura que quieres que defienda el bot.
     Durante toda la conversación, el bot defenderá esta postura.
-          
+
     github: @econopapi
-    
+
     COMANDOS:
-          - /n : iniciar nueva conversación"
-          - /q : salir""")
-    
-    # Initialize Discutidor3000 instance
-    api_key = os.getenv('OPENROUTER_API_KEY')
-    discutidor = Discutidor3000(api_key=api_key)
-    
-    current_conversation_id = None
+          - /n : iniciar nueva conversación
+          - /l [página] : listar conversaciones recientes
+          - /r <id> : reanudar una conversación
+          - /q : salir"""
 
-    while True:
-        if current_conversation_id is None:
-            user_input = input("Nueva conversación - Indica la postura a defender:\n> ").strip()
-            
-            # terminar programa
-            if user_input.lower() == "/q":
-                print("Adiós!")
-                break
 
-            try:
-                response = discutidor.chat(message=user_input)
-                if response is None:
-                    print(" > [!] Error en la conversación, inténtalo de nuevo.")
-                    continue
-                current_conversation_id = response["conversation_id"]
-            except Exception as e:
-                print(f" > [!] Error al iniciar la conversación: {e}")
-                continue
+def offline_environment(upstream: MockUpstream) -> dict:
+    """Variables de entorno del modo offline: almacenamiento en memoria y
+    el servidor LLM simulado como único backend."""
+    return {"STORAGE_BACKEND": "memory",
+            "LOCAL_LLM_BASE_URL": upstream.base_url,
+            "LOCAL_LLM_STREAMING": "1",
+            "LOCAL_LLM_JSON_MODE": "1",
+            "LLM_BACKEND": "local",
+            "LLM_TARGETS": ""}
+
+
+def print_stream(events, out=None) -> dict:
+    """Imprime los fragmentos de la respuesta según llegan.
+    Returns:
+        dict: Evento `start` (ID y postura de la conversación) más la
+        respuesta completa (`response`, None si hubo un error)."""
+    out = out or sys.stdout
+    result = {}
+    for event in events:
+        if event["type"] == "start":
+            result.update(event)
+            out.write("> Bot: ")
+        elif event["type"] == "token":
+            out.write(event["content"])
+            out.flush()
+        elif event["type"] == "done":
+            result["response"] = event["response"]
+            out.write("\n")
+            out.flush()
+    return result
 
-        else:
-            user_input = input(f"> Conversación {current_conversation_id[:7]} - Escribe tu mensaje:\n> ").strip()
 
-            # terminar programa
-            if user_input.lower() == "/q":
+def print_recent(discutidor: Discutidor3000, page: int = 1, page_size: int = 10) -> None:
+    """Muestra una página del listado de conversaciones recientes."""
+    listing = discutidor.list_conversations(limit=page_size, offset=(page - 1) * page_size)
+    if not listing["conversations"]:
+        print(" > No hay conversaciones.")
+        return
+    print(f" > Conversaciones recientes (página {page}, {listing['total']} en total):")
+    for conversation in listing["conversations"]:
+        print(f"   {conversation['conversation_id']}  {conversation['last_updated'][:16]}"
+              f"  [{conversation['messages']}] {conversation['posture']}")
+
+
+def resume(discutidor: Discutidor3000, conversation_id: str) -> bool:
+    """Muestra los últimos mensajes de una conversación antes de reanudarla.
+    Returns:
+        bool: False si la conversación no existe."""
+    try:
+        page = discutidor.get_messages(conversation_id, limit=1)
+        history = discutidor.get_messages(conversation_id,
+                                          offset=max(0, page["total"] - 4))
+    except ConversationNotFoundError:
+        print(f" > [!] Conversación no encontrada: {conversation_id}")
+        return False
+    for message in history["messages"]:
+        author = "Bot" if message["role"] == "bot" else "Tú"
+        print(f"> {author}: {message['content']}")
+    return True
+
+
+def chat(args: argparse.Namespace) -> None:
+    """CLI interactivo. Las respuestas se imprimen en streaming; con
+    `--offline` usa almacenamiento en memoria y el servidor LLM simulado."""
+    upstream = None
+    if args.offline:
+        upstream = MockUpstream(token_delay=args.token_delay).start()
+        os.environ.update(offline_environment(upstream))
+    discutidor = Discutidor3000(api_key=os.getenv('OPENROUTER_API_KEY'))
+    print(BANNER)
+    if upstream is not None:
+        print(f"\n    Modo offline: servidor simulado en {upstream.base_url}")
+
+    current_conversation_id = None
+    if args.resume and resume(discutidor, args.resume):
+        current_conversation_id = args.resume
+
+    try:
+        while True:
+            if current_conversation_id is None:
+                prompt = "Nueva conversación - Indica la postura a defender:\n> "
+            else:
+                prompt = f"> Conversación {current_conversation_id[:7]} - Escribe tu mensaje:\n> "
+            try:
+                user_input = input(prompt).strip()
+            except EOFError:
+                user_input = "/q"
+            command, _, argument = user_input.partition(" ")
+
+            if command.lower() == "/q":
                 print("Adiós!")
                 break
-
-            # iniciar nueva conversación
-            if user_input.lower() == "/n":
+            if command.lower() == "/n":
                 current_conversation_id = None
                 continue
+            if command.lower() == "/l":
+                print_recent(discutidor, page=int(argument) if argument.strip().isdigit() else 1)
+                continue
+            if command.lower() == "/r":
+                if argument.strip() and resume(discutidor, argument.strip()):
+                    current_conversation_id = argument.strip()
+                continue
+            if not user_input:
+                continue
 
             try:
-                response = discutidor.chat(
-                    message=user_input,
-                    conversation_id=current_conversation_id)
-                if response is None:
-                    print(" > [!] Error en la conversación, inténtalo de nuevo.")
-                    continue
-
-                print(f"> Bot: {response['response']}")
+                result = print_stream(discutidor.stream_chat(message=user_input,
+                                                             conversation_id=current_conversation_id,
+                                                             backend=args.backend,
+                                                             model=args.model))
             except Exception as e:
                 print(f" > [!] Error en la conversación: {e}")
-                current_conversation_id = None
+                continue
+            if result.get("response") is None:
+                print(" > [!] Error en la conversación, inténtalo de nuevo.")
+            if current_conversation_id is None and result.get("conversation_id"):
+                current_conversation_id = result["conversation_id"]
+                print(f" > Postura: {result['posture']}")
+    finally:
+        discutidor.close()
+        if upstream is not None:
+            upstream.stop()
+
+
+def export_conversations(args: argparse.Namespace) -> None:
+    """Exporta las conversaciones como NDJSON (opcionalmente gzip) a un
+    archivo o a stdout."""
+    storage = open_storage()
+    chunks = ndjson_chunks(storage.iter_conversations(batch_size=args.batch_size,
+                                                      posture=args.posture,
+                                                      since=args.since,
+                                                      until=args.until))
+    if args.gzip:
+        chunks = gzip_chunks(chunks)
+    output = open(args.output, "wb") if args.output != "-" else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            output.write(chunk)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+        storage.close()
+
+
+def import_conversations(args: argparse.Namespace) -> None:
+    """Importa conversaciones desde un archivo NDJSON (gzip detectado automáticamente)."""
+    storage = open_storage()
+    source = open_ndjson(args.input) if args.input != "-" else sys.stdin
+    try:
+        result = storage.import_conversations(source,
+                                              batch_size=args.batch_size,
+                                              ttl=args.ttl)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        storage.close()
+    print(f"Importadas: {result['imported']} - Inválidas: {result['failed']}", file=sys.stderr)
+
+
+def run_debates(args: argparse.Namespace) -> None:
+    """Ejecuta debates entre bots (o reanuda los pendientes) y escribe cada
+    transcripción como una línea NDJSON en cuanto termina."""
+    discutidor = Discutidor3000(api_key=os.getenv('OPENROUTER_API_KEY'))
+    orchestrator = DebateOrchestrator(discutidor, concurrency=args.concurrency)
+    if args.resume:
+        transcripts = orchestrator.resume()
+    else:
+        # una postura por línea; "A | B" fija también la contraria
+        with open(args.postures, encoding="utf-8") as f:
+            pairs = [(a.strip(), b.strip() or None) for a, _, b in
+                     (line.partition("|") for line in f if line.strip())]
+        transcripts = orchestrator.run_postures(pairs, rounds=args.rounds,
+                                                backend=args.backend, model=args.model)
+    output = open(args.output, "a", encoding="utf-8") if args.output != "-" else sys.stdout
+    counts = {"done": 0, "failed": 0}
+    try:
+        for transcript in transcripts:
+            output.write(json.dumps(transcript, ensure_ascii=False) + "\n")
+            output.flush()
+            counts[transcript["status"]] = counts.get(transcript["status"], 0) + 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        discutidor.close()
+    print(f"Debates completados: {counts['done']} - Fallidos: {counts['failed']}", file=sys.stderr)
+
+
+def capacity_report(args: argparse.Namespace) -> None:
+    """Genera el informe de capacidad del almacenamiento (JSON) mostrando el
+    progreso por stderr."""
+    storage = open_storage()
+    progress = {}
+    try:
+        for progress in storage.capacity_report(sample_size=args.sample_size,
+                                                sample_rate=args.sample_rate,
+                                                batch_size=args.batch_size,
+                                                pause=args.pause):
+            print(f"Recorridas: {progress['scanned']} - Muestreadas: {progress['sampled']}",
+                  file=sys.stderr)
+    finally:
+        storage.close()
+    report = json.dumps(progress.get("report"), indent=2, ensure_ascii=False)
+    if args.output == "-":
+        print(report)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+
+
+def add_chat_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--resume", metavar="ID", help="Reanudar una conversación existente")
+    parser.add_argument("--offline", action="store_true",
+                        help="Almacenamiento en memoria y servidor LLM simulado")
+    parser.add_argument("--token-delay", type=float, default=0.03,
+                        help="Pausa entre fragmentos del servidor simulado, en segundos")
+    parser.add_argument("--backend", help="Backend para las nuevas conversaciones")
+    parser.add_argument("--model", help="Modelo para las nuevas conversaciones")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Discutidor3000 CLI")
+    commands = parser.add_subparsers(dest="command")
+
+    export_parser = commands.add_parser("export", help="Exportar conversaciones como NDJSON")
+    export_parser.add_argument("-o", "--output", default="-", help="Archivo de salida (- para stdout)")
+    export_parser.add_argument("--gzip", action="store_true", help="Comprimir con gzip")
+    export_parser.add_argument("--posture", help="Filtrar por postura (subcadena)")
+    export_parser.add_argument("--since", help="Creadas desde esta fecha (ISO 8601)")
+    export_parser.add_argument("--until", help="Creadas antes de esta fecha (ISO 8601)")
+    export_parser.add_argument("--batch-size", type=int, default=500)
+    export_parser.set_defaults(func=export_conversations)
+
+    import_parser = commands.add_parser("import", help="Importar conversaciones desde NDJSON")
+    import_parser.add_argument("input", help="Archivo NDJSON o NDJSON.gz (- para stdin)")
+    import_parser.add_argument("--batch-size", type=int, default=500)
+    import_parser.add_argument("--ttl", type=int, default=1_120_000, help="TTL en segundos")
+    import_parser.set_defaults(func=import_conversations)
+
+    debate_parser = commands.add_parser("debate", help="Debates entre bots (postura A contra no-A)")
+    debate_parser.add_argument("postures", nargs="?",
+                               help="Archivo con una postura por línea (\"A | B\" para fijar B)")
+    debate_parser.add_argument("--rounds", type=int, default=3)
+    debate_parser.add_argument("--concurrency", type=int, default=None,
+                               help="Debates simultáneos (por defecto DEBATE_CONCURRENCY)")
+    debate_parser.add_argument("--backend")
+    debate_parser.add_argument("--model")
+    debate_parser.add_argument("--resume", action="store_true",
+                               help="Reanudar los debates sin terminar")
+    debate_parser.add_argument("-o", "--output", default="-",
+                               help="Archivo NDJSON de transcripciones (se anexa; - para stdout)")
+    debate_parser.set_defaults(func=run_debates)
+
+    capacity_parser = commands.add_parser("capacity", help="Informe de capacidad del almacenamiento")
+    capacity_parser.add_argument("--sample-size", type=int, default=10_000,
+                                 help="Máximo de conversaciones inspeccionadas")
+    capacity_parser.add_argument("--sample-rate", type=float, default=1.0,
+                                 help="Fracción de claves inspeccionadas (0-1)")
+    capacity_parser.add_argument("--batch-size", type=int, default=200)
+    capacity_parser.add_argument("--pause", type=float, default=0.05,
+                                 help="Segundos de pausa entre lotes")
+    capacity_parser.add_argument("-o", "--output", default="-", help="Archivo JSON (- para stdout)")
+    capacity_parser.set_defaults(func=capacity_report)
+
+    chat_parser = commands.add_parser("chat", help="CLI interactivo (comando por defecto)")
+    add_chat_arguments(chat_parser)
+    chat_parser.set_defaults(func=chat)
+    add_chat_arguments(parser)
+
+    args = parser.parse_args(argv)
+    if args.command == "debate" and not (args.resume or args.postures):
+        parser.error("debate: indica un archivo de posturas o --resume")
+    if args.command is None:
+        chat(args)
+        return
+    try:
+        args.func(args)
+    except StorageFeatureError as e:
+        # el backend de STORAGE_BACKEND no tiene la capacidad que pide el comando
+        parser.exit(2, f"{parser.prog} {args.command}: {e}\n")
 
 
 if __name__ == "__main__":
-    init()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,40 @@
+"""
+Configuración de gunicorn para producción:
+    gunicorn -c gunicorn.conf.py main:api
+Cada valor se puede ajustar por variable de entorno (ver .env-example).
+"""
+
+import os
+
+from api.serving import default_workers
+from api.telemetry import configure_logging
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+
+# WEB_CONCURRENCY fija el número de workers; si no, se deriva de las CPUs
+# disponibles (cuota del contenedor incluida)
+workers = int(os.getenv("WEB_CONCURRENCY") or default_workers())
+worker_class = "api.serving.DiscutidorWorker"
+
+# la app se importa una sola vez en el árbitro y los workers la heredan al
+# hacer fork; los servicios (Redis, backends, tracing) se crean después,
+# en el lifespan de cada worker
+preload_app = True
+
+# reciclado de workers tras N peticiones (con variación para que no se
+# reinicien todos a la vez); el límite de memoria lo aplica el worker
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+
+# al apagar, los workers esperan DRAIN_TIMEOUT a las peticiones en curso;
+# el margen cubre el cierre de los servicios antes de que gunicorn los mate
+graceful_timeout = int(float(os.getenv("DRAIN_TIMEOUT", "30"))) + 10
+# latido del worker; las llamadas al LLM no bloquean el event loop
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+
+def post_fork(server, worker):
+    # el hilo del logging asíncrono no sobrevive al fork
+    configure_logging()
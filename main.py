@@ -1,12 +1,47 @@
 import logging
 import os
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
-from api.endpoints import chat_router
+from dotenv import load_dotenv
+from api.endpoints import chat_router, admin_router
+from api.services import Discutidor3000
+from api.telemetry import (
+    configure_logging,
+    shutdown_logging,
+    configure_tracing,
+    shutdown_tracing,
+    RequestIdMiddleware,
+    TracingMiddleware)
+
+# logging asíncrono con niveles por módulo (LOG_LEVEL, LOG_LEVELS)
+configure_logging()
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Construye los servicios al arrancar y los precalienta antes de
+    aceptar tráfico; los libera al apagar."""
+    load_dotenv()
+    # exportador de spans (TRACE_EXPORTER: none, file u otlp)
+    configure_tracing()
+    discutidor = Discutidor3000(api_key=os.getenv("OPENROUTER_API_KEY"))
+    try:
+        report = await run_in_threadpool(discutidor.warmup)
+        logger.info(f"Precalentamiento completado: {report}")
+    except Exception as e:
+        logger.error(f"Error en el precalentamiento: {e}")
+    # el servicio solo se publica una vez precalentado
+    app.state.discutidor = discutidor
+    discutidor.start_background_tasks()
+    yield
+    discutidor.close()
+    shutdown_tracing()
+    shutdown_logging()
 
-logging.basicConfig(level=logging.DEBUG,
-                    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 
 # Configurar root_path basado en variable de entorno
 root_path = os.getenv("ROOT_PATH", "")
@@ -15,15 +50,42 @@ api = FastAPI(
     title="Discutidor3000 API",
     description="API para chatbot argumentativo",
     version="1.0.0",
-    root_path=root_path
+    root_path=root_path,
+    lifespan=lifespan
 )
 
+api.add_middleware(RequestIdMiddleware)
+api.add_middleware(TracingMiddleware)
+
 api.include_router(chat_router,
                    prefix="/api/v1",
                    tags=["chat"])
+api.include_router(admin_router,
+                   prefix="/api/v1/admin",
+                   tags=["admin"])
 
 @api.get("/")
 def hola():
     return JSONResponse(
         status_code=200,
-        content={"message": "Discutidor3000 API - Endpoint disponible: POST /api/v1/chat"})
\ No newline at end of file
+        content={"message": "Discutidor3000 API - Endpoint disponible: POST /api/v1/chat"})
+
+
+@api.get("/healthz")
+def healthz():
+    """Liveness: el proceso está vivo y atendiendo peticiones."""
+    return JSONResponse(status_code=200, content={"status": "ok"})
+
+
+@api.get("/readyz")
+def readyz():
+    """Readiness: el worker está precalentado, Redis responde con baja
+    latencia y el upstream del LLM es alcanzable."""
+    discutidor = getattr(api.state, "discutidor", None)
+    if discutidor is None:
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    status = discutidor.check_readiness()
+    ready = status.pop("ready")
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", **status})
@@ -1,5 +1,6 @@
 import sys
 import os
+import fnmatch
 import pytest
 from unittest.mock import Mock, patch
 from datetime import datetime
@@ -8,6 +9,154 @@ from datetime import datetime
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, project_root)
 
+class FakeRedis:
+    """Cliente Redis en memoria con los comandos que usan los tests."""
+
+    def __init__(self):
+        self.data = {}
+        self.zsets = {}
+        self.streams = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+        return True
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1)
+        return int(self.data[key])
+
+    def delete(self, *keys):
+        return sum(1 for k in keys if self.data.pop(k, None) is not None)
+
+    def unlink(self, *keys):
+        return self.delete(*keys)
+
+    def expire(self, key, ttl, nx=False, gt=False):
+        return key in self.data or key in self.zsets
+
+    def ttl(self, key):
+        return 100 if key in self.data else -2
+
+    def memory_usage(self, key, samples=None):
+        value = self.data.get(key)
+        return None if value is None else 64 + len(str(value))
+
+    def info(self, section=None):
+        return {"used_memory": 1_000_000, "maxmemory": 0}
+
+    def sadd(self, key, *members):
+        self.data.setdefault(key, set()).update(members)
+        return len(members)
+
+    def srem(self, key, *members):
+        current = self.data.get(key, set())
+        removed = current.intersection(members)
+        current.difference_update(members)
+        return len(removed)
+
+    def smembers(self, key):
+        return set(self.data.get(key, set()))
+
+    def hset(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def exists(self, *keys):
+        return sum(1 for k in keys if k in self.data)
+
+    def scan_iter(self, match=None, count=None):
+        return iter([k for k in list(self.data) if fnmatch.fnmatch(k, match or "*")])
+
+    def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    def zrem(self, key, *members):
+        return sum(1 for m in members if self.zsets.get(key, {}).pop(m, None) is not None)
+
+    def hmget(self, key, fields):
+        return [self.data.get(key, {}).get(f) for f in fields]
+
+    def hdel(self, key, *fields):
+        return sum(1 for f in fields if self.data.get(key, {}).pop(f, None) is not None)
+
+    def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    def _by_score(self, key, low, high):
+        items = sorted(self.zsets.get(key, {}).items(), key=lambda item: item[1])
+        return [(m, score) for m, score in items if float(low) <= score <= float(high)]
+
+    def zrangebyscore(self, key, low, high, start=0, num=None):
+        members = [m for m, _ in self._by_score(key, low, high)]
+        return members[start:start + num if num else None]
+
+    def zrevrangebyscore(self, key, high, low, start=0, num=None, withscores=False):
+        members = list(reversed(self._by_score(key, low, high)))[start:start + num if num else None]
+        return members if withscores else [m for m, _ in members]
+
+    def zrevrange(self, key, start, end, withscores=False):
+        members = list(reversed(self._by_score(key, "-inf", "+inf")))
+        members = members[start:end + 1 if end != -1 else None]
+        return members if withscores else [m for m, _ in members]
+
+    def zremrangebyscore(self, key, low, high):
+        expired = [m for m, _ in self._by_score(key, low, high)]
+        return self.zrem(key, *expired)
+
+    def zcount(self, key, low, high):
+        return len(self._by_score(key, low, high))
+
+    def zrangebylex(self, key, low, high, start=0, num=None):
+        members = sorted(m for m in self.zsets.get(key, {}) if low[1:] <= m <= high[1:])
+        return members[start:start + num if num else None]
+
+    def zscore(self, key, member):
+        return self.zsets.get(key, {}).get(member)
+
+    def xadd(self, key, fields, maxlen=None, approximate=True):
+        entries = self.streams.setdefault(key, [])
+        entries.append((f"{len(entries) + 1}-0", dict(fields)))
+        if maxlen:
+            del entries[:-maxlen]
+        return entries[-1][0]
+
+    def eval(self, script, numkeys, key, value, *args):
+        # scripts condicionales: renovación o borrado si el valor coincide
+        if self.data.get(key) != value:
+            return 0
+        return 1 if "EXPIRE" in script else self.delete(key)
+
+    def pipeline(self, transaction=False):
+        client = self
+        class Pipe:
+            def __init__(self):
+                self.calls = []
+            def __getattr__(self, name):
+                return lambda *args, **kw: self.calls.append((name, args, kw))
+            def __len__(self):
+                return len(self.calls)
+            def execute(self):
+                calls, self.calls = self.calls, []
+                return [getattr(client, name)(*args, **kw) for name, args, kw in calls]
+        return Pipe()
+
+    def close(self):
+        pass
+
+
 @pytest.fixture
 def mock_redis():
     """Fixture para mockear Redis."""
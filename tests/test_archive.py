@@ -0,0 +1,151 @@
+"""
+Tests para el nivel de archivo de conversaciones
+Cubre los segmentos comprimidos, el índice y el barrido desde Redis
+"""
+
+import unittest
+import os
+import json
+import tempfile
+from unittest.mock import patch
+
+from api.services.archive import ArchiveCorruptedError, ConversationArchive
+from api.services.redis import ACTIVITY_KEY, RedisService, conversation_key
+from api.structures import Conversation, Message
+from conftest import FakeRedis
+
+class TestConversationArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.archive = ConversationArchive(self.tmp.name, segment_max_bytes=200)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_put_and_get(self):
+        """Las conversaciones se leen tal como se archivaron."""
+        self.archive.put_many({"a": '{"id": "a"}', "b": '{"id": "b"}'})
+        self.assertEqual(self.archive.get("a"), '{"id": "a"}')
+        self.assertEqual(self.archive.get("b"), '{"id": "b"}')
+        self.assertIsNone(self.archive.get("c"))
+        self.assertEqual(len(self.archive), 2)
+
+    def test_latest_version_wins(self):
+        """Una nueva versión archivada sustituye a la anterior."""
+        self.archive.put("a", "v1")
+        self.archive.put("a", "v2")
+        self.assertEqual(self.archive.get("a"), "v2")
+
+    def test_segments_rotate(self):
+        """Se abre un segmento nuevo al superar el tamaño máximo."""
+        self.archive.put_many({str(i): os.urandom(100).hex() for i in range(5)})
+        self.assertGreater(self.archive.stats()["segments"], 1)
+        self.assertEqual(len(self.archive), 5)
+
+    def test_index_shared_between_instances(self):
+        """Otro proceso ve las entradas nuevas del índice al buscarlas."""
+        other = ConversationArchive(self.tmp.name)
+        self.archive.put("a", "data")
+        self.assertEqual(other.get("a"), "data")
+        self.archive.delete("a")
+        self.assertNotIn("a", other)
+
+    def test_corruption_detected(self):
+        """Un registro dañado se detecta con el CRC."""
+        self.archive.put("a", "data" * 10)
+        path = os.path.join(self.tmp.name, "segment-000001.seg")
+        with open(path, "r+b") as f:
+            f.seek(10)
+            f.write(b"\x00\x00")
+        with self.assertRaises(ArchiveCorruptedError):
+            self.archive.get("a")
+
+
+class TestRedisArchiving(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        with patch.dict('os.environ', {"ARCHIVE_DIR": self.tmp.name}):
+            with patch('api.services.redis.redis.Redis.from_url', return_value=FakeRedis()):
+                self.service = RedisService()
+        self.client = self.service.redis
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _conversation(self, conversation_id):
+        return Conversation(conversation_id=conversation_id, posture="p",
+                            messages=[Message(role="user", content="hola")])
+
+    def test_archive_and_fault_in(self):
+        """Las conversaciones inactivas salen de Redis y vuelven al leerlas."""
+        self.service.set_conversation("old", self._conversation("old"))
+        self.service.set_conversation("new", self._conversation("new"))
+        self.client.zsets[ACTIVITY_KEY]["old"] -= 30 * 86_400
+
+        self.assertEqual(self.service.archive_idle(max_idle_days=7), 1)
+        self.assertNotIn(conversation_key("old"), self.client.data)
+        self.assertIn(conversation_key("new"), self.client.data)
+        self.assertNotIn("old", self.client.zsets[ACTIVITY_KEY])
+
+        restored = self.service.get_conversation("old")
+        self.assertEqual(restored.conversation_id, "old")
+        self.assertIn(conversation_key("old"), self.client.data)
+        self.assertIn("old", self.client.zsets[ACTIVITY_KEY])
+
+    def test_changed_conversation_not_deleted(self):
+        """Una conversación modificada durante el barrido no se borra de Redis."""
+        self.service.set_conversation("c", self._conversation("c"))
+        self.client.zsets[ACTIVITY_KEY]["c"] -= 30 * 86_400
+        original_put = self.service.archive.put_many
+
+        def put_and_modify(conversations):
+            written = original_put(conversations)
+            self.service.set_conversation("c", self._conversation("c").model_copy(
+                update={"posture": "nueva"}))
+            return written
+
+        with patch.object(self.service.archive, 'put_many', side_effect=put_and_modify):
+            self.assertEqual(self.service.archive_idle(max_idle_days=7), 0)
+        self.assertEqual(json.loads(self.client.data[conversation_key("c")])["posture"], "nueva")
+
+    def test_single_sweeper(self):
+        """Solo un worker barre a la vez."""
+        self.client.set("archive:sweeper:lock", "otro")
+        self.assertEqual(self.service.archive_idle(max_idle_days=0), 0)
+
+    def test_sweeper_keeps_foreign_lock(self):
+        """Si el bloqueo expiró y lo tomó otro worker, no se libera al terminar."""
+        def steal(conversations):
+            self.client.data["archive:sweeper:lock"] = "otro"
+            return len(conversations)
+
+        self.service.set_conversation("a", self._conversation("a"))
+        with patch.object(self.service.archive, 'put_many', side_effect=steal):
+            self.service.archive_idle(max_idle_days=0)
+        self.assertEqual(self.client.get("archive:sweeper:lock"), "otro")
+
+        self.client.delete("archive:sweeper:lock")
+        self.service.archive_idle(max_idle_days=0)
+        self.assertIsNone(self.client.get("archive:sweeper:lock"))
+
+    def test_purge_archived_in_batches(self):
+        """La purga recorre el archivo por lotes, informa del progreso,
+        limita el ritmo y omite los registros ilegibles."""
+        self.service.archive.put_many({f"a{i}": self._conversation(f"a{i}").model_dump_json()
+                                       for i in range(5)})
+        self.service.archive.put("roto", "{no es json")
+        with patch('api.services.redis.time.sleep') as mock_sleep, \
+             patch.object(self.service.archive, 'delete_many',
+                          wraps=self.service.archive.delete_many) as mock_delete:
+            progress = list(self.service.purge_conversations(posture="p", batch_size=2,
+                                                             max_per_second=1))
+        self.assertEqual(progress[-1], {"scanned": 6, "matched": 5, "deleted": 5})
+        self.assertEqual(len(progress), 4)  # un informe por lote completo y el final
+        self.assertEqual(mock_delete.call_count, 3)
+        self.assertTrue(mock_sleep.called)
+        self.assertEqual(list(self.service.archive.ids()), ["roto"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+"""
+Tests para los backends del LLM
+Cubre OpenRouter y servidores compatibles con OpenAI
+"""
+
+import unittest
+import json
+import requests
+from unittest.mock import patch, Mock, MagicMock
+
+from api.services.backends import OpenAICompatibleBackend, OpenRouterBackend
+
+class TestOpenAICompatibleBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = OpenAICompatibleBackend(base_url="http://localhost:8080/v1/",
+                                               name="local")
+
+    def test_url(self):
+        """Test de construcción de la URL."""
+        self.assertEqual(self.backend.url, "http://localhost:8080/v1/chat/completions")
+        self.assertNotIn("Authorization", self.backend.headers)
+
+    @patch('api.services.backends.requests.Session.post')
+    def test_complete_success(self, mock_post):
+        """Test de completion exitosa."""
+        mock_post.return_value = Mock(status_code=200)
+        mock_post.return_value.json.return_value = {
+            "choices": [{"message": {"content": "Hola"}}]
+        }
+
+        result = self.backend.complete([{"role": "user", "content": "test"}],
+                                       model="llama3")
+        self.assertEqual(result["choices"][0]["message"]["content"], "Hola")
+        self.assertEqual(mock_post.call_args.kwargs["json"]["model"], "llama3")
+
+    @patch('api.services.backends.requests.Session.post')
+    def test_complete_without_json_mode(self, mock_post):
+        """Sin soporte de modo JSON no se envía `response_format`."""
+        mock_post.return_value = Mock(status_code=200)
+        mock_post.return_value.json.return_value = {}
+
+        self.backend.complete([{"role": "user", "content": "test"}],
+                              model="llama3", use_json=True)
+        self.assertNotIn("response_format", mock_post.call_args.kwargs["json"])
+
+    @patch('api.services.backends.requests.Session.post')
+    def test_complete_error(self, mock_post):
+        """Test de error HTTP."""
+        mock_post.return_value = Mock(status_code=503, text="Unavailable")
+
+        result = self.backend.complete([], model="llama3")
+        self.assertIsNone(result)
+
+    @patch('api.services.backends.requests.Session.post')
+    def test_complete_exception(self, mock_post):
+        """Test de excepción de red."""
+        mock_post.side_effect = ConnectionError("refused")
+
+        result = self.backend.complete([], model="llama3")
+        self.assertIsNone(result)
+
+    @patch('api.services.backends.requests.Session.post')
+    def test_stream(self, mock_post):
+        """Test de parseo de Server-Sent Events."""
+        chunks = [{"choices": [{"delta": {"content": "Ho"}}]},
+                  {"choices": [{"delta": {"content": "la"}}]}]
+        response = MagicMock(status_code=200)
+        response.iter_lines.return_value = (
+            [f"data: {json.dumps(c)}" for c in chunks] + ["", ": keep-alive", "data: [DONE]"])
+        mock_post.return_value.__enter__.return_value = response
+
+        result = list(self.backend.stream([], model="llama3"))
+        self.assertEqual(result, chunks)
+        self.assertTrue(mock_post.call_args.kwargs["json"]["stream"])
+
+    @patch('api.services.backends.requests.Session.head')
+    def test_ping(self, mock_head):
+        """Cualquier respuesta HTTP cuenta como alcanzable."""
+        mock_head.return_value = Mock(status_code=405)
+        self.assertTrue(self.backend.ping()["reachable"])
+        mock_head.side_effect = requests.ConnectionError("refused")
+        self.assertFalse(self.backend.ping()["reachable"])
+
+    @patch('api.services.backends.requests.Session.head')
+    def test_warmup(self, mock_head):
+        """Test de apertura de conexiones en paralelo."""
+        self.backend.warmup(connections=3)
+        self.assertEqual(mock_head.call_count, 3)
+
+    def test_stream_not_supported(self):
+        """Test de backend sin streaming."""
+        backend = OpenAICompatibleBackend(base_url="http://x", supports_streaming=False)
+        with self.assertRaises(NotImplementedError):
+            list(backend.stream([], model="llama3"))
+
+
+class TestOpenRouterBackend(unittest.TestCase):
+
+    def test_capabilities(self):
+        """OpenRouter declara streaming y modo JSON."""
+        backend = OpenRouterBackend(api_key="key")
+        self.assertTrue(backend.supports_streaming)
+        self.assertTrue(backend.supports_json_mode)
+        self.assertEqual(backend.headers["Authorization"], "Bearer key")
+
+    def test_payload_json_and_provider(self):
+        """Test de payload con modo JSON y preferencia de proveedor."""
+        backend = OpenRouterBackend(api_key="key")
+        payload = backend._payload([], "model-a", use_json=True, provider="provider-x")
+        self.assertEqual(payload["response_format"], {"type": "json_object"})
+        self.assertEqual(payload["provider"]["order"], ["provider-x"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+Tests de los microbenchmarks de rutas de CPU
+Comparación con la línea base y código de salida ante regresiones
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from benchmarks import bench_hot_paths
+
+
+class TestCompare(unittest.TestCase):
+
+    def test_regressions_and_improvements(self):
+        """Solo cuentan los cambios que superan el umbral."""
+        baseline = {"a": 10.0, "b": 10.0, "c": 10.0, "d": 10.0}
+        results = {"a": 12.0, "b": 13.0, "c": 7.0, "d": 10.0, "nueva": 99.0}
+        regressions, improvements = bench_hot_paths.compare(results, baseline, 0.25)
+        self.assertEqual(regressions, ["b"])
+        self.assertEqual(improvements, ["c"])
+
+
+class TestMain(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.baseline = os.path.join(directory.name, "hot_paths.json")
+        self.timings = {"rapida": 1.0, "lenta": 1.0}
+        functions = {"rapida": lambda: None, "lenta": lambda: None}
+        names = {fn: name for name, fn in functions.items()}
+        for p in (patch.object(bench_hot_paths, "cases", return_value=list(functions.items())),
+                  patch.object(bench_hot_paths, "measure",
+                               side_effect=lambda fn, repeat: self.timings[names[fn]])):
+            p.start()
+            self.addCleanup(p.stop)
+
+    def run_main(self, *args):
+        return bench_hot_paths.main(["--baseline", self.baseline, "--repeat", "1", *args])
+
+    def test_save_and_compare(self):
+        """Se guarda la línea base y una comparación sin cambios pasa."""
+        self.assertEqual(self.run_main("--save-baseline"), 0)
+        with open(self.baseline, encoding="utf-8") as f:
+            saved = json.load(f)
+        self.assertEqual(saved["results"], {"rapida": 1.0, "lenta": 1.0})
+        self.assertIn("python", saved["environment"])
+        self.assertEqual(self.run_main(), 0)
+
+    def test_regression_fails(self):
+        """Una ruta que sigue empeorada tras volver a medirla hace fallar el comando."""
+        self.run_main("--save-baseline")
+        self.timings["lenta"] = 2.0
+        self.assertEqual(self.run_main("--threshold", "0.5"), 1)
+        self.assertEqual(self.run_main("--threshold", "1.5"), 0)
+
+    def test_filter_keeps_baseline(self):
+        """Guardar un subconjunto conserva las demás rutas de la línea base."""
+        self.run_main("--save-baseline")
+        self.timings["rapida"] = 0.5
+        self.run_main("--save-baseline", "--filter", "rapida")
+        with open(self.baseline, encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["results"], {"rapida": 0.5, "lenta": 1.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+Tests del informe de capacidad
+Histogramas, relación tamaño/mensajes, proyección y muestreo incremental
+"""
+
+import json
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from api.services.capacity import DAY, CapacityReport, histogram
+from api.services.redis import RedisService
+from api.structures import Conversation, Message
+from conftest import FakeRedis
+
+
+def _conversation(messages: int, created_at: str, **extra) -> str:
+    return json.dumps({"conversation_id": "x", "posture": "p",
+                       "messages": [{"role": "user", "content": "m"}] * messages,
+                       "created_at": created_at, **extra})
+
+
+class TestCapacityReport(unittest.TestCase):
+
+    def test_histogram(self):
+        """Cada valor cae en la primera cubeta cuyo límite no supera."""
+        self.assertEqual(histogram([1, 2, 3, 10], [2, 5]),
+                         [{"le": 2, "count": 2}, {"le": 5, "count": 1},
+                          {"le": "+Inf", "count": 1}])
+
+    def test_summary(self):
+        """El informe ajusta bytes por mensaje y proyecta con el ritmo de creación."""
+        now = datetime.now()
+        report = CapacityReport(ttl=10 * DAY)
+        report.scanned = 40
+        for i, messages in enumerate([2, 4, 6, 8]):
+            created = (now - timedelta(days=5 if i else 0.5)).isoformat()
+            self.assertTrue(report.add(_conversation(messages, created),
+                                       1000 + 100 * messages, (i + 1) * DAY))
+        self.assertFalse(report.add(None, None, -2))
+        self.assertTrue(report.add(_conversation(1, now.isoformat(), parent_id="x", fork_at=3),
+                                   1100, -1))
+
+        summary = report.summary(used_memory=500_000, maxmemory=1_000_000)
+        self.assertEqual(summary["sampled"], 5)
+        self.assertEqual(summary["forks"], 1)
+        self.assertEqual(summary["messages"]["max"], 8)
+        self.assertEqual(summary["size_per_message"], {"bytes_per_message": 100.0,
+                                                       "base_bytes": 1000.0})
+        # 2 de 5 creadas en el último día, sobre 40 claves
+        self.assertEqual(summary["creation_rate_per_day"], 16.0)
+        self.assertEqual(summary["projection"]["steady_state_conversations"], 160)
+        horizons = summary["projection"]["horizons"]
+        self.assertEqual([h["days"] for h in horizons], [7, 30, 90])
+        # a 7 días solo sigue viva la persistente: 40 * 1/5 + 16 * 7
+        self.assertEqual(horizons[0]["conversations"], 120)
+        self.assertIsNone(summary["projection"]["days_until_maxmemory"])
+        # con un límite menor se llena al séptimo día
+        tight = report.summary(used_memory=500_000, maxmemory=600_000)
+        self.assertEqual(tight["projection"]["days_until_maxmemory"], 7)
+
+    def test_empty(self):
+        """Sin muestra no hay distribuciones ni proyección."""
+        summary = CapacityReport().summary()
+        self.assertEqual(summary["sampled"], 0)
+        self.assertNotIn("projection", summary)
+
+
+class TestCapacitySampling(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeRedis()
+        with patch('api.services.redis.redis.Redis.from_url', return_value=self.fake):
+            self.service = RedisService()
+        for i in range(5):
+            self.service.set_conversation(f"c{i}", Conversation(
+                conversation_id=f"c{i}", posture="p",
+                messages=[Message(role="user", content="hola")] * (i + 1)))
+
+    @patch('api.services.redis.time.sleep')
+    def test_capacity_report(self, mock_sleep):
+        """Se recorren todas las claves en lotes, con pausas, hasta el tamaño de muestra."""
+        progress = list(self.service.capacity_report(sample_size=3, batch_size=2, pause=0.1))
+        self.assertEqual([p["scanned"] for p in progress], [2, 4, 5])
+        final = progress[-1]
+        self.assertEqual(final["sampled"], 3)
+        self.assertEqual(final["report"]["scanned"], 5)
+        self.assertEqual(final["report"]["used_memory"], 1_000_000)
+        self.assertEqual(mock_sleep.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
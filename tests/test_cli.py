@@ -0,0 +1,74 @@
+"""
+Tests del CLI interactivo en modo offline
+Almacenamiento en memoria y servidor LLM simulado, sin red ni API key
+"""
+
+import io
+import os
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import patch
+
+import cli
+
+
+class TestInteractiveCli(unittest.TestCase):
+
+    def run_cli(self, inputs, argv=("--offline", "--token-delay", "0")):
+        """Ejecuta el CLI con las entradas dadas y devuelve lo impreso."""
+        out = io.StringIO()
+        with patch.dict(os.environ, {"OPENROUTER_API_KEY": ""}), \
+             patch("builtins.input", side_effect=list(inputs)), \
+             redirect_stdout(out):
+            cli.main(list(argv))
+        return out.getvalue()
+
+    def test_print_stream(self):
+        """Los fragmentos se imprimen según llegan y se devuelve la respuesta."""
+        events = [{"type": "start", "conversation_id": "c1", "posture": "p"},
+                  {"type": "token", "content": "Hola"},
+                  {"type": "token", "content": " mundo"},
+                  {"type": "done", "response": "Hola mundo", "usage": None}]
+        out = io.StringIO()
+        result = cli.print_stream(iter(events), out=out)
+        self.assertEqual(out.getvalue(), "> Bot: Hola mundo\n")
+        self.assertEqual(result["conversation_id"], "c1")
+        self.assertEqual(result["response"], "Hola mundo")
+
+    def test_offline_session(self):
+        """Una conversación completa en streaming y el listado de recientes."""
+        output = self.run_cli(["Los gatos mandan", "No es cierto", "/l", "/n", "/q"])
+        self.assertIn("Modo offline", output)
+        self.assertIn("> Bot: Respuesta simulada #1: Los gatos mandan", output)
+        self.assertIn("> Bot: Respuesta simulada #2: No es cierto", output)
+        self.assertIn("1 en total", output)
+        self.assertTrue(output.rstrip().endswith("Adiós!"))
+
+    def test_resume(self):
+        """/r reanuda una conversación mostrando sus últimos mensajes."""
+        with patch("api.services.discutidor3000.uuid4", return_value="c-1"):
+            output = self.run_cli(["Los gatos mandan", "/n", "/r nada",
+                                   "/r c-1", "Sigue", "/q"])
+        self.assertIn("Conversación no encontrada: nada", output)
+        self.assertIn("> Tú: Los gatos mandan", output)
+        self.assertIn("> Bot: Respuesta simulada #2: Sigue", output)
+
+    def test_resume_flag(self):
+        """--resume continúa la conversación indicada."""
+        with patch("cli.resume", return_value=True) as mock_resume, \
+             patch("cli.Discutidor3000.stream_chat", return_value=iter([])) as mock_stream:
+            self.run_cli(["Otro mensaje", "/q"],
+                         argv=("chat", "--offline", "--resume", "c-1"))
+        self.assertEqual(mock_resume.call_args.args[1], "c-1")
+        self.assertEqual(mock_stream.call_args.kwargs["conversation_id"], "c-1")
+
+    def test_stream_error(self):
+        """Un error en la conversación se informa sin cerrar el CLI."""
+        with patch("cli.Discutidor3000.stream_chat", side_effect=RuntimeError("caído")):
+            output = self.run_cli(["Los gatos mandan", "/q"])
+        self.assertIn("[!] Error en la conversación: caído", output)
+        self.assertIn("Adiós!", output)
+
+
+if __name__ == '__main__':
+    unittest.main()
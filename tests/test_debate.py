@@ -0,0 +1,158 @@
+"""
+Tests del orquestador de debates entre bots
+Turnos alternados, puntos de control en Redis y reanudación
+"""
+
+import unittest
+from unittest.mock import patch, Mock
+
+from api.services.debate import DebateOrchestrator, opposite_posture
+from api.services.discutidor3000 import Discutidor3000
+from api.services.redis import DEBATES_KEY, RedisService
+from conftest import FakeRedis
+
+
+class Crash(BaseException):
+    """Caída del proceso a mitad de un debate."""
+
+
+class TestDebateOrchestrator(unittest.TestCase):
+
+    def setUp(self):
+        """Discutidor3000 sobre un Redis en memoria y un upstream simulado."""
+        self.fake = FakeRedis()
+        with patch('api.services.discutidor3000.RedisService'):
+            self.discutidor = Discutidor3000(api_key="test_api_key")
+        with patch('api.services.redis.redis.Redis.from_url', return_value=self.fake):
+            self.discutidor.redis = RedisService()
+        self.discutidor.redis.record_usage = Mock()
+        self.calls = 0
+        self.crash_at = None
+        patcher = patch.object(self.discutidor, '_api_request', side_effect=self.upstream)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.orchestrator = DebateOrchestrator(self.discutidor, concurrency=4)
+
+    def upstream(self, messages, targets=None):
+        self.calls += 1
+        if self.calls == self.crash_at:
+            raise Crash()
+        return {"choices": [{"message": {"content": f"argumento {self.calls}"}}]}
+
+    def test_opposite_posture(self):
+        """La postura contraria por defecto niega la original."""
+        self.assertEqual(opposite_posture("La Tierra es plana"), "Es falso que la Tierra es plana")
+
+    def test_run_postures(self):
+        """Cada debate alterna turnos hasta completar las rondas."""
+        transcripts = list(self.orchestrator.run_postures(
+            [("La Tierra es plana", None), ("Los gatos mandan", "Los perros mandan")], rounds=2))
+
+        self.assertEqual(len(transcripts), 2)
+        for transcript in transcripts:
+            self.assertEqual(transcript["status"], "done")
+            self.assertEqual([t["side"] for t in transcript["turns"]], ["a", "b", "a", "b"])
+            self.assertEqual([t["round"] for t in transcript["turns"]], [1, 1, 2, 2])
+        self.assertEqual(self.calls, 8)
+        self.assertEqual(self.fake.smembers(DEBATES_KEY), set())
+
+        # cada bot recibe como mensaje el argumento del otro
+        transcript = transcripts[0]
+        conversation_b = self.discutidor.redis.get_conversation(transcript["conversation_b"])
+        self.assertEqual(conversation_b.messages[1].content, transcript["turns"][0]["content"])
+        self.assertEqual(len(conversation_b.messages), 5)
+
+    def test_resume_after_crash(self):
+        """Tras una caída, el debate se reanuda desde el último turno completado."""
+        debate_id = self.orchestrator.create("La Tierra es plana", rounds=2)
+        self.crash_at = 3
+        with self.assertRaises(Crash):
+            list(self.orchestrator.run([debate_id]))
+        self.assertEqual(self.fake.smembers(DEBATES_KEY), {debate_id})
+        self.assertEqual(len(self.discutidor.redis.get_debate(debate_id)["turns"]), 2)
+
+        self.crash_at = None
+        transcripts = list(self.orchestrator.resume())
+
+        self.assertEqual(transcripts[0]["status"], "done")
+        self.assertEqual(len(transcripts[0]["turns"]), 4)
+        conversation_a = self.discutidor.redis.get_conversation(transcripts[0]["conversation_a"])
+        # el mensaje del turno interrumpido no se duplica
+        self.assertEqual([m.role for m in conversation_a.messages],
+                         ["system", "user", "assistant", "user", "assistant"])
+
+    def test_resume_recovers_completed_turn(self):
+        """Un turno generado pero no registrado en el punto de control no se repite."""
+        debate_id = self.orchestrator.create("La Tierra es plana", rounds=1)
+        list(self.orchestrator.run([debate_id]))
+        state = self.discutidor.redis.get_debate(debate_id)
+        state["turns"], state["status"] = state["turns"][:1], "running"
+        self.discutidor.redis.save_debate(debate_id, state)
+
+        calls = self.calls
+        transcripts = list(self.orchestrator.resume())
+
+        self.assertEqual(self.calls, calls)
+        self.assertEqual(len(transcripts[0]["turns"]), 2)
+
+    def test_debate_locked_by_other_worker(self):
+        """Un debate bloqueado por otro worker no se ejecuta."""
+        debate_id = self.orchestrator.create("La Tierra es plana", rounds=1)
+        self.discutidor.redis.lock_debate(debate_id, "otro:1")
+        self.assertEqual(list(self.orchestrator.run([debate_id])), [])
+        self.assertEqual(self.calls, 0)
+
+    def test_lock_owner_checks(self):
+        """Solo el dueño renueva o libera el bloqueo de un debate."""
+        store = self.discutidor.redis
+        self.assertTrue(store.lock_debate("d", "w:1"))
+        self.assertTrue(store.lock_debate("d", "w:1"))
+        self.assertFalse(store.lock_debate("d", "w:2"))
+        store.unlock_debate("d", "w:2")
+        self.assertEqual(self.fake.get("debate:{d}:lock"), "w:1")
+        store.unlock_debate("d", "w:1")
+        self.assertIsNone(self.fake.get("debate:{d}:lock"))
+
+    def test_lost_lock_stops_debate(self):
+        """Si otro worker toma el bloqueo a mitad del debate, este se detiene
+        sin pisar su estado ni liberar su bloqueo."""
+        debate_id = self.orchestrator.create("La Tierra es plana", rounds=2)
+        lock = f"debate:{{{debate_id}}}:lock"
+
+        def steal(messages, targets=None):
+            self.fake.data[lock] = "otro:1"
+            return self.upstream(messages, targets)
+
+        self.discutidor._api_request.side_effect = steal
+        self.assertEqual(list(self.orchestrator.run([debate_id])), [])
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.fake.get(lock), "otro:1")
+        self.assertEqual(self.discutidor.redis.get_debate(debate_id)["status"], "running")
+
+    def test_storage_error_skips_only_that_debate(self):
+        """Un error de Redis en un debate no impide emitir los demás."""
+        first = self.orchestrator.create("La Tierra es plana", rounds=1)
+        second = self.orchestrator.create("Los gatos mandan", rounds=1)
+        lock_debate = self.discutidor.redis.lock_debate
+
+        def failing_lock(debate_id, *args):
+            if debate_id == first:
+                raise ConnectionError("Redis no disponible")
+            return lock_debate(debate_id, *args)
+
+        with patch.object(self.discutidor.redis, 'lock_debate', side_effect=failing_lock):
+            transcripts = list(self.orchestrator.run([first, second]))
+        self.assertEqual([t["debate_id"] for t in transcripts], [second])
+
+    def test_upstream_failure(self):
+        """Sin respuesta del upstream el debate termina como fallido."""
+        self.discutidor._api_request.side_effect = None
+        self.discutidor._api_request.return_value = None
+        transcripts = list(self.orchestrator.run_postures([("La Tierra es plana", None)]))
+        self.assertEqual(transcripts[0]["status"], "failed")
+        self.assertIn("turno 1", transcripts[0]["error"])
+        self.assertEqual(self.fake.smembers(DEBATES_KEY), set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,8 +10,12 @@ import pytest
 
 from api.services.discutidor3000 import (
     Discutidor3000, 
+    BackendNotFoundError,
     ConversationNotFoundError, 
-    PostureExtractionError
+    InvalidForkError,
+    ModelNotAllowedError,
+    PostureExtractionError,
+    StorageWriteError
 )
 from api.structures import ChatResponse, Message, Conversation
 
@@ -44,7 +48,7 @@ class TestDiscutidor3000(unittest.TestCase):
         self.assertIn(posture, prompt)
         self.assertIn("defender la postura", prompt)
 
-    @patch('api.services.discutidor3000.requests.post')
+    @patch('api.services.backends.requests.Session.post')
     def test_api_request_success(self, mock_post):
         """Test de solicitud exitosa a API."""
         mock_response = Mock()
@@ -58,7 +62,7 @@ class TestDiscutidor3000(unittest.TestCase):
         self.assertIsNotNone(result)
         self.assertEqual(result["choices"][0]["message"]["content"], "Test response")
 
-    @patch('api.services.discutidor3000.requests.post')
+    @patch('api.services.backends.requests.Session.post')
     def test_api_request_error(self, mock_post):
         """Test de error en API request."""
         mock_response = Mock()
@@ -69,7 +73,7 @@ class TestDiscutidor3000(unittest.TestCase):
         result = self.discutidor._api_request([{"role": "user", "content": "test"}])
         self.assertIsNone(result)
 
-    @patch('api.services.discutidor3000.requests.post')
+    @patch('api.services.backends.requests.Session.post')
     def test_api_request_with_json_format(self, mock_post):
         """Test de request con formato JSON."""
         mock_response = Mock()
@@ -85,6 +89,104 @@ class TestDiscutidor3000(unittest.TestCase):
         )
         self.assertIsNotNone(result)
 
+    @patch('api.services.backends.requests.Session.post')
+    def test_api_request_provider_preference(self, mock_post):
+        """Test de preferencia de proveedor según el destino."""
+        with patch.dict('os.environ', {"LLM_TARGETS": "model-a@provider-x,model-b"}):
+            with patch('api.services.discutidor3000.RedisService'):
+                discutidor = Discutidor3000(api_key=self.api_key)
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {
+            "choices": [{"message": {"content": "Test response"}}]
+        }
+        mock_post.return_value = mock_response
+
+        discutidor._api_request([{"role": "user", "content": "test"}])
+        payload = mock_post.call_args.kwargs["json"]
+        self.assertEqual(payload["model"], "model-a")
+        self.assertEqual(payload["provider"]["order"], ["provider-x"])
+
+    @patch('api.services.backends.requests.Session.post')
+    def test_api_request_local_backend(self, mock_post):
+        """Test de conversación fijada a un backend local."""
+        env = {"LOCAL_LLM_BASE_URL": "http://localhost:8080/v1", "LLM_BACKEND": "local",
+               "LLM_ALLOWED_MODELS": "llama3"}
+        with patch.dict('os.environ', env):
+            with patch('api.services.discutidor3000.RedisService'):
+                discutidor = Discutidor3000(api_key=None)
+        mock_post.return_value = Mock(status_code=200)
+        mock_post.return_value.json.return_value = {
+            "choices": [{"message": {"content": "Test response"}}]
+        }
+
+        targets = discutidor._select_targets("local", "llama3")
+        discutidor._api_request([{"role": "user", "content": "test"}],
+                                use_json=True, targets=targets)
+        self.assertEqual(mock_post.call_args.kwargs["url"],
+                         "http://localhost:8080/v1/chat/completions")
+        payload = mock_post.call_args.kwargs["json"]
+        self.assertEqual(payload["model"], "llama3")
+        self.assertNotIn("response_format", payload)
+
+    def test_select_targets_unknown_backend(self):
+        """Test de backend no configurado."""
+        with self.assertRaises(BackendNotFoundError):
+            self.discutidor._select_targets("desconocido")
+
+    def test_select_targets_model_not_allowed(self):
+        """Un modelo no configurado ni permitido no se fija."""
+        with self.assertRaises(ModelNotAllowedError):
+            self.discutidor._select_targets(model="caro/modelo-arbitrario")
+        self.assertEqual(self.discutidor.router.pinned, [])
+
+    def test_select_targets_pinned_once(self):
+        """Un modelo permitido se fija una sola vez aunque se pida varias."""
+        self.discutidor.allowed_models.add("otro/modelo")
+        first = self.discutidor._select_targets(model="otro/modelo")
+        second = self.discutidor._select_targets(model="otro/modelo")
+        self.assertIs(first[0], second[0])
+        self.assertEqual(len(self.discutidor.router.pinned), 1)
+
+    def test_select_targets_default(self):
+        """Sin preferencia se usan todos los destinos."""
+        self.assertIsNone(self.discutidor._select_targets())
+        targets = self.discutidor._select_targets(model=self.discutidor.model)
+        self.assertEqual(targets, self.discutidor.router.targets)
+
+    def test_check_readiness(self):
+        """Test de readiness con caché del estado del upstream."""
+        self.discutidor.redis.ping.return_value = {"ok": True, "latency_ms": 1.0}
+        with patch.object(self.discutidor.backends["openrouter"], 'ping') as mock_ping:
+            mock_ping.return_value = {"reachable": True, "latency_ms": 10.0}
+            
+            self.assertTrue(self.discutidor.check_readiness()["ready"])
+            self.assertTrue(self.discutidor.check_readiness()["ready"])
+            mock_ping.assert_called_once()
+
+    def test_check_readiness_slow_redis(self):
+        """Redis por encima del umbral de latencia no está listo."""
+        self.discutidor.redis.ping.return_value = {"ok": True, "latency_ms": 10_000.0}
+        self.discutidor._upstream_status = (float("inf"), {"openrouter": {"reachable": True}})
+        
+        self.assertFalse(self.discutidor.check_readiness()["ready"])
+
+    def test_warmup(self):
+        """Test de precalentamiento de Redis y backends."""
+        self.discutidor.redis.warmup.return_value = True
+        with patch.object(self.discutidor.backends["openrouter"], 'ping') as mock_ping:
+            with patch.object(self.discutidor.backends["openrouter"], 'warmup') as mock_warmup:
+                mock_ping.return_value = {"reachable": True, "latency_ms": 10.0}
+                
+                report = self.discutidor.warmup()
+                self.assertTrue(report["redis"])
+                mock_warmup.assert_called_once()
+
+    def test_get_router_stats(self):
+        """Test de estadísticas por destino."""
+        stats = self.discutidor.get_router_stats()
+        self.assertEqual(stats[0]["model"], self.discutidor.model)
+
     @patch.object(Discutidor3000, '_api_request')
     def test_get_posture_success(self, mock_api_request):
         """Test de extracción exitosa de postura."""
@@ -95,6 +197,31 @@ class TestDiscutidor3000(unittest.TestCase):
         result = self.discutidor._get_posture("Defend that Python is better")
         self.assertEqual(result, "Test posture")
 
+    @patch.object(Discutidor3000, '_api_request')
+    def test_get_posture_records_usage(self, mock_api_request):
+        """El consumo de la extracción se atribuye a la conversación y al cliente."""
+        mock_api_request.return_value = {
+            "model": "m1",
+            "choices": [{"message": {"content": '{"posture": "Test posture"}'}}],
+            "usage": {"prompt_tokens": 30, "completion_tokens": 5}
+        }
+        with patch.object(self.discutidor.redis, 'record_usage') as mock_record:
+            self.discutidor._get_posture("Test message", conversation_id="c1",
+                                         client_id="acme")
+        conversation_id, client_id, model, usage, _ = mock_record.call_args.args
+        self.assertEqual((conversation_id, client_id, model), ("c1", "acme", "m1"))
+        self.assertEqual((usage["prompt_tokens"], usage["completion_tokens"]), (30, 5))
+
+    @patch.object(Discutidor3000, '_api_request')
+    def test_get_posture_wrapped_json(self, mock_api_request):
+        """Test de postura devuelta sin modo JSON, envuelta en texto."""
+        mock_api_request.return_value = {
+            "choices": [{"message": {"content": 'Claro: {"posture": "Test posture"}'}}]
+        }
+
+        result = self.discutidor._get_posture("Defend that Python is better")
+        self.assertEqual(result, "Test posture")
+
     @patch.object(Discutidor3000, '_api_request')
     def test_get_posture_api_error(self, mock_api_request):
         """Test de error en extracción de postura."""
@@ -153,6 +280,36 @@ class TestDiscutidor3000(unittest.TestCase):
                     self.assertIsNotNone(result)
                     self.assertEqual(result["response"], "Bot response")
 
+    def test_record_usage(self):
+        """Test de acumulación de consumo en la conversación."""
+        self.discutidor.pricing = {"model-a": {"prompt": 1.0, "cached": 0.1, "completion": 2.0}}
+        conversation = Conversation(
+            conversation_id="test_id",
+            posture="Test posture",
+            messages=[],
+            client_id="client-a"
+        )
+        response = {"model": "model-a",
+                    "usage": {"prompt_tokens": 1000, "completion_tokens": 500,
+                              "prompt_tokens_details": {"cached_tokens": 800}}}
+        
+        with patch.object(self.discutidor.redis, 'record_usage') as mock_record:
+            self.discutidor._record_usage(conversation, response)
+            self.discutidor._record_usage(conversation, response)
+            mock_record.assert_called_with(
+                "test_id", "client-a", "model-a",
+                {"prompt_tokens": 1000, "completion_tokens": 500, "cached_tokens": 800},
+                self.discutidor._compute_cost("model-a", {"prompt_tokens": 1000,
+                                                          "completion_tokens": 500,
+                                                          "cached_tokens": 800}))
+        self.assertEqual(conversation.usage.prompt_tokens, 2000)
+        self.assertEqual(conversation.usage.cached_tokens, 1600)
+        self.assertAlmostEqual(conversation.usage.cost, 2 * (200 + 80 + 1000) / 1_000_000)
+
+    def test_compute_cost_unknown_model(self):
+        """Sin precios configurados el costo es cero."""
+        self.assertEqual(self.discutidor._compute_cost("unknown", {"prompt_tokens": 10}), 0.0)
+
     def test_gen_response_not_found(self):
         """Test de respuesta cuando no se encuentra conversación."""
         with patch.object(self.discutidor.redis, 'get_conversation') as mock_get:
@@ -236,6 +393,20 @@ class TestDiscutidor3000(unittest.TestCase):
                     result = self.discutidor.continue_conversation("test_id", "New message")
                     self.assertIsNotNone(result)
 
+    @patch.object(Discutidor3000, '_api_request')
+    def test_user_message_not_saved(self, mock_request):
+        """Si el mensaje del usuario no se guarda, no se llama al LLM."""
+        conversation = Conversation(conversation_id="test_id", posture="Test posture",
+                                    messages=[Message(role="user", content="Previous message")])
+        self.discutidor.redis.get_conversation.return_value = conversation
+        self.discutidor.redis.set_conversation.return_value = False
+
+        with self.assertRaises(StorageWriteError):
+            self.discutidor.continue_conversation("test_id", "New message")
+        with self.assertRaises(StorageWriteError):
+            self.discutidor.open_conversation("new_id", "Test posture", "Hola")
+        mock_request.assert_not_called()
+
     def test_continue_conversation_not_found(self):
         """Test de continuar conversación inexistente."""
         with patch.object(self.discutidor.redis, 'get_conversation') as mock_get:
@@ -277,5 +448,119 @@ class TestDiscutidor3000(unittest.TestCase):
             result = self.discutidor.get_all_conversations()
             self.assertIsNone(result)
 
+    def test_delete_conversation(self):
+        """Test de borrado de una conversación inexistente."""
+        self.discutidor.redis.delete_conversation.return_value = False
+        with self.assertRaises(ConversationNotFoundError):
+            self.discutidor.delete_conversation("test_id")
+
+    def test_start_purge(self):
+        """La purga corre en segundo plano y guarda su progreso."""
+        self.discutidor.redis.purge_conversations.return_value = iter(
+            [{"scanned": 2, "matched": 1, "deleted": 1}])
+        with patch('api.services.discutidor3000.threading.Thread') as mock_thread:
+            job_id = self.discutidor.start_purge(posture="tierra")
+        target = mock_thread.call_args.kwargs["target"]
+        target(*mock_thread.call_args.kwargs["args"])
+
+        saved = [c.args[1] for c in self.discutidor.redis.save_purge_progress.call_args_list]
+        self.assertEqual(saved[0]["status"], "running")
+        self.assertEqual(saved[1]["deleted"], 1)
+        self.assertEqual(saved[-1]["status"], "done")
+        self.assertTrue(all(c.args[0] == job_id
+                            for c in self.discutidor.redis.save_purge_progress.call_args_list))
+
+    def _parent(self, **kwargs):
+        return Conversation(
+            conversation_id="parent", posture="Test posture", client_id="c1",
+            messages=[Message(role="system" if i == 0 else "user", content=str(i))
+                      for i in range(6)],
+            **kwargs)
+
+    def test_fork_conversation(self):
+        """La bifurcación referencia el prefijo de la conversación original."""
+        self.discutidor.redis.get_conversation.return_value = self._parent()
+        fork = self.discutidor.fork_conversation("parent", at=5)
+        self.assertEqual(fork.parent_id, "parent")
+        self.assertEqual(fork.ancestors, ["parent"])
+        self.assertEqual(fork.fork_at, 5)
+        self.assertEqual(len(fork.messages), 5)
+        self.assertEqual(fork.client_id, "c1")
+        self.discutidor.redis.set_conversation.assert_called_once_with(fork.conversation_id, fork)
+
+    def test_fork_conversation_reuses_ancestor(self):
+        """Si el prefijo está entero en el antecesor, se referencia a este."""
+        self.discutidor.redis.get_conversation.return_value = self._parent(
+            parent_id="root", fork_at=5, ancestors=["root"])
+        fork = self.discutidor.fork_conversation("parent", at=4)
+        self.assertEqual(fork.parent_id, "root")
+        self.assertEqual(fork.ancestors, ["root"])
+
+    def test_fork_conversation_copies(self):
+        """Los prefijos cortos y las cadenas demasiado profundas se copian."""
+        self.discutidor.fork_max_depth = 2
+        self.discutidor.redis.get_conversation.return_value = self._parent(
+            parent_id="b", fork_at=2, ancestors=["a", "b"])
+        deep = self.discutidor.fork_conversation("parent")
+        short = self.discutidor.fork_conversation("parent", at=2)
+        for fork in (deep, short):
+            self.assertIsNone(fork.parent_id)
+            self.assertEqual(fork.fork_at, 0)
+        self.assertEqual(len(deep.messages), 6)
+
+    def test_fork_conversation_errors(self):
+        """Errores de conversación inexistente y de punto de bifurcación."""
+        self.discutidor.redis.get_conversation.return_value = None
+        with self.assertRaises(ConversationNotFoundError):
+            self.discutidor.fork_conversation("parent")
+        self.discutidor.redis.get_conversation.return_value = self._parent()
+        with self.assertRaises(InvalidForkError):
+            self.discutidor.fork_conversation("parent", at=7)
+
+    def test_get_messages(self):
+        """Historial paginado sin el prompt de sistema, con cursor."""
+        self.discutidor.redis.get_conversation_version.return_value = 7
+        self.discutidor.redis.get_conversation.return_value = self._parent()
+
+        page = self.discutidor.get_messages("parent", limit=2)
+        self.assertEqual(page["version"], 7)
+        self.assertEqual(page["total"], 5)
+        self.assertEqual([m["index"] for m in page["messages"]], [1, 2])
+        self.assertEqual(page["next_cursor"], 2)
+
+        delta = self.discutidor.get_messages("parent", since=page["next_cursor"], limit=10)
+        self.assertEqual([m["index"] for m in delta["messages"]], [3, 4, 5])
+        self.assertIsNone(delta["next_cursor"])
+        self.assertEqual(self.discutidor.get_messages("parent", offset=1, limit=1)
+                         ["messages"][0]["index"], 2)
+
+    def test_get_messages_without_version(self):
+        """Las conversaciones sin contador de versión lo inicializan."""
+        self.discutidor.redis.get_conversation_version.return_value = None
+        self.discutidor.redis.get_conversation.return_value = self._parent()
+        self.discutidor.redis.init_conversation_version.return_value = 1
+        self.assertEqual(self.discutidor.get_messages("parent")["version"], 1)
+
+        self.discutidor.redis.get_conversation.return_value = None
+        with self.assertRaises(ConversationNotFoundError):
+            self.discutidor.get_messages("parent")
+
+    def test_gen_response_turn_event(self):
+        """La respuesta se guarda junto con su evento de turno."""
+        self.discutidor.redis.get_conversation.return_value = Conversation(
+            conversation_id="test_id", posture="p", client_id="c1",
+            messages=[Message(role="system", content="s"), Message(role="user", content="u")])
+        with patch.object(self.discutidor, '_api_request') as mock_api:
+            mock_api.return_value = {"choices": [{"message": {"content": "respuesta"}}],
+                                     "usage": {"prompt_tokens": 7, "completion_tokens": 3}}
+            self.discutidor._gen_response("test_id")
+
+        event = self.discutidor.redis.set_conversation.call_args.kwargs["event"]
+        self.assertEqual(event["role"], "assistant")
+        self.assertEqual(event["length"], "9")
+        self.assertEqual(event["prompt_tokens"], "7")
+        self.assertEqual(event["client_id"], "c1")
+        self.assertIn("latency_ms", event)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -9,26 +9,43 @@ from unittest.mock import patch, Mock
 from fastapi.testclient import TestClient
 from fastapi import FastAPI
 
-from api.endpoints.endpoints import chat_router
-from api.services.discutidor3000 import ConversationNotFoundError, PostureExtractionError
-from api.structures import ChatResponse, Message
+from api.endpoints import admin_router, chat_router, get_discutidor
+from api.endpoints.encoding import negotiate_encoding
+from api.telemetry.profiling import profiler
+from api.services.discutidor3000 import (
+    BackendNotFoundError,
+    ConversationNotFoundError,
+    InvalidForkError,
+    PostureExtractionError,
+    StorageWriteError
+)
+from api.structures import ChatResponse, Conversation, Message
 
 # Crear una aplicación FastAPI para testing
 app = FastAPI()
 app.include_router(chat_router, prefix="/api/v1")
+app.include_router(admin_router, prefix="/api/v1/admin")
 client = TestClient(app)
 
 class TestEndpoints(unittest.TestCase):
 
+    def setUp(self):
+        """Inyecta un Discutidor3000 simulado en lugar del creado en el lifespan."""
+        self.discutidor = Mock()
+        app.dependency_overrides[get_discutidor] = lambda: self.discutidor
+
+    def tearDown(self):
+        app.dependency_overrides.clear()
+
     def test_hola_endpoint(self):
         """Test del endpoint raíz."""
         response = client.get("/api/v1/")
         self.assertEqual(response.status_code, 200)
         self.assertIn("Discutidor3000 API", response.json()["mensaje"])
 
-    @patch('api.endpoints.endpoints.discutidor')
-    def test_chat_endpoint_success(self, mock_discutidor):
+    def test_chat_endpoint_success(self):
         """Test del endpoint de chat exitoso."""
+        mock_discutidor = self.discutidor
         mock_response = ChatResponse(
             conversation_id="test_id",
             message=[Message(role="user", content="Test message")]
@@ -43,9 +60,9 @@ class TestEndpoints(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn("conversation_id", response.json())
 
-    @patch('api.endpoints.endpoints.discutidor')
-    def test_chat_endpoint_none_response(self, mock_discutidor):
+    def test_chat_endpoint_none_response(self):
         """Test del endpoint de chat con respuesta None."""
+        mock_discutidor = self.discutidor
         mock_discutidor.chat.return_value = None
         
         response = client.post(
@@ -55,9 +72,9 @@ class TestEndpoints(unittest.TestCase):
         
         self.assertEqual(response.status_code, 500)
 
-    @patch('api.endpoints.endpoints.discutidor')
-    def test_chat_endpoint_conversation_not_found(self, mock_discutidor):
+    def test_chat_endpoint_conversation_not_found(self):
         """Test del endpoint de chat con conversación no encontrada."""
+        mock_discutidor = self.discutidor
         mock_discutidor.chat.side_effect = ConversationNotFoundError("Conversation not found")
         
         response = client.post(
@@ -67,9 +84,9 @@ class TestEndpoints(unittest.TestCase):
         
         self.assertEqual(response.status_code, 404)
 
-    @patch('api.endpoints.endpoints.discutidor')
-    def test_chat_endpoint_posture_extraction_error(self, mock_discutidor):
+    def test_chat_endpoint_posture_extraction_error(self):
         """Test del endpoint de chat con error de extracción de postura."""
+        mock_discutidor = self.discutidor
         mock_discutidor.chat.side_effect = PostureExtractionError("Cannot extract posture")
         
         response = client.post(
@@ -79,9 +96,21 @@ class TestEndpoints(unittest.TestCase):
         
         self.assertEqual(response.status_code, 500)
 
-    @patch('api.endpoints.endpoints.discutidor')
-    def test_chat_endpoint_generic_error(self, mock_discutidor):
+    def test_chat_endpoint_backend_not_found(self):
+        """Test del endpoint de chat con backend no configurado."""
+        mock_discutidor = self.discutidor
+        mock_discutidor.chat.side_effect = BackendNotFoundError("Backend no configurado: x")
+        
+        response = client.post(
+            "/api/v1/chat",
+            json={"message": "Test message", "backend": "x"}
+        )
+        
+        self.assertEqual(response.status_code, 400)
+
+    def test_chat_endpoint_generic_error(self):
         """Test del endpoint de chat con error genérico."""
+        mock_discutidor = self.discutidor
         mock_discutidor.chat.side_effect = Exception("Generic error")
         
         response = client.post(
@@ -91,36 +120,237 @@ class TestEndpoints(unittest.TestCase):
         
         self.assertEqual(response.status_code, 500)
 
-    @patch('api.endpoints.endpoints.discutidor')
-    def test_conversations_endpoint_success(self, mock_discutidor):
-        """Test del endpoint de conversaciones exitoso."""
-        mock_discutidor.get_all_conversations.return_value = {
-            "conversations": ["conversation:1", "conversation:2"]
-        }
+    def test_conversations_endpoint_success(self):
+        """Sin postura se devuelve una página de las conversaciones más recientes."""
+        self.discutidor.list_conversations.return_value = {
+            "total": 3, "conversations": [{"conversation_id": "c", "posture": "p",
+                                           "messages": 2, "last_updated": ""}]}
+
+        response = client.get("/api/v1/conversations?limit=1&offset=2")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["total"], 3)
+        self.assertEqual(response.json()["conversations"][0]["conversation_id"], "c")
+        self.discutidor.list_conversations.assert_called_once_with(limit=1, offset=2)
+        self.discutidor.get_all_conversations.assert_not_called()
+
+    def test_conversations_endpoint_default_page(self):
+        """Sin parámetros se usa la página por defecto."""
+        self.discutidor.list_conversations.return_value = {"total": 0, "conversations": []}
+
+        response = client.get("/api/v1/conversations")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"total": 0, "conversations": []})
+        self.discutidor.list_conversations.assert_called_once_with(limit=100, offset=0)
+
+    def test_conversations_endpoint_error(self):
+        """Test del endpoint de conversaciones con error."""
+        mock_discutidor = self.discutidor
+        mock_discutidor.list_conversations.side_effect = Exception("Database error")
         
         response = client.get("/api/v1/conversations")
         
+        self.assertEqual(response.status_code, 500)
+
+    def test_conversations_by_posture(self):
+        """Con `posture` se responde desde el índice de posturas."""
+        self.discutidor.find_conversations.return_value = {
+            "posture": "la tierra es plana", "total": 1, "conversations": ["a"]}
+
+        response = client.get("/api/v1/conversations?posture=La%20Tierra%20es%20plana&limit=5")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["conversations"], ["a"])
+        self.discutidor.find_conversations.assert_called_once_with(
+            "La Tierra es plana", limit=5, offset=0)
+        self.discutidor.get_all_conversations.assert_not_called()
+
+    def test_search_conversations(self):
+        """Búsqueda por prefijo o palabras clave en el índice."""
+        self.discutidor.search_postures.return_value = {"query": "tierra", "postures": []}
+
+        response = client.get("/api/v1/conversations/search?q=tierra&mode=keywords")
+        self.assertEqual(response.status_code, 200)
+        self.discutidor.search_postures.assert_called_once_with("tierra", mode="keywords",
+                                                                limit=20)
+        invalid = client.get("/api/v1/conversations/search?q=tierra&mode=regex")
+        self.assertEqual(invalid.status_code, 422)
+
+    def test_messages_endpoint(self):
+        """El historial se devuelve con un ETag derivado de la versión."""
+        self.discutidor.get_messages.return_value = {
+            "conversation_id": "test_id", "version": 3, "total": 1,
+            "messages": [{"index": 1, "role": "user", "content": "hola"}], "next_cursor": None}
+
+        response = client.get("/api/v1/conversations/test_id/messages?since=0&limit=10")
+
         self.assertEqual(response.status_code, 200)
-        self.assertIn("conversations", response.json())
+        self.assertEqual(response.headers["etag"], 'W/"3"')
+        self.discutidor.get_messages.assert_called_once_with("test_id", offset=0, limit=10,
+                                                             since=0)
+
+    def test_messages_endpoint_compression(self):
+        """Las respuestas grandes se comprimen según Accept-Encoding; las pequeñas no."""
+        self.discutidor.get_messages.return_value = {
+            "conversation_id": "test_id", "version": 3, "total": 50, "next_cursor": None,
+            "messages": [{"index": i, "role": "user", "content": "argumento " * 20}
+                         for i in range(1, 51)]}
+
+        compressed = client.get("/api/v1/conversations/test_id/messages",
+                                headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(compressed.headers["content-encoding"], "gzip")
+        self.assertEqual(compressed.headers["vary"], "Accept-Encoding")
+        self.assertEqual(len(compressed.json()["messages"]), 50)
+        self.assertTrue(compressed.headers["etag"].startswith("W/"))
+
+        identity = client.get("/api/v1/conversations/test_id/messages",
+                              headers={"Accept-Encoding": "gzip;q=0, identity"})
+        self.assertNotIn("content-encoding", identity.headers)
+        with patch.dict(os.environ, {"COMPRESS_MIN_BYTES": "1000000"}):
+            small = client.get("/api/v1/conversations/test_id/messages",
+                               headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("content-encoding", small.headers)
+
+    def test_negotiate_encoding(self):
+        """Se elige la codificación disponible con mayor peso; brotli solo si está instalado."""
+        with patch('api.endpoints.encoding.brotli', Mock()):
+            self.assertEqual(negotiate_encoding("gzip, deflate, br"), "br")
+            self.assertEqual(negotiate_encoding("br;q=0.5, gzip"), "gzip")
+        with patch('api.endpoints.encoding.brotli', None):
+            self.assertEqual(negotiate_encoding("br, gzip;q=0.5"), "gzip")
+            self.assertIsNone(negotiate_encoding("br"))
+            self.assertEqual(negotiate_encoding("*"), "gzip")
+        self.assertIsNone(negotiate_encoding("identity"))
+        self.assertIsNone(negotiate_encoding(None))
+
+    def test_messages_endpoint_not_modified(self):
+        """Con If-None-Match vigente se responde 304 sin leer la conversación."""
+        self.discutidor.get_conversation_version.return_value = 3
+
+        response = client.get("/api/v1/conversations/test_id/messages",
+                              headers={"If-None-Match": 'W/"2", "3"'})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["etag"], 'W/"3"')
+        self.assertEqual(response.headers["cache-control"], "no-cache")
+        self.discutidor.get_messages.assert_not_called()
 
-    @patch('api.endpoints.endpoints.discutidor')
-    def test_conversations_endpoint_none_result(self, mock_discutidor):
-        """Test del endpoint de conversaciones con resultado None."""
-        mock_discutidor.get_all_conversations.return_value = None
+    def test_messages_endpoint_not_found(self):
+        """404 si la conversación no existe."""
+        self.discutidor.get_conversation_version.return_value = None
+        self.discutidor.get_messages.side_effect = ConversationNotFoundError("No existe")
+        response = client.get("/api/v1/conversations/x/messages",
+                              headers={"If-None-Match": '"1"'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_fork_conversation_endpoint(self):
+        """La bifurcación responde 201 con el ID de la nueva conversación."""
+        self.discutidor.fork_conversation.return_value = Conversation(
+            conversation_id="fork", posture="p", parent_id="test_id", fork_at=4,
+            messages=[Message(role="user", content="m")] * 4)
+
+        response = client.post("/api/v1/conversations/test_id/fork?at=4")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {"conversation_id": "fork", "forked_from": "test_id",
+                                           "messages": 4, "shared": 4})
+        self.discutidor.fork_conversation.assert_called_once_with("test_id", at=4,
+                                                                  client_id=None)
+
+    def test_fork_conversation_endpoint_errors(self):
+        """404 si no existe, 400 si el punto de bifurcación no es válido."""
+        self.discutidor.fork_conversation.side_effect = ConversationNotFoundError("No existe")
+        self.assertEqual(client.post("/api/v1/conversations/x/fork").status_code, 404)
+        self.discutidor.fork_conversation.side_effect = InvalidForkError("Fuera de rango")
+        self.assertEqual(client.post("/api/v1/conversations/x/fork?at=99").status_code, 400)
+        self.assertEqual(client.post("/api/v1/conversations/x/fork?at=0").status_code, 422)
+
+    def test_delete_conversation_endpoint(self):
+        """Test de borrado de una conversación."""
+        response = client.delete("/api/v1/conversations/test_id")
+        self.assertEqual(response.status_code, 204)
+        self.discutidor.delete_conversation.assert_called_once_with("test_id")
+
+    def test_delete_conversation_not_found(self):
+        """Test de borrado de una conversación inexistente."""
+        self.discutidor.delete_conversation.side_effect = ConversationNotFoundError("No existe")
+        response = client.delete("/api/v1/conversations/test_id")
+        self.assertEqual(response.status_code, 404)
+
+    def test_router_stats_endpoint(self):
+        """Test del endpoint de estadísticas del enrutador."""
+        mock_discutidor = self.discutidor
+        mock_discutidor.get_router_stats.return_value = [{"target": "model-a"}]
+
+        response = client.get("/api/v1/router/stats")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["targets"][0]["target"], "model-a")
+
+    def test_storage_stats_endpoint(self):
+        """Test del endpoint de métricas del almacenamiento."""
+        self.discutidor.get_storage_stats.return_value = {
+            "backend": "redis", "write_buffer": {"flushes": 3, "writes_per_flush": 4.0}}
+
+        response = client.get("/api/v1/storage/stats")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["write_buffer"]["flushes"], 3)
+
+    def test_chat_endpoint_storage_error(self):
+        """Test del endpoint de chat cuando no se puede guardar el mensaje."""
+        self.discutidor.chat.side_effect = StorageWriteError("No se pudo guardar")
+
+        response = client.post("/api/v1/chat", json={"message": "Test message"})
+
+        self.assertEqual(response.status_code, 503)
+
+    def test_chat_endpoint_client_id(self):
+        """El cliente se toma de la cabecera X-Client-Id."""
+        mock_discutidor = self.discutidor
+        mock_discutidor.chat.return_value = ChatResponse(conversation_id="test_id", message=[])
         
-        response = client.get("/api/v1/conversations")
+        client.post("/api/v1/chat", json={"message": "Test message"},
+                    headers={"X-Client-Id": "client-a"})
         
+        self.assertEqual(mock_discutidor.chat.call_args.kwargs["client_id"], "client-a")
+
+    def test_chat_endpoint_speculative_opt_out(self):
+        """`speculative: false` se pasa al chatbot (por defecto, True)."""
+        mock_discutidor = self.discutidor
+        mock_discutidor.chat.return_value = ChatResponse(conversation_id="test_id", message=[])
+
+        client.post("/api/v1/chat", json={"message": "Test message"})
+        self.assertTrue(mock_discutidor.chat.call_args.kwargs["speculative"])
+        client.post("/api/v1/chat", json={"message": "Test message", "speculative": False})
+        self.assertFalse(mock_discutidor.chat.call_args.kwargs["speculative"])
+
+    def test_opening_stats_endpoint(self):
+        """Test del endpoint de métricas de las aperturas pregeneradas."""
+        self.discutidor.get_opening_stats.return_value = {"enabled": True, "hits": 7}
+
+        response = client.get("/api/v1/openings/stats")
+
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.json()["conversations"], {})
+        self.assertEqual(response.json()["hits"], 7)
 
-    @patch('api.endpoints.endpoints.discutidor')
-    def test_conversations_endpoint_error(self, mock_discutidor):
-        """Test del endpoint de conversaciones con error."""
-        mock_discutidor.get_all_conversations.side_effect = Exception("Database error")
+    def test_top_usage_endpoint(self):
+        """Test del endpoint de mayores consumidores."""
+        mock_discutidor = self.discutidor
+        mock_discutidor.get_top_usage.return_value = [{"id": "client-a", "total_tokens": 10}]
         
-        response = client.get("/api/v1/conversations")
+        response = client.get("/api/v1/usage/top?by=models&days=7")
         
-        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["top"][0]["id"], "client-a")
+        mock_discutidor.get_top_usage.assert_called_once_with(dimension="models", days=7, limit=10)
+
+    def test_top_usage_endpoint_invalid_dimension(self):
+        """Test del endpoint de consumo con dimensión inválida."""
+        response = client.get("/api/v1/usage/top?by=postures")
+        
+        self.assertEqual(response.status_code, 422)
 
     def test_chat_endpoint_invalid_request(self):
         """Test del endpoint de chat con request inválido."""
@@ -128,5 +358,171 @@ class TestEndpoints(unittest.TestCase):
         
         self.assertEqual(response.status_code, 422)  # Validation error
 
+class TestAdminEndpoints(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch.dict('os.environ', {"ADMIN_TOKEN": "secreto"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(profiler.stop)
+        self.headers = {"X-Admin-Token": "secreto"}
+
+    def test_admin_disabled_without_token(self):
+        """Sin ADMIN_TOKEN los endpoints de administración están deshabilitados."""
+        with patch.dict('os.environ', {"ADMIN_TOKEN": ""}):
+            response = client.get("/api/v1/admin/profiling", headers=self.headers)
+        self.assertEqual(response.status_code, 403)
+
+    def test_admin_invalid_token(self):
+        """Test de token de administración inválido."""
+        response = client.get("/api/v1/admin/profiling", headers={"X-Admin-Token": "x"})
+        self.assertEqual(response.status_code, 401)
+
+    def test_profiling_session(self):
+        """Test de inicio, conflicto, parada y descarga del perfil."""
+        response = client.post("/api/v1/admin/profiling/start", headers=self.headers,
+                               json={"mode": "cpu", "sample_rate": 1.0, "duration": None})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["active"])
+        self.assertEqual(response.json()["pid"], os.getpid())
+        conflict = client.post("/api/v1/admin/profiling/start", headers=self.headers, json={})
+        self.assertEqual(conflict.status_code, 409)
+
+        stopped = client.post("/api/v1/admin/profiling/stop", headers=self.headers)
+        self.assertFalse(stopped.json()["active"])
+        download = client.get("/api/v1/admin/profiling/download", headers=self.headers)
+        self.assertEqual(download.status_code, 200)
+        self.assertIn("attachment", download.headers["content-disposition"])
+        self.assertIn(f"-{os.getpid()}-", download.headers["content-disposition"])
+        self.assertEqual(download.headers["x-worker-pid"], str(os.getpid()))
+
+    def test_export_conversations(self):
+        """La exportación se sirve como NDJSON, opcionalmente comprimido."""
+        discutidor = Mock()
+        discutidor.export_conversations.side_effect = lambda **kw: iter(
+            [{"conversation_id": "a"}, {"conversation_id": "b"}])
+        app.dependency_overrides[get_discutidor] = lambda: discutidor
+        self.addCleanup(app.dependency_overrides.clear)
+
+        response = client.get("/api/v1/admin/conversations/export?posture=tierra",
+                              headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "application/x-ndjson")
+        self.assertEqual(len(response.text.splitlines()), 2)
+        self.assertEqual(discutidor.export_conversations.call_args.kwargs["posture"], "tierra")
+
+        compressed = client.get("/api/v1/admin/conversations/export?compress=true",
+                                headers=self.headers)
+        self.assertEqual(compressed.headers["content-type"], "application/gzip")
+        invalid = client.get("/api/v1/admin/conversations/export?since=ayer",
+                             headers=self.headers)
+        self.assertEqual(invalid.status_code, 400)
+
+    def test_purge(self):
+        """La purga masiva exige filtros y devuelve un trabajo consultable."""
+        discutidor = Mock()
+        discutidor.start_purge.return_value = "job-1"
+        discutidor.get_purge_progress.side_effect = lambda job_id: (
+            {"status": "done", "deleted": 5} if job_id == "job-1" else None)
+        app.dependency_overrides[get_discutidor] = lambda: discutidor
+        self.addCleanup(app.dependency_overrides.clear)
+
+        empty = client.post("/api/v1/admin/conversations/purge", headers=self.headers, json={})
+        self.assertEqual(empty.status_code, 400)
+        started = client.post("/api/v1/admin/conversations/purge", headers=self.headers,
+                              json={"older_than_days": 30, "dry_run": True})
+        self.assertEqual(started.status_code, 202)
+        self.assertTrue(discutidor.start_purge.call_args.kwargs["dry_run"])
+        progress = client.get("/api/v1/admin/conversations/purge/job-1", headers=self.headers)
+        self.assertEqual(progress.json()["deleted"], 5)
+        missing = client.get("/api/v1/admin/conversations/purge/x", headers=self.headers)
+        self.assertEqual(missing.status_code, 404)
+
+    def test_capacity_report(self):
+        """El informe de capacidad se lanza en segundo plano y se consulta por ID."""
+        discutidor = Mock()
+        discutidor.start_capacity_report.return_value = "job-2"
+        discutidor.get_capacity_report.side_effect = lambda job_id: (
+            {"status": "done", "report": {"sampled": 3}} if job_id == "job-2" else None)
+        app.dependency_overrides[get_discutidor] = lambda: discutidor
+        self.addCleanup(app.dependency_overrides.clear)
+
+        invalid = client.post("/api/v1/admin/capacity", headers=self.headers,
+                              json={"sample_rate": 2})
+        self.assertEqual(invalid.status_code, 422)
+        started = client.post("/api/v1/admin/capacity", headers=self.headers,
+                              json={"sample_size": 500})
+        self.assertEqual(started.status_code, 202)
+        self.assertEqual(started.json()["job_id"], "job-2")
+        self.assertEqual(discutidor.start_capacity_report.call_args.kwargs["sample_size"], 500)
+        report = client.get("/api/v1/admin/capacity/job-2", headers=self.headers)
+        self.assertEqual(report.json()["report"]["sampled"], 3)
+        missing = client.get("/api/v1/admin/capacity/x", headers=self.headers)
+        self.assertEqual(missing.status_code, 404)
+
+    def test_profiling_invalid_mode(self):
+        """Test de modo de perfilado no soportado."""
+        response = client.post("/api/v1/admin/profiling/start", headers=self.headers,
+                               json={"mode": "gpu"})
+        self.assertEqual(response.status_code, 422)
+
+
+class TestLifespan(unittest.TestCase):
+
+    def setUp(self):
+        """La aplicación real, con Discutidor3000 simulado en el lifespan."""
+        import main
+        self.main = main
+        patcher = patch('main.Discutidor3000')
+        self.mock_class = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.discutidor = self.mock_class.return_value
+        self.discutidor.warmup.return_value = {"redis": True, "backends": {}}
+
+    def test_lifespan_builds_and_warms(self):
+        """El servicio se construye y precalienta al arrancar."""
+        with TestClient(self.main.api):
+            self.discutidor.warmup.assert_called_once()
+            self.assertIs(self.main.api.state.discutidor, self.discutidor)
+        self.discutidor.close.assert_called_once()
+
+    def test_healthz(self):
+        """Test del endpoint de liveness."""
+        with TestClient(self.main.api) as test_client:
+            response = test_client.get("/healthz")
+        self.assertEqual(response.status_code, 200)
+
+    def test_request_id_header(self):
+        """El ID de petición se reutiliza o se genera y se devuelve."""
+        with TestClient(self.main.api) as test_client:
+            echoed = test_client.get("/healthz", headers={"X-Request-ID": "req-123"})
+            generated = test_client.get("/healthz")
+        self.assertEqual(echoed.headers["x-request-id"], "req-123")
+        self.assertTrue(generated.headers["x-request-id"])
+
+    def test_readyz_ready(self):
+        """Test del endpoint de readiness con dependencias sanas."""
+        self.discutidor.check_readiness.return_value = {
+            "ready": True, "redis": {"ok": True, "latency_ms": 1.0}, "upstream": {}}
+        with TestClient(self.main.api) as test_client:
+            response = test_client.get("/readyz")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "ready")
+
+    def test_readyz_not_ready(self):
+        """Test del endpoint de readiness con Redis lento o caído."""
+        self.discutidor.check_readiness.return_value = {
+            "ready": False, "redis": {"ok": False, "latency_ms": 5000.0}, "upstream": {}}
+        with TestClient(self.main.api) as test_client:
+            response = test_client.get("/readyz")
+        self.assertEqual(response.status_code, 503)
+
+    def test_dependency_not_initialized(self):
+        """Sin lifespan, los endpoints responden 503."""
+        bare = FastAPI()
+        bare.include_router(chat_router, prefix="/api/v1")
+        response = TestClient(bare).get("/api/v1/router/stats")
+        self.assertEqual(response.status_code, 503)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
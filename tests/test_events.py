@@ -0,0 +1,87 @@
+"""
+Tests de los eventos de turno
+Evento compacto, escritura en el stream y consumidor con grupos
+"""
+
+import unittest
+from unittest.mock import patch, Mock
+import redis
+
+from api.services.events import TURNS_STREAM, TurnEventConsumer, turn_event
+from api.services.redis import RedisService
+from api.structures import Conversation, Message
+from conftest import FakeRedis
+
+
+class TestTurnEvents(unittest.TestCase):
+
+    def test_turn_event(self):
+        """El evento lleva metadatos del turno como texto, sin el contenido."""
+        event = turn_event("c1", "assistant", "hola mundo",
+                           usage={"prompt_tokens": 10, "completion_tokens": 2, "cost": 0.5},
+                           latency_ms=123.456, model="m", client_id="cliente")
+        self.assertEqual(event["length"], "10")
+        self.assertEqual(event["prompt_tokens"], "10")
+        self.assertEqual(event["latency_ms"], "123.5")
+        self.assertEqual(event["model"], "m")
+        self.assertNotIn("hola mundo", event.values())
+        self.assertTrue(all(isinstance(v, str) for v in event.values()))
+        self.assertEqual(set(turn_event("c1", "user", "x")),
+                         {"conversation_id", "role", "length", "ts"})
+
+    def test_event_written_with_conversation(self):
+        """El evento se escribe en el mismo pipeline que la conversación, en
+        un stream acotado."""
+        fake = FakeRedis()
+        with patch.dict('os.environ', {"TURN_EVENTS_MAXLEN": "2"}):
+            with patch('api.services.redis.redis.Redis.from_url', return_value=fake):
+                service = RedisService()
+        conversation = Conversation(conversation_id="c1", posture="p",
+                                    messages=[Message(role="user", content="m")])
+        for _ in range(3):
+            service.set_conversation("c1", conversation, event=turn_event("c1", "user", "m"))
+        service.set_conversation("c1", conversation)
+
+        self.assertEqual(len(fake.streams[TURNS_STREAM]), 2)
+        self.assertEqual(fake.streams[TURNS_STREAM][-1][1]["conversation_id"], "c1")
+
+
+class TestTurnEventConsumer(unittest.TestCase):
+
+    def setUp(self):
+        self.client = Mock()
+        self.consumer = TurnEventConsumer(self.client, "billing", consumer="w1")
+
+    def test_ensure_group_exists(self):
+        """Un grupo existente no es un error; otros errores sí."""
+        self.client.xgroup_create.side_effect = redis.ResponseError("BUSYGROUP ya existe")
+        self.consumer.ensure_group()
+        self.client.xgroup_create.side_effect = redis.ResponseError("WRONGTYPE")
+        with self.assertRaises(redis.ResponseError):
+            self.consumer.ensure_group()
+
+    def test_run_acks_processed_events(self):
+        """Se confirman en lote los eventos procesados; los fallidos quedan pendientes."""
+        self.client.xautoclaim.return_value = ["0-0", [("1-0", {"role": "user"})], []]
+        self.client.xreadgroup.return_value = [
+            [TURNS_STREAM, [("2-0", {"role": "assistant"}), ("3-0", {"role": "boom"})]]]
+        seen = []
+
+        def handler(fields):
+            if fields["role"] == "boom":
+                raise ValueError("fallo")
+            seen.append(fields["role"])
+            if len(seen) == 2:
+                self.consumer.stop()
+
+        self.consumer.run(handler)
+
+        self.assertEqual(seen, ["user", "assistant"])
+        self.client.xack.assert_any_call(TURNS_STREAM, "billing", "1-0")
+        self.client.xack.assert_called_with(TURNS_STREAM, "billing", "2-0")
+        self.client.xreadgroup.assert_called_once_with("billing", "w1", {TURNS_STREAM: ">"},
+                                                       count=100, block=5000)
+
+
+if __name__ == '__main__':
+    unittest.main()
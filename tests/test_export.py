@@ -0,0 +1,167 @@
+"""
+Tests para la exportación e importación de conversaciones en NDJSON
+Cubre el recorrido con SCAN en lotes, los filtros, gzip y el CLI
+"""
+
+import unittest
+import gzip
+import json
+import os
+import tempfile
+from unittest.mock import patch
+
+import cli
+from api.services.export import gzip_chunks, ndjson_chunks, open_ndjson
+from api.services.redis import RedisService, conversation_key, forks_key
+from api.services.storage import SQLiteStore
+from api.structures import Conversation, Message
+from conftest import FakeRedis
+
+def make_conversation(conversation_id, posture="La Tierra es plana",
+                      created_at="2025-03-25T12:00:00"):
+    return Conversation(conversation_id=conversation_id, posture=posture,
+                        messages=[Message(role="user", content="hola")],
+                        created_at=created_at, last_updated=created_at)
+
+
+class TestNdjson(unittest.TestCase):
+
+    def test_chunks(self):
+        """Los registros se agrupan en bloques de líneas completas."""
+        chunks = list(ndjson_chunks(({"i": i} for i in range(100)), chunk_size=64))
+        self.assertGreater(len(chunks), 1)
+        lines = b"".join(chunks).decode().splitlines()
+        self.assertEqual([json.loads(l)["i"] for l in lines], list(range(100)))
+
+    def test_gzip_roundtrip(self):
+        """El flujo comprimido se descomprime como un gzip normal."""
+        data = b"".join(gzip_chunks(ndjson_chunks([{"a": 1}, {"b": 2}])))
+        self.assertEqual(gzip.decompress(data), b'{"a": 1}\n{"b": 2}\n')
+
+
+class TestExportImport(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeRedis()
+        with patch('api.services.redis.redis.Redis.from_url', return_value=self.fake):
+            self.service = RedisService()
+        self.service.set_conversation("a", make_conversation("a"))
+        self.service.set_conversation("b", make_conversation("b", posture="Los gatos mandan"))
+        self.service.set_conversation("c", make_conversation("c", created_at="2025-05-01T00:00:00"))
+
+    def test_iter_batches(self):
+        """Se leen todas las conversaciones en lotes con pipelines."""
+        with patch.object(self.fake, 'pipeline', wraps=self.fake.pipeline) as mock_pipeline:
+            ids = sorted(c["conversation_id"] for c in self.service.iter_conversations(batch_size=2))
+        self.assertEqual(ids, ["a", "b", "c"])
+        self.assertEqual(mock_pipeline.call_count, 2)
+
+    def test_iter_filters(self):
+        """Filtros por postura y rango de fechas de creación."""
+        by_posture = [c["conversation_id"] for c in
+                      self.service.iter_conversations(posture="tierra")]
+        self.assertEqual(sorted(by_posture), ["a", "c"])
+        by_date = [c["conversation_id"] for c in
+                   self.service.iter_conversations(since="2025-04-01", until="2025-06-01")]
+        self.assertEqual(by_date, ["c"])
+
+    def test_import(self):
+        """La importación valida cada línea y escribe en lotes."""
+        lines = [make_conversation("x").model_dump_json(), "",
+                 "{no es json", make_conversation("y").model_dump_json()]
+        target = FakeRedis()
+        with patch('api.services.redis.redis.Redis.from_url', return_value=target):
+            result = RedisService().import_conversations(lines, batch_size=1)
+        self.assertEqual(result, {"imported": 2, "failed": 1})
+        self.assertIn(conversation_key("x"), target.data)
+
+    def add_fork(self):
+        parent = self.service.get_conversation("a")
+        self.service.set_conversation("f", Conversation(
+            conversation_id="f", posture=parent.posture, parent_id="a", fork_at=1,
+            ancestors=["a"], messages=parent.messages + [Message(role="user", content="f")]))
+
+    def test_export_resolves_forks(self):
+        """Las bifurcaciones se exportan con el historial completo y sin
+        depender de su padre."""
+        self.add_fork()
+        fork = next(c for c in self.service.iter_conversations()
+                    if c["conversation_id"] == "f")
+        self.assertEqual([m["content"] for m in fork["messages"]], ["hola", "f"])
+        self.assertIsNone(fork["parent_id"])
+        self.assertEqual((fork["fork_at"], fork["ancestors"]), (0, []))
+
+    def test_roundtrip_with_fork(self):
+        """Exportar e importar conserva el historial de las bifurcaciones,
+        en Redis y en otro almacenamiento."""
+        self.add_fork()
+        lines = [json.dumps(c) for c in self.service.iter_conversations()]
+        target = FakeRedis()
+        with patch('api.services.redis.redis.Redis.from_url', return_value=target):
+            imported = RedisService()
+        imported.import_conversations(lines)
+        target.delete(conversation_key("a"))
+        self.assertEqual([m.content for m in imported.get_conversation("f").messages],
+                         ["hola", "f"])
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SQLiteStore(os.path.join(tmp, "db.sqlite"))
+            store.import_conversations(lines)
+            self.assertEqual([m.content for m in store.get_conversation("f").messages],
+                             ["hola", "f"])
+            store.close()
+
+    def test_import_legacy_fork(self):
+        """Una bifurcación exportada solo con sus mensajes se registra en su
+        padre y extiende el TTL de sus antecesores."""
+        parent = make_conversation("p")
+        fork = Conversation(conversation_id="f", posture=parent.posture, parent_id="p",
+                            fork_at=1, ancestors=["p"],
+                            messages=[Message(role="user", content="f")])
+        target = FakeRedis()
+        with patch('api.services.redis.redis.Redis.from_url', return_value=target):
+            imported = RedisService()
+        imported.import_conversations([parent.model_dump_json(), fork.model_dump_json()])
+        self.assertEqual(target.smembers(forks_key("p")), {"f"})
+        self.assertEqual([m.content for m in imported.get_conversation("f").messages],
+                         ["hola", "f"])
+
+    def test_cli_roundtrip(self):
+        """Exportación e importación con gzip desde el CLI."""
+        target = FakeRedis()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "dump.ndjson.gz")
+            with patch('api.services.redis.redis.Redis.from_url', return_value=self.fake):
+                cli.main(["export", "-o", path, "--gzip"])
+            with open_ndjson(path) as f:
+                self.assertEqual(len(f.readlines()), 3)
+            with patch('api.services.redis.redis.Redis.from_url', return_value=target):
+                cli.main(["import", path])
+        self.assertEqual(sorted(target.data), sorted(self.fake.data))
+
+    def test_cli_storage_backend(self):
+        """El CLI usa el almacenamiento de STORAGE_BACKEND, como el servicio."""
+        with tempfile.TemporaryDirectory() as tmp:
+            dump = os.path.join(tmp, "dump.ndjson")
+            with open(dump, "w") as f:
+                f.write(make_conversation("x").model_dump_json() + "\n")
+            env = {"STORAGE_BACKEND": "sqlite", "SQLITE_PATH": os.path.join(tmp, "db.sqlite")}
+            with patch.dict(os.environ, env), \
+                 patch('api.services.redis.redis.Redis.from_url') as mock_redis:
+                cli.main(["import", dump])
+                cli.main(["export", "-o", os.path.join(tmp, "out.ndjson")])
+            mock_redis.assert_not_called()
+            with open(os.path.join(tmp, "out.ndjson")) as f:
+                self.assertEqual(json.loads(f.read())["conversation_id"], "x")
+
+    def test_cli_unsupported_feature(self):
+        """Si el almacenamiento no soporta el comando se informa sin traza."""
+        with patch.dict(os.environ, {"STORAGE_BACKEND": "memory"}), \
+             patch('sys.stderr') as stderr:
+            with self.assertRaises(SystemExit) as exit:
+                cli.main(["capacity"])
+        self.assertEqual(exit.exception.code, 2)
+        self.assertIn("no soporta el informe de capacidad",
+                      "".join(call.args[0] for call in stderr.write.call_args_list))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,7 +16,7 @@ class TestIntegration(unittest.TestCase):
         with patch('api.services.discutidor3000.RedisService'):
             self.discutidor = Discutidor3000(api_key="test_api_key")
 
-    @patch('api.services.discutidor3000.requests.post')
+    @patch('api.services.backends.requests.Session.post')
     def test_complete_new_conversation_flow(self, mock_post):
         """Test del flujo completo de nueva conversación."""
         # Mock para extracción de postura
@@ -74,7 +74,7 @@ class TestIntegration(unittest.TestCase):
         
         with patch.object(self.discutidor.redis, 'get_conversation') as mock_get:
             with patch.object(self.discutidor.redis, 'set_conversation') as mock_set:
-                with patch('api.services.discutidor3000.requests.post') as mock_post:
+                with patch('api.services.backends.requests.Session.post') as mock_post:
                     mock_get.return_value = existing_conversation
                     mock_set.return_value = True
                     
@@ -0,0 +1,149 @@
+"""
+Tests contra el servidor LLM simulado
+Verifica la caché de prompts de extremo a extremo
+"""
+
+import os
+import unittest
+from unittest.mock import patch
+
+from api.services.backends import mark_cache_prefix, parse_usage
+from api.services.discutidor3000 import Discutidor3000
+from api.services.mock_upstream import MockUpstream, PromptCache, count_tokens
+
+class TestPromptCaching(unittest.TestCase):
+
+    def setUp(self):
+        """Discutidor3000 contra el servidor simulado, con Redis en memoria."""
+        self.upstream = MockUpstream().start()
+        env = {"LOCAL_LLM_BASE_URL": self.upstream.base_url,
+               "LOCAL_LLM_JSON_MODE": "1",
+               "LOCAL_LLM_CACHE_CONTROL": "1",
+               "LLM_BACKEND": "local",
+               "LLM_TARGETS": ""}
+        with patch.dict('os.environ', env):
+            with patch('api.services.discutidor3000.RedisService') as mock_redis:
+                self.discutidor = Discutidor3000(api_key=None)
+        store = {}
+        redis = mock_redis.return_value
+        redis.set_conversation.side_effect = lambda cid, conv, *a, **kw: store.__setitem__(
+            cid, conv.model_copy(deep=True)) or True
+        redis.get_conversation.side_effect = lambda cid: (
+            store[cid].model_copy(deep=True) if cid in store else None)
+
+    def tearDown(self):
+        self.upstream.stop()
+
+    def test_mark_cache_prefix(self):
+        """Se marcan el system prompt y el último mensaje del historial."""
+        messages = [{"role": "system", "content": "s"},
+                    {"role": "user", "content": "u1"},
+                    {"role": "assistant", "content": "a1"},
+                    {"role": "user", "content": "u2"}]
+        marked = mark_cache_prefix(messages)
+        self.assertEqual(marked[0]["content"][0]["cache_control"], {"type": "ephemeral"})
+        self.assertEqual(marked[2]["content"][0]["text"], "a1")
+        self.assertEqual(marked[3], messages[3])
+        self.assertEqual(messages[0]["content"], "s")  # sin mutar el original
+
+    def test_parse_usage(self):
+        """Test de lectura de tokens cacheados en ambos formatos."""
+        self.assertEqual(parse_usage({"usage": {"prompt_tokens": 10,
+                                                "prompt_cache_hit_tokens": 8}})["cached_tokens"], 8)
+        self.assertEqual(parse_usage(None), {"prompt_tokens": 0,
+                                             "completion_tokens": 0,
+                                             "cached_tokens": 0})
+
+    def test_stable_prefix_hits_cache(self):
+        """Cada turno reutiliza el prefijo cacheado del anterior, no solo el
+        system prompt: el punto de corte avanza y el proveedor busca aciertos
+        en los mensajes previos."""
+        first = self.discutidor.chat("Defiende que la Tierra es plana")
+        self.discutidor.chat("No estoy de acuerdo", first.conversation_id)
+        self.discutidor.chat("Sigo sin estar de acuerdo", first.conversation_id)
+
+        turns = [p for p in self.upstream.requests if "response_format" not in p]
+        self.assertEqual(len(turns), 3)
+        # el prefijo del segundo turno coincide con el primero
+        self.assertEqual(turns[1]["messages"][0], turns[0]["messages"][0])
+
+        system_tokens = count_tokens(turns[0]["messages"][0]["content"])
+        stats = self.discutidor.get_router_stats()[0]
+        # segundo turno: el system prompt; tercero: hasta la primera respuesta
+        self.assertGreater(stats["cached_tokens"], 2 * system_tokens)
+        self.assertGreater(stats["cache_hit_ratio"], 0)
+
+    def test_cache_lookback(self):
+        """Un punto de corte posterior acierta en el prefijo guardado por
+        uno anterior, dentro de la ventana de búsqueda."""
+        cache = PromptCache()
+        marked = lambda text: {"role": "user", "content": [
+            {"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}]}
+        history = [{"role": "system", "content": "s" * 40}, marked("u" * 40)]
+        self.assertEqual(cache.lookup_and_store(history), 0)
+        history = history[:1] + [{"role": "user", "content": "u" * 40},
+                                 {"role": "assistant", "content": "a" * 40},
+                                 marked("v" * 40)]
+        self.assertEqual(cache.lookup_and_store(history), 20)
+
+
+class TestStreamChat(unittest.TestCase):
+
+    def setUp(self):
+        """Discutidor3000 contra el servidor simulado, con almacenamiento en memoria."""
+        self.upstream = MockUpstream().start()
+        env = {"STORAGE_BACKEND": "memory",
+               "LOCAL_LLM_BASE_URL": self.upstream.base_url,
+               "LOCAL_LLM_JSON_MODE": "1",
+               "LLM_BACKEND": "local",
+               "LLM_TARGETS": ""}
+        with patch.dict(os.environ, env):
+            self.discutidor = Discutidor3000(api_key=None)
+        self.addCleanup(self.upstream.stop)
+        self.addCleanup(self.discutidor.close)
+
+    def test_stream_new_and_resume(self):
+        """Los fragmentos forman la respuesta guardada; el turno registra el consumo."""
+        events = list(self.discutidor.stream_chat("Los gatos mandan"))
+        self.assertEqual(events[0]["type"], "start")
+        self.assertEqual(events[0]["posture"], "Los gatos mandan")
+        tokens = [e["content"] for e in events if e["type"] == "token"]
+        self.assertGreater(len(tokens), 1)
+        done = events[-1]
+        self.assertEqual(done["type"], "done")
+        self.assertEqual("".join(tokens), done["response"])
+        self.assertGreater(done["usage"]["completion_tokens"], 0)
+        self.assertTrue(self.upstream.requests[-1]["stream"])
+
+        conversation_id = events[0]["conversation_id"]
+        events = list(self.discutidor.stream_chat("No es cierto", conversation_id))
+        self.assertIn("#2", events[-1]["response"])
+        page = self.discutidor.get_messages(conversation_id)
+        self.assertEqual([m["role"] for m in page["messages"]], ["user", "bot", "user", "bot"])
+        self.assertEqual(page["messages"][-1]["content"], events[-1]["response"])
+        usage = self.discutidor.storage.get_conversation(conversation_id).usage
+        self.assertEqual(usage.completion_tokens, done["usage"]["completion_tokens"]
+                         + events[-1]["usage"]["completion_tokens"])
+
+    def test_stream_fallback(self):
+        """Si el streaming falla antes del primer fragmento, se genera la respuesta completa."""
+        with patch.object(self.discutidor.backends["local"], "stream",
+                          side_effect=RuntimeError("sin streaming")):
+            events = list(self.discutidor.stream_chat("Los gatos mandan"))
+        self.assertEqual([e["type"] for e in events], ["start", "token", "done"])
+        self.assertIn("Respuesta simulada #1", events[-1]["response"])
+        self.assertNotIn("stream", self.upstream.requests[-1])
+
+    def test_list_conversations(self):
+        """El listado paginado devuelve primero las conversaciones más recientes."""
+        for posture in ("uno", "dos", "tres"):
+            list(self.discutidor.stream_chat(posture))
+        first = self.discutidor.list_conversations(limit=2)
+        self.assertEqual(first["total"], 3)
+        self.assertEqual([c["posture"] for c in first["conversations"]], ["tres", "dos"])
+        second = self.discutidor.list_conversations(limit=2, offset=2)
+        self.assertEqual([c["posture"] for c in second["conversations"]], ["uno"])
+
+
+if __name__ == '__main__':
+    unittest.main()
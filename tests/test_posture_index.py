@@ -0,0 +1,122 @@
+"""
+Tests del índice de posturas
+Normalización, indexación, consultas y limpieza de expiradas
+"""
+
+import unittest
+from unittest.mock import patch
+
+from api.services.posture_index import (
+    EXPIRY_SHARDS,
+    PREFIX,
+    PostureIndex,
+    normalize_posture,
+    posture_tokens)
+from api.services.sharding import hash_tag
+from conftest import FakeRedis
+
+
+class TestNormalization(unittest.TestCase):
+
+    def test_normalize_posture(self):
+        """Se ignoran mayúsculas, acentos, puntuación y espacios repetidos."""
+        self.assertEqual(normalize_posture("  ¡La PIZZA con piña   es deliciosa! "),
+                         "la pizza con pina es deliciosa")
+
+    def test_posture_tokens(self):
+        """Los tokens excluyen palabras vacías y repetidas."""
+        self.assertEqual(posture_tokens("La pizza es pizza, y punto"),
+                         ["pizza", "punto"])
+
+
+class TestPostureIndex(unittest.TestCase):
+
+    def setUp(self):
+        """Índice sobre un Redis en memoria con tres conversaciones."""
+        self.fake = FakeRedis()
+        self.index = PostureIndex(self.fake)
+        pipe = self.fake.pipeline()
+        self.index.add(pipe, "a", "La Tierra es plana", ttl=100)
+        self.index.add(pipe, "b", "la tierra es PLANA!", ttl=200)
+        self.index.add(pipe, "c", "La tierra gira alrededor del Sol", ttl=300)
+        pipe.execute()
+
+    def test_find(self):
+        """Las conversaciones de una postura se devuelven de la que expira
+        más tarde a la que antes."""
+        result = self.index.find("LA TIERRA ES PLANA")
+        self.assertEqual(result, {"posture": "la tierra es plana", "total": 2,
+                                  "conversations": ["b", "a"]})
+        self.assertEqual(self.index.find("la tierra es plana", limit=1, offset=1)
+                         ["conversations"], ["a"])
+
+    def test_find_excludes_expired(self):
+        """Las conversaciones expiradas no se devuelven aunque sigan indexadas."""
+        now = self.fake.zsets[self.index._expiry_key_for("a")]["a"] + 1
+        with patch('api.services.posture_index.time.time', return_value=now):
+            result = self.index.find("la tierra es plana")
+        self.assertEqual(result["conversations"], ["b"])
+        self.assertEqual(result["total"], 1)
+
+    def test_search_prefix(self):
+        """El prefijo devuelve las posturas que empiezan por él con su recuento."""
+        self.assertEqual(self.index.search_prefix("la tierra"),
+                         [{"posture": "la tierra es plana", "count": 2},
+                          {"posture": "la tierra gira alrededor del sol", "count": 1}])
+        self.assertEqual(self.index.search_prefix("los gatos"), [])
+
+    def test_search_keywords(self):
+        """Se exigen todas las palabras y la última se completa como prefijo."""
+        self.assertEqual(self.index.search_keywords("tierra plana")["conversations"],
+                         ["b", "a"])
+        result = self.index.search_keywords("tierra gi")
+        self.assertEqual(result["tokens"], ["tierra", "gira"])
+        self.assertEqual(result["conversations"], ["c"])
+        self.assertEqual(self.index.search_keywords("de la")["conversations"], [])
+
+    def test_search_keywords_bounded(self):
+        """La intersección recorre el token más raro y para al llegar al límite."""
+        pipe = self.fake.pipeline()
+        for i in range(500):
+            self.index.add(pipe, f"t{i}", "La tierra es redonda", ttl=1000 + i)
+        pipe.execute()
+        with patch.object(self.fake, "zrevrangebyscore",
+                          wraps=self.fake.zrevrangebyscore) as scan:
+            result = self.index.search_keywords("redonda tierra", limit=3)
+        self.assertEqual(result["conversations"], ["t499", "t498", "t497"])
+        self.assertEqual(scan.call_count, 1)
+        self.assertEqual(self.index.search_keywords("plana tierra")["conversations"],
+                         ["b", "a"])
+
+    def test_keys_spread(self):
+        """Cada postura y cada token tiene su hash tag; solo los índices
+        lexicográficos comparten slot."""
+        self.assertEqual(hash_tag(self.index._posture_key("la tierra es plana")),
+                         "la tierra es plana")
+        self.assertEqual(hash_tag(self.index._token_key("plana")), "plana")
+        self.assertEqual(hash_tag(self.index._byid_key("a")), "a")
+        self.assertEqual(hash_tag(f"{PREFIX}:names"), hash_tag(f"{PREFIX}:tokens"))
+
+    def test_remove(self):
+        """Al desindexar se limpian la postura, los tokens y el hash de IDs."""
+        pipe = self.fake.pipeline()
+        self.assertEqual(self.index.remove(pipe, ["a", "x"]), ["la tierra es plana"])
+        pipe.execute()
+        self.assertEqual(self.index.find("la tierra es plana")["conversations"], ["b"])
+        self.assertNotIn("a", self.fake.zsets[self.index._token_key("plana")])
+        self.assertNotIn(self.index._byid_key("a"), self.fake.data)
+
+    def test_cleanup(self):
+        """La limpieza desindexa las expiradas y retira las posturas vacías."""
+        now = self.fake.zsets[self.index._expiry_key_for("c")]["c"] - 1
+        with patch('api.services.posture_index.time.time', return_value=now):
+            self.assertEqual(self.index.cleanup(), 2)
+        self.assertEqual({m for shard in range(EXPIRY_SHARDS)
+                          for m in self.fake.zsets.get(self.index._expiry_key(shard), {})}, {"c"})
+        self.assertNotIn("la tierra es plana", self.fake.zsets[f"{PREFIX}:names"])
+        self.assertNotIn("plana", self.fake.zsets[f"{PREFIX}:tokens"])
+        self.assertIn("tierra", self.fake.zsets[f"{PREFIX}:tokens"])
+
+
+if __name__ == '__main__':
+    unittest.main()
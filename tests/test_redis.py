@@ -6,11 +6,13 @@ Cubre todas las operaciones de Redis con mocks
 import unittest
 from unittest.mock import patch, Mock
 import json
+import time
 import redis
 import pytest
 
-from api.services.redis import RedisService
+from api.services.redis import ACTIVITY_KEY, RedisService, conversation_key, forks_key
 from api.structures import Conversation, Message
+from conftest import FakeRedis
 
 class TestRedisService(unittest.TestCase):
 
@@ -25,6 +27,77 @@ class TestRedisService(unittest.TestCase):
             service = RedisService()
             mock_redis.assert_called_once()
 
+    def test_pool_size(self):
+        """El tamaño del pool de conexiones es configurable."""
+        with patch.dict('os.environ', {"REDIS_POOL_SIZE": "8"}):
+            with patch('api.services.redis.redis.Redis.from_url') as mock_redis:
+                RedisService()
+        self.assertEqual(mock_redis.call_args.kwargs["max_connections"], 8)
+
+    def test_cluster_mode(self):
+        """Test de conexión a Redis Cluster."""
+        with patch.dict('os.environ', {"REDIS_MODE": "cluster"}):
+            with patch('api.services.redis.RedisCluster.from_url') as mock_cluster:
+                service = RedisService()
+        mock_cluster.assert_called_once()
+        self.assertIs(service.redis, mock_cluster.return_value)
+
+    def test_sentinel_mode(self):
+        """Test de descubrimiento del maestro mediante Sentinel."""
+        env = {"REDIS_MODE": "sentinel",
+               "REDIS_SENTINELS": "s1:26379, s2:26380",
+               "REDIS_SENTINEL_MASTER": "discutidor"}
+        with patch.dict('os.environ', env):
+            with patch('api.services.redis.Sentinel') as mock_sentinel:
+                RedisService()
+        self.assertEqual(mock_sentinel.call_args.args[0], [("s1", 26379), ("s2", 26380)])
+        self.assertEqual(mock_sentinel.return_value.master_for.call_args.args[0], "discutidor")
+
+    def test_sharded_mode(self):
+        """Test de sharding en el cliente sobre varios nodos."""
+        env = {"REDIS_MODE": "sharded", "REDIS_SHARDS": "redis://a:6379/0,redis://b:6379/0"}
+        with patch.dict('os.environ', env):
+            with patch('api.services.sharding.redis.Redis.from_url') as mock_redis:
+                service = RedisService()
+        self.assertEqual(mock_redis.call_count, 2)
+        self.assertEqual(len(service._connection_pools()), 2)
+        service.close()
+
+    def test_invalid_mode(self):
+        """Test de topología no soportada."""
+        with patch.dict('os.environ', {"REDIS_MODE": "mesh"}):
+            with self.assertRaises(ValueError):
+                RedisService()
+
+    def test_ping(self):
+        """Test de ping con latencia."""
+        self.redis_service.redis.ping.return_value = True
+        result = self.redis_service.ping()
+        self.assertTrue(result["ok"])
+        self.assertIn("latency_ms", result)
+
+    def test_ping_error(self):
+        """Test de ping con Redis caído."""
+        self.redis_service.redis.ping.side_effect = redis.RedisError("Connection error")
+        self.assertFalse(self.redis_service.ping()["ok"])
+
+    def test_warmup(self):
+        """Test de apertura de conexiones del pool."""
+        pool = self.redis_service.redis.connection_pool
+        self.redis_service.redis.ping.return_value = True
+        
+        self.assertTrue(self.redis_service.warmup(connections=3))
+        self.assertEqual(pool.get_connection.call_count, 3)
+        self.assertEqual(pool.release.call_count, 3)
+
+    def test_warmup_error(self):
+        """Test de precalentamiento con Redis caído."""
+        pool = self.redis_service.redis.connection_pool
+        pool.get_connection.side_effect = [Mock(), redis.ConnectionError("refused")]
+        
+        self.assertFalse(self.redis_service.warmup(connections=3))
+        self.assertEqual(pool.release.call_count, 1)
+
     def test_set_conversation_success(self):
         """Test de almacenar conversación exitosamente."""
         conversation = Conversation(
@@ -35,12 +108,13 @@ class TestRedisService(unittest.TestCase):
             last_updated="2025-03-25T12:00:00"
         )
         
-        with patch.object(self.redis_service.redis, 'setex') as mock_setex:
-            mock_setex.return_value = True
-            
-            result = self.redis_service.set_conversation("test_id", conversation)
-            self.assertTrue(result)
-            mock_setex.assert_called_once()
+        pipe = self.redis_service.redis.pipeline.return_value
+        pipe.execute.return_value = [True]
+
+        result = self.redis_service.set_conversation("test_id", conversation)
+        self.assertTrue(result)
+        pipe.setex.assert_called_once()
+        self.assertEqual(pipe.setex.call_args.args[0], "conversation:{test_id}")
 
     def test_set_conversation_redis_error(self):
         """Test de error de Redis al almacenar conversación."""
@@ -52,11 +126,11 @@ class TestRedisService(unittest.TestCase):
             last_updated="2025-03-25T12:00:00"
         )
         
-        with patch.object(self.redis_service.redis, 'setex') as mock_setex:
-            mock_setex.side_effect = redis.RedisError("Connection error")
-            
-            result = self.redis_service.set_conversation("test_id", conversation)
-            self.assertFalse(result)
+        pipe = self.redis_service.redis.pipeline.return_value
+        pipe.execute.side_effect = redis.RedisError("Connection error")
+
+        result = self.redis_service.set_conversation("test_id", conversation)
+        self.assertFalse(result)
 
     def test_get_conversation_success(self):
         """Test de obtener conversación exitosamente."""
@@ -83,6 +157,18 @@ class TestRedisService(unittest.TestCase):
             result = self.redis_service.get_conversation("test_id")
             self.assertIsNone(result)
 
+    def test_get_conversation_legacy_key(self):
+        """Las conversaciones con la clave anterior se migran al leerlas."""
+        data = json.dumps({"conversation_id": "test_id", "posture": "p", "messages": []})
+        client = self.redis_service.redis
+        client.get.side_effect = lambda key: data if key == "conversation:test_id" else None
+        client.ttl.return_value = 100
+
+        result = self.redis_service.get_conversation("test_id")
+        self.assertEqual(result.conversation_id, "test_id")
+        client.setex.assert_called_once_with("conversation:{test_id}", 100, data)
+        client.delete.assert_called_once_with("conversation:test_id")
+
     def test_get_conversation_redis_error(self):
         """Test de error de Redis al obtener conversación."""
         with patch.object(self.redis_service.redis, 'get') as mock_get:
@@ -101,27 +187,233 @@ class TestRedisService(unittest.TestCase):
 
     def test_get_all_conversations_success(self):
         """Test de obtener todas las conversaciones exitosamente."""
-        with patch.object(self.redis_service.redis, 'keys') as mock_keys:
-            mock_keys.return_value = ["conversation:1", "conversation:2"]
+        with patch.object(self.redis_service.redis, 'scan_iter') as mock_scan:
+            mock_scan.return_value = iter(["conversation:{1}", "conversation:{2}"])
             
             result = self.redis_service.get_all_conversations()
             self.assertEqual(len(result), 2)
 
     def test_get_all_conversations_empty(self):
         """Test de obtener conversaciones cuando no hay ninguna."""
-        with patch.object(self.redis_service.redis, 'keys') as mock_keys:
-            mock_keys.return_value = []
+        with patch.object(self.redis_service.redis, 'scan_iter') as mock_scan:
+            mock_scan.return_value = iter([])
             
             result = self.redis_service.get_all_conversations()
             self.assertIsNone(result)
 
     def test_get_all_conversations_redis_error(self):
         """Test de error de Redis al obtener todas las conversaciones."""
-        with patch.object(self.redis_service.redis, 'keys') as mock_keys:
-            mock_keys.side_effect = redis.RedisError("Connection error")
+        with patch.object(self.redis_service.redis, 'scan_iter') as mock_scan:
+            mock_scan.side_effect = redis.RedisError("Connection error")
             
             result = self.redis_service.get_all_conversations()
             self.assertIsNone(result)
 
+    def test_record_usage(self):
+        """Test de registro de consumo en los contadores diarios."""
+        pipe = self.redis_service.redis.pipeline.return_value
+        
+        result = self.redis_service.record_usage(
+            "test_id", "client-a", "model-a",
+            {"prompt_tokens": 100, "completion_tokens": 20, "cached_tokens": 80}, 0.5)
+        self.assertTrue(result)
+        members = {call.args[2] for call in pipe.zincrby.call_args_list}
+        self.assertEqual(members, {"test_id", "client-a", "model-a"})
+        self.assertEqual(pipe.zincrby.call_args_list[0].args[1], 120)
+        self.assertTrue(all(call.args[0].startswith("usage:{")
+                            for call in pipe.hincrby.call_args_list))
+        pipe.execute.assert_called_once()
+
+    def test_record_usage_redis_error(self):
+        """Test de error de Redis al registrar consumo."""
+        self.redis_service.redis.pipeline.return_value.execute.side_effect = \
+            redis.RedisError("Connection error")
+        
+        result = self.redis_service.record_usage("test_id", None, "model-a", {})
+        self.assertFalse(result)
+
+    def test_get_top_usage(self):
+        """Test de agregación de los mayores consumidores."""
+        pipe = self.redis_service.redis.pipeline.return_value
+        pipe.execute.side_effect = [
+            [2, True, [("client-a", 120.0), ("client-b", 10.0)], 1],
+            [{"prompt_tokens": "60", "completion_tokens": "10", "cached_tokens": "0",
+              "requests": "1", "cost": "0.25"},
+             {"prompt_tokens": "40", "completion_tokens": "10", "cached_tokens": "30",
+              "requests": "1", "cost": "0.25"},
+             {}, {"prompt_tokens": "8", "completion_tokens": "2"}]]
+        
+        result = self.redis_service.get_top_usage("clients", days=2, limit=10)
+        union = pipe.zunionstore.call_args.args[0]
+        self.assertTrue(union.startswith("usage:{clients}:"))
+        pipe.zrevrange.assert_called_once_with(union, 0, 9, withscores=True)
+        pipe.delete.assert_called_once_with(union)
+        self.assertEqual([r["id"] for r in result], ["client-a", "client-b"])
+        self.assertEqual(result[0]["prompt_tokens"], 100)
+        self.assertEqual(result[0]["cost"], 0.5)
+        self.assertEqual(result[1]["total_tokens"], 10)
+
+    def test_get_top_usage_invalid_dimension(self):
+        """Test de dimensión no soportada."""
+        with self.assertRaises(ValueError):
+            self.redis_service.get_top_usage("postures")
+
+
+class TestPurge(unittest.TestCase):
+
+    def setUp(self):
+        """RedisService sobre un Redis en memoria con cuatro conversaciones."""
+        self.fake = FakeRedis()
+        with patch('api.services.redis.redis.Redis.from_url', return_value=self.fake):
+            self.service = RedisService()
+        for cid, posture, client, updated in [
+                ("a", "La Tierra es plana", "c1", "2020-01-01T00:00:00"),
+                ("b", "La tierra es plana", "c2", "2099-01-01T00:00:00"),
+                ("c", "Los gatos mandan", "c1", "2020-01-01T00:00:00"),
+                ("d", "Los gatos mandan", "c2", "2099-01-01T00:00:00")]:
+            self.service.set_conversation(cid, Conversation(
+                conversation_id=cid, posture=posture, messages=[], client_id=client,
+                created_at=updated, last_updated=updated))
+            self.fake.zadd(ACTIVITY_KEY, {cid: 0})
+
+    def test_delete_conversation(self):
+        """Se elimina la conversación y su entrada en los índices."""
+        self.assertTrue(self.service.delete_conversation("a"))
+        self.assertNotIn(conversation_key("a"), self.fake.data)
+        self.assertNotIn("a", self.fake.zsets[ACTIVITY_KEY])
+        self.assertEqual(self.service.find_conversations_by_posture("La tierra es plana")
+                         ["conversations"], ["b"])
+        self.assertFalse(self.service.delete_conversation("a"))
+
+    def test_list_recent(self):
+        """El listado se pagina desde el índice de actividad y retira las
+        conversaciones que ya expiraron."""
+        now = time.time()
+        self.fake.zsets[ACTIVITY_KEY] = {"a": now - 4, "b": now - 3, "c": now - 2, "d": now - 1}
+        del self.fake.data[conversation_key("c")]
+        with patch.object(self.service, 'iter_conversations') as mock_iter:
+            first = self.service.list_recent(limit=2)
+            second = self.service.list_recent(limit=2, offset=2)
+        mock_iter.assert_not_called()
+        self.assertEqual([c["conversation_id"] for c in first["conversations"]], ["d"])
+        self.assertEqual(first["total"], 3)
+        self.assertNotIn("c", self.fake.zsets[ACTIVITY_KEY])
+        self.assertEqual([c["conversation_id"] for c in second["conversations"]], ["a"])
+
+    def test_purge_filters(self):
+        """Se borran solo las conversaciones que cumplen todos los filtros."""
+        progress = list(self.service.purge_conversations(older_than_days=30,
+                                                         posture="tierra",
+                                                         batch_size=2))
+        self.assertEqual(progress[-1], {"scanned": 4, "matched": 1, "deleted": 1})
+        self.assertEqual(len(progress), 3)  # un informe por lote y el final
+        self.assertNotIn(conversation_key("a"), self.fake.data)
+        self.assertEqual(set(self.fake.zsets[ACTIVITY_KEY]), {"b", "c", "d"})
+
+    def test_conversation_version(self):
+        """Cada escritura incrementa la versión; al borrar se elimina."""
+        self.assertEqual(self.service.get_conversation_version("a"), 1)
+        self.service.set_conversation("a", self.service.get_conversation("a"))
+        self.assertEqual(self.service.get_conversation_version("a"), 2)
+        self.service.delete_conversation("a")
+        self.assertIsNone(self.service.get_conversation_version("a"))
+
+    def test_purge_dry_run(self):
+        """En modo de prueba solo se cuentan las coincidencias."""
+        progress = list(self.service.purge_conversations(client_id="c2", dry_run=True))
+        self.assertEqual(progress[-1]["matched"], 2)
+        self.assertEqual(progress[-1]["deleted"], 0)
+        self.assertEqual(len(list(self.fake.scan_iter(match="conversation:*"))), 4)
+
+    def test_purge_rate_limit(self):
+        """El ritmo de borrado se limita con pausas entre lotes."""
+        with patch('api.services.redis.time.sleep') as mock_sleep:
+            list(self.service.purge_conversations(client_id="c1", batch_size=1,
+                                                  max_per_second=1))
+        self.assertTrue(mock_sleep.called)
+        self.assertGreater(mock_sleep.call_args_list[-1].args[0], 0.5)
+
+    def test_purge_dry_run_rate_limit(self):
+        """La simulación también limita el ritmo: se pausa por claves leídas,
+        aunque no haya coincidencias."""
+        with patch('api.services.redis.time.sleep') as mock_sleep:
+            progress = list(self.service.purge_conversations(client_id="nadie", batch_size=1,
+                                                             max_per_second=1, dry_run=True))
+        self.assertEqual(progress[-1]["matched"], 0)
+        self.assertEqual(mock_sleep.call_count, progress[-1]["scanned"])
+        self.assertGreater(mock_sleep.call_args_list[-1].args[0], 0.5)
+
+    def test_purge_progress(self):
+        """El progreso se guarda y se recupera de Redis."""
+        self.service.save_purge_progress("job", {"status": "running", "deleted": 3})
+        self.assertEqual(self.service.get_purge_progress("job"),
+                         {"status": "running", "deleted": 3})
+        self.assertIsNone(self.service.get_purge_progress("otro"))
+
+
+class TestForks(unittest.TestCase):
+
+    def setUp(self):
+        """Conversación raíz de seis mensajes, una bifurcación en el quinto
+        y otra bifurcación de esta."""
+        self.fake = FakeRedis()
+        with patch('api.services.redis.redis.Redis.from_url', return_value=self.fake):
+            self.service = RedisService()
+        messages = [Message(role="user", content=str(i)) for i in range(6)]
+        self.service.set_conversation("root", Conversation(
+            conversation_id="root", posture="p", messages=messages))
+        self.service.set_conversation("child", Conversation(
+            conversation_id="child", posture="p", parent_id="root", fork_at=5,
+            ancestors=["root"], messages=messages[:5] + [Message(role="user", content="c")]))
+        self.service.set_conversation("grandchild", Conversation(
+            conversation_id="grandchild", posture="p", parent_id="child", fork_at=6,
+            ancestors=["root", "child"],
+            messages=messages[:5] + [Message(role="user", content=x) for x in "cg"]))
+
+    def contents(self, conversation_id):
+        return [m.content for m in self.service.get_conversation(conversation_id).messages]
+
+    def test_fork_stores_only_own_messages(self):
+        """La bifurcación guarda solo sus mensajes y se registra en el padre."""
+        stored = json.loads(self.fake.data[conversation_key("child")])
+        self.assertEqual([m["content"] for m in stored["messages"]], ["c"])
+        self.assertEqual(self.fake.smembers(forks_key("root")), {"child"})
+
+    def test_fork_resolves_chain(self):
+        """Al leerla se reconstruye el historial a través de los antecesores."""
+        self.assertEqual(self.contents("child"), ["0", "1", "2", "3", "4", "c"])
+        self.assertEqual(self.contents("grandchild"), ["0", "1", "2", "3", "4", "c", "g"])
+
+    def test_fork_write_extends_ancestors_ttl(self):
+        """Cada escritura de la bifurcación extiende el TTL de sus antecesores."""
+        conversation = self.service.get_conversation("grandchild")
+        pipe = Mock()
+        pipe.execute.return_value = [True]
+        with patch.object(self.fake, 'pipeline', return_value=pipe):
+            self.service.set_conversation("grandchild", conversation, ttl=50)
+        pipe.expire.assert_any_call(conversation_key("root"), 50, gt=True)
+        pipe.expire.assert_any_call(conversation_key("child"), 50, gt=True)
+
+    def test_missing_ancestor(self):
+        """Sin el antecesor no se puede reconstruir la bifurcación."""
+        self.fake.delete(conversation_key("root"))
+        self.assertIsNone(self.service.get_conversation("child"))
+
+    def test_compact_conversation(self):
+        """La compactación materializa el historial y corta la dependencia."""
+        self.assertTrue(self.service.compact_conversation("child"))
+        self.assertFalse(self.service.compact_conversation("child"))
+        self.fake.delete(conversation_key("root"))
+        self.assertEqual(self.contents("child"), ["0", "1", "2", "3", "4", "c"])
+        self.assertEqual(self.contents("grandchild"), ["0", "1", "2", "3", "4", "c", "g"])
+        self.assertEqual(self.fake.smembers(forks_key("root")), set())
+
+    def test_delete_parent_keeps_forks(self):
+        """Borrar el padre compacta antes sus bifurcaciones."""
+        self.assertTrue(self.service.delete_conversation("root"))
+        self.assertEqual(self.contents("child"), ["0", "1", "2", "3", "4", "c"])
+        self.assertEqual(self.contents("grandchild"), ["0", "1", "2", "3", "4", "c", "g"])
+        self.assertNotIn(forks_key("root"), self.fake.data)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,161 @@
+"""
+Tests para ModelRouter
+Cubre la selección de destinos, conmutación por error y peticiones cubiertas
+"""
+
+import unittest
+import threading
+import time
+
+from api.services.router import ModelRouter, RouteTarget, TargetStats
+
+class TestTargetStats(unittest.TestCase):
+
+    def test_ewma_latency(self):
+        """Test de la media móvil exponencial de latencia."""
+        stats = TargetStats(alpha=0.5)
+        stats.record_success(1.0)
+        stats.record_success(3.0)
+        self.assertAlmostEqual(stats.ewma_latency, 2.0)
+
+    def test_ewma_error(self):
+        """Test de la tasa de error suavizada."""
+        stats = TargetStats(alpha=0.5)
+        stats.record_error()
+        self.assertAlmostEqual(stats.ewma_error, 0.5)
+        stats.record_success(1.0)
+        self.assertAlmostEqual(stats.ewma_error, 0.25)
+        self.assertEqual(stats.consecutive_errors, 0)
+
+    def test_percentile(self):
+        """Test del cálculo de percentiles."""
+        stats = TargetStats()
+        self.assertIsNone(stats.percentile(0.95))
+        for i in range(1, 101):
+            stats.record_success(i / 100)
+        self.assertAlmostEqual(stats.percentile(0.95), 0.96)
+
+
+class TestModelRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.primary = RouteTarget("model-a")
+        self.secondary = RouteTarget.parse("model-b@provider-x")
+        self.router = ModelRouter([self.primary, self.secondary], cooldown=60)
+
+    def test_parse_target(self):
+        """Test del parseo de `modelo@proveedor`."""
+        self.assertEqual(self.secondary.model, "model-b")
+        self.assertEqual(self.secondary.provider, "provider-x")
+        self.assertIsNone(self.primary.provider)
+
+    def test_requires_targets(self):
+        """Test de router sin destinos."""
+        with self.assertRaises(ValueError):
+            ModelRouter([])
+
+    def test_rank_prefers_configured_order(self):
+        """Sin estadísticas se respeta el orden configurado."""
+        self.assertEqual(self.router.rank(), [self.primary, self.secondary])
+
+    def test_rank_prefers_lower_latency(self):
+        """Test de preferencia por el destino con menor latencia."""
+        self.primary.stats.record_success(3.0)
+        self.secondary.stats.record_success(0.5)
+        self.assertEqual(self.router.rank()[0], self.secondary)
+
+    def test_unhealthy_target_ranked_last(self):
+        """Un destino con errores consecutivos se relega."""
+        for _ in range(3):
+            self.primary.stats.record_error()
+        self.assertFalse(self.router.is_healthy(self.primary))
+        self.assertEqual(self.router.rank()[0], self.secondary)
+
+    def test_call_success(self):
+        """Test de llamada exitosa al primer destino."""
+        result = self.router.call(lambda target: {"model": target.model})
+        self.assertEqual(result, {"model": "model-a"})
+        self.assertEqual(self.primary.stats.requests, 1)
+
+    def test_call_failover(self):
+        """Si el destino falla se prueba el siguiente."""
+        def fn(target):
+            if target is self.primary:
+                raise RuntimeError("caído")
+            return {"model": target.model}
+
+        result = self.router.call(fn)
+        self.assertEqual(result, {"model": "model-b"})
+        self.assertEqual(self.primary.stats.errors, 1)
+
+    def test_call_all_fail(self):
+        """Test de todos los destinos fallando."""
+        self.assertIsNone(self.router.call(lambda target: None))
+        self.assertEqual(self.secondary.stats.errors, 1)
+
+    def test_call_candidates(self):
+        """Test de restricción de destinos candidatos."""
+        result = self.router.call(lambda target: target.name,
+                                  candidates=[self.secondary])
+        self.assertEqual(result, "model-b@provider-x")
+
+    def test_hedged_request(self):
+        """Un destino lento se cubre con un duplicado al de respaldo."""
+        router = ModelRouter([self.primary, self.secondary],
+                             hedge=True, hedge_delay=0.05)
+        release = threading.Event()
+
+        def fn(target):
+            if target is self.primary:
+                release.wait(2)
+                return "lento"
+            return "rápido"
+
+        try:
+            self.assertEqual(router.call(fn), "rápido")
+            self.assertEqual(self.secondary.stats.hedges, 1)
+        finally:
+            release.set()
+
+    def test_hedged_request_fast_primary(self):
+        """Sin retraso no se envía duplicado."""
+        router = ModelRouter([self.primary, self.secondary],
+                             hedge=True, hedge_delay=1.0)
+        self.assertEqual(router.call(lambda target: target.model), "model-a")
+        self.assertEqual(self.secondary.stats.hedges, 0)
+        self.assertEqual(self.secondary.stats.requests, 0)
+
+    def test_hedged_single_target(self):
+        """Con un solo destino no se duplica la petición contra él mismo."""
+        router = ModelRouter([self.primary], hedge=True, hedge_delay=0.01)
+
+        def fn(target):
+            time.sleep(0.05)
+            return target.model
+
+        self.assertEqual(router.call(fn), "model-a")
+        self.assertEqual(self.primary.stats.requests, 1)
+        self.assertEqual(self.primary.stats.hedges, 0)
+
+    def test_stats(self):
+        """Test de exposición de estadísticas por destino."""
+        self.router.call(lambda target: "ok")
+        stats = self.router.stats()
+        self.assertEqual(len(stats), 2)
+        self.assertEqual(stats[0]["target"], "model-a")
+        self.assertEqual(stats[0]["requests"], 1)
+        self.assertTrue(stats[0]["healthy"])
+
+    def test_pin_bounded(self):
+        """Los destinos fijados se reutilizan y su número está acotado."""
+        router = ModelRouter([self.primary], max_pinned=2)
+        first = router.pin(RouteTarget("model-x"))
+        self.assertIs(router.pin(RouteTarget("model-x")), first)
+        router.pin(RouteTarget("model-y"))
+        extra = router.pin(RouteTarget("model-z"))
+        self.assertEqual([t.name for t in router.pinned], ["model-x", "model-y"])
+        self.assertEqual(extra.name, "model-z")
+        self.assertEqual(len(router.stats()), 3)
+
+if __name__ == '__main__':
+    unittest.main()
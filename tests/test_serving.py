@@ -0,0 +1,91 @@
+"""
+Tests del modo de producción (gunicorn + uvicorn)
+Cálculo de workers, reciclado por memoria y drenado al apagar
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from gunicorn.config import Config
+from gunicorn.glogging import Logger
+
+from api import serving
+from api.serving import DiscutidorWorker, cpu_limit, default_workers
+
+
+class TestWorkerCount(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def write(self, path, content):
+        path = self.root + path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+    def test_cgroup_quota(self):
+        """La cuota del contenedor limita las CPUs (cgroup v2 y v1)."""
+        self.write(serving.CGROUP_CPU_MAX, "150000 100000\n")
+        with patch("api.serving.os.sched_getaffinity", return_value=set(range(8))):
+            self.assertEqual(cpu_limit(self.root), 1.5)
+            os.remove(self.root + serving.CGROUP_CPU_MAX)
+            self.write(serving.CGROUP_V1_QUOTA, "200000")
+            self.write(serving.CGROUP_V1_PERIOD, "100000")
+            self.assertEqual(cpu_limit(self.root), 2.0)
+
+    def test_no_quota(self):
+        """Sin cuota se usan los núcleos asignados al proceso."""
+        self.write(serving.CGROUP_CPU_MAX, "max 100000\n")
+        with patch("api.serving.os.sched_getaffinity", return_value={0, 1, 2}):
+            self.assertEqual(cpu_limit(self.root), 3.0)
+
+    def test_default_workers(self):
+        """Dos workers por CPU, entre 1 y MAX_WORKERS."""
+        with patch.dict(os.environ, {"WORKERS_PER_CPU": "2", "MAX_WORKERS": "16"}):
+            self.assertEqual(default_workers(1.5), 3)
+            self.assertEqual(default_workers(0.2), 1)
+            self.assertEqual(default_workers(32), 16)
+
+
+class TestDiscutidorWorker(unittest.TestCase):
+
+    def make_worker(self, env):
+        cfg = Config()
+        cfg.set("graceful_timeout", 40)
+        with patch.dict(os.environ, env):
+            return DiscutidorWorker(age=1, ppid=os.getpid(), sockets=[], app=Mock(),
+                                    timeout=30, cfg=cfg, log=Logger(cfg))
+
+    def test_event_loop_and_drain(self):
+        """uvloop/httptools activados y plazo de drenado desde DRAIN_TIMEOUT."""
+        worker = self.make_worker({"DRAIN_TIMEOUT": "25"})
+        self.assertEqual(worker.config.loop, "uvloop" if serving.uvloop else "auto")
+        self.assertEqual(worker.config.http, "httptools" if serving.httptools else "auto")
+        self.assertEqual(worker.config.timeout_graceful_shutdown, 25.0)
+
+    def test_rss_recycling(self):
+        """Al superar WORKER_MAX_RSS_MB el worker se apaga ordenadamente una sola vez."""
+        worker = self.make_worker({"WORKER_MAX_RSS_MB": "100"})
+        worker.tmp = Mock()
+        with patch("api.serving.rss_bytes", return_value=50 * 2**20), \
+             patch("api.serving.os.kill") as mock_kill:
+            worker.notify()
+            mock_kill.assert_not_called()
+        with patch("api.serving.rss_bytes", return_value=150 * 2**20), \
+             patch("api.serving.os.kill") as mock_kill:
+            worker.notify()
+            worker.notify()
+            mock_kill.assert_called_once_with(worker.pid, serving.signal.SIGTERM)
+
+    def test_rss_size(self):
+        """La memoria residente del proceso es positiva."""
+        self.assertGreater(serving.rss_bytes(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+Tests para el sharding de Redis en el cliente
+Cubre el anillo de hashing consistente, los hash tags y los pipelines
+"""
+
+import unittest
+import fnmatch
+import redis
+from collections import Counter
+from unittest.mock import patch
+
+from api.services.sharding import HashRing, ShardedRedis, hash_tag
+
+class FakeNode:
+    """Nodo Redis en memoria con los comandos usados en los tests."""
+
+    def __init__(self, url, **options):
+        self.url = url
+        self.data = {}
+        self.pipelines = 0
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+        return True
+
+    def keys(self, pattern="*"):
+        return [k for k in self.data if fnmatch.fnmatch(k, pattern)]
+
+    def scan_iter(self, match=None, count=None, **kwargs):
+        return iter(self.keys(match or "*"))
+
+    def delete(self, *keys):
+        return sum(1 for k in keys if self.data.pop(k, None) is not None)
+
+    def zunion(self, keys, **kwargs):
+        return list(keys)
+
+    def ping(self):
+        return True
+
+    def close(self):
+        pass
+
+    def pipeline(self, transaction=False):
+        node = self
+        node.pipelines += 1
+        class Pipe:
+            def __init__(self):
+                self.calls = []
+            def __getattr__(self, name):
+                return lambda *args, **kw: self.calls.append((name, args, kw))
+            def execute(self):
+                return [getattr(node, name)(*args, **kw) for name, args, kw in self.calls]
+        return Pipe()
+
+
+class TestHashRing(unittest.TestCase):
+
+    def test_hash_tag(self):
+        """Solo el contenido del primer hash tag decide el nodo."""
+        self.assertEqual(hash_tag("conversation:{abc}"), "abc")
+        self.assertEqual(hash_tag("conversation:{abc}:messages"), "abc")
+        self.assertEqual(hash_tag("usage:{}:x"), "usage:{}:x")
+        self.assertEqual(hash_tag("plain"), "plain")
+
+    def test_distribution(self):
+        """Las claves se reparten de forma aproximadamente uniforme."""
+        ring = HashRing(range(4))
+        counts = Counter(ring.node_for(f"conversation:{{{i}}}") for i in range(4000))
+        self.assertEqual(set(counts), {0, 1, 2, 3})
+        self.assertTrue(all(600 < c < 1400 for c in counts.values()))
+
+    def test_consistent(self):
+        """Añadir un nodo solo mueve una fracción de las claves."""
+        before, after = HashRing(range(4)), HashRing(range(5))
+        keys = [f"k{i}" for i in range(2000)]
+        moved = sum(1 for k in keys if before.node_for(k) != after.node_for(k))
+        self.assertLess(moved, len(keys) * 0.35)
+
+
+class TestShardedRedis(unittest.TestCase):
+
+    def setUp(self):
+        with patch('api.services.sharding.redis.Redis.from_url', side_effect=FakeNode):
+            self.client = ShardedRedis([f"redis://node{i}:6379/0" for i in range(3)])
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_routing_and_listing(self):
+        """Los comandos se enrutan por clave y los listados cubren todos los nodos."""
+        for i in range(30):
+            self.client.setex(f"conversation:{{{i}}}", 10, str(i))
+        self.assertEqual(self.client.get("conversation:{7}"), "7")
+        self.assertEqual(len(self.client.keys("conversation:*")), 30)
+        self.assertEqual(len(list(self.client.scan_iter(match="conversation:*"))), 30)
+        self.assertTrue(all(node.data for node in self.client.shards))
+        self.assertEqual(self.client.delete(*[f"conversation:{{{i}}}" for i in range(10)]), 10)
+
+    def test_pipeline_preserves_order(self):
+        """El pipeline se divide por nodo y devuelve los resultados en orden."""
+        pipe = self.client.pipeline()
+        for i in range(20):
+            pipe.setex(f"k{i}", 10, str(i))
+        for i in range(20):
+            pipe.get(f"k{i}")
+        self.assertEqual(len(pipe), 40)
+        results = pipe.execute()
+        self.assertEqual(results[20:], [str(i) for i in range(20)])
+        self.assertEqual(sum(node.pipelines for node in self.client.shards), 3)
+
+    def test_cross_slot(self):
+        """Los comandos multiclave exigen un hash tag común."""
+        self.assertEqual(self.client.zunion(["usage:{clients}:1", "usage:{clients}:2"]),
+                         ["usage:{clients}:1", "usage:{clients}:2"])
+        keys = [f"k{i}" for i in range(20)]
+        with self.assertRaises(redis.RedisError):
+            self.client.zunion(keys)
+
+if __name__ == '__main__':
+    unittest.main()
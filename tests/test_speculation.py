@@ -0,0 +1,146 @@
+"""
+Tests de las aperturas pregeneradas para posturas en tendencia
+Popularidad en ventana deslizante, reposición con el upstream ocioso,
+caducidad y uso en conversaciones nuevas
+"""
+
+import os
+import unittest
+from unittest.mock import patch
+
+from api.services.discutidor3000 import Discutidor3000
+from api.services.mock_upstream import MockUpstream
+from api.services.speculation import Opening, OpeningPool
+
+
+class TestOpeningPool(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        clock = patch("api.services.speculation.time")
+        clock.start().monotonic.side_effect = lambda: self.now
+        self.addCleanup(clock.stop)
+        self.idle = True
+        self.generated = []
+        self.pool = OpeningPool(generate=self.generate, is_idle=lambda: self.idle,
+                                window=60, min_count=2, top=2, per_posture=2, max_age=120)
+
+    def generate(self, posture):
+        self.generated.append(posture)
+        return Opening(posture, f"apertura {len(self.generated)}",
+                       {"usage": {"prompt_tokens": 10, "completion_tokens": 5}}, latency_ms=900)
+
+    def test_posture_variants(self):
+        """Las variantes triviales de una postura cuentan como la misma."""
+        for posture in ("  La Tierra  es PLANA. ", "la tierra es plana"):
+            self.pool.record(posture)
+        self.assertEqual(self.pool.trending(), [("la tierra es plana", 2)])
+
+    def test_trending_window(self):
+        """Solo están en tendencia las posturas frecuentes dentro de la ventana."""
+        for posture in ("Gatos", "Gatos", "gatos", "Perros", "Perros", "Pan"):
+            self.pool.record(posture)
+        self.assertEqual(self.pool.trending(), [("gatos", 3), ("Perros", 2)])
+        self.now += 61
+        self.pool.record("Perros")
+        self.assertEqual(self.pool.trending(), [])
+
+    def test_refill_and_take(self):
+        """Se repone hasta el tamaño del lote y cada apertura se usa una sola vez."""
+        for _ in range(2):
+            self.pool.record("Gatos")
+        while self.pool.refill():
+            pass
+        self.assertEqual(self.generated, ["Gatos", "Gatos"])
+        self.assertEqual(self.pool.take("gatos").content, "apertura 2")
+        self.assertEqual(self.pool.take("Gatos").content, "apertura 1")
+        self.assertIsNone(self.pool.take("Gatos"))
+        stats = self.pool.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["generated"]), (2, 1, 2))
+
+    def test_refill_only_when_idle(self):
+        """Con el upstream ocupado no se genera nada."""
+        for _ in range(2):
+            self.pool.record("Gatos")
+        self.idle = False
+        self.assertEqual(self.pool.refill(), 0)
+        self.assertEqual(self.generated, [])
+
+    def test_stale_openings_expire(self):
+        """Las aperturas que superan la antigüedad máxima no se sirven."""
+        for _ in range(2):
+            self.pool.record("Gatos")
+        self.pool.refill()
+        self.now += 121
+        self.assertIsNone(self.pool.take("Gatos"))
+        stats = self.pool.stats()
+        self.assertEqual(stats["expired"], 1)
+        self.assertEqual(stats["wasted_tokens"], 15)
+
+
+class TestSpeculativeOpenings(unittest.TestCase):
+
+    def setUp(self):
+        """Discutidor3000 contra el servidor simulado, con aperturas pregeneradas."""
+        self.upstream = MockUpstream().start()
+        env = {"STORAGE_BACKEND": "memory",
+               "LOCAL_LLM_BASE_URL": self.upstream.base_url,
+               "LOCAL_LLM_JSON_MODE": "1",
+               "LLM_BACKEND": "local",
+               "LLM_TARGETS": "",
+               "SPECULATIVE_OPENINGS": "1",
+               "SPECULATIVE_MIN_COUNT": "2"}
+        with patch.dict(os.environ, env):
+            self.discutidor = Discutidor3000(api_key=None)
+        self.addCleanup(self.upstream.stop)
+        self.addCleanup(self.discutidor.close)
+
+    def trend(self, posture):
+        for _ in range(2):
+            self.discutidor.chat(posture)
+        self.assertEqual(self.discutidor.openings.refill(), 1)
+
+    def test_new_conversation_uses_opening(self):
+        """Una conversación nueva con postura en tendencia no espera a la generación."""
+        self.trend("Los gatos mandan")
+        requests = len(self.upstream.requests)
+        response = self.discutidor.chat("Los gatos mandan")
+        # solo la extracción de la postura llega al upstream
+        self.assertEqual(len(self.upstream.requests), requests + 1)
+        conversation = self.discutidor.redis.get_conversation(response.conversation_id)
+        self.assertEqual([m.role for m in conversation.messages], ["system", "user", "assistant"])
+        self.assertGreater(conversation.usage.completion_tokens, 0)
+        stats = self.discutidor.get_opening_stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["trending"][0]["posture"], "Los gatos mandan")
+
+        # la conversación continúa con normalidad
+        self.assertIsNotNone(self.discutidor.chat("No es cierto", response.conversation_id))
+
+    def test_opt_out(self):
+        """Con `speculative=False` o un modelo fijado se genera la respuesta."""
+        self.trend("Los gatos mandan")
+        requests = len(self.upstream.requests)
+        self.discutidor.chat("Los gatos mandan", speculative=False)
+        self.discutidor.chat("Los gatos mandan", backend="local")
+        self.assertEqual(len(self.upstream.requests), requests + 4)
+        self.assertEqual(self.discutidor.get_opening_stats()["hits"], 0)
+
+    def test_stream_chat_uses_opening(self):
+        """En streaming la apertura se emite en un único fragmento."""
+        self.trend("Los gatos mandan")
+        events = list(self.discutidor.stream_chat("Los gatos mandan"))
+        self.assertEqual([e["type"] for e in events], ["start", "token", "done"])
+        self.assertEqual(events[1]["content"], events[2]["response"])
+
+    def test_disabled(self):
+        """Sin SPECULATIVE_OPENINGS no se registra ni se pregenera nada."""
+        with patch.dict(os.environ, {"STORAGE_BACKEND": "memory", "LLM_TARGETS": ""}):
+            discutidor = Discutidor3000(api_key="test")
+        self.addCleanup(discutidor.close)
+        self.assertIsNone(discutidor.openings)
+        self.assertEqual(discutidor.get_opening_stats(), {"enabled": False})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,263 @@
+"""
+Tests de conformidad del almacenamiento
+Los mismos casos se ejecutan contra todos los backends de ConversationStore
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from api.services.redis import RedisService
+from api.services.storage import (
+    ConversationStore,
+    MemoryStore,
+    SQLiteStore,
+    StorageFeatureError,
+    conversation_key,
+    create_storage)
+from api.structures import Conversation, Message
+from conftest import FakeRedis
+
+
+def _conversation(conversation_id: str, posture: str = "La Tierra es plana",
+                  updated: str = "2025-03-25T12:00:00", **extra) -> Conversation:
+    return Conversation(conversation_id=conversation_id, posture=posture,
+                        messages=[Message(role="system", content="s"),
+                                  Message(role="user", content="hola")],
+                        created_at=updated, last_updated=updated, **extra)
+
+
+class StorageConformance:
+    """Casos comunes; cada subclase crea su backend en `make_store`."""
+
+    # los backends cuyo reloj no se puede adelantar omiten los casos de expiración
+    controls_clock = True
+
+    def make_store(self) -> ConversationStore:
+        raise NotImplementedError
+
+    def setUp(self):
+        self.store = self.make_store()
+        self.addCleanup(self.store.close)
+
+    def test_set_and_get(self):
+        """Se recupera la conversación guardada, igual a la original."""
+        conversation = _conversation("a", client_id="c1")
+        self.assertTrue(self.store.set_conversation("a", conversation))
+        self.assertEqual(self.store.get_conversation("a"), conversation)
+        self.assertIsNone(self.store.get_conversation("nada"))
+
+    def test_versions(self):
+        """La versión empieza en 1 y crece con cada escritura."""
+        self.assertIsNone(self.store.get_conversation_version("a"))
+        self.store.set_conversation("a", _conversation("a"))
+        self.store.set_conversation("a", _conversation("a"))
+        self.assertEqual(self.store.get_conversation_version("a"), 2)
+
+    def test_append_messages(self):
+        """Anexar mensajes conserva los anteriores y cambia la versión."""
+        self.store.set_conversation("a", _conversation("a"))
+        updated = self.store.append_messages("a", [Message(role="assistant", content="r")])
+        self.assertEqual([m.content for m in updated.messages], ["s", "hola", "r"])
+        self.assertEqual(len(self.store.get_conversation("a").messages), 3)
+        self.assertEqual(self.store.get_conversation_version("a"), 2)
+        self.assertIsNone(self.store.append_messages("nada", [Message(role="user", content="x")]))
+
+    def test_list_and_iterate(self):
+        """Se listan todas las conversaciones y se recorren con filtros."""
+        self.assertIsNone(self.store.get_all_conversations())
+        for i in range(5):
+            self.store.set_conversation(f"c{i}", _conversation(
+                f"c{i}", posture="Los gatos mandan" if i % 2 else "La Tierra es plana"))
+        self.assertEqual(sorted(self.store.get_all_conversations()),
+                         sorted(conversation_key(f"c{i}") for i in range(5)))
+        found = list(self.store.iter_conversations(batch_size=2, posture="gatos"))
+        self.assertEqual(sorted(c["conversation_id"] for c in found), ["c1", "c3"])
+
+    def test_delete(self):
+        """Borrar elimina la conversación y su versión; borrar dos veces es falso."""
+        self.store.set_conversation("a", _conversation("a"))
+        self.assertTrue(self.store.delete_conversation("a"))
+        self.assertFalse(self.store.delete_conversation("a"))
+        self.assertIsNone(self.store.get_conversation("a"))
+        self.assertIsNone(self.store.get_conversation_version("a"))
+
+    def test_expire(self):
+        """Solo se puede fijar la expiración de conversaciones existentes."""
+        self.store.set_conversation("a", _conversation("a"))
+        self.assertTrue(self.store.expire_conversation("a", 60))
+        self.assertFalse(self.store.expire_conversation("nada", 60))
+
+    def test_expiration(self):
+        """Las conversaciones expiradas no se devuelven ni se listan."""
+        if not self.controls_clock:
+            self.skipTest("reloj del backend no controlable")
+        self.store.set_conversation("a", _conversation("a"), ttl=10)
+        self.store.set_conversation("b", _conversation("b"), ttl=1000)
+        self.store.expire_conversation("b", 20)
+        with patch("api.services.storage.time.time", return_value=time.time() + 15):
+            self.assertIsNone(self.store.get_conversation("a"))
+            self.assertIsNotNone(self.store.get_conversation("b"))
+            self.assertEqual(self.store.get_all_conversations(), [conversation_key("b")])
+        with patch("api.services.storage.time.time", return_value=time.time() + 25):
+            # la memoria ya descartó `a` al leerla; el barrido elimina el resto
+            self.assertGreaterEqual(self.store.sweep(), 1)
+            self.assertIsNone(self.store.get_all_conversations())
+            self.assertIsNone(self.store.get_conversation_version("b"))
+
+    def test_posture_lookup(self):
+        """La búsqueda por postura devuelve lo mismo en todos los backends."""
+        self.store.set_conversation("a", _conversation("a", posture="La Tierra es plana"))
+        self.store.set_conversation("b", _conversation("b", posture="la tierra es PLANA!"))
+        self.store.set_conversation("c", _conversation("c", posture="Los gatos mandan"))
+        found = self.store.find_conversations_by_posture("La tierra es plana")
+        self.assertEqual(found["total"], 2)
+        self.assertEqual(sorted(found["conversations"]), ["a", "b"])
+        prefix = self.store.search_postures("la tie")
+        self.assertEqual(prefix["postures"], [{"posture": "la tierra es plana", "count": 2}])
+        keywords = self.store.search_postures("gato", mode="keywords")
+        self.assertEqual(keywords["conversations"], ["c"])
+
+    def test_import(self):
+        """La importación valida cada línea y cuenta las inválidas."""
+        lines = [_conversation("a").model_dump_json(), "{}", ""]
+        self.assertEqual(self.store.import_conversations(lines),
+                         {"imported": 1, "failed": 1})
+        self.assertIsNotNone(self.store.get_conversation("a"))
+
+
+class TestMemoryStore(StorageConformance, unittest.TestCase):
+
+    def make_store(self):
+        return MemoryStore(max_conversations=100)
+
+    def test_lru_eviction(self):
+        """Al superar el límite se descarta la conversación usada hace más tiempo."""
+        store = MemoryStore(max_conversations=2)
+        store.set_conversation("a", _conversation("a"))
+        store.set_conversation("b", _conversation("b"))
+        store.get_conversation("a")
+        store.set_conversation("c", _conversation("c"))
+        self.assertIsNotNone(store.get_conversation("a"))
+        self.assertIsNone(store.get_conversation("b"))
+
+    def test_returns_copies(self):
+        """Modificar una conversación leída no altera la guardada."""
+        self.store.set_conversation("a", _conversation("a"))
+        self.store.get_conversation("a").messages.clear()
+        self.assertEqual(len(self.store.get_conversation("a").messages), 2)
+
+
+class TestSQLiteStore(StorageConformance, unittest.TestCase):
+
+    def make_store(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, "conversations.db")
+        return SQLiteStore(self.path)
+
+    def test_wal_and_indexes(self):
+        """La base usa WAL e índices por last_updated y expires_at."""
+        connection = self.store._connection()
+        self.assertEqual(connection.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        indexes = {row[1] for row in connection.execute("PRAGMA index_list(conversations)")}
+        self.assertIn("conversations_last_updated", indexes)
+        self.assertIn("conversations_expires_at", indexes)
+
+    def test_list_recent(self):
+        """El listado se ordena y pagina en SQL, con el índice de last_updated."""
+        for i in range(5):
+            self.store.set_conversation(f"c{i}", _conversation(
+                f"c{i}", updated=f"2025-03-2{i}T12:00:00"))
+        self.store.set_conversation("old", _conversation("old"), ttl=-1)
+        page = self.store.list_recent(limit=2, offset=1)
+        self.assertEqual(page["total"], 5)
+        self.assertEqual([c["conversation_id"] for c in page["conversations"]], ["c3", "c2"])
+        self.assertEqual(page["conversations"][0],
+                         {"conversation_id": "c3", "posture": "La Tierra es plana",
+                          "messages": 2, "last_updated": "2025-03-23T12:00:00"})
+        with patch.object(self.store, "iter_conversations") as mock_iter:
+            self.store.list_recent()
+        mock_iter.assert_not_called()
+        plan = " ".join(row[3] for row in self.store._connection().execute(
+            "EXPLAIN QUERY PLAN SELECT id, posture, json_array_length(data, '$.messages'), "
+            "last_updated FROM conversations WHERE expires_at > ? "
+            "ORDER BY last_updated DESC LIMIT ? OFFSET ?", (0, 2, 1)))
+        self.assertIn("conversations_last_updated", plan)
+
+    def test_persistence(self):
+        """Las conversaciones sobreviven a reabrir la base."""
+        self.store.set_conversation("a", _conversation("a"))
+        self.store.close()
+        reopened = SQLiteStore(self.path)
+        self.addCleanup(reopened.close)
+        self.assertEqual(reopened.get_conversation("a").conversation_id, "a")
+
+    def test_sqlite_errors(self):
+        """Los errores de SQLite se registran y se devuelven como fallo."""
+        self.store.set_conversation("a", _conversation("a"))
+        self.store._connection().execute("DROP TABLE conversations")
+        with self.assertLogs("api.services.storage", level="ERROR"):
+            self.assertFalse(self.store.delete_conversation("a"))
+            self.assertFalse(self.store.expire_conversation("a", 60))
+            self.assertIsNone(self.store.get_conversation_version("a"))
+            self.assertIsNone(self.store.get_all_conversations())
+
+    def test_concurrent_appends(self):
+        """Las escrituras concurrentes desde varios hilos no se pierden."""
+        self.store.set_conversation("a", _conversation("a"))
+        def append(i):
+            self.store.append_messages("a", [Message(role="user", content=str(i))])
+        threads = [threading.Thread(target=append, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.store.get_conversation("a").messages), 10)
+
+
+class TestRedisStore(StorageConformance, unittest.TestCase):
+
+    controls_clock = False
+
+    def make_store(self):
+        with patch('api.services.redis.redis.Redis.from_url', return_value=FakeRedis()):
+            return RedisService()
+
+
+class TestCreateStorage(unittest.TestCase):
+
+    def test_create_storage(self):
+        """STORAGE_BACKEND elige el backend embebido; los desconocidos fallan."""
+        with patch.dict(os.environ, {"STORAGE_BACKEND": "memory"}):
+            self.assertIsInstance(create_storage(), MemoryStore)
+        with self.assertRaises(ValueError):
+            create_storage("cassandra")
+
+    def test_discutidor_storage(self):
+        """Discutidor3000 funciona sin Redis con un backend embebido."""
+        from api.services.discutidor3000 import Discutidor3000
+        with patch.dict(os.environ, {"STORAGE_BACKEND": "memory"}):
+            discutidor = Discutidor3000(api_key="k")
+        self.addCleanup(discutidor.close)
+        self.assertIsInstance(discutidor.storage, MemoryStore)
+        self.assertIs(discutidor.redis, discutidor.storage)
+        discutidor.storage.set_conversation("a", _conversation("a"))
+        self.assertEqual(discutidor.get_messages("a")["total"], 1)
+
+    def test_unsupported_features(self):
+        """Los backends embebidos no emiten eventos ni informes de capacidad."""
+        store = MemoryStore()
+        self.assertFalse(store.supports_events)
+        with self.assertRaises(StorageFeatureError):
+            store.turn_events("billing")
+        with self.assertRaises(StorageFeatureError):
+            store.capacity_report()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+"""
+Tests del búfer de escrituras agrupadas de Redis
+Agrupación de escrituras concurrentes, durabilidad y lectura de lo propio
+"""
+
+import os
+import threading
+import unittest
+from unittest.mock import patch
+
+import redis
+
+from api.services.redis import RedisService, conversation_key
+from api.services.write_buffer import WriteBuffer
+from api.structures import Conversation, Message
+from conftest import FakeRedis
+
+
+class GatedRedis(FakeRedis):
+    """FakeRedis que cuenta los pipelines ejecutados y puede retenerlos."""
+
+    def __init__(self):
+        super().__init__()
+        self.executes = 0
+        self.gate = threading.Event()
+        self.gate.set()
+        self.fail = False
+
+    def pipeline(self, transaction=False):
+        pipe = super().pipeline(transaction)
+        execute = pipe.execute
+        def gated():
+            self.gate.wait(5)
+            self.executes += 1
+            if self.fail:
+                raise redis.ConnectionError("conexión perdida")
+            return execute()
+        pipe.execute = gated
+        return pipe
+
+
+def _conversation(conversation_id: str, content: str = "hola") -> Conversation:
+    return Conversation(conversation_id=conversation_id, posture="La Tierra es plana",
+                        messages=[Message(role="user", content=content)])
+
+
+class TestWriteBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.client = GatedRedis()
+        self.buffer = WriteBuffer(self.client, flush_interval=0.005, max_batch=64)
+        self.addCleanup(self.buffer.close)
+
+    def test_group_commit(self):
+        """Las escrituras concurrentes comparten pipeline y cada una recibe sus resultados."""
+        self.client.gate.clear()  # el primer lote se retiene mientras llegan las demás
+        def build(pipe, i):
+            pipe.incr(f"n{i}")
+            pipe.incr(f"n{i}")
+        futures = [self.buffer.submit(lambda pipe, i=i: build(pipe, i)) for i in range(40)]
+        self.client.gate.set()
+        self.assertEqual([f.result(5) for f in futures], [[1, 2]] * 40)
+        self.assertLessEqual(self.client.executes, 2)
+        stats = self.buffer.stats()
+        self.assertEqual(stats["writes"], 40)
+        self.assertEqual(stats["commands"], 80)
+        self.assertGreaterEqual(stats["batch_size_max"], 39)
+        self.assertIsNotNone(stats["flush_latency_p99_ms"])
+
+    def test_max_batch(self):
+        """Un lote nunca supera `max_batch` escrituras."""
+        self.client.gate.clear()
+        futures = [self.buffer.submit(lambda pipe, i=i: pipe.set(f"k{i}", i)) for i in range(150)]
+        self.client.gate.set()
+        for future in futures:
+            future.result(5)
+        self.assertLessEqual(self.buffer.stats()["batch_size_max"], 64)
+
+    def test_pending_reads(self):
+        """El valor encolado se lee hasta que el lote se confirma."""
+        self.client.gate.clear()
+        future = self.buffer.submit(lambda pipe: pipe.set("k", "v"), key="k", payload="v")
+        self.assertEqual(self.buffer.get_pending("k"), "v")
+        self.client.gate.set()
+        future.result(5)
+        self.assertIsNone(self.buffer.get_pending("k"))
+        self.assertEqual(self.client.get("k"), "v")
+
+    def test_batch_failure(self):
+        """Si el lote falla, cada escritura recibe el error."""
+        self.client.fail = True
+        future = self.buffer.submit(lambda pipe: pipe.set("k", "v"))
+        with self.assertRaises(redis.ConnectionError):
+            future.result(5)
+        self.assertEqual(self.buffer.stats()["errors"], 1)
+
+    def test_sync_timeout(self):
+        """Si las escrituras no se confirman a tiempo, sync lo notifica."""
+        self.client.gate.clear()
+        self.buffer.submit(lambda pipe: pipe.set("k", "v"))
+        with self.assertRaises(TimeoutError):
+            self.buffer.sync(timeout=0.05)
+        self.client.gate.set()
+        self.buffer.sync(timeout=5)
+        self.assertEqual(self.client.get("k"), "v")
+
+    def test_close_flushes(self):
+        """Al cerrar se confirman las escrituras pendientes."""
+        self.buffer.submit(lambda pipe: pipe.set("k", "v"))
+        self.buffer.close()
+        self.assertEqual(self.client.get("k"), "v")
+        with self.assertRaises(RuntimeError):
+            self.buffer.submit(lambda pipe: pipe.set("k", "w"))
+
+
+class TestRedisServiceWriteBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.client = GatedRedis()
+        env = {"REDIS_WRITE_BUFFER": "1", "REDIS_WRITE_FLUSH_MS": "5"}
+        with patch.dict(os.environ, env), \
+             patch('api.services.redis.redis.Redis.from_url', return_value=self.client):
+            self.service = RedisService()
+        self.addCleanup(self.service.close)
+
+    def test_durable_write(self):
+        """Una escritura durable solo devuelve tras confirmarse en Redis."""
+        self.assertTrue(self.service.set_conversation("a", _conversation("a")))
+        self.assertIsNotNone(self.client.get(conversation_key("a")))
+        self.assertEqual(self.service.get_conversation_version("a"), 1)
+
+    def test_durable_write_error(self):
+        """Si el lote falla, la escritura durable devuelve False."""
+        self.client.fail = True
+        self.assertFalse(self.service.set_conversation("a", _conversation("a")))
+
+    def test_deferred_write(self):
+        """Una escritura diferida devuelve enseguida y se lee antes de confirmarse."""
+        self.client.gate.clear()
+        self.assertTrue(self.service.set_conversation("a", _conversation("a", "diferida"),
+                                                      durable=False))
+        self.assertIsNone(self.client.get(conversation_key("a")))
+        self.assertEqual(self.service.get_conversation("a").messages[0].content, "diferida")
+        self.client.gate.set()
+        self.service.sync_writes()
+        self.assertIsNotNone(self.client.get(conversation_key("a")))
+
+    def test_delete_after_deferred_write(self):
+        """Borrar espera a las escrituras diferidas para no resucitar la conversación."""
+        self.service.set_conversation("a", _conversation("a"), durable=False)
+        self.assertTrue(self.service.delete_conversation("a"))
+        self.assertIsNone(self.service.get_conversation("a"))
+
+    def test_delete_waits_for_deferred_write(self):
+        """Si la escritura diferida no se confirma a tiempo, el borrado no sigue."""
+        self.service.write_timeout = 0.05
+        self.client.gate.clear()
+        self.service.set_conversation("a", _conversation("a"), durable=False)
+        with self.assertRaises(TimeoutError):
+            self.service.delete_conversation("a")
+        self.client.gate.set()
+        self.service.write_timeout = 5
+        self.assertTrue(self.service.delete_conversation("a"))
+        self.assertIsNone(self.service.get_conversation("a"))
+
+    def test_concurrent_turns(self):
+        """Los turnos concurrentes se confirman en muchos menos pipelines."""
+        def turn(i):
+            conversation = _conversation(f"c{i}")
+            self.service.set_conversation(f"c{i}", conversation)
+            self.service.set_conversation(f"c{i}", conversation, durable=False)
+        threads = [threading.Thread(target=turn, args=(i,)) for i in range(32)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.service.sync_writes()
+        self.assertEqual(self.service.get_conversation_version("c7"), 2)
+        self.assertLess(self.client.executes, 2 * 32)
+        self.assertEqual(self.service.write_stats()["writes"], 2 * 32 + 1)  # más la marca de sync
+
+
+if __name__ == '__main__':
+    unittest.main()